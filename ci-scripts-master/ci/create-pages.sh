@@ -32,7 +32,10 @@ function prepare_tarball_content() {
     if [ -d checksums ]; then
         cp -r checksums "$tarball_content_dir/ci/checksums"
     fi
-    cp -r template "$tarball_content_dir/ci/template"
+    # template directory is not present since kl-upload-component.sh generates component.yaml itself
+    if [ -d template ]; then
+        cp -r template "$tarball_content_dir/ci/template"
+    fi
 }
 
 for version in $RELEASE_TAGS_FULL; do
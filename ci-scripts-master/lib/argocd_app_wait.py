@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+import sys
+import argparse
+import asyncio
+import json
+import random
+import shlex
+import time
+
+
+# adaptive polling: delay grows while application state does not change and drops back on every state change
+BACKOFF_FACTOR = 1.5
+MIN_POLL_DELAY = 0.5
+MAX_POLL_DELAY = 5
+# sync operation phases of failed sync
+FAILED_PHASES = ('Failed', 'Error')
+
+# exit codes (4 is the former argocd.sh revision deadline exit code)
+EXIT_FAILED = 1
+EXIT_TIMEOUT = 4
+
+
+class AppFailedException(Exception):
+    """Exception raised if sync of application revision fails or argocd CLI keeps failing
+
+    Args:
+        app (str): application name
+        error (str): error description
+    """
+    def __init__(self, app, error):
+        self.app = app
+        self.error = error
+
+
+class AppTimeoutException(Exception):
+    """Exception raised if application is not synced and healthy before the deadline
+
+    Args:
+        app (str): application name
+        state (str): last application state
+    """
+    def __init__(self, app, state):
+        self.app = app
+        self.state = state
+
+
+def app_state(app, revision):
+    """Returns (revision seen, synced, healthy, failed operation message, state description) of application
+
+    Args:
+        app (dict): application (argocd app get -o json)
+        revision (str): expected gitops revision (commit SHA, can be abbreviated)
+
+    """
+    status = app.get('status') or {}
+    sync = status.get('sync') or {}
+    health = (status.get('health') or {}).get('status', 'Unknown')
+    operation = status.get('operationState') or {}
+    sync_revision = sync.get('revision') or ''
+    seen = sync_revision.startswith(revision) or \
+        any((entry.get('revision') or '').startswith(revision) for entry in status.get('history') or [])
+    # application may be already synced to newer revision pushed by concurrent job
+    synced = seen and sync.get('status') == 'Synced'
+    operation_revision = ((operation.get('syncResult') or {}).get('revision') or
+                          ((operation.get('operation') or {}).get('sync') or {}).get('revision') or '')
+    failed = None
+    if operation.get('phase') in FAILED_PHASES and operation_revision.startswith(revision):
+        failed = operation.get('message') or operation['phase']
+    description = '{}/{} at {}'.format(sync.get('status', 'Unknown'), health, sync_revision[:8] or '-')
+    return seen, synced, synced and health == 'Healthy', failed, description
+
+
+async def _argocd(argocd, *args):
+    process = await asyncio.create_subprocess_exec(*shlex.split(argocd), *args, stdout=asyncio.subprocess.PIPE,
+                                                   stderr=asyncio.subprocess.PIPE)
+    try:
+        stdout, stderr = await process.communicate()
+    except asyncio.CancelledError:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+    return process.returncode, stdout.decode(errors='replace'), stderr.decode(errors='replace')
+
+
+async def wait_for_app(app, revision, deadline, argocd='argocd', max_poll_delay=MAX_POLL_DELAY,
+                       min_poll_delay=MIN_POLL_DELAY, fail_retry_count=3, started=None, log=sys.stderr):
+    """Waits until application is synced to revision and healthy
+
+    The first poll requests refresh of the application, so Argo CD notices the new revision without waiting
+    for its periodic refresh. Polling delay grows (with jitter) from min_poll_delay up to max_poll_delay while
+    the application state does not change.
+
+    Args:
+        app (str): application name
+        revision (str): gitops revision (commit SHA, can be abbreviated)
+        deadline (float): time.monotonic() deadline
+        argocd (str): argocd command (may contain global options)
+        max_poll_delay (float): maximum delay between polls in seconds
+        min_poll_delay (float): initial delay between polls in seconds
+        fail_retry_count (int): how many times in a row argocd app get can fail
+        started (float): time.monotonic() start of the wait (default now)
+        log (file): stream for progress messages
+
+    Returns:
+        dict: seconds to revision seen, to synced and to healthy
+
+    Raises:
+        AppFailedException: if sync of the revision fails or argocd app get fails more than fail_retry_count times
+        AppTimeoutException: if application is not synced and healthy before deadline
+
+    """
+    started = time.monotonic() if started is None else started
+    min_poll_delay = min(min_poll_delay, max_poll_delay)
+    delay = min_poll_delay
+    fail_count = 0
+    state = None
+    times = {'seen': None, 'synced': None, 'healthy': None}
+    refresh = ['--refresh']
+    while True:
+        try:
+            returncode, stdout, stderr = await asyncio.wait_for(
+                _argocd(argocd, 'app', 'get', app, '-o', 'json', *refresh), max(deadline - time.monotonic(), 0.001))
+        except asyncio.TimeoutError:
+            raise AppTimeoutException(app, state)
+        try:
+            if returncode != 0:
+                raise ValueError(stderr.strip() or 'exit code {}'.format(returncode))
+            seen, synced, healthy, failed, new_state = app_state(json.loads(stdout), revision)
+        except (ValueError, AttributeError) as e:
+            fail_count += 1
+            print("ERROR: {}: argocd app get failed: {}".format(app, e), file=log, flush=True)
+            if fail_count > fail_retry_count:
+                raise AppFailedException(app, str(e))
+            delay = min(delay * BACKOFF_FACTOR, max_poll_delay)
+        else:
+            fail_count = 0
+            refresh = []
+            now = time.monotonic() - started
+            for event, reached in (('seen', seen), ('synced', synced), ('healthy', healthy)):
+                if reached and times[event] is None:
+                    times[event] = now
+            if failed:
+                raise AppFailedException(app, 'sync of {} failed: {}'.format(revision, failed))
+            if healthy:
+                print("{}: synced in {:.1f}s, healthy in {:.1f}s".format(app, times['synced'], times['healthy']),
+                      file=log, flush=True)
+                return times
+            if new_state != state:
+                print("INFO: {}: {}".format(app, new_state if seen else 'waiting for revision {} ({})'.format(
+                    revision, new_state)), file=log, flush=True)
+            delay = min_poll_delay if new_state != state else min(delay * BACKOFF_FACTOR, max_poll_delay)
+            state = new_state
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise AppTimeoutException(app, state)
+        await asyncio.sleep(min(random.uniform(delay / 2, delay), remaining))
+
+
+async def wait_for_apps(apps, revision, timeout, **kwargs):
+    """Waits for all applications concurrently under single deadline
+
+    Args:
+        apps (list): application names
+        revision (str): gitops revision
+        timeout (float): timeout in seconds
+        kwargs: see wait_for_app()
+
+    Returns:
+        list: times (dict) or exception per application (in apps order)
+
+    """
+    started = time.monotonic()
+    deadline = started + timeout
+
+    async def wait(app):
+        try:
+            return await wait_for_app(app, revision, deadline, started=started, **kwargs)
+        except (AppFailedException, AppTimeoutException) as e:
+            return e
+
+    return await asyncio.gather(*[wait(app) for app in apps])
+
+
+def get_exit_code(results):
+    """Returns aggregated exit code: 1 if sync of any application failed, 4 on timeout"""
+    for exception, exit_code in ((AppFailedException, EXIT_FAILED), (AppTimeoutException, EXIT_TIMEOUT)):
+        if any(isinstance(result, exception) for result in results):
+            return exit_code
+    return 0
+
+
+def format_summary(apps, results):
+    """Returns table of time to synced and time to healthy per application
+
+    Args:
+        apps (list): application names
+        results (list): times or exception per application
+
+    Returns:
+        str: formatted table
+
+    """
+    def seconds(value):
+        return '-' if value is None else '{:.1f}s'.format(value)
+
+    width = max([len('application')] + [len(app) for app in apps])
+    lines = ["{:<{width}}  {:>14}  {:>15}  {}".format('application', 'time to synced', 'time to healthy', 'result',
+                                                      width=width)]
+    for app, result in zip(apps, results):
+        if isinstance(result, AppFailedException):
+            times, outcome = {}, 'failed: {}'.format(result.error)
+        elif isinstance(result, AppTimeoutException):
+            times, outcome = {}, 'timeout ({})'.format(result.state or 'no state')
+        else:
+            times, outcome = result, 'ok'
+        lines.append("{:<{width}}  {:>14}  {:>15}  {}".format(app, seconds(times.get('synced')),
+                                                              seconds(times.get('healthy')), outcome, width=width))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Wait until Argo CD applications are synced to gitops revision '
+                                                 'and healthy (concurrently, under single deadline)')
+    parser.add_argument('apps', type=str, nargs='+', help='application names')
+    parser.add_argument('--revision', type=str, required=True, help='gitops revision (commit SHA)')
+    parser.add_argument('--argocd', type=str, default='argocd', help='argocd command (default: %(default)s)')
+    parser.add_argument('--timeout', type=float, default=300, help='deadline for all applications in seconds '
+                                                                   '(default: %(default)s)')
+    parser.add_argument('--max-poll-delay', type=float, default=MAX_POLL_DELAY,
+                        help='maximum delay between polls in seconds (default: %(default)s)')
+
+    args = parser.parse_args()
+    results = asyncio.run(wait_for_apps(args.apps, args.revision, args.timeout, argocd=args.argocd,
+                                        max_poll_delay=args.max_poll_delay))
+    print(format_summary(args.apps, results))
+    exit(get_exit_code(results))
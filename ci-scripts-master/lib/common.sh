@@ -11,6 +11,7 @@ GITLAB_HOSTNAME=${CI_SCRIPTS_GITLAB_HOSTNAME:-"gitlab.seznam.net"}
 GITLAB_URL=${CI_SCRIPTS_GITLAB_URL:-"https://${GITLAB_HOSTNAME}"}
 GITLAB_USER_LOGIN_URL=${CI_SCRIPTS_GITLAB_USER_LOGIN_URL:-"https://${GITLAB_HOSTNAME}/api/v4/users"}
 KUBECTL_BIN=${KUBECTL_BIN:-kubectl}
+CI_SCRIPTS_LIB_DIR="$(dirname "$(readlink -f "${BASH_SOURCE[0]}")")"
 
 # assert on invalid global ci-scripts variables
 if [[ "${KUBECTL_BIN}" =~ --(password|token) ]]; then
@@ -58,7 +59,7 @@ function get_npm_version() {
 # retrieve version from Cargo.toml https://doc.rust-lang.org/cargo/reference/manifest.html#the-version-field
 # It uses semver definition, see https://semver.org/
 function get_cargo_version() {
-    local cargo_file="${1:-'Cargo.toml'}"
+    local cargo_file="${1:-Cargo.toml}"
     egrep 'version\s*=\s*"([0-9]+\.[0-9]+\.[0-9]+(-.+)?)"' "${cargo_file}" 2>/dev/null |
         sed -r 's/.*version\s*=\s*"(.*)".*/\1/m'
 }
@@ -81,58 +82,27 @@ function get_version_from_dockerfile() {
 # retrieve version from CHANGELOG.md file https://keepachangelog.com/en/1.0.0/
 # function is looking for the first occurence of "## [1.2whatever] - 2222-2-22 22:22"
 # string inside of brackets is returned
+# If [Unreleased] tag is present, it has to be followed by empty section (separated from the first version tag
+# by a new line), function exits otherwise. The changelog is indexed in single pass by release_history.py
+# (see `release_history.py index` for JSON index of all sections).
 function get_version_from_changelog_md() {
     local changelog_file=${1:-"CHANGELOG.md"}
+    local ecode=0
     if [ -f "${changelog_file}" -a -s "${changelog_file}" ]; then
-        local line_with_unreleased_tag=$(grep -m 1 -Ein "^##[ \t]+\[Unreleased.*\]" "${changelog_file}")
-        local line_with_version_tag=$(grep -m 1 -En "^##[ \t]+\[[ \t]*[0-9]+\.[0-9]+\.[0-9]+[^]]*\]" "${changelog_file}")
-
-        # If [Unreleased] tag is present, check if there are any changes not included in the actual release.
-        # Shortly, if there is any text between lines with [Unreleased] and first [1.2.3] version tag, then function fails.
-        if [ ! -z "$line_with_unreleased_tag" ]; then
-            local line_from=$(echo $line_with_unreleased_tag | sed -e 's/:.*//g')
-            local line_to=$(($(echo $line_with_version_tag | sed -e 's/:.*//g') - 1 ))
-
-            if [ $line_from -eq $line_to ]; then
-                myexit 1 "Error: [Unreleased] tag should be separated from the last release section by a new line."
-            fi
-            if [ $line_from -gt $line_to ]; then
-                myexit 1 "Error: [Unreleased] tag has to be defined before the first version tag."
-            fi
-
-            while read line; do
-                if [[ $line =~ [^[:space:]] ]]; then
-                    myexit 1 "Error: There are changes in the [Unreleased] part of a changelog, which are already commited.
-Move them to the part of the changelog which is related to the changes or raise the version number."
-                fi
-            done < <(head -$line_to  "${changelog_file}" | tail -$(($line_to - $line_from)))
-        fi
-
-        echo $line_with_version_tag | grep -Eo '[0-9]+\.[0-9]+\.[0-9]+[^] ]*'
+        python3 "${CI_SCRIPTS_LIB_DIR}/release_history.py" version --changelog "${changelog_file}" || ecode=$?
+        # exit code 3: there is no version tag
+        [ "${ecode}" -eq 3 ] && return 1
+        [ "${ecode}" -eq 0 ] || exit 1
     fi
 }
 
+# get_version ( [--explain] )
+#   resolves version from the first non-empty source (see PROBES in version_resolver.py for the order),
+#   sources are probed lazily and the result is memoized per HEAD commit and working tree state
+#   within CI job (or in CI_SCRIPTS_VERSION_CACHE_DIR if set), --explain prints the winning source and probe timing
+#   to stderr
 function get_version() {
-    for version in \
-        "$VERSION" \
-        "$([ -x "$PWD/ci/version.sh" ] && bash "$PWD/ci/version.sh")" \
-        "$(get_deb_version)" \
-        "$(make _print-VERSION 2>/dev/null)" \
-        "$(make _print-version 2>/dev/null)" \
-        "$(get_npm_version)" \
-        "$(get_cargo_version)" \
-        "$(cat "$PWD/VERSION" 2>/dev/null)" \
-        "$(get_version_from_changelog_md)" \
-        "$(get_version_from_dockerfile)" \
-        "$(get_version_from_git_tag)" \
-        "$(get_git_revision)";
-    do
-        test -n "$version" && break
-    done
-    if [ "$(echo $version | wc -w)" -ne 1 ]; then
-        myexit 1 "ERROR: version '$version' can not contain whitespaces or be empty!"
-    fi
-    echo $version
+    trace_run get_version python3 "${CI_SCRIPTS_LIB_DIR}/version_resolver.py" "$@" || exit 1
 }
 
 # joins string using deliminator
@@ -250,7 +220,7 @@ function detect_docker_server_api_version() {
 #   assert container client is functional
 function ensure_docker_env() {
     local docker_server_api_version=
-    if ! ${DOCKER_BIN:-docker} info &>/dev/null; then
+    if ! trace_run docker_info ${DOCKER_BIN:-docker} info &>/dev/null; then
         # try to detect docker server API version if not defined
         if docker_server_api_version="$(detect_docker_server_api_version)"; then
             export DOCKER_API_VERSION="${docker_server_api_version}"
@@ -282,7 +252,7 @@ function ensure_docker_login() {
 
     # can not use --password-stdin because docker is broken and complains:
     # Error: Cannot perform an interactive login from a non TTY device
-    if ${DOCKER_BIN:-docker} login --password "$(<${password_file})" --username "${username}" "$server"; then
+    if trace_run docker_login ${DOCKER_BIN:-docker} login --password "$(<${password_file})" --username "${username}" "$server"; then
         mylog "docker login succeeded (${username}@${server})"
         return 0
     fi
@@ -387,6 +357,8 @@ function get_kubectl_version() {
 # Notes:
 #   * if arguments are not supplied, then everything is kept secret
 #   * if more than single regexp group is given then the just first group is used
+#   * all matches on the line are hidden
+#   * use secret_masker.py directly to hide secrets of more regexps (and secret variable values) in single pass
 #
 # exit code:
 #   * 2 invalid [regexp-with-group] argument
@@ -394,10 +366,26 @@ function get_kubectl_version() {
 # example: $ echo 'token: ffdsfdsfdsf' |  hide_secret 'token:[ \t]*(.+)$' '*'
 #          token: ***********
 function hide_secret () {
-    gawk -r -v "ch=${2:-"*"}" -v "re=${1:-"(.+)"}" \
-      '{m=match($0,re,ma); \
-        if((m>0)&&(ma[1,"length"]>0)){printf("%s%s%s\n",substr($0,1,ma[1,"start"]-1),genstr(ch,ma[1,"length"]),substr($0,ma[1,"start"]+ma[1,"length"]))}else{print}} \
-        function genstr(ch,cn){rstr="";for(_i=0;_i<cn;_i++){rstr=sprintf("%s%s",rstr,ch)}return(rstr)}'
+    python3 "${CI_SCRIPTS_LIB_DIR}/secret_masker.py" --pattern="${1:-"(.+)"}" --fill="${2:-"*"}"
+}
+
+# hide_secret_variables (<variable-name> [variable-name..])
+#   filters stdin stream hiding all occurrences of values of given (even not exported) variables with "*"
+# example: $ kubectl config view --raw | hide_secret_variables KUBE_TOKEN CI_JOB_TOKEN
+function hide_secret_variables () {
+    local name
+    local -a args=()
+    local -a variables=()
+    if [ "$#" -eq 0 ]; then
+        cat
+        return
+    fi
+    for name in "$@"; do
+        args+=(--secret-variable="${name}")
+        variables+=("${name}=${!name}")
+    done
+    # values are passed by environment only (export is a builtin), never by command line visible in ps
+    ( export "${variables[@]}"; python3 "${CI_SCRIPTS_LIB_DIR}/secret_masker.py" "${args[@]}" )
 }
 
 # join_files FILE [FILE..]
@@ -549,6 +537,12 @@ function generate_curl_credentials_for_docker_image_project() {
     fi
 }
 
+# docker_registry_api_url( <docker-image> )
+#   prints Harbor API base url of the registry <docker-image> belongs to,
+#   CI_SCRIPTS_DOCKER_REGISTRY_API_URL overrides it (e.g. test/harbor-api-mock.py url)
+function docker_registry_api_url() {
+    echo -n "${CI_SCRIPTS_DOCKER_REGISTRY_API_URL:-"https://$(echo -n "$1" | awk -F/ '{printf $1}')"}"
+}
 
 # docker_image_copy <src-image> <dst-image> [src-image-digest] [overwrite-ena]
 #   copies <src-image> to <dst-image> (using docker pull+tag+push or retag)
@@ -573,7 +567,7 @@ function docker_image_copy_retag () {
     fi
 
     # 1. test src image is present, receive image hash, test API access
-    local src_image_query_url="https://$(echo -n "${src_image}" | sed -r 's#/#/api/repositories/#;s#:#/tags/#')"
+    local src_image_query_url="$(docker_registry_api_url "${src_image}")/api/repositories/$(echo -n "${src_image}" | sed -r 's#^[^/]+/##;s#:#/tags/#')"
     if ! response=$(curl -L -K <(generate_curl_credentials_for_docker_image_project "${src_image}") "${src_image_query_url}"); then
         echo_stderr "${FUNCNAME[0]}(): Source image ${src_image} presence detection failed!"
         return 2
@@ -589,7 +583,7 @@ function docker_image_copy_retag () {
         return 4
     fi
 
-    local dst_image_query_url="https://$(echo -n "${dst_image}" | sed -r 's#/#/api/repositories/#;s#:#/tags/#')"
+    local dst_image_query_url="$(docker_registry_api_url "${dst_image}")/api/repositories/$(echo -n "${dst_image}" | sed -r 's#^[^/]+/##;s#:#/tags/#')"
     if response=$(curl -L -K <(generate_curl_credentials_for_docker_image_project "${dst_image}") "${dst_image_query_url}"); then
         dst_digest_detected=$(echo -n "${response}" | jq -r .digest)
         [ "${dst_digest_detected}" == "null" ] && dst_digest_detected=""
@@ -601,7 +595,7 @@ function docker_image_copy_retag () {
     fi
 
     # 2. retag action
-    local retag_query_url="https://$(echo -n "${dst_image}" | sed -r 's#/#/api/repositories/#;s#:.+$#/tags#')"
+    local retag_query_url="$(docker_registry_api_url "${dst_image}")/api/repositories/$(echo -n "${dst_image}" | sed -r 's#^[^/]+/##;s#:.+$#/tags#')"
     local dst_image_tag=$(echo -n "${dst_image}" | sed -r 's#^[^:]+:##')
     local src_image_project_repository="$(echo -n "${src_image}" | sed -r 's#^[^/]+/##;s#:.+$##')"
     local retag_data="$(printf '{"tag":"%s","src_image":"%s:%s","override":%s}' "${dst_image_tag}" \
@@ -631,6 +625,8 @@ function docker_image_copy_retag () {
 #   optionally verifies [src-image-digest]
 #   allows overwriting destination image if [overwrite-ena] is 1 or true
 function docker_image_copy() {
+    local src_image="$1"
+    local dst_image="$2"
     local src_image_registry_host=$(echo -n "${src_image}" | awk -F/ '{printf $1}')
     local dst_image_registry_host=$(echo -n "${dst_image}" | awk -F/ '{printf $1}')
 
@@ -643,3 +639,134 @@ function docker_image_copy() {
         docker_image_copy_pull_tag_push "$@"
     fi
 }
+
+# docker_image_promote <src-image> <src-image-digest> <overwrite-ena> <dst-image|dst-tag>...
+#   copies <src-image> to all destinations at once (see docker_image_promote.py), source digest is resolved once,
+#   destinations in the source registry are retagged concurrently, the others are pulled once and pushed concurrently
+#   optionally verifies <src-image-digest> (empty to skip), allows overwriting if <overwrite-ena> is 1 or true
+#   prints "<dst-image> <digest>" per promoted destination, latency per destination to stderr
+#   returns docker_image_copy return code of the first failed destination (8 if verification of digest fails)
+function docker_image_promote() {
+    local src_image="$1"
+    local src_digest="$2"
+    local args=()
+    [ -n "${src_digest}" ] && args+=(--digest "${src_digest}")
+    [ "$3" == "1" -o "${3,,}" == "true" ] && args+=(--overwrite)
+    if [ -z "${src_image}" -o -z "$4" ]; then
+        echo_stderr "${FUNCNAME[0]}(): Source or destination image not specified!"
+        return 1
+    fi
+    python3 "${CI_SCRIPTS_LIB_DIR}/docker_image_promote.py" "${args[@]}" "${src_image}" "${@:4}"
+}
+
+# Tracing (opt-in, enabled by CI_SCRIPTS_TRACE_FILE, summarize traces of pipeline jobs with trace_report.py)
+#   trace_begin <span-name>                opens named span (spans nest)
+#   trace_end [exit-code]                  closes the innermost span
+#   trace_run <span-name> <cmd> [args..]   runs the command in a span, returns its exit code
+#   trace_end_all [exit-code]              closes all open spans (EXIT trap, call it from own EXIT trap)
+# Every script sourcing common.sh is traced as a span named by the script, spans of called ci-scripts are nested
+# under the calling span (CI_SCRIPTS_TRACE_PARENT). Closed span is appended to CI_SCRIPTS_TRACE_FILE as JSON line:
+#   {"name": .., "stack": "<parent span>;..", "start": <epoch>, "end": <epoch>, "spawns": <count>, "exit_code": ..,
+#    "pid": .., "job": CI_JOB_NAME, "job_id": CI_JOB_ID, "pipeline_id": CI_PIPELINE_ID}
+# spawns is number of processes started in the pid namespace during the span (concurrent processes included).
+# With tracing disabled the helpers are no-ops.
+if [ -n "${CI_SCRIPTS_TRACE_FILE}" ]; then
+    # _trace_clock
+    #   sets _CI_SCRIPTS_TRACE_NOW (epoch seconds) and _CI_SCRIPTS_TRACE_LAST_PID (last pid of the pid namespace)
+    #   using builtins only
+    function _trace_clock() {
+        local ignored
+        _CI_SCRIPTS_TRACE_NOW="${EPOCHREALTIME/,/.}"
+        if [ -z "${_CI_SCRIPTS_TRACE_NOW}" ]; then
+            _CI_SCRIPTS_TRACE_NOW="$(date +%s.%N)"
+        fi
+        _CI_SCRIPTS_TRACE_LAST_PID=
+        if [ -r /proc/loadavg ]; then
+            read -r ignored ignored ignored ignored _CI_SCRIPTS_TRACE_LAST_PID < /proc/loadavg
+        fi
+    }
+
+    # _trace_json_string <string>
+    #   sets _CI_SCRIPTS_TRACE_JSON to <string> escaped for JSON string
+    function _trace_json_string() {
+        _CI_SCRIPTS_TRACE_JSON="${1//\\/\\\\}"
+        _CI_SCRIPTS_TRACE_JSON="${_CI_SCRIPTS_TRACE_JSON//\"/\\\"}"
+        _CI_SCRIPTS_TRACE_JSON="${_CI_SCRIPTS_TRACE_JSON//$'\t'/ }"
+        _CI_SCRIPTS_TRACE_JSON="${_CI_SCRIPTS_TRACE_JSON//$'\n'/ }"
+    }
+
+    function trace_begin() {
+        local name="${1:-unnamed}"
+        _trace_clock
+        _CI_SCRIPTS_TRACE_NAMES+=("${name//;/_}")
+        _CI_SCRIPTS_TRACE_PARENTS+=("${CI_SCRIPTS_TRACE_PARENT}")
+        _CI_SCRIPTS_TRACE_STARTS+=("${_CI_SCRIPTS_TRACE_NOW}")
+        _CI_SCRIPTS_TRACE_PIDS+=("${_CI_SCRIPTS_TRACE_LAST_PID}")
+        export CI_SCRIPTS_TRACE_PARENT="${CI_SCRIPTS_TRACE_PARENT:+${CI_SCRIPTS_TRACE_PARENT};}${name//;/_}"
+    }
+
+    function trace_end() {
+        local exit_code="${1:-0}"
+        local depth=$(( ${#_CI_SCRIPTS_TRACE_NAMES[@]} - 1 ))
+        local spawns=null
+        local name=
+        local stack=
+        [ "${depth}" -ge 0 ] || return 0
+
+        _trace_clock
+        if [ -n "${_CI_SCRIPTS_TRACE_LAST_PID}" -a -n "${_CI_SCRIPTS_TRACE_PIDS[depth]}" ]; then
+            spawns=$(( _CI_SCRIPTS_TRACE_LAST_PID - _CI_SCRIPTS_TRACE_PIDS[depth] ))
+            # pid wrap-around
+            [ "${spawns}" -ge 0 ] || spawns=null
+        fi
+        _trace_json_string "${_CI_SCRIPTS_TRACE_NAMES[depth]}"
+        name="${_CI_SCRIPTS_TRACE_JSON}"
+        _trace_json_string "${_CI_SCRIPTS_TRACE_PARENTS[depth]}"
+        stack="${_CI_SCRIPTS_TRACE_JSON}"
+        _trace_json_string "${CI_JOB_NAME}"
+        printf '{"name": "%s", "stack": "%s", "start": %s, "end": %s, "spawns": %s, "exit_code": %d, "pid": %d, "job": "%s", "job_id": "%s", "pipeline_id": "%s"}\n' \
+            "${name}" "${stack}" "${_CI_SCRIPTS_TRACE_STARTS[depth]}" "${_CI_SCRIPTS_TRACE_NOW}" "${spawns}" \
+            "${exit_code}" "${BASHPID}" "${_CI_SCRIPTS_TRACE_JSON}" "${CI_JOB_ID}" "${CI_PIPELINE_ID}" \
+            2> /dev/null >> "${CI_SCRIPTS_TRACE_FILE}" || true
+
+        export CI_SCRIPTS_TRACE_PARENT="${_CI_SCRIPTS_TRACE_PARENTS[depth]}"
+        unset "_CI_SCRIPTS_TRACE_NAMES[depth]" "_CI_SCRIPTS_TRACE_PARENTS[depth]" \
+              "_CI_SCRIPTS_TRACE_STARTS[depth]" "_CI_SCRIPTS_TRACE_PIDS[depth]"
+    }
+
+    function trace_run() {
+        local exit_code=
+        trace_begin "$1"
+        shift
+        # failing command exits the script under errexit (span is closed by trace_end_all EXIT trap then)
+        "$@"
+        exit_code=$?
+        trace_end ${exit_code}
+        return ${exit_code}
+    }
+
+    function trace_end_all() {
+        while [ "${#_CI_SCRIPTS_TRACE_NAMES[@]}" -gt 0 ]; do
+            trace_end "${1:-0}"
+        done
+    }
+
+    # the script span is opened once per process (common.sh may be sourced repeatedly)
+    if [ -z "${_CI_SCRIPTS_TRACE_SCRIPT}" ]; then
+        _CI_SCRIPTS_TRACE_SCRIPT="${0##*/}"
+        _CI_SCRIPTS_TRACE_NAMES=()
+        _CI_SCRIPTS_TRACE_PARENTS=()
+        _CI_SCRIPTS_TRACE_STARTS=()
+        _CI_SCRIPTS_TRACE_PIDS=()
+        if [[ "${CI_SCRIPTS_TRACE_FILE}" == */* ]]; then
+            mkdir -p "${CI_SCRIPTS_TRACE_FILE%/*}"
+        fi
+        trace_begin "${_CI_SCRIPTS_TRACE_SCRIPT}"
+        trap 'trace_end_all $?' EXIT
+    fi
+else
+    function trace_begin() { :; }
+    function trace_end() { :; }
+    function trace_end_all() { :; }
+    function trace_run() { shift; "$@"; }
+fi
@@ -12,6 +12,21 @@
 #   -c|--component         COMPONENT  Redefine component name (of docker image registry/namespace/component:tag)
 #   -n|--namespace         NAMESPACE  Redefine namespace name (of docker image registry/namespace/component:tag)
 #   -d|--docker-image-name NAME       Redefine whole docker image name
+#   --registry-cache                  Build with BuildKit layer cache stored in CI registry (see below)
+#
+# The script is sensitive to the following env variables:
+#     CI_SCRIPTS_DOCKER_BUILD_CACHE                 - default: false (true is the same as --registry-cache)
+#     CI_SCRIPTS_DOCKER_BUILD_CACHE_FALLBACK_BRANCH - default: master
+#     CI_SCRIPTS_DOCKER_BUILD_REPORT_FILE           - default: empty (write cache hit ratio and build time as JSON)
+#     CI_SCRIPTS_DEVELOPMENT_DOCKER_REGISTRY_USER          - default: empty (no login before registry cache build)
+#     CI_SCRIPTS_DEVELOPMENT_DOCKER_REGISTRY_PASSWORD_FILE - default: empty (no login before registry cache build)
+#
+# Registry cache: the image is built by BuildKit with inline cache and pushed to CI registry as
+# <repository>:cache-<branch slug>. The next builds of the branch use it (and cache of the fallback branch)
+# as --cache-from. Tag pipelines only read the cache of the fallback branch. Failed login to CI registry or push
+# of the cache is reported as warning only. Volatile metadata (build date,
+# hostname and job id) are set by --label instead of --build-arg, so they do not invalidate cached layers.
+# Cache hit ratio and build time are reported after every build.
 #
 # Examples:
 #   ## Typical usage:
@@ -29,10 +44,12 @@ dir=$(dirname $self)
 # initialize global variables
 COMPONENT=
 DOCKER_IMAGE_NAME=
+REGISTRY_CACHE=${CI_SCRIPTS_DOCKER_BUILD_CACHE:-false}
+CACHE_FALLBACK_BRANCH=${CI_SCRIPTS_DOCKER_BUILD_CACHE_FALLBACK_BRANCH:-master}
 
 source $dir/common.sh
 
-pargs=$(getopt -o "h,c:,d:,b:,n:" -l "help,component:,docker-build-args:,docker-image-name:,namespace:" -n "$0" -- "$@")
+pargs=$(getopt -o "h,c:,d:,b:,n:" -l "help,component:,docker-build-args:,docker-image-name:,namespace:,registry-cache" -n "$0" -- "$@")
 eval set -- "$pargs"
 while true; do
   case "$1" in
@@ -52,6 +69,10 @@ while true; do
         DOCKER_IMAGE_NAME="$2"
         shift 2
         ;;
+    --registry-cache)
+        REGISTRY_CACHE=true
+        shift
+        ;;
     --)
         shift
         break
@@ -76,6 +97,15 @@ DOCKER_IMAGE_NAME=${DOCKER_IMAGE_NAME:-$(get_ci_docker_image_name)}
 
 ensure_docker_env
 
+# get_cache_docker_image_name <branch>
+#   registry cache image of branch, i.e. DOCKER_IMAGE_NAME with tag cache-<branch slug>
+function get_cache_docker_image_name() {
+    local repository="${DOCKER_IMAGE_NAME}"
+    # strip tag (not registry port)
+    [[ "${repository##*/}" == *:* ]] && repository="${repository%:*}"
+    echo "${repository}:cache-$(echo -n "$1" | tr 'A-Z' 'a-z' | tr -c 'a-z0-9_.-' '-' | cut -c1-100)"
+}
+
 if in_ci; then
     BUILD_TYPE="automated"
 else
@@ -89,10 +119,7 @@ if [ -x "$PWD/ci/docker-build.sh" ]; then
 fi
 
 docker_build_command+=(
-    --build-arg BUILD_DATE="$(date --iso-8601=seconds)"
-    --build-arg BUILD_HOSTNAME="$(hostname)"
     --build-arg BUILD_JOB_NAME="${CI_JOB_NAME:-$CI_BUILD_NAME}"
-    --build-arg BUILD_NUMBER="${CI_JOB_ID:-$CI_BUILD_ID}"
     --build-arg CI_COMMIT_TAG="${CI_COMMIT_TAG}"
     --build-arg VCS_REF="$(get_git_revision)"
     --build-arg VCS_BRANCH="$(get_git_branch)"
@@ -100,11 +127,62 @@ docker_build_command+=(
     --build-arg VERSION="$(get_version)"
     --build-arg BUILD_TYPE="$BUILD_TYPE"
     --pull=true
-    --no-cache=true
+)
+
+CACHE_IMAGE_NAME=
+CACHE_PUSH=false
+if [ "${REGISTRY_CACHE}" == "true" ]; then
+    # cache is pulled by the build, failed login must not fail the build (ensure_docker_login exits on failure)
+    if ( ensure_docker_login "${DOCKER_CI_REGISTRY}" "${CI_SCRIPTS_DEVELOPMENT_DOCKER_REGISTRY_USER}" "${CI_SCRIPTS_DEVELOPMENT_DOCKER_REGISTRY_PASSWORD_FILE}" ); then
+        CACHE_PUSH=true
+    else
+        mylog "WARNING: docker login to ${DOCKER_CI_REGISTRY} failed, registry cache will not be pushed"
+    fi
+    cache_branch="${CI_COMMIT_REF_SLUG:-$(get_git_branch)}"
+    # tag pipelines read the cache of the fallback branch only
+    if [ -z "${CI_COMMIT_TAG}" -a -n "${cache_branch}" ]; then
+        CACHE_IMAGE_NAME="$(get_cache_docker_image_name "${cache_branch}")"
+        docker_build_command+=(--cache-from "${CACHE_IMAGE_NAME}")
+    fi
+    if [ "$(get_cache_docker_image_name "${CACHE_FALLBACK_BRANCH}")" != "${CACHE_IMAGE_NAME}" ]; then
+        docker_build_command+=(--cache-from "$(get_cache_docker_image_name "${CACHE_FALLBACK_BRANCH}")")
+    fi
+    # volatile metadata are labels of the image config, build-args would invalidate the following layers
+    docker_build_command+=(
+        --label org.label-schema.build-date="$(date --iso-8601=seconds)"
+        --label org.label-schema.build-ci-host-name="$(hostname)"
+        --label org.label-schema.build-ci-build-id="${CI_JOB_ID:-$CI_BUILD_ID}"
+        --build-arg BUILDKIT_INLINE_CACHE=1
+        --progress=plain
+    )
+    export DOCKER_BUILDKIT=1
+else
+    docker_build_command+=(
+        --build-arg BUILD_DATE="$(date --iso-8601=seconds)"
+        --build-arg BUILD_HOSTNAME="$(hostname)"
+        --build-arg BUILD_NUMBER="${CI_JOB_ID:-$CI_BUILD_ID}"
+        --no-cache=true
+    )
+fi
+
+docker_build_command+=(
     "$@"
     -t "$DOCKER_IMAGE_NAME"
     .
 )
 mylog "Running docker build: ${docker_build_command[*]}"
-"${docker_build_command[@]}"
+# BuildKit writes the progress to stderr
+trace_run docker_build "${docker_build_command[@]}" 2>&1 | \
+    python3 "${dir}/docker_build_report.py" --image "${DOCKER_IMAGE_NAME}" \
+        ${CI_SCRIPTS_DOCKER_BUILD_REPORT_FILE:+--report-file "${CI_SCRIPTS_DOCKER_BUILD_REPORT_FILE}"}
 mylog "Created docker image: $DOCKER_IMAGE_NAME"
+
+if [ -n "${CACHE_IMAGE_NAME}" -a "${CACHE_PUSH}" == "true" ]; then
+    # missing cache must not fail the build
+    if ${DOCKER_BIN:-docker} tag "${DOCKER_IMAGE_NAME}" "${CACHE_IMAGE_NAME}" && \
+            trace_run docker_push_cache ${DOCKER_BIN:-docker} push "${CACHE_IMAGE_NAME}"; then
+        mylog "Pushed registry cache: ${CACHE_IMAGE_NAME}"
+    else
+        mylog "WARNING: push of registry cache ${CACHE_IMAGE_NAME} failed"
+    fi
+fi
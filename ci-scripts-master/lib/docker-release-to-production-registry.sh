@@ -11,6 +11,8 @@
 #   -n|--docker-image-name              NAME Define source docker image name (default: "", takes preference over --docker-image-name-file)
 #   -d|--docker-image-digest          DIGEST Define source docker image digest (default: "", takes preference over --docker-image-digest-file)
 #   -N|--destination-docker-image-name  NAME Define destination docker image name (autodetected using production-docker-image-name.sh if not specified)
+#   -e|--extra-tags                     TAGS Release the image with additional tags too (comma-separated list, e.g. "2,latest"),
+#                                            all tags are released at once (source digest is resolved once)
 #
 # The script is sensitive to the following env variables:
 #     DOCKER_RELEASE_PRODUCTION_DIGEST_FILE                 - default: docker-release-production.digest
@@ -24,6 +26,8 @@
 #        --docker-image-name docker.dev.dszn.cz/sklik-devops/kubelogmon-server:2.1.0-rc1
 #        --docker-image-digest sha256:3e5ae89edebe2c0d57d5f3a87d299ea6a2b4f5ba5396b56eee4ddfffd1ff3389
 #        --destination-docker-image-name "$(production-docker-image-name.sh docker.dev.dszn.cz/sklik-devops/kubelogmon-server:2.1.0-rc1)"
+# c] release with floating tags
+#    $ /ci/docker-release-to-production-registry.sh --extra-tags "$(/ci/latest-tags.sh)"
 
 set -eo pipefail
 
@@ -46,16 +50,18 @@ DOCKER_RELEASE_PRODUCTION_DIGEST_FILE=${DOCKER_RELEASE_PRODUCTION_DIGEST_FILE:-d
 # local functions
 # ---------------------------------------------------------------------------
 function cleanup() {
+    local ecode=$?
     if [ ${RETCODE} == 0 ]; then
         echo -e "\nINFO: All steps succeeded"
     elif [ ${RETCODE} == 254 ]; then
         echo -e "\nERROR: An unhandled issue occurred"
     fi
+    trace_end_all ${ecode}
 }
 
 # parse arguments
 # ---------------------------------------------------------------------------
-pargs=$(getopt -o "h,f:,F:,n:,d:,N:" -l "help,docker-image-name-file:,docker-image-digest-file:,docker-image-name:,docker-image-digest:,destination-docker-image-name:" -n "$0" -- "$@")
+pargs=$(getopt -o "h,f:,F:,n:,d:,N:,e:" -l "help,docker-image-name-file:,docker-image-digest-file:,docker-image-name:,docker-image-digest:,destination-docker-image-name:,extra-tags:" -n "$0" -- "$@")
 eval set -- "$pargs"
 while true; do
   case "$1" in
@@ -83,6 +89,10 @@ while true; do
         DESTINATION_DOCKER_IMAGE_NAME="$2"
         shift 2
         ;;
+    -e|--extra-tags)
+        EXTRA_TAGS="$2"
+        shift 2
+        ;;
     --)
         shift
         break
@@ -135,17 +145,23 @@ set | grep -E "^((DESTINATION_)?DOCKER_IMAGE_.+|CI_SCRIPTS_.+_DOCKER_REGISTRY.*)
 ensure_docker_env
 ensure_docker_login "${CI_SCRIPTS_PRODUCTION_DOCKER_REGISTRY}" "${CI_SCRIPTS_PRODUCTION_DOCKER_REGISTRY_USER}" "${CI_SCRIPTS_PRODUCTION_DOCKER_REGISTRY_PASSWORD_FILE}"
 
-if docker_image_copy "${DOCKER_IMAGE_NAME}" "${DESTINATION_DOCKER_IMAGE_NAME}" \
-                     "${DOCKER_IMAGE_DIGEST}" "${DESTINATION_DOCKER_IMAGE_OVERWRITE_ENABLED}" ; then
+# destination image with extra tags (the same repository)
+DESTINATION_DOCKER_IMAGES="${DESTINATION_DOCKER_IMAGE_NAME}"
+for extra_tag in $(echo "${EXTRA_TAGS}" | tr ',' ' '); do
+    DESTINATION_DOCKER_IMAGES="${DESTINATION_DOCKER_IMAGES} ${DESTINATION_DOCKER_IMAGE_NAME%:*}:${extra_tag}"
+done
+
+if PROMOTED_DOCKER_IMAGES="$(docker_image_promote "${DOCKER_IMAGE_NAME}" "${DOCKER_IMAGE_DIGEST}" \
+                             "${DESTINATION_DOCKER_IMAGE_OVERWRITE_ENABLED}" ${DESTINATION_DOCKER_IMAGES})"; then
 
-    echo $DESTINATION_DOCKER_IMAGE_NAME > ${DOCKER_RELEASE_PRODUCTION_URI_FILE}
-    get_docker_image_digest "$DESTINATION_DOCKER_IMAGE_NAME" > ${DOCKER_RELEASE_PRODUCTION_DIGEST_FILE}
+    echo "${PROMOTED_DOCKER_IMAGES}" | awk '{print $1}' > ${DOCKER_RELEASE_PRODUCTION_URI_FILE}
+    echo "${PROMOTED_DOCKER_IMAGES}" | awk '{print $2}' > ${DOCKER_RELEASE_PRODUCTION_DIGEST_FILE}
 
-    echo "INFO: docker image ${DOCKER_IMAGE_NAME} copied to ${DESTINATION_DOCKER_IMAGE_NAME}"
+    echo "INFO: docker image ${DOCKER_IMAGE_NAME} copied to ${DESTINATION_DOCKER_IMAGES}"
 else
     ecode=$?
     RETCODE=4
-    myexit --help ${RETCODE} "ERROR: docker image transfer failed (docker_image_copy(${DOCKER_IMAGE_NAME} ${DESTINATION_DOCKER_IMAGE_NAME} ${DOCKER_IMAGE_DIGEST}) -> ${ecode})."
+    myexit --help ${RETCODE} "ERROR: docker image transfer failed (docker_image_promote(${DOCKER_IMAGE_NAME} ${DOCKER_IMAGE_DIGEST} ${DESTINATION_DOCKER_IMAGES}) -> ${ecode})."
 fi
 
 RETCODE=0
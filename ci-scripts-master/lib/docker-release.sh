@@ -12,6 +12,8 @@
 # Notes:
 #   * $DOCKER_IMAGE_NAME can be set via --docker-image-name only, is is NOT read from the environment
 #   * $NAMESPACE, $COMPONENT, $TAG are read from the environment but are individually overridable using OPTIONS
+#   * the image and all extra tags are released at once (the input image is pulled once, destinations are pushed
+#     concurrently or retagged by Harbor API within the same registry)
 #
 # Possible OPTIONS are:
 #   -h|--help                         Show this message and exists
@@ -134,23 +136,13 @@ if ! $OVERWRITE; then
     docker_image_exists || myexit $? "Cannot push to docker registry, image ($DOCKER_IMAGE_NAME) probably exists?"
 fi
 
-set -x
-${DOCKER_BIN} pull $INPUT_DOCKER_IMAGE_NAME
-${DOCKER_BIN} tag $INPUT_DOCKER_IMAGE_NAME $DOCKER_IMAGE_NAME
-${DOCKER_BIN} push $DOCKER_IMAGE_NAME
-[ -z "$TRACE" ] && set +x
-
-echo $DOCKER_IMAGE_NAME > ${DOCKER_RELEASE_URI_FN}
-get_docker_image_digest "$DOCKER_IMAGE_NAME" > ${DOCKER_RELEASE_DIGEST_FN}
-
-if [ -n "$EXTRA_TAGS" ]; then
-    for extra_tag in $(echo "$EXTRA_TAGS" | tr ',' ' '); do
-        set -x
-        DOCKER_IMAGE_NAME="$(get_docker_image_name "" "" "" $extra_tag)"
-        ${DOCKER_BIN} tag $INPUT_DOCKER_IMAGE_NAME $DOCKER_IMAGE_NAME
-        ${DOCKER_BIN} push $DOCKER_IMAGE_NAME
-        [ -z "$TRACE" ] && set +x
-        echo $DOCKER_IMAGE_NAME >> ${DOCKER_RELEASE_URI_FN}
-        get_docker_image_digest "$DOCKER_IMAGE_NAME" >> ${DOCKER_RELEASE_DIGEST_FN}
-    done
-fi
+# the image and all extra tags are promoted at once (pulled once, pushed concurrently, retagged within the registry)
+DESTINATION_IMAGES="$DOCKER_IMAGE_NAME"
+for extra_tag in $(echo "$EXTRA_TAGS" | tr ',' ' '); do
+    DESTINATION_IMAGES="$DESTINATION_IMAGES $(get_docker_image_name "" "" "" $extra_tag)"
+done
+
+PROMOTED_IMAGES="$(docker_image_promote "$INPUT_DOCKER_IMAGE_NAME" "" true $DESTINATION_IMAGES)"
+
+echo "$PROMOTED_IMAGES" | awk '{print $1}' > ${DOCKER_RELEASE_URI_FN}
+echo "$PROMOTED_IMAGES" | awk '{print $2}' > ${DOCKER_RELEASE_DIGEST_FN}
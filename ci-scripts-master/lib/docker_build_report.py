@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+import sys
+import argparse
+import json
+import re
+import time
+
+
+# BuildKit plain progress: "#5 [2/4] RUN make", "#7 [build 3/6] COPY . /src", "#5 CACHED"
+BUILDKIT_STEP_RE = re.compile(r'^#(\d+) \[(?:[^\]]* )?\d+/\d+\] (\S+)')
+BUILDKIT_CACHED_RE = re.compile(r'^#(\d+) CACHED\s*$')
+# classic builder: "Step 2/4 : RUN make", " ---> Using cache"
+CLASSIC_STEP_RE = re.compile(r'^Step (\d+)/\d+ : (\S+)')
+CLASSIC_CACHED_RE = re.compile(r'^ ---> Using cache\s*$')
+
+
+class BuildOutputParser:
+    """Collects build steps and cache hits from docker build output (BuildKit plain progress or classic builder)
+
+    FROM steps are not counted as build steps.
+    """
+    def __init__(self):
+        self.steps = set()
+        self.cached = set()
+        self._classic_step = None
+
+    def feed(self, line):
+        """Processes single line of docker build output"""
+        match = BUILDKIT_STEP_RE.match(line)
+        if match:
+            if match.group(2).upper() != 'FROM':
+                self.steps.add(('buildkit', match.group(1)))
+            return
+        match = BUILDKIT_CACHED_RE.match(line)
+        if match:
+            self.cached.add(('buildkit', match.group(1)))
+            return
+        match = CLASSIC_STEP_RE.match(line)
+        if match:
+            self._classic_step = ('classic', match.group(1)) if match.group(2).upper() != 'FROM' else None
+            if self._classic_step:
+                self.steps.add(self._classic_step)
+            return
+        if self._classic_step and CLASSIC_CACHED_RE.match(line):
+            self.cached.add(self._classic_step)
+
+    def stats(self):
+        """Returns dict of steps, cached steps and cache hit ratio (None if there are no steps)"""
+        cached = len(self.cached & self.steps)
+        return {'steps': len(self.steps), 'cached': cached,
+                'hit_ratio': cached / len(self.steps) if self.steps else None}
+
+
+def report(input_stream, output_stream, started=None):
+    """Passes docker build output through and returns build statistics
+
+    Args:
+        input_stream (file): docker build output (binary stream, the output is copied byte-for-byte)
+        output_stream (file): binary stream the output is copied to
+        started (float): time.monotonic() start of the build (default now)
+
+    Returns:
+        dict: steps, cached, hit_ratio and seconds (build time)
+
+    """
+    started = time.monotonic() if started is None else started
+    parser = BuildOutputParser()
+    for line in input_stream:
+        output_stream.write(line)
+        output_stream.flush()
+        parser.feed(line.decode(errors='replace').rstrip('\n'))
+    return dict(parser.stats(), seconds=time.monotonic() - started)
+
+
+def format_report(stats, image=None):
+    """Returns single line summary of build statistics"""
+    ratio = '-' if stats['hit_ratio'] is None else '{:.0f}%'.format(stats['hit_ratio'] * 100)
+    return 'Docker build{}: {} of {} steps cached ({}), build time {:.1f}s'.format(
+        ' of ' + image if image else '', stats['cached'], stats['steps'], ratio, stats['seconds'])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pass docker build output (stdin) through and report cache hit '
+                                                 'ratio and build time')
+    parser.add_argument('--image', type=str, help='built image (for the report)')
+    parser.add_argument('--report-file', type=str, help='write statistics to file as JSON')
+
+    args = parser.parse_args()
+    stats = report(sys.stdin.buffer, sys.stdout.buffer)
+    print(format_report(stats, args.image))
+    if args.report_file:
+        with open(args.report_file, 'w') as f:
+            json.dump(dict(stats, image=args.image), f)
@@ -0,0 +1,484 @@
+#!/usr/bin/env python3
+import sys
+import argparse
+import base64
+import collections
+import http.client
+import json
+import os
+import re
+import shlex
+import subprocess
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_HTTP_TIMEOUT = 30
+# return codes of docker_image_copy (common.sh) kept for the same failures
+EXIT_SOURCE_NOT_FOUND = 2
+EXIT_SOURCE_DIGEST_UNKNOWN = 3
+EXIT_SOURCE_DIGEST_MISMATCH = 4
+EXIT_OVERWRITE_REFUSED = 5
+EXIT_TAG_FAILED = 6
+EXIT_PUSH_FAILED = 7
+EXIT_VERIFY_FAILED = 8
+
+PromotionResult = collections.namedtuple('PromotionResult', 'image method returncode error digest seconds')
+
+
+class PromotionFailedException(Exception):
+    """Exception raised if an image cannot be promoted
+
+    Args:
+        image (str): image which failed (source or destination)
+        returncode (int): docker_image_copy compatible return code
+        error (str): error description
+    """
+    def __init__(self, image, returncode, error):
+        self.image = image
+        self.returncode = returncode
+        self.error = error
+
+
+class RegistryApiException(Exception):
+    """Exception raised if Harbor API request fails
+
+    Args:
+        error (str): error description
+    """
+    def __init__(self, error):
+        self.error = error
+
+
+def split_image(image):
+    """Splits image name to registry host, repository (project/name) and tag
+
+    Example:
+        local-registry:5000/project/name:1.0 -> ('local-registry:5000', 'project/name', '1.0')
+    """
+    registry, _, path = image.partition('/')
+    repository, _, tag = path.rpartition(':')
+    if not repository or '/' in tag:
+        return registry, path, 'latest'
+    return registry, repository, tag
+
+
+def expand_destination(src_image, destination):
+    """Returns destination image name, destination without '/' is a tag of the source repository"""
+    if '/' in destination:
+        return destination
+    registry, repository, _ = split_image(src_image)
+    return '{}/{}:{}'.format(registry, repository, destination.lstrip(':'))
+
+
+def get_registry_credentials(image, environ=os.environ):
+    """Returns (user, password) for the registry project of image, the same as
+    generate_curl_credentials_for_docker_image_project (common.sh), None if there are none"""
+    for stage in ('DEVELOPMENT', 'PRODUCTION'):
+        prefix = 'CI_SCRIPTS_{}_DOCKER_REGISTRY'.format(stage)
+        registry, namespace = environ.get(prefix), environ.get(prefix + '_NAMESPACE')
+        user, password_file = environ.get(prefix + '_USER'), environ.get(prefix + '_PASSWORD_FILE')
+        if registry and namespace and user and password_file and \
+                re.match('^{}/{}[:/]'.format(re.escape(registry), re.escape(namespace)), image):
+            with open(password_file) as f:
+                return user, f.read().rstrip('\n')
+    return None
+
+
+class RegistryApiClient:
+    """Harbor (v1) repositories API client sharing pool of persistent (keep-alive) connections among threads
+
+    Connections closed by the server meanwhile are re-established (the request is retried once).
+
+    Args:
+        environ (dict): environment with CI_SCRIPTS_DOCKER_REGISTRY_API_URL and registry credentials
+        timeout (float): connection timeout in seconds
+    """
+    def __init__(self, environ=os.environ, timeout=DEFAULT_HTTP_TIMEOUT):
+        self.environ = environ
+        self.timeout = timeout
+        self.connections = 0
+        self._idle = collections.defaultdict(list)
+        self._credentials = {}
+        self._lock = threading.Lock()
+
+    def api_url(self, image):
+        """Returns API base url of the registry image belongs to (CI_SCRIPTS_DOCKER_REGISTRY_API_URL overrides it)"""
+        return self.environ.get('CI_SCRIPTS_DOCKER_REGISTRY_API_URL') or 'https://{}'.format(split_image(image)[0])
+
+    def _acquire(self, url):
+        key = (url.scheme, url.netloc)
+        with self._lock:
+            if self._idle[key]:
+                return True, self._idle[key].pop()
+            self.connections += 1
+        connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        return False, connection_class(url.hostname, url.port, timeout=self.timeout)
+
+    def _release(self, url, connection):
+        with self._lock:
+            self._idle[(url.scheme, url.netloc)].append(connection)
+
+    def _headers(self, image):
+        if image not in self._credentials:
+            self._credentials[image] = get_registry_credentials(image, self.environ)
+        headers = {'Accept': 'application/json'}
+        if self._credentials[image]:
+            token = base64.b64encode('{}:{}'.format(*self._credentials[image]).encode()).decode()
+            headers['Authorization'] = 'Basic {}'.format(token)
+        return headers
+
+    def request(self, image, method, path, body=None):
+        """Sends HTTP request to API of the registry image belongs to
+
+        Args:
+            image (str): image (selects registry and credentials)
+            method (str): HTTP method
+            path (str): API path (e.g. /api/repositories/project/name/tags)
+            body (object): request JSON body
+
+        Returns:
+            tuple: HTTP status (int), reply body (bytes)
+
+        Raises:
+            RegistryApiException: if the request fails on connection level
+
+        """
+        url = urllib.parse.urlsplit(self.api_url(image))
+        headers = self._headers(image)
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        for attempt in range(2):
+            reused, connection = self._acquire(url)
+            try:
+                connection.request(method, url.path.rstrip('/') + path, data, headers)
+                response = connection.getresponse()
+                reply = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                # keep-alive connection may have been closed by the server meanwhile, retry once on new one
+                if not reused or attempt:
+                    raise RegistryApiException('{} {}: {}: {}'.format(method, path, type(e).__name__, e))
+                continue
+            if response.will_close:
+                connection.close()
+            else:
+                self._release(url, connection)
+            return response.status, reply
+
+    def get_digest(self, image):
+        """Returns content digest of image, None if the image does not exist
+
+        Raises:
+            RegistryApiException: if the request fails
+        """
+        _, repository, tag = split_image(image)
+        status, reply = self.request(image, 'GET', '/api/repositories/{}/tags/{}'.format(repository, tag))
+        if status == 404:
+            return None
+        if status != 200:
+            raise RegistryApiException('{} details: HTTP {}'.format(image, status))
+        try:
+            return json.loads(reply.decode()).get('digest') or None
+        except (ValueError, AttributeError) as e:
+            raise RegistryApiException('{} details: {}'.format(image, e))
+
+    def retag(self, src_image, src_digest, dst_image, overwrite=False):
+        """Tags src_image content (src_digest) as dst_image within the same registry
+
+        Conflict (HTTP 409) is refusal only if the destination content differs, retried request (see request())
+        may conflict with the destination created by the first one whose reply was lost.
+
+        Raises:
+            PromotionFailedException: if destination exists with different content and overwrite is not enabled
+            RegistryApiException: if the request fails otherwise
+        """
+        _, src_repository, _ = split_image(src_image)
+        _, dst_repository, dst_tag = split_image(dst_image)
+        status, reply = self.request(dst_image, 'POST', '/api/repositories/{}/tags'.format(dst_repository),
+                                     {'tag': dst_tag, 'src_image': '{}:{}'.format(src_repository, src_digest),
+                                      'override': overwrite})
+        if status == 409 and self.get_digest(dst_image) != src_digest:
+            raise PromotionFailedException(dst_image, EXIT_OVERWRITE_REFUSED,
+                                           'exists with different content, refusing to override')
+        if not 200 <= status < 300 and status != 409:
+            raise RegistryApiException('{} retag: HTTP {} {}'.format(dst_image, status, reply.decode(errors='replace')))
+
+    def close(self):
+        """Closes all idle connections"""
+        with self._lock:
+            idle, self._idle = self._idle, collections.defaultdict(list)
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+
+class DockerCli:
+    """docker command-line wrapper (output of every command is captured, so concurrent commands do not mix)
+
+    Args:
+        docker_bin (str): docker command (may contain global options)
+    """
+    def __init__(self, docker_bin='docker'):
+        self.command = shlex.split(docker_bin)
+
+    def run(self, *args):
+        """Runs docker command, returns subprocess.CompletedProcess"""
+        return subprocess.run(self.command + list(args), stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                              universal_newlines=True)
+
+    def repo_digest(self, image):
+        """Returns content digest of locally available image, None if it cannot be detected"""
+        process = self.run('inspect', image)
+        try:
+            return json.loads(process.stdout)[0]['RepoDigests'][0].split('@')[1] if process.returncode == 0 else None
+        except (ValueError, LookupError, TypeError):
+            return None
+
+    def image_digests(self):
+        """Returns dict image -> content digest of all locally available images (single docker images call)"""
+        process = self.run('images', '--format', '{{ .Repository }}:{{ .Tag }} {{ .Digest }}', '--digests')
+        return dict(line.split()[:2] for line in process.stdout.splitlines() if len(line.split()) >= 2)
+
+
+class ImagePromoter:
+    """Promotes (copies) single source image to more destinations at once
+
+    The source digest is resolved once. Destinations in the source registry are retagged concurrently by Harbor API,
+    the rest (and retag failures) is copied by docker: the source is pulled once, tagged and pushed concurrently.
+    All destinations are finally verified to have the source digest.
+
+    Destinations are promoted by method retag or push, or left as they are if they already have the source
+    content (identical by Harbor API, present by docker pull).
+
+    Args:
+        src_image (str): source image
+        src_digest (str): expected source image digest (not verified if not set)
+        overwrite (bool): allow overwriting existing destination with different content
+        docker (DockerCli): docker wrapper
+        api (RegistryApiClient): Harbor API client (Harbor API is not used if not set)
+        max_workers (int): maximum number of concurrent retags/pushes
+    """
+    def __init__(self, src_image, src_digest=None, overwrite=False, docker=None, api=None,
+                 max_workers=DEFAULT_MAX_WORKERS):
+        self.src_image = src_image
+        self.src_digest = src_digest or None
+        self.overwrite = overwrite
+        self.docker = docker or DockerCli()
+        self.api = api
+        self.max_workers = max_workers
+        self._api_digest = None
+        self._docker_digest = None
+        self._docker_error = None
+        self._docker_lock = threading.Lock()
+
+    def _check_digest(self, digest):
+        if self.src_digest and digest != self.src_digest:
+            raise PromotionFailedException(self.src_image, EXIT_SOURCE_DIGEST_MISMATCH,
+                                           'has different content than expected (got:{} != expected:{})'.format(
+                                               digest, self.src_digest))
+
+    def _pull_source(self):
+        """Pulls the source image (just once for all destinations), returns its digest"""
+        with self._docker_lock:
+            if self._docker_digest is None and self._docker_error is None:
+                try:
+                    process = self.docker.run('pull', self.src_image)
+                    if process.returncode:
+                        raise PromotionFailedException(self.src_image, EXIT_SOURCE_NOT_FOUND,
+                                                       'pull failed: {}'.format(process.stdout.strip()))
+                    digest = self.docker.repo_digest(self.src_image)
+                    if not digest:
+                        raise PromotionFailedException(self.src_image, EXIT_SOURCE_DIGEST_UNKNOWN,
+                                                       'content digest detection failed')
+                    self._check_digest(digest)
+                    self._docker_digest = digest
+                except PromotionFailedException as e:
+                    self._docker_error = e
+            if self._docker_error:
+                raise self._docker_error
+            return self._docker_digest
+
+    def _copy_by_docker(self, dst_image):
+        src_digest = self._pull_source()
+        if not self.overwrite:
+            # the destination is checked only if it must not be overwritten
+            if self.docker.run('pull', dst_image).returncode == 0:
+                dst_digest = self.docker.repo_digest(dst_image)
+                if dst_digest == src_digest:
+                    return 'present'
+                if dst_digest:
+                    raise PromotionFailedException(dst_image, EXIT_OVERWRITE_REFUSED,
+                                                   'exists with different content ({} != {}), refusing to override'
+                                                   .format(src_digest, dst_digest))
+        process = self.docker.run('tag', self.src_image, dst_image)
+        if process.returncode:
+            raise PromotionFailedException(dst_image, EXIT_TAG_FAILED, 'tagging failed: {}'.format(process.stdout.strip()))
+        process = self.docker.run('push', dst_image)
+        if process.returncode:
+            raise PromotionFailedException(dst_image, EXIT_PUSH_FAILED, 'push failed: {}'.format(process.stdout.strip()))
+        return 'push'
+
+    def _copy_by_api(self, dst_image):
+        try:
+            if not self.overwrite and self.api.get_digest(dst_image) == self._api_digest:
+                return 'identical'
+            self.api.retag(self.src_image, self._api_digest, dst_image, self.overwrite)
+            return 'retag'
+        except RegistryApiException:
+            # the same fallback as docker_image_copy does
+            return self._copy_by_docker(dst_image)
+
+    def _promote(self, dst_image, use_api):
+        start = time.monotonic()
+        try:
+            method = self._copy_by_api(dst_image) if use_api else self._copy_by_docker(dst_image)
+            return PromotionResult(dst_image, method, 0, None, None, time.monotonic() - start)
+        except PromotionFailedException as e:
+            error = e.error if e.image == dst_image else '{} {}'.format(e.image, e.error)
+            return PromotionResult(dst_image, None, e.returncode, error, None, time.monotonic() - start)
+
+    def _resolve_source(self, api_images):
+        """Resolves the source digest once (by Harbor API if any destination is to be retagged, by docker pull
+        otherwise), returns True if Harbor API can be used"""
+        if api_images:
+            try:
+                self._api_digest = self.api.get_digest(self.src_image)
+            except RegistryApiException:
+                self._api_digest = None
+            if self._api_digest:
+                self._check_digest(self._api_digest)
+                return True
+        self._pull_source()
+        return False
+
+    def _verify(self, results, executor):
+        """Verifies all promoted destinations have the source digest in one pass (concurrent API queries
+        for retagged destinations, single docker images call for pushed ones)"""
+        by_docker = any(result.method in ('push', 'present') for result in results)
+        local_digests = self.docker.image_digests() if by_docker else {}
+
+        def detect(result):
+            if result.returncode:
+                return result
+            if result.method in ('push', 'present'):
+                src_digest = self._docker_digest
+                digest = local_digests.get(result.image)
+            else:
+                src_digest = self._api_digest
+                try:
+                    digest = self.api.get_digest(result.image)
+                except RegistryApiException:
+                    digest = None
+            if digest != src_digest:
+                return result._replace(returncode=EXIT_VERIFY_FAILED, digest=digest,
+                                       error='{}: verification failed (got:{} != expected:{})'.format(
+                                           result.image, digest, src_digest))
+            return result._replace(digest=digest)
+
+        return list(executor.map(detect, results))
+
+    def promote(self, dst_images):
+        """Promotes the source image to all destinations
+
+        Args:
+            dst_images (list): destination images
+
+        Returns:
+            list: PromotionResult per destination (in the same order), failed destinations have non-zero returncode
+
+        Raises:
+            PromotionFailedException: if the source image cannot be resolved (no destination is touched)
+
+        """
+        src_registry = split_image(self.src_image)[0]
+        api_images = {image for image in dst_images if self.api and split_image(image)[0] == src_registry}
+        use_api = self._resolve_source(api_images)
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(dst_images)))) as executor:
+            results = list(executor.map(lambda image: self._promote(image, use_api and image in api_images),
+                                        dst_images))
+            return self._verify(results, executor)
+
+
+def promote(src_image, dst_images, src_digest=None, overwrite=False, docker_bin='docker', environ=os.environ,
+            max_workers=DEFAULT_MAX_WORKERS):
+    """Promotes source image to all destinations (see ImagePromoter), Harbor API is used unless disabled
+    by CI_SCRIPTS_DOCKER_REGISTRY_USE_HARBOR_API_ENABLED
+
+    Returns:
+        list: PromotionResult per destination
+
+    Raises:
+        PromotionFailedException: if the source image cannot be resolved
+    """
+    api = None
+    if environ.get('CI_SCRIPTS_DOCKER_REGISTRY_USE_HARBOR_API_ENABLED', 'true') == 'true':
+        api = RegistryApiClient(environ)
+    try:
+        promoter = ImagePromoter(src_image, src_digest, overwrite, DockerCli(docker_bin), api, max_workers)
+        return promoter.promote(dst_images)
+    finally:
+        if api:
+            api.close()
+
+
+def get_exit_code(results):
+    """Returns return code of the first failed destination, 0 if all succeeded"""
+    return next((result.returncode for result in results if result.returncode), 0)
+
+
+def format_report(results):
+    """Returns table of method, result and latency per destination
+
+    Args:
+        results (list): PromotionResult per destination
+
+    Returns:
+        str: formatted table
+
+    """
+    width = max([len('destination')] + [len(result.image) for result in results])
+    row = "{:<{width}}  {:<9}  {:<6}  {:>8}"
+    lines = [row.format('destination', 'method', 'result', 'time', width=width)]
+    for result in results:
+        lines.append(row.format(result.image, result.method or '-', 'failed' if result.returncode else 'ok',
+                                '{:.2f}s'.format(result.seconds), width=width))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Promote (copy) docker image to more destination images/tags at once, '
+                                                 'prints "<destination> <digest>" per promoted destination')
+    parser.add_argument('src_image', type=str, help='source image')
+    parser.add_argument('dst_images', type=str, nargs='+',
+                        help='destination images (destination without "/" is a tag in the source repository)')
+    parser.add_argument('-d', '--digest', type=str, help='expected source image digest')
+    parser.add_argument('-o', '--overwrite', action='store_true',
+                        help='overwrite existing destination images with different content')
+    parser.add_argument('--docker-bin', type=str, default=os.environ.get('DOCKER_BIN') or 'docker',
+                        help='docker command (default: DOCKER_BIN or docker)')
+    parser.add_argument('-j', '--max-workers', type=int, default=DEFAULT_MAX_WORKERS,
+                        help='maximum number of concurrent retags/pushes (default: %(default)s)')
+
+    args = parser.parse_args()
+    dst_images = [expand_destination(args.src_image, destination) for destination in args.dst_images]
+    try:
+        results = promote(args.src_image, dst_images, args.digest, args.overwrite, args.docker_bin,
+                          max_workers=args.max_workers)
+
+    except PromotionFailedException as e:
+        print("Source image {} {}".format(e.image, e.error), file=sys.stderr)
+        exit(e.returncode)
+
+    for result in results:
+        if result.returncode:
+            print("Promotion to {} failed: {}".format(result.image, result.error), file=sys.stderr)
+        else:
+            print(result.image, result.digest)
+    print(format_report(results), file=sys.stderr)
+    exit(get_exit_code(results))
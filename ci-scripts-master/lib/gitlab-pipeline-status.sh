@@ -74,6 +74,7 @@ in_ci && read -r ACCESS_TOKEN <<< "${ACCESS_TOKEN:-$CI_PIPELINE_ACCESS_TOKEN}"
 
 tmpfile=$(mktemp)
 function cleanup {
+  trace_end_all $?
   rm -f "$tmpfile"
 }
 trap cleanup EXIT
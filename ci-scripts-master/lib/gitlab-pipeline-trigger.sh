@@ -15,6 +15,15 @@
 #   -r|--pipeline-git-ref  REF          Gitlab git reference (commit, branch, tag) name (default "master")
 #   -e|--pipeline-env      ENV-VAR-NAME Pass additional env.variable when triggering the pipeline. Can be repeated.
 #                                         specify just name of the env.variable (pair name=value will be passed)
+#   -f|--fan-out           FILE         Fan-out mode: trigger all pipelines listed in yaml FILE concurrently and wait
+#                                         for their final state (see gitlab_pipeline_fanout.py for the file format),
+#                                         triggers and state changes are printed as JSON lines, summary table
+#                                         with duration per pipeline is printed to stderr.
+#                                         Options below are used in fan-out mode only.
+#   --access-token         TOKEN        Gitlab User's private access token to get pipeline status. If not passed
+#                                         CI_PIPELINE_ACCESS_TOKEN is used.
+#   -j|--jobs              JOBS         Maximum number of pipelines being triggered at once (default 4)
+#   --timeout              TIMEOUT      Timeout in seconds for all pipelines (default 3600)
 #
 # Example:
 #   # trigger development-kubernetes-backup pipeline, branch my-branch, return the pipeline ID
@@ -23,11 +32,16 @@
 #   export A=a
 #   export B=b
 #   ./gitlab-pipeline-trigger.sh --project-id 8379 --pipeline-env A --pipeline-env B --output-format "." --trigger-token <pipeline-trigger-token>
+#   # trigger all downstream pipelines listed in downstream.yaml and wait for them
+#   ./gitlab-pipeline-trigger.sh --fan-out downstream.yaml --trigger-token <pipeline-trigger-token> --access-token <token>
 #
 # Exit codes:
 #   0        Operation succeeded.
 #   1        Failed to get arguments, or required argument is missing.
+#            Fan-out mode: any pipeline failed (or was canceled) or timeout reached.
 #   2        Failure causing pipeline not to be triggered, but GitLab requested.
+#            Fan-out mode: also if gitlab returned 404 for any pipeline status.
+#   99       Fan-out mode: maximum number of failed pipeline status requests reached.
 
 set -eo pipefail
 
@@ -44,10 +58,14 @@ TRIGGER_TOKEN=
 PIPELINE_GIT_REF="master"
 OUTPUT_FORMAT=".id"
 PIPELINE_ARGUMENTS=()
+FAN_OUT_FILE=
+ACCESS_TOKEN=
+FAN_OUT_JOBS=4
+FAN_OUT_TIMEOUT=3600
 
 source $dir/common.sh
 
-pargs=$(getopt -o "h,p:,i:,t:,o:,r:,e:" -l "help,project-id:,pipeline-id:,trigger-token:,output-format:,pipeline-git-ref:,pipeline-env:" -n "$0" -- "$@")
+pargs=$(getopt -o "h,p:,i:,t:,o:,r:,e:,f:,j:" -l "help,project-id:,pipeline-id:,trigger-token:,output-format:,pipeline-git-ref:,pipeline-env:,fan-out:,access-token:,jobs:,timeout:" -n "$0" -- "$@")
 eval set -- "$pargs"
 while true; do
   case "$1" in
@@ -76,6 +94,22 @@ while true; do
         PIPELINE_ARGUMENTS+=("variables[${2}]=${!2}")
         shift 2
         ;;
+    -f|--fan-out)
+        FAN_OUT_FILE="$2"
+        shift 2
+        ;;
+    --access-token)
+        ACCESS_TOKEN="$2"
+        shift 2
+        ;;
+    -j|--jobs)
+        FAN_OUT_JOBS="$2"
+        shift 2
+        ;;
+    --timeout)
+        FAN_OUT_TIMEOUT="$2"
+        shift 2
+        ;;
     --)
         shift
         break
@@ -86,6 +120,16 @@ while true; do
   esac
 done
 
+# fan-out mode, tokens are passed in environment not to be visible in process list
+if [ -n "${FAN_OUT_FILE}" ]; then
+    read -r ACCESS_TOKEN <<< "${ACCESS_TOKEN:-$CI_PIPELINE_ACCESS_TOKEN}"
+    [ -z "${ACCESS_TOKEN}" ] && \
+      myexit --help 1 'Private token must be set in fan-out mode! Use --access-token option or CI_PIPELINE_ACCESS_TOKEN environment var.'
+    GITLAB_ACCESS_TOKEN="${ACCESS_TOKEN}" GITLAB_TRIGGER_TOKEN="${TRIGGER_TOKEN:-$CI_PIPELINE_TRIGGER_TOKEN}" \
+      exec python3 $dir/gitlab_pipeline_fanout.py --gitlab-url "${GITLAB_URL}" --jobs "${FAN_OUT_JOBS}" \
+                                                  --timeout "${FAN_OUT_TIMEOUT}" "${FAN_OUT_FILE}"
+fi
+
 # fallback to GitLab CI environment variables / pipeline variables
 read -r PROJECT_ID <<< "${PROJECT_ID:-$CI_PIPELINE_PROJECT_ID}"
 
@@ -95,7 +139,7 @@ read -r PROJECT_ID <<< "${PROJECT_ID:-$CI_PIPELINE_PROJECT_ID}"
 
 # store the token in file (make sure to drop suffixing \n)
 temp_fn=$(mktemp)
-trap "rm -f ${temp_fn}" EXIT
+trap "trace_end_all \$?; rm -f ${temp_fn}" EXIT
 cat <<< "${TRIGGER_TOKEN:-$CI_PIPELINE_TRIGGER_TOKEN}" | tr -d '\n' > ${temp_fn}
 [ -s "${temp_fn}" ] || \
   myexit --help 1 "Trigger token has to be non-empty! Use -t|--trigger-token options or CI_PIPELINE_TRIGGER_TOKEN environment var."
@@ -1,20 +1,33 @@
 #!/bin/bash
 #
-# gitlab-wait-for-pipeline-status.sh [OPTIONS] [ADDITIONAL_OPTIONS]
+# gitlab-wait-for-pipeline-status.sh [OPTIONS]
 #
-# Returns a final status of a given gitlab pipeline other than `running/pending`.
+# Returns a final status of given gitlab pipeline(s) other than `running/pending`.
+# All pipelines are watched concurrently over single connection (see gitlab_pipeline_watch.py),
+# delay between status polls grows while the pipeline state does not change.
 #
 # Possible OPTIONS are:
 #   -h|--help                         Show this message and exists.
-#   --fail-retry-count   THRESHOLD    How many times the internal call of gitlab-pipeline-status.sh can fail. Default: 3
-#   --timeout            TIMEOUT      Timeout in seconds for how long we should wait until the
-#                                     pipeline status is not running. Default 60.
-#   --retry-delay        DELAY        What delay should be introducted between pipeline status retries. In seconds, default: 10.
-#   Everything after -- is consideres as ADDITIONAL_OPTIONS, and is passed as an argument to
-#   script gitlab-pipeline-status.sh which is internally used.
+#   -p|--project-id      PROJECT      Gitlab's project ID. If not passed and gitlab CI environment
+#                                     is detected, CI_PROJECT_ID env variable is used.
+#   -i|--pipeline-id     ID           Gitlab's pipeline ID, PROJECT:ID for pipeline of another project.
+#                                     Required, can be repeated. Final status of more pipelines is printed
+#                                     as "PROJECT ID STATUS" lines as soon as each pipeline finishes.
+#   --access-token       TOKEN        Gitlab User's private access token. If not passed and gitlab CI
+#                                     environment is detected, CI_PIPELINE_ACCESS_TOKEN is used.
+#   --fail-retry-count   THRESHOLD    How many times the pipeline status request can fail. Default: 3
+#   --timeout            TIMEOUT      Timeout in seconds (wall-clock) for how long we should wait until the
+#                                     pipelines are not running. Default 60.
+#   --retry-delay        DELAY        Maximum delay between pipeline status retries. In seconds, default: 10.
 #
 # Example:
-#   gitlab-wait-for-pipeline-status.sh --project-id 8379 --pipeline-id 427354 --token <my-private-access-token-to-gitlab-api>
+#   gitlab-wait-for-pipeline-status.sh --project-id 8379 --pipeline-id 427354 --access-token <my-private-access-token-to-gitlab-api>
+#
+# Exit codes:
+#   0        All pipelines reached final state.
+#   1        Failed to get arguments, or timeout reached.
+#   2        If gitlab returned 404 status code for any pipeline.
+#   99       If maximum number of failed retries was reached (gitlab returned status code different then 200 and 404).
 
 set -eo pipefail
 
@@ -27,17 +40,18 @@ dir=$(dirname $self)
 TIMEOUT=60
 RETRY_DELAY=10
 FAIL_RETRY_COUNT=3
+PROJECT_ID=
+PIPELINE_IDS=()
+ACCESS_TOKEN=
 
 source $dir/common.sh
 
-delegated_args=()
 pargs=$(getopt -o "h,t:,p:,i:" -l "help,timeout:,fail-retry-count:,retry-delay:,project-id:,pipeline-id:,access-token:" -n "$0" -- "$@")
 eval set -- "$pargs"
 while true; do
   case "$1" in
     -h|--help)
         help_display $self
-        $dir/gitlab-pipeline-status.sh --help
         exit 0
         ;;
     -t|--timeout)
@@ -52,49 +66,36 @@ while true; do
         RETRY_DELAY="$2"
         shift 2
         ;;
+    -p|--project-id)
+        PROJECT_ID="$2"
+        shift 2
+        ;;
+    -i|--pipeline-id)
+        PIPELINE_IDS+=(--pipeline-id "$2")
+        shift 2
+        ;;
+    --access-token)
+        ACCESS_TOKEN="$2"
+        shift 2
+        ;;
     --)
         shift
         break
         ;;
     *)
-        delegated_args+=($1)
-        shift
+        myexit --help 1 "Not implemented: $1"
         ;;
   esac
 done
 
-fail_count=0
-for i in $(seq 1 $RETRY_DELAY $TIMEOUT); do
-    # we dont want to fail, if gitlab is unavailable for a second
-    set +e
-    state="$("$dir/gitlab-pipeline-status.sh" "${delegated_args[@]}")"
-    exit_code=$?
-    set -e
-    if [ "$exit_code" -eq 0 ]; then
-        if [[ "$state" =~ ^(success|failed|canceled|skipped)$ ]]; then
-            echo $state
-            exit 0
-        elif [[ "$state" =~ ^(pending|running)$ ]]; then
-            mylog "INFO: Pipeline is still in '$state' state" >&2
-        else
-            mylog "WARNING: Pipeline is still in unknown '$state' state" >&2
-        fi
-    elif [ "$exit_code" -eq 99 ]; then
-        mylog "ERROR: Got error code $exit_code" >&2
-        fail_count=$(( $fail_count+1 ))
-
-        if [ $fail_count -gt "$FAIL_RETRY_COUNT" ]; then
-            mylog "FATAL: Reached maximum number of failed retries ($FAIL_RETRY_COUNT), exiting" >&2
-            exit 1
-        fi
-    else
-        mylog "FATAL: $state" >&2
-        exit 1
-    fi
-
-    sleep $RETRY_DELAY
-done
+# if passed project id was empty and we detect CI environment we fill current project
+in_ci && read -r PROJECT_ID <<< "${PROJECT_ID:-$CI_PROJECT_ID}"
+in_ci && read -r ACCESS_TOKEN <<< "${ACCESS_TOKEN:-$CI_PIPELINE_ACCESS_TOKEN}"
 
-mylog "Timeouted with last state: $state"
+[ "${#PIPELINE_IDS[@]}" -eq 0 ] && myexit --help 1 "Pipeline ID must be set!"
+[ -z $(cat <<< "$ACCESS_TOKEN") ] && myexit --help 1 "Private token must be set!"
 
-exit 1
+# access token is passed in environment not to be visible in process list
+GITLAB_ACCESS_TOKEN="${ACCESS_TOKEN}" exec python3 $dir/gitlab_pipeline_watch.py \
+    --gitlab-url "https://${GITLAB_HOSTNAME}" ${PROJECT_ID:+--project-id "${PROJECT_ID}"} "${PIPELINE_IDS[@]}" \
+    --timeout "${TIMEOUT}" --retry-delay "${RETRY_DELAY}" --fail-retry-count "${FAIL_RETRY_COUNT}"
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+import sys
+import asyncio
+import json
+import os
+import time
+import urllib.parse
+from ruamel.yaml import YAML
+from ruamel.yaml.error import YAMLError
+
+try:
+    from .gitlab_pipeline_watch import GitlabClient, GitlabTransientException, ArgumentParser, wait_for_pipeline
+    from .gitlab_pipeline_watch import PipelineNotFoundException, PipelineTransientException, PipelineTimeoutException
+    from .gitlab_pipeline_watch import EXIT_TIMEOUT, EXIT_NOT_FOUND, EXIT_TRANSIENT
+except ImportError:
+    from gitlab_pipeline_watch import GitlabClient, GitlabTransientException, ArgumentParser, wait_for_pipeline
+    from gitlab_pipeline_watch import PipelineNotFoundException, PipelineTransientException, PipelineTimeoutException
+    from gitlab_pipeline_watch import EXIT_TIMEOUT, EXIT_NOT_FOUND, EXIT_TRANSIENT
+
+
+DEFAULT_REF = 'master'
+# final states not failing the fan-out
+SUCCESSFUL_STATES = ('success', 'skipped')
+
+
+class FanOutFileException(Exception):
+    """Exception raised if fan-out file is not valid
+
+    Args:
+        fan_out_file (str): fan-out file path
+        error (str): error description
+    """
+    def __init__(self, fan_out_file, error):
+        self.fan_out_file = fan_out_file
+        self.error = error
+
+
+class TriggerFailedException(Exception):
+    """Exception raised if GitLab does not trigger the pipeline
+
+    Args:
+        error (str): error description
+    """
+    def __init__(self, error):
+        self.error = error
+
+
+def load_fan_out_file(fan_out_file, environ=os.environ):
+    """Reads list of pipelines to be triggered
+
+    File is yaml (or JSON) list of objects with keys:
+        project-id (required), ref (default master), variables (object, default empty),
+        trigger-token-env (name of environment variable with project's trigger token, default token is used if not set)
+
+    Args:
+        fan_out_file (str): fan-out file path
+        environ (dict): environment with trigger tokens
+
+    Returns:
+        list: dicts with keys project_id, ref, variables, trigger_token (None for default token)
+
+    Raises:
+        FanOutFileException: if the file is not valid
+
+    """
+    try:
+        with open(fan_out_file) as f:
+            entries = YAML(typ='safe').load(f)
+    except (OSError, YAMLError) as e:
+        raise FanOutFileException(fan_out_file, str(e))
+    if not isinstance(entries, list):
+        raise FanOutFileException(fan_out_file, 'list of pipelines expected')
+
+    pipelines = []
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict) or entry.get('project-id') in (None, ''):
+            raise FanOutFileException(fan_out_file, 'item {}: project-id is required'.format(index))
+        unknown = set(entry) - {'project-id', 'ref', 'variables', 'trigger-token-env'}
+        if unknown:
+            raise FanOutFileException(fan_out_file, 'item {}: unknown keys {}'.format(index, ', '.join(sorted(unknown))))
+        variables = entry.get('variables') or {}
+        if not isinstance(variables, dict):
+            raise FanOutFileException(fan_out_file, 'item {}: variables must be an object'.format(index))
+        trigger_token = None
+        if entry.get('trigger-token-env'):
+            trigger_token = environ.get(entry['trigger-token-env'])
+            if not trigger_token:
+                raise FanOutFileException(fan_out_file, 'item {}: environment variable {} is not set'.format(
+                    index, entry['trigger-token-env']))
+        pipelines.append({
+            'project_id': str(entry['project-id']),
+            'ref': str(entry.get('ref') or DEFAULT_REF),
+            'variables': {str(k): '' if v is None else str(v) for k, v in variables.items()},
+            'trigger_token': trigger_token,
+        })
+    return pipelines
+
+
+async def trigger_pipeline(client, project_id, ref, variables, trigger_token):
+    """Triggers pipeline via trigger token
+
+    Returns:
+        int: pipeline ID
+
+    Raises:
+        TriggerFailedException: if the pipeline is not triggered
+
+    """
+    form = [('token', trigger_token), ('ref', ref)] + \
+        [('variables[{}]'.format(name), value) for name, value in sorted(variables.items())]
+    path = '/api/v4/projects/{}/trigger/pipeline'.format(urllib.parse.quote(project_id, safe=''))
+    try:
+        status, body = await client.request('POST', path, urllib.parse.urlencode(form).encode())
+    except GitlabTransientException as e:
+        raise TriggerFailedException(e.error)
+    try:
+        pipeline_id = json.loads(body.decode()).get('id')
+    except (ValueError, AttributeError):
+        pipeline_id = None
+    if status not in (200, 201) or not isinstance(pipeline_id, int):
+        raise TriggerFailedException('GitLab pipeline trigger failure! Unexpected reply ({}): {}'.format(
+            status, body.decode(errors='replace')))
+    return pipeline_id
+
+
+async def fan_out(client, pipelines, trigger_token, timeout, jobs=4, emit=None, **kwargs):
+    """Triggers all pipelines (at most jobs at once) and waits for all of them concurrently
+
+    Waiting for a pipeline starts as soon as it is triggered, all pipelines share single deadline.
+
+    Args:
+        client (GitlabClient): GitLab client
+        pipelines (list): pipelines as returned by load_fan_out_file()
+        trigger_token (str): default trigger token
+        timeout (float): timeout of the whole fan-out in seconds
+        jobs (int): maximum number of pipelines being triggered at once
+        emit (callable): called with event dict on every trigger and pipeline state change
+        kwargs: see gitlab_pipeline_watch.wait_for_pipeline()
+
+    Returns:
+        list: result dict per pipeline (project_id, ref, pipeline_id, status, duration, error)
+
+    """
+    started = time.monotonic()
+    deadline = started + timeout
+    semaphore = asyncio.Semaphore(jobs)
+    emit = emit or (lambda event: None)
+
+    async def run(pipeline):
+        result = {'project_id': pipeline['project_id'], 'ref': pipeline['ref'], 'pipeline_id': None,
+                  'status': None, 'duration': None, 'error': None}
+
+        def event(name, **data):
+            emit(dict(event=name, project_id=result['project_id'], ref=result['ref'],
+                      pipeline_id=result['pipeline_id'], elapsed=round(time.monotonic() - started, 3), **data))
+
+        def on_state(_, state):
+            result['status'] = state
+            event('state', status=state)
+
+        try:
+            async with semaphore:
+                result['pipeline_id'] = await trigger_pipeline(client, pipeline['project_id'], pipeline['ref'],
+                                                               pipeline['variables'],
+                                                               pipeline['trigger_token'] or trigger_token)
+            triggered = time.monotonic()
+            event('triggered')
+            await wait_for_pipeline(client, (pipeline['project_id'], result['pipeline_id']), deadline,
+                                    on_state=on_state, **kwargs)
+            result['duration'] = time.monotonic() - triggered
+        except TriggerFailedException as e:
+            result['error'] = e
+            event('trigger_failed', error=e.error)
+        except (PipelineNotFoundException, PipelineTransientException, PipelineTimeoutException) as e:
+            result['error'] = e
+            event('error', status=result['status'], error=type(e).__name__)
+        return result
+
+    return await asyncio.gather(*[run(pipeline) for pipeline in pipelines])
+
+
+def get_exit_code(results):
+    """Returns aggregated exit code
+
+    2 if any pipeline was not triggered or found, 99 on transient errors, 1 on timeout or failed pipeline, 0 otherwise
+    """
+    errors = [result['error'] for result in results]
+    for exceptions, exit_code in (((TriggerFailedException, PipelineNotFoundException), EXIT_NOT_FOUND),
+                                  ((PipelineTransientException,), EXIT_TRANSIENT),
+                                  ((PipelineTimeoutException,), EXIT_TIMEOUT)):
+        if any(isinstance(error, exceptions) for error in errors):
+            return exit_code
+    if any(result['status'] not in SUCCESSFUL_STATES for result in results):
+        return 1
+    return 0
+
+
+def format_summary(results):
+    """Returns table of pipelines with final state and duration (from trigger to final state)"""
+    rows = [('project', 'ref', 'pipeline', 'status', 'duration')]
+    for result in results:
+        if isinstance(result['error'], TriggerFailedException):
+            status = 'not triggered'
+        elif isinstance(result['error'], PipelineTimeoutException):
+            status = 'timeout ({})'.format(result['status'])
+        elif result['error'] is not None:
+            status = 'unknown'
+        else:
+            status = result['status']
+        rows.append((result['project_id'], result['ref'], str(result['pipeline_id'] or '-'), status,
+                     '-' if result['duration'] is None else '{:.1f}s'.format(result['duration'])))
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    return '\n'.join('  '.join(value.ljust(width) for value, width in zip(row, widths)).rstrip() for row in rows)
+
+
+async def main(args, pipelines):
+    client = GitlabClient(args.gitlab_url, args.access_token, max_connections=args.jobs)
+
+    def emit(event):
+        print(json.dumps(event, sort_keys=True), flush=True)
+
+    try:
+        results = await fan_out(client, pipelines, args.trigger_token, args.timeout, args.jobs, emit,
+                                max_retry_delay=args.retry_delay, fail_retry_count=args.fail_retry_count)
+    finally:
+        await client.close()
+    print(format_summary(results), file=sys.stderr)
+    return get_exit_code(results)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Trigger GitLab pipelines listed in fan-out file concurrently and wait for '
+                                        'their final state. Triggers and state changes are printed as JSON lines.')
+    parser.add_argument('fan_out_file', type=str, help='yaml/JSON list of pipelines (project-id, ref, variables, '
+                                                       'trigger-token-env)')
+    parser.add_argument('--gitlab-url', type=str,
+                        default=os.environ.get('GITLAB_URL', 'https://{}'.format(
+                            os.environ.get('GITLAB_HOSTNAME', 'gitlab.seznam.net'))),
+                        help='GitLab URL (default: %(default)s)')
+    parser.add_argument('--access-token', type=str, default=os.environ.get('GITLAB_ACCESS_TOKEN'),
+                        help='private access token for pipeline status (default: GITLAB_ACCESS_TOKEN)')
+    parser.add_argument('--trigger-token', type=str, default=os.environ.get('GITLAB_TRIGGER_TOKEN'),
+                        help='default trigger token (default: GITLAB_TRIGGER_TOKEN)')
+    parser.add_argument('-j', '--jobs', type=int, default=4,
+                        help='maximum number of pipelines being triggered at once (default: %(default)s)')
+    parser.add_argument('-t', '--timeout', type=float, default=3600,
+                        help='timeout of the whole fan-out in seconds (default: %(default)s)')
+    parser.add_argument('--retry-delay', type=float, default=10,
+                        help='maximum delay between status polls in seconds (default: %(default)s)')
+    parser.add_argument('--fail-retry-count', type=int, default=3,
+                        help='how many times the status request can fail (default: %(default)s)')
+
+    args = parser.parse_args()
+    if not args.access_token:
+        parser.error('Private token must be set!')
+    if args.jobs < 1:
+        parser.error('--jobs must be positive')
+    try:
+        pipelines = load_fan_out_file(args.fan_out_file)
+    except FanOutFileException as e:
+        parser.error("Invalid fan-out file '{}': {}".format(e.fan_out_file, e.error))
+    if not args.trigger_token and any(pipeline['trigger_token'] is None for pipeline in pipelines):
+        parser.error('Trigger token must be set!')
+
+    exit(asyncio.run(main(args, pipelines)))
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+import sys
+import argparse
+import asyncio
+import json
+import os
+import random
+import ssl
+import time
+import urllib.parse
+
+
+FINAL_STATES = ('success', 'failed', 'canceled', 'skipped')
+RUNNING_STATES = ('pending', 'running')
+# requests which can be safely sent again (e.g. on reused keep-alive connection closed by the server)
+IDEMPOTENT_METHODS = ('GET', 'HEAD')
+
+# adaptive polling: delay grows while pipeline state does not change and drops back on every state change
+BACKOFF_FACTOR = 1.5
+MIN_RETRY_DELAY = 1
+
+# exit codes (same as gitlab-pipeline-status.sh)
+EXIT_TIMEOUT = 1
+EXIT_NOT_FOUND = 2
+EXIT_TRANSIENT = 99
+
+
+class GitlabTransientException(Exception):
+    """Exception raised if GitLab can not be reached or replies with unexpected status
+
+    Args:
+        error (str): error description
+    """
+    def __init__(self, error):
+        self.error = error
+
+
+class PipelineNotFoundException(Exception):
+    """Exception raised if GitLab replies 404 for pipeline
+
+    Args:
+        pipeline (tuple): (project ID, pipeline ID)
+        body (str): GitLab reply
+    """
+    def __init__(self, pipeline, body):
+        self.pipeline = pipeline
+        self.body = body
+
+
+class PipelineTransientException(Exception):
+    """Exception raised if maximum number of failed retries is reached
+
+    Args:
+        pipeline (tuple): (project ID, pipeline ID)
+        error (str): last error description
+    """
+    def __init__(self, pipeline, error):
+        self.pipeline = pipeline
+        self.error = error
+
+
+class PipelineTimeoutException(Exception):
+    """Exception raised if pipeline does not reach final state before the deadline
+
+    Args:
+        pipeline (tuple): (project ID, pipeline ID)
+        state (str): last known pipeline state
+    """
+    def __init__(self, pipeline, state):
+        self.pipeline = pipeline
+        self.state = state
+
+
+class GitlabClient:
+    """Minimal asyncio GitLab API client keeping pool of persistent (keep-alive) connections
+
+    At most max_connections requests are sent at once, connections closed by the server are re-established.
+
+    Args:
+        gitlab_url (str): GitLab URL (e.g. https://gitlab.seznam.net)
+        access_token (str): private access token (sent as PRIVATE-TOKEN header)
+        ssl_context (ssl.SSLContext): SSL context for https (default context if not set)
+        max_connections (int): connection pool size
+    """
+    def __init__(self, gitlab_url, access_token=None, ssl_context=None, max_connections=1):
+        url = urllib.parse.urlsplit(gitlab_url)
+        self.https = url.scheme == 'https'
+        self.host = url.hostname
+        self.port = url.port or (443 if self.https else 80)
+        self.base_path = url.path.rstrip('/')
+        self.access_token = access_token
+        self.ssl_context = ssl_context
+        self.connections = 0
+        self._idle = []
+        self._semaphore = asyncio.Semaphore(max_connections)
+
+    async def _connect(self):
+        ssl_context = (self.ssl_context or ssl.create_default_context()) if self.https else None
+        connection = await asyncio.open_connection(self.host, self.port, ssl=ssl_context)
+        self.connections += 1
+        return connection
+
+    async def close(self):
+        """Closes all idle connections"""
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            writer.close()
+
+    @staticmethod
+    async def _read_body(reader, headers):
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+                chunk = await reader.readexactly(size + 2)
+                if not size:
+                    break
+                chunks.append(chunk[:-2])
+            return b''.join(chunks)
+        if 'content-length' in headers:
+            return await reader.readexactly(int(headers['content-length']))
+        return await reader.read()
+
+    async def _request(self, connection, method, path, body, content_type):
+        reader, writer = connection
+        lines = ['{} {}{} HTTP/1.1'.format(method, self.base_path, path),
+                 'Host: {}'.format(self.host),
+                 'Accept: application/json',
+                 'Connection: keep-alive']
+        if self.access_token:
+            lines.append('PRIVATE-TOKEN: {}'.format(self.access_token))
+        if body is not None:
+            lines += ['Content-Type: {}'.format(content_type), 'Content-Length: {}'.format(len(body))]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode() + (body or b''))
+        await writer.drain()
+
+        status_line = await reader.readuntil(b'\r\n')
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = (await reader.readuntil(b'\r\n')).decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        data = await self._read_body(reader, headers)
+        keep_alive = headers.get('connection', '').lower() != 'close' and not status_line.startswith(b'HTTP/1.0')
+        return status, data, keep_alive
+
+    async def request(self, method, path, body=None, content_type='application/x-www-form-urlencoded'):
+        """Sends HTTP request to GitLab API
+
+        Args:
+            method (str): HTTP method
+            path (str): API path (e.g. /api/v4/projects/1/pipelines/2)
+            body (bytes): request body
+            content_type (str): request body content type
+
+        Returns:
+            tuple: HTTP status (int), reply body (bytes)
+
+        Non-idempotent requests (e.g. pipeline trigger POST) are sent on new connection and never retried,
+        the server may have processed the request even if the reply is lost.
+
+        Raises:
+            GitlabTransientException: if the request fails on connection level
+
+        """
+        async with self._semaphore:
+            for attempt in range(2):
+                reused = bool(self._idle) and method in IDEMPOTENT_METHODS
+                connection = None
+                try:
+                    connection = self._idle.pop() if reused else await self._connect()
+                    status, data, keep_alive = await self._request(connection, method, path, body, content_type)
+                except (OSError, ValueError, IndexError, asyncio.IncompleteReadError, asyncio.LimitOverrunError) as e:
+                    if connection is not None:
+                        connection[1].close()
+                    # keep-alive connection may have been closed by the server meanwhile, retry once on new one
+                    if not reused or attempt:
+                        raise GitlabTransientException('{}: {}'.format(type(e).__name__, e))
+                    continue
+                except BaseException:
+                    if connection is not None:
+                        connection[1].close()
+                    raise
+                if keep_alive:
+                    self._idle.append(connection)
+                else:
+                    connection[1].close()
+                return status, data
+
+
+class ArgumentParser(argparse.ArgumentParser):
+    """Argument parser exiting with 1 on invalid arguments (exit code 2 is reserved for not found pipeline)"""
+    def error(self, message):
+        self.print_usage(sys.stderr)
+        self.exit(1, '{}: error: {}\n'.format(self.prog, message))
+
+
+def parse_pipeline(pipeline, default_project_id=None):
+    """Parses pipeline given as ID or PROJECT_ID:ID
+
+    Returns:
+        tuple: (project ID, pipeline ID)
+
+    Raises:
+        ValueError: if project ID is not set or pipeline is malformed
+
+    """
+    project_id, _, pipeline_id = pipeline.rpartition(':')
+    project_id = project_id or default_project_id
+    if not project_id or not pipeline_id:
+        raise ValueError("Project ID must be set for pipeline '{}'!".format(pipeline))
+    return project_id, pipeline_id
+
+
+async def wait_for_pipeline(client, pipeline, deadline, max_retry_delay=10, fail_retry_count=3,
+                            min_retry_delay=MIN_RETRY_DELAY, log=sys.stderr, on_state=None):
+    """Polls pipeline status until it reaches final state
+
+    Polling delay grows (with jitter) from min_retry_delay up to max_retry_delay while the pipeline state
+    does not change.
+
+    Args:
+        client (GitlabClient): GitLab client
+        pipeline (tuple): (project ID, pipeline ID)
+        deadline (float): time.monotonic() deadline
+        max_retry_delay (float): maximum delay between polls in seconds
+        fail_retry_count (int): how many times the status request can fail
+        min_retry_delay (float): initial delay between polls in seconds
+        log (file): stream for progress messages
+        on_state (callable): called with (pipeline, state) on every pipeline state change (including final one)
+
+    Returns:
+        str: final pipeline state
+
+    Raises:
+        PipelineNotFoundException: if GitLab replies 404
+        PipelineTransientException: if status request failed more than fail_retry_count times
+        PipelineTimeoutException: if pipeline does not reach final state before deadline
+
+    """
+    path = '/api/v4/projects/{}/pipelines/{}'.format(urllib.parse.quote(str(pipeline[0]), safe=''), pipeline[1])
+    min_retry_delay = min(min_retry_delay, max_retry_delay)
+    delay = min_retry_delay
+    fail_count = 0
+    state = None
+    while True:
+        try:
+            status, body = await asyncio.wait_for(client.request('GET', path),
+                                                  max(deadline - time.monotonic(), 0.001))
+            if status == 404:
+                raise PipelineNotFoundException(pipeline, body.decode(errors='replace'))
+            if status != 200:
+                raise GitlabTransientException('Expected that gitlab will return 200 http status, got {} instead '
+                                               'with body {}'.format(status, body.decode(errors='replace')))
+            new_state = json.loads(body.decode())['status']
+        except asyncio.TimeoutError:
+            raise PipelineTimeoutException(pipeline, state)
+        except (GitlabTransientException, ValueError, KeyError, TypeError) as e:
+            error = e.error if isinstance(e, GitlabTransientException) else 'Unexpected reply: {}'.format(e)
+            fail_count += 1
+            print("ERROR: {}:{}: {}".format(pipeline[0], pipeline[1], error), file=log, flush=True)
+            if fail_count > fail_retry_count:
+                raise PipelineTransientException(pipeline, error)
+            delay = min(delay * BACKOFF_FACTOR, max_retry_delay)
+        else:
+            if on_state and new_state != state:
+                on_state(pipeline, new_state)
+            if new_state in FINAL_STATES:
+                return new_state
+            if new_state in RUNNING_STATES:
+                print("INFO: {}:{}: Pipeline is still in '{}' state".format(pipeline[0], pipeline[1], new_state),
+                      file=log, flush=True)
+            else:
+                print("WARNING: {}:{}: Pipeline is still in unknown '{}' state".format(pipeline[0], pipeline[1],
+                                                                                      new_state),
+                      file=log, flush=True)
+            delay = min_retry_delay if new_state != state else min(delay * BACKOFF_FACTOR, max_retry_delay)
+            state = new_state
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise PipelineTimeoutException(pipeline, state)
+        await asyncio.sleep(min(random.uniform(delay / 2, delay), remaining))
+
+
+async def wait_for_pipelines(client, pipelines, timeout, on_result=None, **kwargs):
+    """Waits for all pipelines concurrently under single deadline
+
+    Args:
+        client (GitlabClient): GitLab client
+        pipelines (list): (project ID, pipeline ID) tuples
+        timeout (float): timeout in seconds
+        on_result (callable): called with (pipeline, final state or exception) as soon as pipeline is finished
+        kwargs: see wait_for_pipeline()
+
+    Returns:
+        list: final state or exception per pipeline (in pipelines order)
+
+    """
+    deadline = time.monotonic() + timeout
+
+    async def wait(pipeline):
+        try:
+            result = await wait_for_pipeline(client, pipeline, deadline, **kwargs)
+        except (PipelineNotFoundException, PipelineTransientException, PipelineTimeoutException) as e:
+            result = e
+        if on_result:
+            on_result(pipeline, result)
+        return result
+
+    return await asyncio.gather(*[wait(pipeline) for pipeline in pipelines])
+
+
+def get_exit_code(results):
+    """Returns aggregated exit code: 2 if any pipeline was not found, 99 on transient errors, 1 on timeout"""
+    for exception, exit_code in ((PipelineNotFoundException, EXIT_NOT_FOUND),
+                                 (PipelineTransientException, EXIT_TRANSIENT),
+                                 (PipelineTimeoutException, EXIT_TIMEOUT)):
+        if any(isinstance(result, exception) for result in results):
+            return exit_code
+    return 0
+
+
+def format_result(pipeline, result, with_pipeline=True):
+    """Returns final state (prefixed by project and pipeline ID) or error message"""
+    if isinstance(result, PipelineNotFoundException):
+        return "FATAL: {}:{}: Pipeline not found: {}".format(pipeline[0], pipeline[1], result.body)
+    if isinstance(result, PipelineTransientException):
+        return "FATAL: {}:{}: Reached maximum number of failed retries, last error: {}".format(
+            pipeline[0], pipeline[1], result.error)
+    if isinstance(result, PipelineTimeoutException):
+        return "FATAL: {}:{}: Timeouted with last state: {}".format(pipeline[0], pipeline[1], result.state)
+    return "{} {} {}".format(pipeline[0], pipeline[1], result) if with_pipeline else result
+
+
+async def main(args, pipelines):
+    client = GitlabClient(args.gitlab_url, args.access_token)
+
+    def on_result(pipeline, result):
+        if isinstance(result, Exception):
+            print(format_result(pipeline, result), file=sys.stderr, flush=True)
+        else:
+            print(format_result(pipeline, result, len(pipelines) > 1), flush=True)
+
+    try:
+        results = await wait_for_pipelines(client, pipelines, args.timeout, on_result,
+                                           max_retry_delay=args.retry_delay, min_retry_delay=args.min_retry_delay,
+                                           fail_retry_count=args.fail_retry_count)
+    finally:
+        await client.close()
+    return get_exit_code(results)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Wait for final state of GitLab pipelines. Final state is printed '
+                                                 '(prefixed by project and pipeline ID if more pipelines are watched).')
+    parser.add_argument('-i', '--pipeline-id', type=str, action='append', required=True,
+                        help='pipeline ID or PROJECT_ID:PIPELINE_ID, can be repeated')
+    parser.add_argument('-p', '--project-id', type=str, default=os.environ.get('CI_PROJECT_ID'),
+                        help='default project ID (default: CI_PROJECT_ID)')
+    parser.add_argument('--gitlab-url', type=str,
+                        default=os.environ.get('GITLAB_URL', 'https://{}'.format(
+                            os.environ.get('GITLAB_HOSTNAME', 'gitlab.seznam.net'))),
+                        help='GitLab URL (default: %(default)s)')
+    parser.add_argument('--access-token', type=str, default=os.environ.get('GITLAB_ACCESS_TOKEN'),
+                        help='private access token (default: GITLAB_ACCESS_TOKEN)')
+    parser.add_argument('-t', '--timeout', type=float, default=60, help='timeout in seconds (default: %(default)s)')
+    parser.add_argument('--retry-delay', type=float, default=10,
+                        help='maximum delay between status polls in seconds (default: %(default)s)')
+    parser.add_argument('--min-retry-delay', type=float, default=MIN_RETRY_DELAY,
+                        help='initial delay between status polls in seconds (default: %(default)s)')
+    parser.add_argument('--fail-retry-count', type=int, default=3,
+                        help='how many times the status request can fail (default: %(default)s)')
+
+    args = parser.parse_args()
+    if not args.access_token:
+        parser.error('Private token must be set!')
+    try:
+        pipelines = [parse_pipeline(pipeline, args.project_id) for pipeline in args.pipeline_id]
+    except ValueError as e:
+        parser.error(str(e))
+
+    exit(asyncio.run(main(args, pipelines)))
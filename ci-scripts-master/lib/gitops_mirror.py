@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+import sys
+import argparse
+import fcntl
+import hashlib
+import os
+import random
+import re
+import shutil
+import subprocess
+import time
+import urllib.parse
+
+
+EXIT_GIT_FAILED = 1
+EXIT_PUSH_REJECTED = 2
+EXIT_REBASE_CONFLICT = 3
+# push errors caused by concurrent update of the branch, they are resolved by rebase and retry
+_REJECTED_RE = re.compile(r'\[rejected\]|non-fast-forward|fetch first|cannot lock ref|failed to update ref')
+
+
+class GitException(Exception):
+    """Exception raised if git command fails
+
+    Args:
+        command (list): git command
+        returncode (int): git exit code
+        output (str): git error output
+    """
+    def __init__(self, command, returncode, output):
+        self.command = command
+        self.returncode = returncode
+        self.output = output
+
+
+class PushRejectedException(Exception):
+    """Exception raised if push is still rejected after all attempts
+
+    Args:
+        attempts (int): number of push attempts
+        output (str): git push output of the last attempt
+    """
+    def __init__(self, attempts, output):
+        self.attempts = attempts
+        self.output = output
+
+
+class RebaseConflictException(Exception):
+    """Exception raised if local commits cannot be rebased on the updated branch
+
+    Args:
+        branch (str): remote branch
+        output (str): git rebase output
+    """
+    def __init__(self, branch, output):
+        self.branch = branch
+        self.output = output
+
+
+def git(*args, cwd=None, check=True):
+    """Runs git command, returns CompletedProcess (stdout and stderr as text)
+
+    Raises:
+        GitException: if git fails and check is set
+
+    """
+    command = ['git'] + list(args)
+    process = subprocess.run(command, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                             universal_newlines=True)
+    if check and process.returncode != 0:
+        raise GitException(redact_command(command), process.returncode, process.stderr)
+    return process
+
+
+def strip_credentials(url):
+    """Returns url without user and password"""
+    parts = urllib.parse.urlsplit(url)
+    if not parts.scheme or '@' not in parts.netloc:
+        return url
+    return urllib.parse.urlunsplit(parts._replace(netloc=parts.netloc.rsplit('@', 1)[1]))
+
+
+def redact_command(command):
+    """Returns command with credentials removed from urls"""
+    return [strip_credentials(arg) if '://' in arg else arg for arg in command]
+
+
+def mirror_path(cache_dir, url):
+    """Returns path of bare mirror of repository url in cache directory (credentials are not part of the key)"""
+    url = strip_credentials(url)
+    name = os.path.basename(url.rstrip('/'))
+    if name.endswith('.git'):
+        name = name[:-len('.git')]
+    name = re.sub(r'[^A-Za-z0-9._-]', '_', name)
+    return os.path.join(cache_dir, '{}-{}.git'.format(name, hashlib.sha1(url.encode()).hexdigest()[:12]))
+
+
+class _Lock:
+    """Exclusive lock of the mirror shared by concurrent jobs (flock of file next to the mirror)"""
+    def __init__(self, path):
+        self.path = path + '.lock'
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, 'a')
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._file.close()
+
+
+def update_mirror(cache_dir, url):
+    """Creates or incrementally updates bare mirror of all branches of repository url
+
+    The url (possibly with credentials) is passed to git fetch only, it is never stored in the mirror.
+
+    Args:
+        cache_dir (str): persistent cache directory
+        url (str): repository url
+
+    Returns:
+        tuple: (mirror path, True if the mirror has been created)
+
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    mirror = mirror_path(cache_dir, url)
+    with _Lock(mirror):
+        created = not os.path.isdir(os.path.join(mirror, 'objects'))
+        if created:
+            shutil.rmtree(mirror, ignore_errors=True)
+            git('init', '--bare', '--quiet', mirror)
+        git('fetch', '--prune', '--no-tags', '--quiet', url, '+refs/heads/*:refs/heads/*', cwd=mirror)
+    return mirror, created
+
+
+def _sparse_patterns(paths):
+    """Returns sparse-checkout patterns of files in repository root and given directories (cone-like)"""
+    patterns = ['/*', '!/*/']
+    for path in paths:
+        parts = [part for part in path.strip('/').split('/') if part]
+        # parent directories are included without their content (as cone mode does)
+        for depth in range(1, len(parts)):
+            prefix = '/' + '/'.join(parts[:depth]) + '/'
+            patterns += [prefix, '!' + prefix + '*/']
+        patterns.append('/' + '/'.join(parts) + '/')
+    return patterns
+
+
+def checkout(cache_dir, url, branch, destination, paths=(), user_name=None, user_email=None):
+    """Checks out branch of repository into destination sharing objects with cached mirror
+
+    The clone borrows objects from the mirror (git clone --shared), so only files are written. If paths are
+    given, just files in repository root and in these directories are checked out (sparse checkout).
+
+    Args:
+        cache_dir (str): persistent cache directory
+        url (str): repository url (origin of the checkout)
+        branch (str): checked out branch
+        destination (str): checkout directory (removed first if it exists)
+        paths (list): directories checked out (default: all)
+        user_name (str): git user.name of the checkout
+        user_email (str): git user.email of the checkout
+
+    Returns:
+        dict: statistics (mirror, created, update_seconds, checkout_seconds)
+
+    """
+    started = time.monotonic()
+    mirror, created = update_mirror(cache_dir, url)
+    updated = time.monotonic()
+
+    shutil.rmtree(destination, ignore_errors=True)
+    with _Lock(mirror):
+        git('clone', '--quiet', '--shared', '--no-checkout', '--branch', branch, mirror, destination)
+    git('remote', 'set-url', 'origin', url, cwd=destination)
+    if paths:
+        git('config', 'core.sparseCheckout', 'true', cwd=destination)
+        with open(os.path.join(destination, '.git', 'info', 'sparse-checkout'), 'w') as f:
+            f.write('\n'.join(_sparse_patterns(paths)) + '\n')
+    git('read-tree', '-mu', 'HEAD', cwd=destination)
+    if user_name:
+        git('config', 'user.name', user_name, cwd=destination)
+    if user_email:
+        git('config', 'user.email', user_email, cwd=destination)
+    return {'mirror': mirror, 'created': created, 'update_seconds': updated - started,
+            'checkout_seconds': time.monotonic() - updated}
+
+
+def push(repository, branch, attempts=5, backoff=1.0, output=sys.stderr):
+    """Pushes HEAD to remote branch, rebases local commits on the updated branch if the push is rejected
+
+    Args:
+        repository (str): repository (checkout) directory
+        branch (str): remote branch
+        attempts (int): maximum number of push attempts
+        backoff (float): base of exponential backoff (with jitter) between attempts in seconds
+        output (file): stream for progress messages
+
+    Returns:
+        int: number of push attempts
+
+    Raises:
+        PushRejectedException: if the push is rejected in all attempts
+        RebaseConflictException: if rebase fails
+        GitException: if git fails for other reason
+
+    """
+    for attempt in range(1, attempts + 1):
+        process = git('push', 'origin', 'HEAD:refs/heads/{}'.format(branch), cwd=repository, check=False)
+        if process.returncode == 0:
+            print("Pushed to {} (attempt {}/{})".format(branch, attempt, attempts), file=output, flush=True)
+            return attempt
+        if not _REJECTED_RE.search(process.stderr):
+            raise GitException(['git', 'push', 'origin', branch], process.returncode, process.stderr)
+        if attempt == attempts:
+            raise PushRejectedException(attempts, process.stderr)
+
+        delay = random.uniform(0, backoff * 2 ** (attempt - 1))
+        print("Push to {} rejected (attempt {}/{}), rebasing in {:.1f}s".format(branch, attempt, attempts, delay),
+              file=output, flush=True)
+        time.sleep(delay)
+        git('fetch', '--quiet', '--no-tags', 'origin',
+            '+refs/heads/{0}:refs/remotes/origin/{0}'.format(branch), cwd=repository)
+        rebase = git('rebase', 'origin/{}'.format(branch), cwd=repository, check=False)
+        if rebase.returncode != 0:
+            git('rebase', '--abort', cwd=repository, check=False)
+            raise RebaseConflictException(branch, rebase.stdout + rebase.stderr)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Checkout and push gitops repository using persistent mirror cache')
+    subparsers = parser.add_subparsers(dest='action')
+    subparsers.required = True
+    checkout_parser = subparsers.add_parser('checkout', help='update cached mirror and check out branch from it')
+    checkout_parser.add_argument('--cache-dir', type=str, required=True, help='persistent cache directory')
+    checkout_parser.add_argument('--url', type=str, required=True, help='repository url')
+    checkout_parser.add_argument('--branch', type=str, required=True, help='checked out branch')
+    checkout_parser.add_argument('--destination', type=str, required=True, help='checkout directory')
+    checkout_parser.add_argument('--path', type=str, action='append', default=[],
+                                 help='directory checked out (sparse checkout), can be repeated (default: all)')
+    checkout_parser.add_argument('--user-name', type=str, help='git user.name of the checkout')
+    checkout_parser.add_argument('--user-email', type=str, help='git user.email of the checkout')
+    push_parser = subparsers.add_parser('push', help='push HEAD to branch, rebase and retry if rejected')
+    push_parser.add_argument('--repository', type=str, required=True, help='repository (checkout) directory')
+    push_parser.add_argument('--branch', type=str, required=True, help='remote branch')
+    push_parser.add_argument('--attempts', type=int, default=5, help='maximum push attempts (default: %(default)s)')
+    push_parser.add_argument('--backoff', type=float, default=1.0,
+                             help='base of exponential backoff between attempts in seconds (default: %(default)s)')
+
+    args = parser.parse_args()
+    try:
+        if args.action == 'checkout':
+            stats = checkout(args.cache_dir, args.url, args.branch, args.destination, args.path, args.user_name,
+                             args.user_email)
+            print("Gitops mirror {} {} in {:.1f}s, checked out in {:.1f}s".format(
+                stats['mirror'], 'created' if stats['created'] else 'updated', stats['update_seconds'],
+                stats['checkout_seconds']), file=sys.stderr)
+        else:
+            push(args.repository, args.branch, args.attempts, args.backoff)
+
+    except GitException as e:
+        print("'{}' failed (exit code {}): {}".format(' '.join(e.command), e.returncode, e.output.strip()),
+              file=sys.stderr)
+        exit(EXIT_GIT_FAILED)
+
+    except PushRejectedException as e:
+        print("Push rejected in all {} attempts: {}".format(e.attempts, e.output.strip()), file=sys.stderr)
+        exit(EXIT_PUSH_REJECTED)
+
+    except RebaseConflictException as e:
+        print("Rebase on updated {} failed: {}".format(e.branch, e.output.strip()), file=sys.stderr)
+        exit(EXIT_REBASE_CONFLICT)
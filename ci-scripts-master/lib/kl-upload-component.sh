@@ -15,7 +15,6 @@
 #   kl-upload-component.sh --component-namespace sklik-master --ci-pipeline-url http://some-url.com/pipeline/5 --ci-project-url http://some-url.com --version v1.0.0 --resource-dir /tmp
 #
 
-GOENVTEMPLATOR_EXE=${GOENVTEMPLATOR_EXE:-goenvtemplator2}
 KL_STORAGE_CLIENT_BIN=${KL_STORAGE_CLIENT_BIN:-mc}
 
 dir=$(dirname $(readlink -f $0))
@@ -91,66 +90,31 @@ STORAGE_URL=${STORAGE_URL:-${KL_STORAGE_URL}}
 STORAGE_BUCKET_NAME=${STORAGE_BUCKET_NAME:-${KL_STORAGE_BUCKET_NAME}}
 CREATED=$(date --iso-8601=seconds)
 
-# find out if CRD source "KubeLauncherComponent" exists
-component_yaml_full_path=""
-for kubernetes_manifest_file in "${RESOURCE_DIR}"/*.yaml; do
-    [ -e "$kubernetes_manifest_file" ] || continue
-    python3 -c 'import sys; from ruamel import yaml; y=yaml.safe_load(sys.stdin.read()); assert y.get("kind")=="KubeLauncherComponent"' 2>/dev/null < $kubernetes_manifest_file
-    if [ $? -eq 0 ]; then
-        component_yaml_full_path=$kubernetes_manifest_file
-        break
-    fi
-done
-
-# Search component name
-if [[ -z $COMPONENT_NAME ]]; then
-    if [ -z $component_yaml_full_path ]; then
-        component_name=""
-        for kubernetes_manifest_file in "${RESOURCE_DIR}"/*.yaml; do
-            [ -e "$kubernetes_manifest_file" ] || continue
-            component_name="$(python3 -c 'import sys; from ruamel import yaml; y=yaml.safe_load(sys.stdin.read()); print(y.get("metadata", {}).get("labels", {}).get("app", ""))' < $kubernetes_manifest_file)"
-            if [[ -n "$component_name" ]]; then
-                COMPONENT_NAME=$component_name
-                break
-            fi
-        done
-    else
-        COMPONENT_NAME="$(python3 -c 'import sys; from ruamel import yaml; y=yaml.safe_load(sys.stdin.read()); print(y.get("spec", {}).get("descriptor", {}).get("name", ""))' < $component_yaml_full_path)"
-    fi
-fi
+# find KubeLauncherComponent and component name, generate the component if it does not exist
+# (all manifests are parsed once, generated component is not written to the resource dir)
+SCAN=$(python3 ${dir}/kl_component_scan.py --resource-dir "${RESOURCE_DIR}" --component-name "${COMPONENT_NAME}" \
+           --environment "${ENVIRONMENT}" --version "${VERSION}" --description "${DESCRIPTION}" \
+           --ci-pipeline-url "${PIPELINE_URL}" --ci-project-url "${PROJECT_URL}" --created "${CREATED}") || \
+    myexit --help 1 "Default app name not found in kubernetes manifests, please set parameter --component-name!"
+COMPONENT_NAME=$(jq -r '.app' <<< "${SCAN}")
+mapfile -t MANIFEST_FILES < <(jq -r '.files[]' <<< "${SCAN}")
 
-if [[ -z $COMPONENT_NAME ]]; then
-    component_name=""
-    for kubernetes_manifest_file in "${RESOURCE_DIR}"/*.yaml; do
-        [ -e "$kubernetes_manifest_file" ] || continue
-        component_name="$(python3 -c 'import sys; from ruamel import yaml; y=yaml.safe_load(sys.stdin.read()); print(y.get("spec", {}).get("template", {}).get("metadata", {}).get("labels", {}).get("app", "") if y.get("kind")=="Deployment" else "")' < $kubernetes_manifest_file)"
-        if [[ -n "$component_name" ]]; then
-            COMPONENT_NAME=$component_name
-            break
-        fi
-    done
-fi
-
-[ -n "${COMPONENT_NAME}" ] || myexit --help 1 "Default app name not found in kubernetes manifests, please set parameter --component-name!"
-
-mkdir -p ${COMPONENT_NAME}
 tmpdir=$(mktemp -d)
 mkdir -p ${tmpdir}/${ENVIRONMENT}/${COMPONENT_NAME}
+componentdir=$(mktemp -d)
 
-
-# if CRD source "KubeLauncherComponent" not exists, generate component.yaml
-if [ -z $component_yaml_full_path ]; then
-    component_yaml_full_path=${RESOURCE_DIR}/"component.yaml"
-    ENVIRONMENT=$ENVIRONMENT COMPONENT_NAME=$COMPONENT_NAME PIPELINE_URL=$PIPELINE_URL \
-    PROJECT_URL=$PROJECT_URL VERSION=$VERSION DESCRIPTION=$DESCRIPTION CREATED=$CREATED \
-    ${GOENVTEMPLATOR_EXE} -template ${dir}/template/component.yaml.tmpl:${component_yaml_full_path}
+if [ "$(jq -r '.component_file' <<< "${SCAN}")" == "null" ]; then
+    jq -r '.component' <<< "${SCAN}" > ${componentdir}/component.yaml
+    COMPONENT_FILES=(component.yaml)
+else
+    COMPONENT_FILES=()
 fi
 
-# prepare data structure and create archive
-cp -f ${RESOURCE_DIR}/*.yaml ${COMPONENT_NAME}
-python3 -c 'import sys; from ruamel import yaml; print(yaml.safe_dump([{key: value if value is not None else "" for key,value in yaml.safe_load(sys.stdin)["spec"]["descriptor"].items()}], default_flow_style=False), end="")' < ${component_yaml_full_path}
-tar -czvf ${tmpdir}/${ENVIRONMENT}/${COMPONENT_NAME}/${VERSION}.tgz ${COMPONENT_NAME}/*.yaml
-rm -rf ${COMPONENT_NAME}/
+# create archive (manifests are stored in ${COMPONENT_NAME}/ directory)
+jq '[.descriptor]' <<< "${SCAN}"
+tar -czvf ${tmpdir}/${ENVIRONMENT}/${COMPONENT_NAME}/${VERSION}.tgz --transform "s|^|${COMPONENT_NAME}/|" \
+    -C "${RESOURCE_DIR}" "${MANIFEST_FILES[@]}" -C "${componentdir}" "${COMPONENT_FILES[@]}"
+rm -rf ${componentdir}
 
 # Initialize KL_STORAGE_CLIENT configuration
 repeat_for_ecode 0 5 1 ${KL_STORAGE_CLIENT_BIN} config host add kube-launcher $STORAGE_URL $KL_STORAGE_TOKEN $KL_STORAGE_KEY S3v4 || exit 1
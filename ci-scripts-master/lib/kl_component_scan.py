@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+import sys
+import argparse
+import datetime
+import glob
+import io
+import json
+import os
+from ruamel.yaml import YAML
+from ruamel.yaml.error import YAMLError
+
+
+COMPONENT_KIND = 'KubeLauncherComponent'
+COMPONENT_API_VERSION = 'component.kubeLauncher.szn.cz/v1beta1'
+# descriptor keys of generated component
+DESCRIPTOR_KEYS = ('environment', 'name', 'version', 'description', 'created', 'sourceUrl', 'pipelineUrl')
+
+
+class ComponentNameException(Exception):
+    """Exception raised if component name is not given and cannot be found in manifests
+
+    Args:
+        resource_dir (str): directory with manifests
+    """
+    def __init__(self, resource_dir):
+        self.resource_dir = resource_dir
+
+
+def safe_loader():
+    """Returns ruamel safe loader, it uses C parser (libyaml) if available (bundled in python3-ruamel.yaml of buster)"""
+    return YAML(typ='safe')
+
+
+def parser_name(loader):
+    """Returns 'c' if loader uses C parser, 'pure' otherwise"""
+    return 'c' if getattr(loader.Parser, '__name__', '') == 'CParser' else 'pure'
+
+
+def _get(document, *keys):
+    for key in keys:
+        if not isinstance(document, dict):
+            return None
+        document = document.get(key)
+    return document
+
+
+def load_documents(resource_dir, loader=None, errors=None):
+    """Loads all documents of *.yaml manifests in directory, every file is parsed once
+
+    Args:
+        resource_dir (str): directory with manifests
+        loader (YAML): ruamel safe loader
+        errors (dict): dict to be filled with invalid files (file -> error), they are skipped
+
+    Returns:
+        list: (file, [documents]) tuples in file name order
+
+    """
+    loader = loader or safe_loader()
+    files = []
+    for path in sorted(glob.glob(os.path.join(resource_dir, '*.yaml'))):
+        if not os.path.isfile(path):
+            continue
+        try:
+            with open(path, 'r') as f:
+                documents = [document for document in loader.load_all(f) if document is not None]
+        except (YAMLError, UnicodeDecodeError) as e:
+            if errors is not None:
+                errors[path] = str(e)
+            documents = []
+        files.append((path, documents))
+    return files
+
+
+def find_component(files):
+    """Returns (file, document) of the first KubeLauncherComponent or (None, None)"""
+    for path, documents in files:
+        for document in documents:
+            if _get(document, 'kind') == COMPONENT_KIND:
+                return path, document
+    return None, None
+
+
+def find_component_name(files, component=None):
+    """Returns component name found in manifests ('' if not found)
+
+    The name is taken (in this order) from descriptor of KubeLauncherComponent, or if there is no
+    component from the first metadata.labels.app, and finally from the first Deployment pod template
+    label app. It is the order kl-upload-component.sh always used.
+
+    Args:
+        files (list): (file, [documents]) tuples
+        component (dict): KubeLauncherComponent document
+
+    Returns:
+        str: component name
+
+    """
+    if component is not None:
+        name = _get(component, 'spec', 'descriptor', 'name')
+    else:
+        name = next((_get(d, 'metadata', 'labels', 'app') for _, documents in files for d in documents
+                     if _get(d, 'metadata', 'labels', 'app')), None)
+    if not name:
+        name = next((_get(d, 'spec', 'template', 'metadata', 'labels', 'app') for _, documents in files
+                     for d in documents
+                     if _get(d, 'kind') == 'Deployment' and _get(d, 'spec', 'template', 'metadata', 'labels', 'app')),
+                    None)
+    return str(name) if name else ''
+
+
+def render_component(descriptor):
+    """Returns KubeLauncherComponent document with given descriptor"""
+    return {'apiVersion': COMPONENT_API_VERSION, 'kind': COMPONENT_KIND,
+            'spec': {'descriptor': {key: descriptor.get(key) or '' for key in DESCRIPTOR_KEYS}}}
+
+
+def dump_yaml(data):
+    """Returns data as block style YAML"""
+    dumper = YAML(typ='safe')
+    dumper.default_flow_style = False
+    stream = io.StringIO()
+    dumper.dump(data, stream)
+    return stream.getvalue()
+
+
+def scan_resources(resource_dir, component_name=None, environment='', version='', description='',
+                   pipeline_url='', project_url='', created=None):
+    """Scans manifests for KubeLauncherComponent and component name in single pass
+
+    Args:
+        resource_dir (str): directory with manifests
+        component_name (str): component name (found in manifests if empty)
+        environment, version, description, pipeline_url, project_url (str): descriptor of generated component
+        created (str): creation time of generated component (default now in ISO 8601)
+
+    Returns:
+        dict: app (component name), component_file (existing component manifest or None if generated),
+              component (component manifest YAML), descriptor (dict), files (manifest file names),
+              invalid_files (file -> error), parser ('c' or 'pure')
+
+    Raises:
+        ComponentNameException: if component name is not given and cannot be found
+
+    """
+    loader = safe_loader()
+    errors = {}
+    files = load_documents(resource_dir, loader, errors)
+    component_file, component = find_component(files)
+    name = component_name or find_component_name(files, component)
+    if not name:
+        raise ComponentNameException(resource_dir)
+
+    if component is None:
+        created = created or datetime.datetime.now().astimezone().isoformat(timespec='seconds')
+        component = render_component({'environment': environment, 'name': name, 'version': version,
+                                      'description': description, 'created': created,
+                                      'sourceUrl': project_url, 'pipelineUrl': pipeline_url})
+    descriptor = {key: value if value is not None else ''
+                  for key, value in (_get(component, 'spec', 'descriptor') or {}).items()}
+    return {'app': name, 'component_file': component_file, 'component': dump_yaml(component),
+            'descriptor': descriptor, 'files': [os.path.basename(path) for path, _ in files],
+            'invalid_files': errors, 'parser': parser_name(loader)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Scan kubernetes manifests for kube-launcher component and its name, '
+                                                 'print result as JSON')
+    parser.add_argument('--resource-dir', type=str, required=True, help='directory with *.yaml manifests')
+    parser.add_argument('--component-name', type=str, default='', help='component name (default: found in manifests)')
+    parser.add_argument('--environment', type=str, default='', help='environment of generated component')
+    parser.add_argument('--version', type=str, default='', help='version of generated component')
+    parser.add_argument('--description', type=str, default='', help='description of generated component')
+    parser.add_argument('--ci-pipeline-url', type=str, default='', help='pipeline url of generated component')
+    parser.add_argument('--ci-project-url', type=str, default='', help='project url of generated component')
+    parser.add_argument('--created', type=str, help='creation time of generated component (default: now)')
+
+    args = parser.parse_args()
+    try:
+        result = scan_resources(args.resource_dir, args.component_name, args.environment, args.version,
+                                args.description, args.ci_pipeline_url, args.ci_project_url, args.created)
+        for path, error in result['invalid_files'].items():
+            print("WARNING: skipping invalid manifest '{}': {}".format(path, error), file=sys.stderr)
+        print(json.dumps(result, indent=2, default=str))
+
+    except ComponentNameException as e:
+        print("Default app name not found in kubernetes manifests in '{}', please set parameter --component-name!"
+              .format(e.resource_dir), file=sys.stderr)
+        exit(1)
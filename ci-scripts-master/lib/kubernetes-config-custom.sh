@@ -11,6 +11,8 @@
 # Generate kubernetes yaml config files from templates.
 #
 # Kubernetes templates must be located in "./kubernetes/" directory.
+# Templates are rendered by kubernetes_render_templates.py ({{ env "X" | default "Y" }} syntax),
+# templates using other goenvtemplator2 syntax are rendered by goenvtemplator2.
 # Configuration is taken from ENV_FILEs (you can pass --env-file multiple times)
 # file and is stored in ConfigMap named "${APP}-configmap.yaml"
 # If `--no-configmap` is set, ConfigMap is not created.
@@ -19,6 +21,10 @@
 # Generated manifests are validated using kubeconform
 # (unless `--no-validate` is set).
 #
+# Rendered and validated manifests are cached if CI_SCRIPTS_KUBERNETES_CONFIG_CACHE_DIR is set (use a path
+# listed in GitLab CI cache:paths), cache size is limited by CI_SCRIPTS_KUBERNETES_CONFIG_CACHE_SIZE (default 100M,
+# least recently used entries are evicted).
+#
 # example:
 #   kubernetes-config-custom.sh --env-file conf/production.env --app frontend-api --destination-dir kubernetes/production/
 #
@@ -33,6 +39,8 @@ dir=$(dirname $(readlink -f $0))
 source $dir/common.sh
 
 GOENVTEMPLATOR_EXE=${GOENVTEMPLATOR_EXE:-goenvtemplator2}
+CACHE_DIR="${CI_SCRIPTS_KUBERNETES_CONFIG_CACHE_DIR}"
+CACHE_SIZE="${CI_SCRIPTS_KUBERNETES_CONFIG_CACHE_SIZE:-100M}"
 
 APP=
 
@@ -42,7 +50,6 @@ eval set -- "$pargs"
 
 NO_CONFIGMAP=
 NO_VALIDATE=
-GOENVTEMPLATOR_ARGS=
 ENV_FILES=()
 
 while true; do
@@ -57,7 +64,6 @@ while true; do
         ;;
     --env-file)
         if [ -r "$2" ]; then
-            GOENVTEMPLATOR_ARGS="$GOENVTEMPLATOR_ARGS -env-file $2"
             ENV_FILES+=("$2")
         else
             echo "WARN file $2 cannot be read, ignoring it..."
@@ -104,38 +110,57 @@ K8S_CM_NAME="$APP"
 
 mkdir -p $DEST_DIR
 
-# create kubernetes application environment variables configmap
-if [ "${#ENV_FILES[@]}" -gt 0 -a "${NO_CONFIGMAP}" != "1" ]; then
-  $KUBECTL_BIN create cm $K8S_CM_NAME --dry-run -o yaml --from-env-file=<(cat_files_secure "${ENV_FILES[@]}") > $DEST_DIR/$APP-configmap.yaml
+# render (and validate) manifests into $DEST_DIR
+function render_manifests() {
+  # create kubernetes application environment variables configmap
+  if [ "${#ENV_FILES[@]}" -gt 0 -a "${NO_CONFIGMAP}" != "1" ]; then
+    $KUBECTL_BIN create cm $K8S_CM_NAME --dry-run -o yaml --from-env-file=<(cat_files_secure "${ENV_FILES[@]}") > $DEST_DIR/$APP-configmap.yaml
+  fi
+
+  # copy kubernetes configs $SRC_DIR -> $DEST_DIR and template *.yaml.tmpl ones in single process
+  # (env files are loaded once, multi-document manifests are split, empty lines and empty files are dropped)
+  trace_run render_templates python3 $dir/kubernetes_render_templates.py --source-dir "$SRC_DIR" --destination-dir "$DEST_DIR" \
+      --goenvtemplator "$GOENVTEMPLATOR_EXE" "${ENV_FILES[@]/#/--env-file=}" > /dev/null
+
+  echo "K8S $APP ${ENV_FILES[*]} config generated (in $DEST_DIR)."
+  ls -la $DEST_DIR/*.yaml
+
+  echo "Removing empty files from ${DEST_DIR}:"
+  find ${DEST_DIR} -size 0 -print -delete
+
+  # validate generated manifests with kubeconform
+  if [ "${NO_VALIDATE}" != "1" ]; then
+    # since we're doing the validation locally, we can't know what kubernetes version to validate against - so kubectl
+    # client version is used (hopefully it's close)
+    trace_run kubeconform kubeconform -kubernetes-version "$(get_kubectl_version)" -ignore-missing-schemas -summary $DEST_DIR/*.yaml
+  fi
+}
+
+# rendered and validated manifests are cached in $CACHE_DIR (if set) keyed by hash of all inputs
+# (templates, env files, used env. variables, app name, tool versions)
+CACHE_KEY=
+if [ -n "${CACHE_DIR}" ]; then
+  CACHE_KEY="$(python3 $dir/kubernetes_render_cache.py key --source-dir "$SRC_DIR" "${ENV_FILES[@]/#/--env-file=}" \
+                 --app "$APP" --option "no-configmap=${NO_CONFIGMAP}" --option "no-validate=${NO_VALIDATE}" \
+                 --tool-version "kubectl=$(get_kubectl_version)" \
+                 --tool-version "kubeconform=$(kubeconform -v 2>/dev/null || true)")" || CACHE_KEY=
 fi
 
-# copy kubernetes configs to $SRC_DIR -> $DEST_DIR
-[ "$SRC_DIR" != "$DEST_DIR" -a "$(ls $SRC_DIR/*.yaml 2>/dev/null | wc -l)" -gt "0" ] && \
-  cp -f $SRC_DIR/*.yaml $DEST_DIR
-
-# template kubernetes configs
-for kubernetes_manifest_file in "$SRC_DIR"/*.yaml.tmpl; do
-  [ -e "$kubernetes_manifest_file" ] || continue
-  manifest_basename_orig=$(basename $kubernetes_manifest_file)
-  manifest_basename_modified=$(echo "$manifest_basename_orig" | sed "s/\.tmpl//g")
-  $GOENVTEMPLATOR_EXE $GOENVTEMPLATOR_ARGS -template $kubernetes_manifest_file:$DEST_DIR/$manifest_basename_modified
-  split_yaml "$DEST_DIR/$manifest_basename_modified"
-done
-
-echo "K8S $APP ${ENV_FILES[*]} config generated (in $DEST_DIR)."
-ls -la $DEST_DIR/*.yaml
-
-echo "Removing empty files from ${DEST_DIR}:"
-sed -i '/^$/d' ${DEST_DIR}/*
-find ${DEST_DIR} -size 0 -print -delete
-
-# validate generated manifests with kubeconform
-if [ "${NO_VALIDATE}" != "1" ]; then
-  # since we're doing the validation locally, we can't know what kubernetes version to validate against - so kubectl
-  # client version is used (hopefully it's close)
-  kubeconform -kubernetes-version "$(get_kubectl_version)" -ignore-missing-schemas -summary $DEST_DIR/*.yaml
+if [ -n "${CACHE_KEY}" ] && \
+   [ "$(python3 $dir/kubernetes_render_cache.py restore --cache-dir "$CACHE_DIR" --max-size "$CACHE_SIZE" \
+          --key "$CACHE_KEY" --destination-dir "$DEST_DIR")" == "hit" ]; then
+  echo "K8S $APP ${ENV_FILES[*]} config restored from cache (in $DEST_DIR)."
+  ls -la $DEST_DIR/*.yaml
+else
+  render_manifests
+  [ -n "${CACHE_KEY}" ] && \
+    python3 $dir/kubernetes_render_cache.py store --cache-dir "$CACHE_DIR" --max-size "$CACHE_SIZE" \
+        --key "$CACHE_KEY" --destination-dir "$DEST_DIR"
 fi
 
+[ -n "${CACHE_KEY}" ] && \
+  python3 $dir/kubernetes_render_cache.py stats --cache-dir "$CACHE_DIR" --max-size "$CACHE_SIZE"
+
 set +eo pipefail
 
 # temporary added upload manifest to kube-launcher storage
@@ -143,11 +168,8 @@ if [[ "${KL_UPLOAD_THROUGH_CI_SCRIPTS_KUBERNETES_DEPLOY}" =~ ^[Tt]rue$ ]]; then
     CI_PIPELINE_URL="${CI_PROJECT_URL}/pipelines/${CI_PIPELINE_ID}"
     VERSION=${CI_COMMIT_TAG:-${CI_COMMIT_REF_SLUG}}
     ENVIRONMENT=$( echo $DEST_DIR | sed "s|${PWD}\/||" | sed 's/kubernetes\///' | sed 's/\/$//' | sed 's/-(web|api)$//')
-    # kubernetes don't support CRD file with kind "KubeLauncherComponent", we must use temporary folder
-    TEMPORARY_DEST_DIR="$(echo ${DEST_DIR} | sed 's/\/$//')_KL_TEMPORARY"
-    cp -rf $DEST_DIR $TEMPORARY_DEST_DIR
-    $dir/kl-upload-component.sh --environment $ENVIRONMENT --ci-pipeline-url $CI_PIPELINE_URL --ci-project-url $CI_PROJECT_URL --version $VERSION --resource-dir $TEMPORARY_DEST_DIR
-    rm -rf $TEMPORARY_DEST_DIR
+    # generated "KubeLauncherComponent" (not supported by kubernetes) goes just to the archive, not to DEST_DIR
+    $dir/kl-upload-component.sh --environment $ENVIRONMENT --ci-pipeline-url $CI_PIPELINE_URL --ci-project-url $CI_PROJECT_URL --version $VERSION --resource-dir $DEST_DIR
 fi
 
 # eof
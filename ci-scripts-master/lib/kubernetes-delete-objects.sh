@@ -7,14 +7,22 @@
 #   -l|--label <kubernetes-object-label>                (required)
 #   --sort-ascending-by <sort-object-key-go-template>   (optional)
 #   --keep-n-recent <keep-N-most-recent-objects>        (optional)
+#   --group-by <kubernetes-object-label-name>           (optional, can be repeated)
+#   --batch-size <objects-deleted-by-single-call>       (optional, default 50)
+#   --concurrency <concurrent-delete-calls>             (optional, default 4)
+#   --dry-run                                           (optional)
 #
 #   deletes kubernetes objects according following rules:
 #     * in kubernetes namespace <kubernetes-namespace>
 #     * only kubernetes object kind[s] <kubernetes-object-kind[s]> with defined label <kubernetes-object-label>
-#     * sorts objects ascending way by object key defined by go-template [sort-object-key-go-template]
+#     * objects are grouped by values of --group-by labels (single group if not specified)
+#     * sorts objects of every group ascending way by object key defined by go-template [sort-object-key-go-template]
+#       (field chain `.a.b` or `index .a "b" "c"`, numeric keys are compared numerically)
 #     * deletion:
 #       * all if --keep-n-recent not specified
-#       * [keep-N-most-recent-objects] most recent objects are not deleted if --keep-n-recent specified
+#       * [keep-N-most-recent-objects] most recent objects of every group are not deleted if --keep-n-recent specified
+#     * objects are listed once and deleted by batched kubectl calls (kubernetes_prune.py)
+#     * --dry-run just prints objects which would be deleted
 # 
 
 # Example:
@@ -25,6 +33,9 @@
 #                                         --label app=slo-exporter-userproxy
 #                                         --sort-ascending-by 'index .metadata "labels" "ci-pipeline-id"'
 #                                         --keep-n-recent 5
+#
+#   # keeps the 3 most recent jobs of every app in namespace sklik-dev
+#   $ kubernetes-delete-objects.sh --namespace sklik-dev --kind job --label app --group-by app --keep-n-recent 3
 
 # TODO: push metrics to Prometheus PushGateway
 
@@ -41,7 +52,8 @@ KUBERNETES_OBJECT_KIND=
 KUBERNETES_OBJECT_LABEL=
 SORT_KEY_GO_TEMPLATE=".metadata.resourceVersion"
 KEEP_OBJECT_CNT=0
-pargs=$(getopt -o "h,n:,k:,l:" -l "help,namespace:,kind:,label:,sort-ascending-by:,keep-n-recent:,debug" -n "$0" -- "$@")
+PRUNE_ARGS=()
+pargs=$(getopt -o "h,n:,k:,l:" -l "help,namespace:,kind:,label:,sort-ascending-by:,keep-n-recent:,group-by:,batch-size:,concurrency:,dry-run,debug" -n "$0" -- "$@")
 eval set -- "$pargs"
 
 while true; do
@@ -70,6 +82,14 @@ while true; do
         KEEP_OBJECT_CNT="$2"
         shift 2
         ;;
+    --group-by|--batch-size|--concurrency)
+        PRUNE_ARGS+=("$1" "$2")
+        shift 2
+        ;;
+    --dry-run)
+        PRUNE_ARGS+=("$1")
+        shift
+        ;;
     --debug)
         set -x
         shift
@@ -94,16 +114,6 @@ KUBECTL="${KUBECTL_BIN} --namespace=${KUBERNETES_NAMESPACE}"
 echo "Cleaning-up ${KUBERNETES_OBJECT_KIND} objects in namespace '${KUBERNETES_NAMESPACE}', cluster:"
 ${KUBECTL_BIN} cluster-info | grep Kubernetes
 
-template_str=$(printf '{{range .items}}{{.kind}}/{{.metadata.name}} {{%s}}{{"\\n"}}{{end}}' "${SORT_KEY_GO_TEMPLATE}")
-object_list=$(${KUBECTL} get ${KUBERNETES_OBJECT_KIND} -l "${KUBERNETES_OBJECT_LABEL}" -o go-template --template "${template_str}" | \
-              sort -n -k2 | head -n -${KEEP_OBJECT_CNT} | awk '{print $1}')
-
-manifest_cnt=0
-for i_object in ${object_list}; do
-    echo "Processing kubernetes object '${i_object}'"
-    ${KUBECTL} delete "${i_object}"
-    echo "..deleted."
-    manifest_cnt=$(( ${manifest_cnt} + 1 ))
-done
-echo "Completed in ${SECONDS} sec[s], deleted ${manifest_cnt} objects"
-
+python3 ${dir}/kubernetes_prune.py --kubectl "${KUBECTL}" --kind "${KUBERNETES_OBJECT_KIND}" \
+    --label "${KUBERNETES_OBJECT_LABEL}" --sort-ascending-by "${SORT_KEY_GO_TEMPLATE}" \
+    --keep-n-recent "${KEEP_OBJECT_CNT}" "${PRUNE_ARGS[@]}"
@@ -8,6 +8,7 @@
 #
 # All namespaced resources are deployed to kubernetetes namespace $NAMESPACE.
 # It applies kubernetes resources in order: global-scoped, ConfigMap, Service, Secret, (Cron)Job, other-non-workload, workloads
+# and then waits for rollout of all workloads concurrently, TIMEOUT (default 180s) is deadline for all rollouts.
 #
 # example:
 #   kubernetes-deploy.sh --env production --component frontend-api
@@ -23,10 +24,6 @@ DEPLOY_TIMEOUT=${DEPLOY_TIMEOUT:-180}
 dir=$(dirname $(readlink -f $0))
 source $dir/common.sh
 
-# define specific kubectl deploy actions per resource
-declare -A kubectl_deploy_actions
-kubectl_deploy_actions[Job]='replace --force'
-
 # parsing command-line options
 pargs=$(getopt -o "h," -l "env:,help,namespace:,resources-dir:,deploy-timeout:,debug" -n "$0" -- "$@")
 eval set -- "$pargs"
@@ -76,45 +73,16 @@ KUBERNETES_ENV=${KUBERNETES_ENV:-development}
 RESOURCES_DIR=${RESOURCES_DIR:-"${PWD}/kubernetes/${KUBERNETES_ENV}"}
 KUBECTL="${KUBECTL_BIN}"
 
-GLOBAL_SCOPED_RESOURCES=
-CONFIGMAPS=
-SERVICES=
-SECRETS=
-OTHERS=
-WORKLOADS=
-JOBS=
-
-declare -A manifest_kinds
-for f in ${RESOURCES_DIR}/*.yaml; do
-    kind="$(${KUBECTL_BIN} create -f $f --dry-run -o json | jq -r .kind | sort -u )"
-    manifest_kinds[${f}]="${kind}"
-    case $kind in
-        Namespace|ClusterRoleBinding|ClusterRole|PodSecurityPolicy|ValidatingWebhookConfiguration|PriorityClass|StorageClass)
-            GLOBAL_SCOPED_RESOURCES="${GLOBAL_SCOPED_RESOURCES} $f"
-            ;;
-        ConfigMap)
-            CONFIGMAPS="${CONFIGMAPS} $f"
-            ;;
-        Secret)
-            SECRETS="${SECRETS} $f"
-            ;;
-        Service)
-            SERVICES="${SERVICES} $f"
-            ;;
-        Deployment|DaemonSet|StatefulSet)
-            WORKLOADS="${WORKLOADS} $f"
-            ;;
-        Job|CronJob)
-            JOBS="${JOBS} $f"
-            ;;
-        *)
-            OTHERS="${OTHERS} $f"
-            ;;
-    esac
+# classify manifests and get the deploy plan (resource groups, kubectl actions) at once,
+# see kubernetes_deploy_plan.py for resource kind -> group table and specific kubectl deploy actions per resource
+DEPLOY_PLAN="$(trace_run deploy_plan python3 ${dir}/kubernetes_deploy_plan.py --resources-dir "${RESOURCES_DIR}")"
 
+for group in GLOBAL_SCOPED_RESOURCES CONFIGMAPS SERVICES SECRETS JOBS OTHERS WORKLOADS; do
+    declare "${group}=$(jq -r --arg group "${group}" '.groups[$group] | map(" " + .) | join("")' <<< "${DEPLOY_PLAN}")"
 done
 
-if [[ ! "$CONFIGMAPS $SERVICES $SECRETS $JOBS $OTHERS $WORKLOADS" =~ ^[[:space:]]+$ ]]; then
+# namespace-scoped objects are detected per kind (also in files mixing them with global-scoped objects)
+if [ "$(jq -r .namespaced <<< "${DEPLOY_PLAN}")" == "true" ]; then
 
     if [[ -z "$NAMESPACE" ]]; then
         myexit --help 1 "Parameter --namespace is required when namespace-scoped resources are being deployed! ($CONFIGMAPS $SERVICES $SECRETS $JOBS $OTHERS $WORKLOADS)"
@@ -127,11 +95,11 @@ fi
 set | grep -E '^(WORKLOADS|CONFIGMAPS|SERVICES|SECRETS|GLOBAL_SCOPED_RESOURCES|JOBS|OTHERS)='
 set -x
 
-for resource in $GLOBAL_SCOPED_RESOURCES $CONFIGMAPS $SERVICES $SECRETS $JOBS $OTHERS $WORKLOADS; do
-    kind="${manifest_kinds[${resource}]}"
-    ${KUBECTL} ${kubectl_deploy_actions[${kind}]:-apply --record} -f ${resource}
-done
+while IFS=$'\t' read -r action resource; do
+    trace_run "kubectl_${action%% *} ${resource##*/}" ${KUBECTL} ${action} -f ${resource}
+done < <(jq -r '.steps[] | [.action, .file] | @tsv' <<< "${DEPLOY_PLAN}")
 
-for resource in $WORKLOADS; do
-    timeout --signal=KILL ${DEPLOY_TIMEOUT} ${KUBECTL} rollout status -f $resource
-done
+# watch rollout of all workloads concurrently, DEPLOY_TIMEOUT is shared deadline for all of them
+if [ -n "${WORKLOADS}" ]; then
+    trace_run rollout_watch python3 ${dir}/kubernetes_rollout_watch.py --kubectl "${KUBECTL}" --timeout ${DEPLOY_TIMEOUT} ${WORKLOADS}
+fi
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+import sys
+import argparse
+import glob
+import json
+import os
+from ruamel.yaml import YAML
+from ruamel.yaml.error import YAMLError
+
+
+# resource groups in deploy order, kinds not listed here belong to OTHERS
+DEPLOY_ORDER = ['GLOBAL_SCOPED_RESOURCES', 'CONFIGMAPS', 'SERVICES', 'SECRETS', 'JOBS', 'OTHERS', 'WORKLOADS']
+
+KIND_GROUPS = {
+    'Namespace': 'GLOBAL_SCOPED_RESOURCES',
+    'ClusterRoleBinding': 'GLOBAL_SCOPED_RESOURCES',
+    'ClusterRole': 'GLOBAL_SCOPED_RESOURCES',
+    'PodSecurityPolicy': 'GLOBAL_SCOPED_RESOURCES',
+    'ValidatingWebhookConfiguration': 'GLOBAL_SCOPED_RESOURCES',
+    'PriorityClass': 'GLOBAL_SCOPED_RESOURCES',
+    'StorageClass': 'GLOBAL_SCOPED_RESOURCES',
+    'ConfigMap': 'CONFIGMAPS',
+    'Secret': 'SECRETS',
+    'Service': 'SERVICES',
+    'Deployment': 'WORKLOADS',
+    'DaemonSet': 'WORKLOADS',
+    'StatefulSet': 'WORKLOADS',
+    'Job': 'JOBS',
+    'CronJob': 'JOBS',
+}
+
+# specific kubectl deploy actions per resource kind
+DEFAULT_DEPLOY_ACTION = 'apply --record'
+DEPLOY_ACTIONS = {
+    'Job': 'replace --force',
+}
+
+
+class ManifestParseException(Exception):
+    """Exception raised if manifest file is not valid yaml or contains non-object document
+
+    Args:
+        manifest_file (str): manifest file path
+        error (str): error description
+    """
+    def __init__(self, manifest_file, error):
+        self.manifest_file = manifest_file
+        self.error = error
+
+
+def get_manifest_kinds(manifest_file, loader=None):
+    """Reads all documents of (multi-document) manifest file and returns their kinds
+
+    Args:
+        manifest_file (str): manifest file path
+        loader (YAML): yaml loader to reuse
+
+    Returns:
+        list: kinds of all non-empty documents in file order
+
+    """
+    loader = loader or YAML(typ='safe')
+    kinds = []
+    try:
+        with open(manifest_file) as f:
+            for document in loader.load_all(f):
+                if document is None:
+                    continue
+                if not isinstance(document, dict) or not document.get('kind'):
+                    raise ManifestParseException(manifest_file, 'document without kind')
+                kinds.append(str(document['kind']))
+    except YAMLError as e:
+        raise ManifestParseException(manifest_file, str(e))
+    return kinds
+
+
+def classify_kinds(kinds):
+    """Returns resource group of manifest file containing objects of given kinds
+
+    Files with more objects belong to OTHERS, the same as with the former 'kubectl create --dry-run -o json'
+    classification (kind of multiple objects is List).
+
+    Args:
+        kinds (list): kinds of objects in manifest file
+
+    Returns:
+        str: resource group (see DEPLOY_ORDER)
+
+    """
+    if len(kinds) != 1:
+        return 'OTHERS'
+    return KIND_GROUPS.get(kinds[0], 'OTHERS')
+
+
+def is_namespaced(kinds):
+    """Checks whether manifest file containing objects of given kinds contains any namespace-scoped object"""
+    return any(KIND_GROUPS.get(kind, 'OTHERS') != 'GLOBAL_SCOPED_RESOURCES' for kind in kinds)
+
+
+def get_deploy_action(kinds):
+    """Returns kubectl deploy action for manifest file containing objects of given kinds (files with more objects
+    are applied, as kubectl List)"""
+    if len(kinds) == 1:
+        return DEPLOY_ACTIONS.get(kinds[0], DEFAULT_DEPLOY_ACTION)
+    return DEFAULT_DEPLOY_ACTION
+
+
+def plan_deploy(manifest_files):
+    """Creates ordered deploy plan of manifest files
+
+    Args:
+        manifest_files (list): manifest file paths
+
+    Returns:
+        dict: deploy plan
+            steps (list): ordered steps (file, kinds, group, kubectl action, rollout status check flag,
+                namespace-scoped objects flag)
+            groups (dict): group -> list of files (in deploy order)
+            namespaced (bool): whether any namespace-scoped resource is deployed (--namespace is required)
+
+    """
+    loader = YAML(typ='safe')
+    groups = {group: [] for group in DEPLOY_ORDER}
+    steps = {group: [] for group in DEPLOY_ORDER}
+    for manifest_file in manifest_files:
+        kinds = get_manifest_kinds(manifest_file, loader)
+        if not kinds:
+            continue
+        group = classify_kinds(kinds)
+        groups[group].append(manifest_file)
+        steps[group].append({
+            'file': manifest_file,
+            'kinds': sorted(set(kinds)),
+            'group': group,
+            'action': get_deploy_action(kinds),
+            'rollout': group == 'WORKLOADS',
+            'namespaced': is_namespaced(kinds),
+        })
+
+    return {
+        'steps': [step for group in DEPLOY_ORDER for step in steps[group]],
+        'groups': groups,
+        'namespaced': any(step['namespaced'] for group in DEPLOY_ORDER for step in steps[group]),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Classify kubernetes manifests and print ordered deploy plan (JSON)')
+    parser.add_argument('--resources-dir', type=str, help='directory with *.yaml manifests', required=True)
+
+    args = parser.parse_args()
+    try:
+        files = sorted(glob.glob(os.path.join(args.resources_dir, '*.yaml')))
+        print(json.dumps(plan_deploy(files), indent=2))
+
+    except ManifestParseException as e:
+        print("Invalid manifest '{}': {}".format(e.manifest_file, e.error), file=sys.stderr)
+        exit(1)
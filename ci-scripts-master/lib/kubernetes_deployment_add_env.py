@@ -3,6 +3,12 @@ import sys
 import argparse
 from  ruamel import yaml
 import io
+import os
+import json
+import re
+import glob
+import time
+import concurrent.futures
 
 
 class BadEnvFormatException(Exception):
@@ -45,6 +51,23 @@ class OverwriteDisabledException(Exception):
         self.variable = variable
 
 
+class ManifestFileException(Exception):
+    """Exception raised if processing of manifest file fails in batch mode
+
+    Args:
+        manifest_file (str): manifest file path
+        error (Exception): original exception
+    """
+    def __init__(self, manifest_file, error):
+        self.manifest_file = manifest_file
+        self.error = error
+
+
+class AmbiguousManifestException(Exception):
+    """Exception raised if manifest structure can not be patched safely without full yaml round-trip"""
+    pass
+
+
 def get_env_vars(env_file, prefix):
     """Reads env file and returns dict of env variables
 
@@ -85,6 +108,30 @@ def get_env_vars(env_file, prefix):
 def update_deployment(raw, env_variables, container, allow_overwrite):
     """Update env variables in containers in deployment
 
+    Only the env block of selected container is rewritten (see patch_deployment_env()), full yaml round-trip
+    (see update_deployment_round_trip()) is used when manifest structure is ambiguous.
+
+    Args:
+        raw (str): manifest raw document (yaml format)
+        env_variables (dict): dictionary of enviroment variables to update
+        container (str): container to update
+        allow_overwrite (bool): allow overriding existing variables
+
+    Returns:
+        string: updated raw manifest
+
+    """
+    try:
+        return patch_deployment_env(raw, env_variables, container, allow_overwrite)
+    except AmbiguousManifestException:
+        return update_deployment_round_trip(raw, dict(env_variables), container, allow_overwrite)
+
+
+def update_deployment_round_trip(raw, env_variables, container, allow_overwrite):
+    """Update env variables in containers in deployment using full yaml round-trip
+
+    Whole manifest is re-formatted, overwritten variables are removed from env_variables.
+
     Args:
         raw (str): manifest raw document (yaml format)
         env_variables (dict): dictionary of enviroment variables to update
@@ -139,46 +186,597 @@ def update_deployment(raw, env_variables, container, allow_overwrite):
     return output.getvalue()
 
 
+# block mapping key line, optionally being the first key of block sequence item ("- key: value")
+KEY_LINE_RE = re.compile(r"""^(?P<indent> *)(?P<dash>- +)?(?P<key>[A-Za-z0-9_./-]+|"[A-Za-z0-9_./-]+"|'[A-Za-z0-9_./-]+')"""
+                         r"""[ \t]*:(?:[ \t]+(?P<value>[^\r\n]*?))?[ \t]*\r?\n?$""")
+
+# value which is either empty or comment only (nested block follows)
+EMPTY_VALUE_RE = re.compile(r'^(?:#.*)?$')
+
+# single line scalar without any yaml magic (anchors, tags, flow collections, escapes, ...)
+SIMPLE_SCALAR_RE = re.compile(r"""^(?:(?P<plain>[A-Za-z0-9_./][^#'":]*?)|"(?P<double>[^"\\]*)"|'(?P<single>[^']*)')"""
+                              r"""(?:[ \t]+#.*)?$""")
+
+# block scalars with "keep" chomping own trailing empty lines, inserting text after them would change the value
+KEEP_CHOMPING_RE = re.compile(r':[ \t]+[|>][1-9]?\+')
+
+# block scalar header ending key or sequence item line ("key: |", "- >-", "- key: |2"), group 'owner' is the part
+# of the line preceding the node owning the scalar (its length is the indentation the scalar content has to exceed)
+BLOCK_SCALAR_RE = re.compile(r"""^(?P<owner>[ -]*?)(?:- +|[^ #-][^#]*?:[ \t]+)[|>][1-9+-]{0,2}[ \t]*(?:#.*)?\r?\n?$""")
+
+# characters which can not be written to yaml double quoted scalar via json.dumps()
+NON_PRINTABLE_RE = re.compile('[\x7f-\x9f\ud800-\udfff\ufeff\ufffe\uffff]')
+
+
+def _line_indents(lines):
+    """Returns indentation of each line, -1 for empty and comment only lines
+
+    Lines of block scalars ('|', '>') are content even if they start with '#'.
+    """
+    indents = []
+    scalar_indent = None
+    for line in lines:
+        stripped = line.lstrip(' ')
+        indent = len(line) - len(stripped)
+        if not stripped or stripped.isspace():
+            indents.append(-1)
+            continue
+        if scalar_indent is not None and indent > scalar_indent:
+            indents.append(indent)
+            continue
+        scalar_indent = None
+        if stripped[0] == '#':
+            indents.append(-1)
+            continue
+        indents.append(indent)
+        match = BLOCK_SCALAR_RE.match(line)
+        if match:
+            scalar_indent = len(match.group('owner'))
+    return indents
+
+
+def _is_dash(line, indent):
+    """Checks whether line starts block sequence item at given indentation"""
+    return line[indent:indent + 2].rstrip() == '-'
+
+
+def _simple_scalar(value):
+    """Returns string value of simple single line scalar, raises AmbiguousManifestException otherwise"""
+    match = SIMPLE_SCALAR_RE.match(value or '')
+    if not match or value is None:
+        raise AmbiguousManifestException
+    for group in ('plain', 'double', 'single'):
+        if match.group(group) is not None:
+            return match.group(group)
+    raise AmbiguousManifestException
+
+
+def _quote_scalar(value):
+    """Formats string as yaml double quoted scalar"""
+    value = str(value)
+    if NON_PRINTABLE_RE.search(value):
+        raise AmbiguousManifestException
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _block_end(lines, indents, start, parent_indent):
+    """Returns line range of block nested under key with parent_indent
+
+    Block sequence nested in mapping may share indentation with its parent key ("key:\n- item").
+
+    Args:
+        lines (list): document lines
+        indents (list): document lines indentation (see _line_indents())
+        start (int): index of the first line after the parent key line
+        parent_indent (int): parent key indentation
+
+    Returns:
+        tuple: (index of the first content line or None, index after the last content line)
+
+    """
+    first = None
+    end = start
+    compact_sequence = False
+    for index in range(start, len(lines)):
+        indent = indents[index]
+        if indent < 0:
+            continue
+        if first is None:
+            first = index
+            compact_sequence = indent == parent_indent and _is_dash(lines[index], indent)
+        if indent < parent_indent:
+            break
+        if indent == parent_indent and not (compact_sequence and _is_dash(lines[index], indent)):
+            break
+        end = index + 1
+
+    if first is not None and first >= end:
+        first = None
+    return first, end
+
+
+def _mapping_keys(lines, indents, start, end, indent, first_key=None):
+    """Parses keys of block mapping with given indentation
+
+    Args:
+        lines (list): document lines
+        indents (list): document lines indentation (see _line_indents())
+        start (int): index of the first mapping line
+        end (int): index after the last mapping line
+        indent (int): mapping indentation
+        first_key (tuple): (line index, regexp match) of key placed on sequence item line ("- key: value")
+
+    Returns:
+        dict: key -> (line index, regexp match)
+
+    Raises:
+        AmbiguousManifestException: mapping is not a plain block mapping or contains duplicit or merge keys
+
+    """
+    keys = {}
+    candidates = [first_key] if first_key else []
+    for index in range(start, end):
+        if indents[index] != indent:
+            continue
+        line = lines[index]
+        if candidates and _is_dash(line, indent):
+            # block sequence sharing indentation with its parent key
+            continue
+        match = KEY_LINE_RE.match(line)
+        if not match or match.group('dash'):
+            raise AmbiguousManifestException
+        candidates.append((index, match))
+
+    for index, match in candidates:
+        key = match.group('key').strip('"\'')
+        if key in keys or key == '<<':
+            raise AmbiguousManifestException
+        keys[key] = (index, match)
+    return keys
+
+
+def _nested_block(lines, indents, keys, key, parent_indent):
+    """Returns (first content line, end) of block nested under mapping key, which has to have empty value"""
+    if key not in keys:
+        raise AmbiguousManifestException
+    index, match = keys[key]
+    if not EMPTY_VALUE_RE.match(match.group('value') or ''):
+        raise AmbiguousManifestException
+    first, end = _block_end(lines, indents, index + 1, parent_indent)
+    if first is None:
+        raise AmbiguousManifestException
+    return first, end
+
+
+def _nested_mapping(lines, indents, keys, key, parent_indent):
+    """Returns (keys, indent) of block mapping nested under mapping key"""
+    first, end = _nested_block(lines, indents, keys, key, parent_indent)
+    indent = indents[first]
+    if indent <= parent_indent:
+        raise AmbiguousManifestException
+    return _mapping_keys(lines, indents, first, end, indent), indent
+
+
+def _sequence_items(lines, indents, keys, key, parent_indent):
+    """Parses block sequence of block mappings nested under mapping key
+
+    Returns:
+        tuple: (list of items (keys, key indent, index after the last item content line), sequence indent, end)
+
+    """
+    first, end = _nested_block(lines, indents, keys, key, parent_indent)
+    indent = indents[first]
+    if not _is_dash(lines[first], indent):
+        raise AmbiguousManifestException
+
+    starts = [index for index in range(first, end) if indents[index] == indent]
+    items = []
+    for item_start, item_end in zip(starts, starts[1:] + [end]):
+        line = lines[item_start]
+        if not _is_dash(line, indent):
+            raise AmbiguousManifestException
+        match = KEY_LINE_RE.match(line)
+        if match and match.group('dash'):
+            key_indent = len(match.group('indent')) + len(match.group('dash'))
+            first_key = (item_start, match)
+        elif not line[indent + 1:].strip():
+            content = [i for i in range(item_start + 1, item_end) if indents[i] >= 0]
+            if not content:
+                raise AmbiguousManifestException
+            key_indent = indents[content[0]]
+            first_key = None
+        else:
+            raise AmbiguousManifestException
+        item_keys = _mapping_keys(lines, indents, item_start + 1, item_end, key_indent, first_key)
+        # end of item is its last content line, trailing comments and empty lines are kept after inserted text
+        item_content_end = item_end
+        while indents[item_content_end - 1] < 0:
+            item_content_end -= 1
+        items.append((item_keys, key_indent, item_content_end))
+    return items, indent, end
+
+
+def _item_name(item_keys):
+    if 'name' not in item_keys:
+        raise AmbiguousManifestException
+    return _simple_scalar(item_keys['name'][1].group('value'))
+
+
+def patch_deployment_env(raw, env_variables, container, allow_overwrite):
+    """Update env variables in container of deployment rewriting just the env block
+
+    Manifest is scanned line by line using block indentation, only env entries of selected container
+    (path .spec.template.spec.containers[].env) are modified and the rest of the document is kept byte-for-byte.
+    New env entries are written as double quoted scalars.
+
+    Args:
+        raw (str): manifest raw document (yaml format)
+        env_variables (dict): dictionary of enviroment variables to update
+        container (str): container to update
+        allow_overwrite (bool): allow overriding existing variables
+
+    Returns:
+        string: updated raw manifest
+
+    Raises:
+        AmbiguousManifestException: manifest uses yaml features which can not be patched safely
+            (flow collections, anchors, merge keys, multiple documents, ...), full round-trip should be used
+
+    """
+    if '\r' in raw or KEEP_CHOMPING_RE.search(raw):
+        raise AmbiguousManifestException
+    # str.splitlines() would split on characters which are not yaml line breaks
+    lines = io.StringIO(raw, newline='\n').readlines()
+    indents = _line_indents(lines)
+
+    for line, indent in zip(lines, indents):
+        if indent == 0 and not KEY_LINE_RE.match(line):
+            # directives, document markers, flow collections, complex keys, ...
+            raise AmbiguousManifestException
+    top_keys = _mapping_keys(lines, indents, 0, len(lines), 0)
+
+    if 'kind' not in top_keys:
+        raise AmbiguousManifestException
+    if _simple_scalar(top_keys['kind'][1].group('value')) != 'Deployment':
+        raise NotDeploymentException
+
+    spec_keys, spec_indent = _nested_mapping(lines, indents, top_keys, 'spec', 0)
+    template_keys, template_indent = _nested_mapping(lines, indents, spec_keys, 'template', spec_indent)
+    pod_keys, pod_indent = _nested_mapping(lines, indents, template_keys, 'spec', template_indent)
+    containers, containers_indent, _ = _sequence_items(lines, indents, pod_keys, 'containers', pod_indent)
+    sequence_offset = containers_indent - pod_indent
+
+    names = [_item_name(item[0]) for item in containers]
+    if len(set(names)) != len(names):
+        raise AmbiguousManifestException
+
+    if len(containers) == 1 and container is None:
+        mycontainer = containers[0]
+    elif container:
+        if container not in names:
+            raise ContainerNotFoundException
+        mycontainer = containers[names.index(container)]
+    else:
+        raise ContainerNameNotSetException
+    container_keys, container_indent, container_end = mycontainer
+
+    replacements = {}
+    additions = dict(env_variables)
+    if 'env' in container_keys:
+        env_items, env_indent, env_end = _sequence_items(lines, indents, container_keys, 'env', container_indent)
+        for env_keys, env_key_indent, _ in env_items:
+            name = _item_name(env_keys)
+            if name not in additions:
+                continue
+            if not allow_overwrite:
+                raise OverwriteDisabledException(name)
+            # only plain name/value entries are overwritten in place
+            if set(env_keys) != {'name', 'value'}:
+                raise AmbiguousManifestException
+            index, match = env_keys['value']
+            _simple_scalar(match.group('value'))
+            if _block_end(lines, indents, index + 1, env_key_indent)[0] is not None:
+                raise AmbiguousManifestException
+            prefix = match.group('indent') + (match.group('dash') or '') + match.group('key') + ': '
+            replacements[index] = prefix + _quote_scalar(additions.pop(name)) + '\n'
+        insert_at = env_end
+        dash_indent = env_indent
+        key_offset = env_items[0][1] - env_indent if env_items else 2
+        header = ''
+    else:
+        insert_at = container_end
+        dash_indent = container_indent + sequence_offset
+        key_offset = 2
+        header = ' ' * container_indent + 'env:\n'
+
+    insertion = ''
+    if additions:
+        entries = []
+        for name, value in additions.items():
+            entries.append('{}-{}name: {}\n{}value: {}\n'.format(
+                ' ' * dash_indent, ' ' * (key_offset - 1), _quote_scalar(name),
+                ' ' * (dash_indent + key_offset), _quote_scalar(value)))
+        insertion = header + ''.join(entries)
+
+    if not replacements and not insertion:
+        return raw
+
+    output = []
+    for index, line in enumerate(lines):
+        if index == insert_at:
+            output.append(insertion)
+        output.append(replacements.get(index, line))
+    if insert_at >= len(lines):
+        if lines and not lines[-1].endswith('\n'):
+            output.append('\n')
+        output.append(insertion)
+    return ''.join(output)
+
+
+# top-level 'kind: Deployment' line, used to skip parsing documents which can not be a deployment
+DEPLOYMENT_KIND_RE = re.compile(r'^kind:[ \t]*["\']?Deployment["\']?[ \t]*(#.*)?$', re.MULTILINE)
+
+
+def split_documents(raw):
+    """Splits multi-document yaml stream into documents
+
+    Document separators are kept untouched, so joining the result gives back the original stream.
+
+    Args:
+        raw (str): yaml stream
+
+    Returns:
+        list: list of (separator, document) tuples, separator is '' for the first document
+
+    """
+    result = []
+    separator = ''
+    document = []
+    for line in raw.splitlines(True):
+        if line.rstrip() == '---' or line.startswith('--- '):
+            result.append((separator, ''.join(document)))
+            separator = line
+            document = []
+        else:
+            document.append(line)
+    result.append((separator, ''.join(document)))
+
+    # drop empty leading document if stream starts with separator
+    if result[0] == ('', '') and len(result) > 1:
+        result.pop(0)
+
+    return result
+
+
+def update_deployment_stream(raw, env_variables, container, allow_overwrite):
+    """Update env variables in all deployments of (multi-document) yaml stream
+
+    Documents which are not deployments are passed through untouched.
+
+    Args:
+        raw (str): yaml stream (one or more documents)
+        env_variables (dict): dictionary of enviroment variables to update
+        container (str): container to update
+        allow_overwrite (bool): allow overriding existing variables
+
+    Returns:
+        tuple: (updated raw stream, number of updated deployments, number of documents)
+
+    """
+    output = []
+    deployments = 0
+    documents = split_documents(raw)
+    for separator, document in documents:
+        output.append(separator)
+        if DEPLOYMENT_KIND_RE.search(document):
+            try:
+                document = update_deployment(document, env_variables, container, allow_overwrite)
+                deployments += 1
+            except NotDeploymentException:
+                pass
+        output.append(document)
+
+    return ''.join(output), deployments, len(documents)
+
+
+def find_manifest_files(paths):
+    """Expands directories and glob patterns to list of manifest files
+
+    Args:
+        paths (list): directories (all *.yaml and *.yml files are taken) or glob patterns
+
+    Returns:
+        list: sorted list of unique manifest file paths
+
+    """
+    result = set()
+    for path in paths:
+        if os.path.isdir(path):
+            for pattern in ('*.yaml', '*.yml'):
+                result.update(glob.glob(os.path.join(path, pattern)))
+        else:
+            result.update(p for p in glob.glob(path) if os.path.isfile(p))
+
+    return sorted(result)
+
+
+def process_manifest_file(manifest_file, env_variables, container, allow_overwrite, destination_dir=None):
+    """Update env variables in all deployments of manifest file
+
+    Result is written to destination_dir (under the same file name) or in place if destination_dir is not set.
+    In place update leaves the file untouched if there is nothing to change.
+
+    Args:
+        manifest_file (str): manifest file path
+        env_variables (dict): dictionary of enviroment variables to update
+        container (str): container to update
+        allow_overwrite (bool): allow overriding existing variables
+        destination_dir (str): output directory
+
+    Returns:
+        dict: processing summary (input file, output file, number of deployments and documents, elapsed seconds)
+
+    """
+    started = time.monotonic()
+    with open(manifest_file) as f:
+        raw_data = f.read()
+
+    output_data, deployments, documents = update_deployment_stream(raw_data, env_variables, container,
+                                                                   allow_overwrite)
+
+    output_file = manifest_file
+    if destination_dir:
+        output_file = os.path.join(destination_dir, os.path.basename(manifest_file))
+
+    if output_file != manifest_file or output_data != raw_data:
+        # write to temporary file first, so readers never see partially written manifest
+        tmp_file = '{}.{}.tmp'.format(output_file, os.getpid())
+        with open(tmp_file, 'w') as f:
+            f.write(output_data)
+        os.replace(tmp_file, output_file)
+
+    return {
+        'file': manifest_file,
+        'output': output_file,
+        'deployments': deployments,
+        'documents': documents,
+        'elapsed': time.monotonic() - started,
+    }
+
+
+def process_manifest_files(manifest_files, env_variables, container, allow_overwrite, destination_dir=None,
+                           jobs=None):
+    """Update env variables in all deployments of given manifest files using process pool
+
+    Args:
+        manifest_files (list): manifest file paths
+        env_variables (dict): dictionary of enviroment variables to update (parsed just once by caller)
+        container (str): container to update
+        allow_overwrite (bool): allow overriding existing variables
+        destination_dir (str): output directory, files are updated in place if not set
+        jobs (int): number of worker processes, defaults to number of CPUs, 1 disables the pool
+
+    Returns:
+        list: processing summaries (see process_manifest_file()) in manifest_files order
+
+    Raises:
+        ManifestFileException: processing of some manifest file failed
+
+    """
+    if destination_dir:
+        os.makedirs(destination_dir, exist_ok=True)
+
+    jobs = min(jobs or os.cpu_count() or 1, len(manifest_files)) or 1
+    if jobs == 1:
+        results = []
+        for manifest_file in manifest_files:
+            try:
+                results.append(process_manifest_file(manifest_file, env_variables, container, allow_overwrite,
+                                                     destination_dir))
+            except Exception as e:
+                raise ManifestFileException(manifest_file, e)
+        return results
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(process_manifest_file, manifest_file, env_variables, container,
+                                   allow_overwrite, destination_dir)
+                   for manifest_file in manifest_files]
+        results = []
+        for manifest_file, future in zip(manifest_files, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                for pending in futures:
+                    pending.cancel()
+                raise ManifestFileException(manifest_file, e)
+        return results
+
+
+def format_summary(results, elapsed):
+    """Formats per-file timing summary of batch processing
+
+    Args:
+        results (list): processing summaries (see process_manifest_file())
+        elapsed (float): total elapsed seconds
+
+    Returns:
+        str: human readable summary
+
+    """
+    lines = []
+    for result in results:
+        lines.append("{elapsed:8.3f}s  {deployments:3d}/{documents:<3d} {file} -> {output}".format(**result))
+    lines.append("{:8.3f}s  {:3d}/{:<3d} total ({} files)".format(
+        elapsed,
+        sum(r['deployments'] for r in results),
+        sum(r['documents'] for r in results),
+        len(results)))
+    return "\n".join(lines)
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Append env variables to deployment manifest')
     parser.add_argument('--env-file', type=str, help='environment file path', required=True)
-    parser.add_argument('--deployment-file', type=str, help='deployment manifest path', required=True)
+    manifest_group = parser.add_mutually_exclusive_group(required=True)
+    manifest_group.add_argument('--deployment-file', type=str, help='deployment manifest path')
+    manifest_group.add_argument('--deployment-path', type=str, action='append',
+                                help='batch mode: directory or glob pattern of (multi-document) manifests, '
+                                     'can be repeated')
     parser.add_argument('--container-name', type=str, required=False, default=None,
                         help='container name (required if manifest contains multiple containers)')
     parser.add_argument('--env-prefix', type=str, default=None, help='append only env with specific prefix')
     parser.add_argument('--allow-env-overwrite', type=str, default=False,
                         help='allow overwriting env variables')
+    parser.add_argument('--destination-dir', type=str, default=None,
+                        help='batch mode: write updated manifests to this directory instead of in place')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='batch mode: number of worker processes (default: number of CPUs)')
 
     args = parser.parse_args()
+    deployment_file = args.deployment_file
     try:
 
         envs = get_env_vars(args.env_file, args.env_prefix)
 
-        with open(args.deployment_file) as f:
-            raw_data = f.read()
+        if args.deployment_path:
+            started = time.monotonic()
+            manifest_files = find_manifest_files(args.deployment_path)
+            if not manifest_files:
+                print("No manifest found in '{}'".format("', '".join(args.deployment_path)), file=sys.stderr)
+                exit(1)
+            try:
+                results = process_manifest_files(manifest_files, envs, args.container_name,
+                                                 args.allow_env_overwrite, args.destination_dir, args.jobs)
+            except ManifestFileException as e:
+                deployment_file = e.manifest_file
+                raise e.error
+            print(format_summary(results, time.monotonic() - started))
+        else:
+            with open(args.deployment_file) as f:
+                raw_data = f.read()
 
-        print(update_deployment(raw_data, envs, args.container_name, args.allow_env_overwrite))
+            print(update_deployment(raw_data, envs, args.container_name, args.allow_env_overwrite))
 
     except BadEnvFormatException as e:
         print("Bad env format '{}' in file '{}' on line '{}".format(e.data, args.env_file, e.line), file=sys.stderr)
         exit(1)
 
     except NotDeploymentException as e:
-        print("File '{}' is not deployment manifest".format(args.deployment_file), file=sys.stderr)
+        print("File '{}' is not deployment manifest".format(deployment_file), file=sys.stderr)
         exit(1)
 
     except BadDeploymentFormatException as e:
-        print("Deployment manifest '{}' does not contain path '.spec.template.spec.containers'".format(args.deployment_file), file=sys.stderr)
+        print("Deployment manifest '{}' does not contain path '.spec.template.spec.containers'".format(deployment_file), file=sys.stderr)
         exit(1)
 
     except ContainerNotFoundException as e:
-        print("Container '{}' not found in manifest '{}'".format(args.container_name, args.deployment_file), file=sys.stderr)
+        print("Container '{}' not found in manifest '{}'".format(args.container_name, deployment_file), file=sys.stderr)
         exit(1)
 
     except OverwriteDisabledException as e:
-        print("Trying to overwrite variable '{}', but variable overwriting is not allowed".format(e.variable), file=sys.stderr)
+        print("Trying to overwrite variable '{}' in manifest '{}', but variable overwriting is not allowed".format(e.variable, deployment_file), file=sys.stderr)
         exit(1)
 
     except ContainerNameNotSetException as e:
-        print("Multiple containers found in manifest, but --container-name was not set.", file=sys.stderr)
-        exit(1)
\ No newline at end of file
+        print("Multiple containers found in manifest '{}', but --container-name was not set.".format(deployment_file), file=sys.stderr)
+        exit(1)
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+import sys
+import argparse
+import json
+import re
+import shlex
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+# sort key of objects, the same default as kubernetes-delete-objects.sh always had
+DEFAULT_SORT_KEY = '.metadata.resourceVersion'
+
+_FIELD_PATH_RE = re.compile(r'^(\.[A-Za-z0-9_]+)+$')
+_INDEX_ARG_RE = re.compile(r'"((?:[^"\\]|\\.)*)"|(\S+)')
+
+
+class SortKeyException(Exception):
+    """Exception raised if sort key expression is not supported
+
+    Args:
+        expression (str): sort key expression
+    """
+    def __init__(self, expression):
+        self.expression = expression
+
+
+class ListObjectsException(Exception):
+    """Exception raised if objects cannot be listed
+
+    Args:
+        returncode (int): kubectl get exit code (0 if its output is not valid JSON)
+        output (str): kubectl get error output
+    """
+    def __init__(self, returncode, output):
+        self.returncode = returncode
+        self.output = output
+
+
+class PruneFailedException(Exception):
+    """Exception raised if any delete batch fails (after all batches are processed)
+
+    Args:
+        objects (list): objects of failed batches
+        stats (dict): prune statistics (see prune())
+    """
+    def __init__(self, objects, stats):
+        self.objects = objects
+        self.stats = stats
+
+
+def parse_sort_key(expression):
+    """Returns field path of sort key given by go-template expression
+
+    Supported are field chains (`.metadata.resourceVersion`) and index calls
+    (`index .metadata "labels" "ci-pipeline-id"`), which covers the expressions
+    used with kubernetes-delete-objects.sh --sort-ascending-by.
+
+    Args:
+        expression (str): go-template expression (without braces)
+
+    Returns:
+        list: keys of the field path
+
+    Raises:
+        SortKeyException: if the expression is not supported
+
+    """
+    expression = expression.strip()
+    if _FIELD_PATH_RE.match(expression):
+        return expression[1:].split('.')
+    if expression.startswith('index '):
+        args = [(quoted, bare) for quoted, bare in _INDEX_ARG_RE.findall(expression[len('index '):])]
+        if args and not args[0][0] and _FIELD_PATH_RE.match(args[0][1]) and all(quoted or not bare
+                                                                                for quoted, bare in args[1:]):
+            return args[0][1][1:].split('.') + [quoted.replace('\\"', '"') for quoted, _ in args[1:]]
+    raise SortKeyException(expression)
+
+
+def _field(obj, path):
+    for key in path:
+        if not isinstance(obj, dict):
+            return None
+        obj = obj.get(key)
+    return obj
+
+
+def _sort_value(value):
+    """Numeric values are ordered numerically (as sort -n does), missing values first, the rest as strings"""
+    if value is None:
+        return (0, 0, '')
+    try:
+        return (1, float(value), '')
+    except (TypeError, ValueError):
+        return (2, 0, str(value))
+
+
+def object_ref(obj):
+    """Returns KIND/NAME reference of object accepted by kubectl"""
+    return '{}/{}'.format(obj['kind'], obj['metadata']['name'])
+
+
+def select_objects(objects, keep=0, sort_path=None, group_by=()):
+    """Splits objects to deleted and kept ones, keep most recent objects are kept in every group
+
+    Objects are grouped by values of group_by labels (all objects form single group if no label is given)
+    and sorted ascending by sort_path within the group, the last keep objects of every group are kept.
+
+    Args:
+        objects (list): kubernetes objects (items of kubectl get -o json)
+        keep (int): number of most recent objects kept in every group
+        sort_path (list): field path of sort key (default .metadata.resourceVersion)
+        group_by (list): labels grouping the objects
+
+    Returns:
+        tuple: (deleted, kept) where both are dicts group -> list of objects in ascending order,
+               group is tuple of group_by label values
+
+    """
+    sort_path = sort_path or parse_sort_key(DEFAULT_SORT_KEY)
+    groups = {}
+    for obj in objects:
+        labels = obj.get('metadata', {}).get('labels') or {}
+        groups.setdefault(tuple(labels.get(label, '') for label in group_by), []).append(obj)
+
+    deleted, kept = {}, {}
+    for group, group_objects in sorted(groups.items()):
+        group_objects.sort(key=lambda o: (_sort_value(_field(o, sort_path)), object_ref(o)))
+        split = max(len(group_objects) - keep, 0)
+        deleted[group] = group_objects[:split]
+        kept[group] = group_objects[split:]
+    return deleted, kept
+
+
+def list_objects(kinds, label, kubectl='kubectl'):
+    """Lists objects of given kinds matching label selector by single kubectl call
+
+    Args:
+        kinds (str): kind[s] (comma-separated)
+        label (str): label selector
+        kubectl (str): kubectl command (may contain global options, e.g. --namespace)
+
+    Returns:
+        list: kubernetes objects
+
+    Raises:
+        ListObjectsException: if kubectl get fails
+
+    """
+    process = subprocess.run(shlex.split(kubectl) + ['get', kinds, '-l', label, '-o', 'json'],
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    if process.returncode != 0:
+        raise ListObjectsException(process.returncode, process.stderr)
+    try:
+        return json.loads(process.stdout).get('items') or []
+    except ValueError as e:
+        raise ListObjectsException(0, str(e))
+
+
+def _delete_batch(refs, kubectl):
+    process = subprocess.run(shlex.split(kubectl) + ['delete', '--ignore-not-found'] + refs,
+                             stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+    return process.returncode, process.stdout
+
+
+def delete_objects(refs, kubectl='kubectl', batch_size=50, concurrency=4, output=sys.stdout):
+    """Deletes objects by batched kubectl delete calls, at most concurrency calls run at once
+
+    Args:
+        refs (list): KIND/NAME references of deleted objects
+        kubectl (str): kubectl command (may contain global options, e.g. --namespace)
+        batch_size (int): number of objects deleted by single kubectl call
+        concurrency (int): number of concurrent kubectl calls
+        output (file): stream for kubectl output
+
+    Returns:
+        tuple: (number of batches, list of objects of failed batches)
+
+    """
+    batches = [refs[i:i + batch_size] for i in range(0, len(refs), batch_size)]
+    failed = []
+    if not batches:
+        return 0, failed
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {executor.submit(_delete_batch, batch, kubectl): batch for batch in batches}
+        for future in as_completed(futures):
+            returncode, batch_output = future.result()
+            if batch_output:
+                print(batch_output.rstrip('\n'), file=output, flush=True)
+            if returncode != 0:
+                print("kubectl delete of {} objects failed (exit code {})".format(len(futures[future]), returncode),
+                      file=output, flush=True)
+                failed.extend(futures[future])
+    failed = set(failed)
+    return len(batches), [ref for ref in refs if ref in failed]
+
+
+def prune(kinds, label, kubectl='kubectl', keep=0, sort_key=DEFAULT_SORT_KEY, group_by=(), batch_size=50,
+          concurrency=4, dry_run=False, output=sys.stdout):
+    """Deletes all but keep most recent objects (in every group) of given kinds matching label selector
+
+    Args:
+        kinds (str): kind[s] (comma-separated)
+        label (str): label selector
+        kubectl (str): kubectl command (may contain global options, e.g. --namespace)
+        keep (int): number of most recent objects kept in every group
+        sort_key (str): go-template expression of the sort key (see parse_sort_key())
+        group_by (list): labels grouping the objects
+        batch_size (int): number of objects deleted by single kubectl call
+        concurrency (int): number of concurrent kubectl calls
+        dry_run (bool): just print objects which would be deleted
+        output (file): stream for progress messages
+
+    Returns:
+        dict: statistics (listed, kept, deleted, groups, batches, failed, seconds)
+
+    Raises:
+        SortKeyException: if the sort key expression is not supported
+        ListObjectsException: if kubectl get fails
+        PruneFailedException: if any delete batch fails
+
+    """
+    started = time.monotonic()
+    sort_path = parse_sort_key(sort_key)
+    objects = list_objects(kinds, label, kubectl)
+    deleted, kept = select_objects(objects, keep, sort_path, group_by)
+
+    refs = []
+    for group in deleted:
+        if group_by:
+            print("Group {}: deleting {}, keeping {} objects".format(
+                ','.join('{}={}'.format(name, value) for name, value in zip(group_by, group)),
+                len(deleted[group]), len(kept[group])), file=output, flush=True)
+        for obj in deleted[group]:
+            refs.append(object_ref(obj))
+            if dry_run:
+                print("Would delete '{}'".format(refs[-1]), file=output, flush=True)
+
+    batches, failed = (0, []) if dry_run else delete_objects(refs, kubectl, batch_size, concurrency, output)
+    stats = {'listed': len(objects), 'kept': sum(len(objs) for objs in kept.values()),
+             'deleted': 0 if dry_run else len(refs) - len(failed), 'groups': len(deleted), 'batches': batches,
+             'failed': len(failed), 'dry_run': dry_run, 'seconds': time.monotonic() - started}
+    if dry_run:
+        stats['would_delete'] = len(refs)
+    if failed:
+        raise PruneFailedException(failed, stats)
+    return stats
+
+
+def format_report(stats):
+    """Returns single line report of prune statistics
+
+    Args:
+        stats (dict): prune statistics (see prune())
+
+    Returns:
+        str: report
+
+    """
+    if stats['dry_run']:
+        return "Dry run completed in {:.1f}s: would delete {} of {} objects, keeping {} in {} group(s)".format(
+            stats['seconds'], stats['would_delete'], stats['listed'], stats['kept'], stats['groups'])
+    return ("Completed in {:.1f}s, deleted {} objects ({:.1f} objects/s) in {} batch(es), "
+            "kept {} in {} group(s), failed {}").format(
+        stats['seconds'], stats['deleted'], stats['deleted'] / max(stats['seconds'], 1e-6), stats['batches'],
+        stats['kept'], stats['groups'], stats['failed'])
+
+
+def _positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError("{} is not a positive number".format(value))
+    return number
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Delete all but N most recent kubernetes objects (per label group) '
+                                                 'by batched kubectl calls')
+    parser.add_argument('--kubectl', type=str, default='kubectl', help='kubectl command (default: %(default)s)')
+    parser.add_argument('--kind', type=str, required=True, help='kubernetes object kind[s] (comma-separated)')
+    parser.add_argument('--label', type=str, required=True, help='label selector of kubernetes objects')
+    parser.add_argument('--sort-ascending-by', type=str, default=DEFAULT_SORT_KEY,
+                        help='go-template expression of the sort key (default: %(default)s)')
+    parser.add_argument('--keep-n-recent', type=int, default=0,
+                        help='number of most recent objects kept in every group (default: %(default)s)')
+    parser.add_argument('--group-by', type=str, action='append', default=[],
+                        help='label grouping the objects, can be repeated (default: single group)')
+    parser.add_argument('--batch-size', type=_positive_int, default=50,
+                        help='objects deleted by single kubectl call (default: %(default)s)')
+    parser.add_argument('--concurrency', type=_positive_int, default=4,
+                        help='concurrent kubectl delete calls (default: %(default)s)')
+    parser.add_argument('--dry-run', action='store_true', help='just print objects which would be deleted')
+
+    args = parser.parse_args()
+    try:
+        result = prune(args.kind, args.label, args.kubectl, args.keep_n_recent, args.sort_ascending_by, args.group_by,
+                       args.batch_size, args.concurrency, args.dry_run)
+        print(format_report(result))
+
+    except SortKeyException as e:
+        print("Unsupported sort key expression '{}'".format(e.expression), file=sys.stderr)
+        exit(1)
+
+    except ListObjectsException as e:
+        print("Listing of objects failed (exit code {}): {}".format(e.returncode, e.output.strip()), file=sys.stderr)
+        exit(1)
+
+    except PruneFailedException as e:
+        print(format_report(e.stats))
+        print("Deletion of {} objects failed: {}".format(len(e.objects), ' '.join(e.objects)), file=sys.stderr)
+        exit(1)
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+import sys
+import argparse
+import glob
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+try:
+    from .kubernetes_render_templates import load_env_files, render_template, UnsupportedTemplateException
+except ImportError:
+    from kubernetes_render_templates import load_env_files, render_template, UnsupportedTemplateException
+
+
+CACHE_FORMAT = 'kubernetes-render-cache-v1'
+ENTRIES_DIR = 'entries'
+STATS_FILE = 'stats.json'
+DEFAULT_MAX_SIZE = '100M'
+SIZE_SUFFIXES = {'K': 1024, 'M': 1024 * 1024, 'G': 1024 * 1024 * 1024}
+
+
+class NotCacheableException(Exception):
+    """Exception raised if rendered output can not be cached (its inputs can not be determined)
+
+    Args:
+        reason (str): reason description
+    """
+    def __init__(self, reason):
+        self.reason = reason
+
+
+class _RecordingEnv(dict):
+    """Environment recording names of variables used by template"""
+    def __init__(self, env):
+        super().__init__(env)
+        self.used = set()
+
+    def get(self, name, default=None):
+        self.used.add(name)
+        return super().get(name, default)
+
+
+def parse_size(size):
+    """Parses human readable size (e.g. 100M) into bytes"""
+    size = str(size).strip().upper()
+    if size[-1:] in SIZE_SUFFIXES:
+        return int(float(size[:-1]) * SIZE_SUFFIXES[size[-1]])
+    return int(size)
+
+
+def _hash_update(digest, *values):
+    for value in values:
+        value = value if isinstance(value, bytes) else str(value).encode()
+        digest.update(str(len(value)).encode() + b':' + value + b'\n')
+
+
+def get_cache_key(source_dir, env_files, app, tool_versions=(), options=(), environ=None):
+    """Computes cache key of rendered manifests
+
+    Key covers ci-scripts renderer code, app name, tool versions, options, bytes of all manifests and templates,
+    env files contents (used for ConfigMap) and values of all environment variables used by templates.
+
+    Args:
+        source_dir (str): directory with manifests and templates
+        env_files (list): env files
+        app (str): application name
+        tool_versions (list): tool versions (e.g. kubectl=1.18.8)
+        options (list): other options affecting the output (e.g. --no-validate)
+        environ (dict): process environment (os.environ if not set)
+
+    Returns:
+        str: cache key (hex digest)
+
+    Raises:
+        NotCacheableException: if any template uses syntax not supported by in-process renderer
+
+    """
+    digest = hashlib.sha256()
+    _hash_update(digest, CACHE_FORMAT)
+    lib_dir = os.path.dirname(os.path.abspath(__file__))
+    for module in ('kubernetes_render_templates.py', 'kubernetes_render_cache.py'):
+        with open(os.path.join(lib_dir, module), 'rb') as f:
+            _hash_update(digest, module, f.read())
+    _hash_update(digest, app, *sorted(tool_versions))
+    _hash_update(digest, *options)
+
+    env = _RecordingEnv(load_env_files(env_files, environ))
+    for env_file in env_files:
+        with open(env_file, 'rb') as f:
+            _hash_update(digest, f.read())
+
+    manifests = glob.glob(os.path.join(source_dir, '*.yaml')) + glob.glob(os.path.join(source_dir, '*.yaml.tmpl'))
+    for manifest_file in sorted(manifests):
+        with open(manifest_file, 'rb') as f:
+            content = f.read()
+        _hash_update(digest, os.path.basename(manifest_file), content)
+        if manifest_file.endswith('.tmpl'):
+            try:
+                render_template(content.decode(), env)
+            except (UnsupportedTemplateException, UnicodeDecodeError):
+                raise NotCacheableException('template {} uses unsupported syntax'.format(manifest_file))
+
+    for name in sorted(env.used):
+        _hash_update(digest, name, json.dumps(dict.get(env, name)))
+    return digest.hexdigest()
+
+
+class RenderCache:
+    """Directory cache of rendered manifests with size-bounded LRU eviction
+
+    Every entry is a directory named by cache key, last use is tracked by the entry directory mtime.
+
+    Args:
+        cache_dir (str): cache directory (e.g. GitLab CI cache path)
+        max_size (int): maximum size of all entries in bytes
+    """
+    def __init__(self, cache_dir, max_size=parse_size(DEFAULT_MAX_SIZE)):
+        self.cache_dir = cache_dir
+        self.entries_dir = os.path.join(cache_dir, ENTRIES_DIR)
+        self.max_size = max_size
+        os.makedirs(self.entries_dir, exist_ok=True)
+
+    def _entry_dir(self, key):
+        return os.path.join(self.entries_dir, key)
+
+    def restore(self, key, destination_dir):
+        """Restores cached files into destination dir
+
+        Returns:
+            list: restored files, None on cache miss
+
+        """
+        entry_dir = self._entry_dir(key)
+        if not os.path.isdir(entry_dir):
+            self._record('miss', key)
+            return None
+        os.makedirs(destination_dir, exist_ok=True)
+        restored = []
+        for name in sorted(os.listdir(entry_dir)):
+            shutil.copy2(os.path.join(entry_dir, name), os.path.join(destination_dir, name))
+            restored.append(os.path.join(destination_dir, name))
+        os.utime(entry_dir)
+        self._record('hit', key)
+        return restored
+
+    def store(self, key, destination_dir):
+        """Stores all files of destination dir as cache entry and evicts least recently used entries
+
+        Returns:
+            list: evicted keys
+
+        """
+        tmp_dir = tempfile.mkdtemp(prefix='.tmp-', dir=self.entries_dir)
+        try:
+            for name in sorted(os.listdir(destination_dir)):
+                path = os.path.join(destination_dir, name)
+                if os.path.isfile(path):
+                    shutil.copy2(path, os.path.join(tmp_dir, name))
+            os.rename(tmp_dir, self._entry_dir(key))
+        except OSError:
+            # entry stored meanwhile (or destination not readable)
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not os.path.isdir(self._entry_dir(key)):
+                raise
+        os.utime(self._entry_dir(key))
+        return self.evict(keep=key)
+
+    def entries(self):
+        """Returns list of (key, size, last use) of all entries (least recently used first)"""
+        entries = []
+        for key in os.listdir(self.entries_dir):
+            entry_dir = self._entry_dir(key)
+            if key.startswith('.') or not os.path.isdir(entry_dir):
+                continue
+            size = sum(os.path.getsize(os.path.join(entry_dir, name)) for name in os.listdir(entry_dir))
+            entries.append((key, size, os.path.getmtime(entry_dir)))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def evict(self, keep=None):
+        """Removes least recently used entries until the cache fits max_size
+
+        Returns:
+            list: evicted keys
+
+        """
+        entries = self.entries()
+        total_size = sum(size for _, size, _ in entries)
+        evicted = []
+        for key, size, _ in entries:
+            if total_size <= self.max_size:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            total_size -= size
+            evicted.append(key)
+        return evicted
+
+    def _load_stats(self):
+        try:
+            with open(os.path.join(self.cache_dir, STATS_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'hits': 0, 'misses': 0}
+
+    def _record(self, result, key):
+        stats = self._load_stats()
+        counter = 'hits' if result == 'hit' else 'misses'
+        stats[counter] = stats.get(counter, 0) + 1
+        stats['last'] = {'result': result, 'key': key, 'time': int(time.time())}
+        tmp_file = os.path.join(self.cache_dir, '{}.{}.tmp'.format(STATS_FILE, os.getpid()))
+        with open(tmp_file, 'w') as f:
+            json.dump(stats, f)
+        os.replace(tmp_file, os.path.join(self.cache_dir, STATS_FILE))
+
+    def stats(self):
+        """Returns cache statistics (hits, misses, last result, entries count and size)"""
+        stats = self._load_stats()
+        entries = self.entries()
+        stats.update(entries=len(entries), size=sum(size for _, size, _ in entries), max_size=self.max_size)
+        return stats
+
+
+def format_stats(stats):
+    """Returns one line cache statistics"""
+    last = stats.get('last') or {}
+    return 'kubernetes render cache: {} (key {}), hits {}, misses {}, entries {}, size {}/{} bytes'.format(
+        last.get('result', '-'), last.get('key', '-')[:12], stats.get('hits', 0), stats.get('misses', 0),
+        stats['entries'], stats['size'], stats['max_size'])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cache of rendered (and validated) kubernetes manifests')
+    subparsers = parser.add_subparsers(dest='action')
+
+    key_parser = subparsers.add_parser('key', help='print cache key, fails if the output is not cacheable')
+    key_parser.add_argument('--source-dir', type=str, help='directory with manifests and templates', required=True)
+    key_parser.add_argument('--env-file', type=str, action='append', default=[], help='env file, can be repeated')
+    key_parser.add_argument('--app', type=str, help='application name', required=True)
+    key_parser.add_argument('--tool-version', type=str, action='append', default=[],
+                            help='tool version (e.g. kubectl=1.18.8), can be repeated')
+    key_parser.add_argument('--option', type=str, action='append', default=[],
+                            help='other option affecting the output, can be repeated')
+
+    for action, help_text in (('restore', 'restore cached files, prints hit or miss'),
+                              ('store', 'store files of destination dir'),
+                              ('stats', 'print cache statistics')):
+        action_parser = subparsers.add_parser(action, help=help_text)
+        action_parser.add_argument('--cache-dir', type=str, help='cache directory', required=True)
+        action_parser.add_argument('--max-size', type=str, default=DEFAULT_MAX_SIZE,
+                                   help='maximum cache size (default: %(default)s)')
+        if action != 'stats':
+            action_parser.add_argument('--key', type=str, help='cache key', required=True)
+            action_parser.add_argument('--destination-dir', type=str, help='destination directory', required=True)
+
+    args = parser.parse_args()
+    try:
+        if args.action == 'key':
+            print(get_cache_key(args.source_dir, args.env_file, args.app, args.tool_version, args.option))
+        elif args.action == 'restore':
+            print('miss' if RenderCache(args.cache_dir, parse_size(args.max_size)).restore(
+                args.key, args.destination_dir) is None else 'hit')
+        elif args.action == 'store':
+            for evicted in RenderCache(args.cache_dir, parse_size(args.max_size)).store(args.key, args.destination_dir):
+                print('evicted {}'.format(evicted))
+        elif args.action == 'stats':
+            print(format_stats(RenderCache(args.cache_dir, parse_size(args.max_size)).stats()))
+        else:
+            parser.error('action is required')
+
+    except NotCacheableException as e:
+        print('Not cacheable: {}'.format(e.reason), file=sys.stderr)
+        exit(1)
+
+    except (OSError, ValueError) as e:
+        print(str(e), file=sys.stderr)
+        exit(1)
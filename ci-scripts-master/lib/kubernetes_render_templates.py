@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+import sys
+import argparse
+import concurrent.futures
+import glob
+import io
+import os
+import re
+import subprocess
+import tempfile
+
+
+# templates are rendered in process pool from this count on (pool start-up is not worth it for few templates)
+PARALLEL_THRESHOLD = 32
+
+ACTION_RE = re.compile(r'{{(-\s)?(.*?)(\s-)?}}', re.DOTALL)
+TOKEN_RE = re.compile(r'\s*(?:(?P<string>"(?:[^"\\]|\\.)*")|(?P<raw>`[^`]*`)|(?P<ident>[A-Za-z_][A-Za-z0-9_]*)'
+                      r'|(?P<pipe>\|))')
+STRING_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', '"': '"', '\\': '\\'}
+ENV_LINE_RE = re.compile(r'^\s*(?:export\s+)?([^=\s]+)\s*=(.*)$')
+
+
+class UnsupportedTemplateException(Exception):
+    """Exception raised if template uses syntax not supported by the in-process renderer
+
+    Args:
+        action (str): unsupported template action
+    """
+    def __init__(self, action):
+        self.action = action
+
+
+class TemplateRenderException(Exception):
+    """Exception raised if template can not be rendered
+
+    Args:
+        template_file (str): template file path
+        error (str): error description
+    """
+    def __init__(self, template_file, error):
+        self.template_file = template_file
+        self.error = error
+
+
+def load_env_files(env_files, environ=None):
+    """Loads env files into single dict, variables of later files win (as with cat_files_secure)
+
+    Empty lines and # comments are skipped, values are taken literally (quotes are not allowed in env files).
+
+    Args:
+        env_files (list): env file paths
+        environ (dict): base environment (process environment if not set)
+
+    Returns:
+        dict: merged environment
+
+    """
+    env = dict(os.environ if environ is None else environ)
+    for env_file in env_files:
+        with open(env_file) as f:
+            for line in f:
+                if not line.strip() or line.lstrip().startswith('#'):
+                    continue
+                match = ENV_LINE_RE.match(line.rstrip('\r\n'))
+                if match:
+                    env[match.group(1)] = match.group(2).strip()
+    return env
+
+
+def _parse_string(token):
+    if token.startswith('`'):
+        return token[1:-1]
+    return re.sub(r'\\(.)', lambda m: STRING_ESCAPES.get(m.group(1), m.group(0)), token[1:-1])
+
+
+def _parse_pipeline(action):
+    """Parses template action into list of commands (name or None for literal, args)"""
+    commands = [[]]
+    position = 0
+    while position < len(action):
+        match = TOKEN_RE.match(action, position)
+        if not match:
+            if action[position:].strip():
+                raise UnsupportedTemplateException(action)
+            break
+        position = match.end()
+        if match.group('pipe'):
+            commands.append([])
+        else:
+            commands[-1].append(match)
+    parsed = []
+    for command in commands:
+        if not command:
+            raise UnsupportedTemplateException(action)
+        if command[0].group('ident'):
+            name, args = command[0].group('ident'), command[1:]
+        else:
+            name, args = None, command
+        if any(arg.group('ident') for arg in args):
+            raise UnsupportedTemplateException(action)
+        parsed.append((name, [_parse_string(arg.group(0).strip()) for arg in args]))
+    return parsed
+
+
+def _evaluate(action, env):
+    """Evaluates template action with env and default functions"""
+    value = None
+    for index, (name, args) in enumerate(_parse_pipeline(action)):
+        if index:
+            args = args + [value]
+        if name is None and len(args) == 1:
+            value = args[0]
+        elif name == 'env' and len(args) == 1:
+            value = env.get(args[0], '')
+        elif name == 'default' and len(args) == 2:
+            value = args[1] or args[0]
+        else:
+            raise UnsupportedTemplateException(action)
+    return value
+
+
+def render_template(template, env):
+    """Renders goenvtemplator2 (go template) compatible template
+
+    Supported subset: {{ env "X" }}, {{ env "X" | default "Y" }}, string literals, comments and trim markers
+    ({{- and -}}).
+
+    Args:
+        template (str): template content
+        env (dict): environment
+
+    Returns:
+        str: rendered template
+
+    Raises:
+        UnsupportedTemplateException: if the template uses other syntax (e.g. if, range, other functions)
+
+    """
+    parts = []
+    position = 0
+    for match in ACTION_RE.finditer(template):
+        text = template[position:match.start()]
+        if match.group(1):
+            text = text.rstrip(' \t\r\n')
+        if parts and parts[-1] is None:
+            text = text.lstrip(' \t\r\n')
+            parts.pop()
+        parts.append(text)
+
+        action = match.group(2).strip()
+        if not (action.startswith('/*') and action.endswith('*/')):
+            parts.append(_evaluate(action, env))
+        if match.group(3):
+            parts.append(None)
+        position = match.end()
+
+    text = template[position:]
+    if parts and parts[-1] is None:
+        text = text.lstrip(' \t\r\n')
+        parts.pop()
+    parts.append(text)
+    return ''.join(parts)
+
+
+def split_documents(content):
+    """Splits rendered manifest the same way as split_yaml and removing empty lines did
+
+    Content is split only if it contains '---' line, at every line starting with '---' (the line is dropped),
+    empty parts are skipped without consuming a part number, empty lines are removed from the parts.
+
+    Args:
+        content (str): rendered manifest
+
+    Returns:
+        list: (part number or None if content is not split, part content) tuples, empty parts are None
+
+    """
+    lines = _split_lines(content)
+    if not any(line.rstrip('\n') == '---' for line in lines):
+        return [(None, _remove_empty_lines(lines))]
+
+    parts = []
+    current = []
+    for line in lines + [None]:
+        if line is None or line.startswith('---'):
+            if current:
+                parts.append((len(parts), _remove_empty_lines(current)))
+            current = []
+        else:
+            current.append(line)
+    return parts
+
+
+def _split_lines(content):
+    return io.StringIO(content, newline='\n').readlines()
+
+
+def _remove_empty_lines(lines):
+    return ''.join(line for line in lines if line not in ('\n', '')) or None
+
+
+def _write_file(path, content):
+    """Writes file just once (atomically) or removes it if content is empty"""
+    if content is None:
+        if os.path.exists(path):
+            os.remove(path)
+        return False
+    tmp_file = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_file, 'w', newline='') as f:
+        f.write(content)
+    os.replace(tmp_file, path)
+    return True
+
+
+def render_template_file(template_file, destination_dir, env, env_files=(), goenvtemplator=None):
+    """Renders template file into destination dir, multi-document output is split into indexed files
+
+    Templates using syntax not supported by render_template() are rendered by goenvtemplator2 binary.
+
+    Args:
+        template_file (str): template file path (*.yaml.tmpl)
+        destination_dir (str): destination directory
+        env (dict): environment
+        env_files (list): env files (for goenvtemplator2 fallback)
+        goenvtemplator (str): goenvtemplator2 binary, fallback is disabled if not set
+
+    Returns:
+        list: written files
+
+    """
+    with open(template_file, newline='') as f:
+        template = f.read()
+    try:
+        content = render_template(template, env)
+    except UnsupportedTemplateException as e:
+        if not goenvtemplator:
+            raise TemplateRenderException(template_file, 'unsupported template action {{{{{}}}}}'.format(e.action))
+        content = _render_goenvtemplator(goenvtemplator, template_file, env_files)
+
+    output_name = os.path.basename(template_file).replace('.tmpl', '')
+    output_file = os.path.join(destination_dir, output_name)
+    written = []
+    parts = split_documents(content)
+    if parts[0][0] is None:
+        if _write_file(output_file, parts[0][1]):
+            written.append(output_file)
+        return written
+
+    prefix = os.path.join(destination_dir, output_name.replace('.yaml', '', 1))
+    for number, part in parts:
+        if _write_file('{}-{:02d}.yaml'.format(prefix, number), part):
+            written.append('{}-{:02d}.yaml'.format(prefix, number))
+    # unsplit content is kept as split_yaml did
+    if _write_file(output_file + '.orig', _remove_empty_lines(_split_lines(content))):
+        written.append(output_file + '.orig')
+    if os.path.exists(output_file):
+        os.remove(output_file)
+    return written
+
+
+def _render_goenvtemplator(goenvtemplator, template_file, env_files):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_file = os.path.join(tmp_dir, 'output')
+        args = [goenvtemplator]
+        for env_file in env_files:
+            args += ['-env-file', env_file]
+        try:
+            subprocess.run(args + ['-template', '{}:{}'.format(template_file, output_file)], check=True)
+        except (OSError, subprocess.CalledProcessError) as e:
+            raise TemplateRenderException(template_file, str(e))
+        with open(output_file, newline='') as f:
+            return f.read()
+
+
+def copy_manifest_file(manifest_file, destination_dir):
+    """Copies manifest file into destination dir removing empty lines
+
+    Returns:
+        list: written files
+
+    """
+    with open(manifest_file, newline='') as f:
+        content = _remove_empty_lines(_split_lines(f.read()))
+    output_file = os.path.join(destination_dir, os.path.basename(manifest_file))
+    return [output_file] if _write_file(output_file, content) else []
+
+
+def render_directory(source_dir, destination_dir, env_files, goenvtemplator=None, jobs=None):
+    """Copies *.yaml and renders *.yaml.tmpl files from source dir into destination dir
+
+    Args:
+        source_dir (str): directory with manifests and templates
+        destination_dir (str): destination directory
+        env_files (list): env files (loaded just once)
+        goenvtemplator (str): goenvtemplator2 binary for templates not supported by in-process renderer
+        jobs (int): number of worker processes for big template sets, defaults to number of CPUs
+
+    Returns:
+        list: written files
+
+    Raises:
+        TemplateRenderException: if any template can not be rendered
+
+    """
+    os.makedirs(destination_dir, exist_ok=True)
+    written = []
+    if os.path.realpath(source_dir) != os.path.realpath(destination_dir):
+        for manifest_file in sorted(glob.glob(os.path.join(source_dir, '*.yaml'))):
+            written += copy_manifest_file(manifest_file, destination_dir)
+
+    env = load_env_files(env_files)
+    templates = sorted(glob.glob(os.path.join(source_dir, '*.yaml.tmpl')))
+    jobs = min(jobs or os.cpu_count() or 1, len(templates)) or 1
+    if jobs == 1 or len(templates) < PARALLEL_THRESHOLD:
+        for template_file in templates:
+            written += render_template_file(template_file, destination_dir, env, env_files, goenvtemplator)
+        return written
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(render_template_file, template_file, destination_dir, env, env_files,
+                                   goenvtemplator)
+                   for template_file in templates]
+        for future in futures:
+            try:
+                written += future.result()
+            except TemplateRenderException:
+                for pending in futures:
+                    pending.cancel()
+                raise
+    return written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render kubernetes manifest templates (*.yaml.tmpl) and copy '
+                                                 'manifests (*.yaml) into destination directory')
+    parser.add_argument('--source-dir', type=str, help='directory with manifests and templates', required=True)
+    parser.add_argument('--destination-dir', type=str, help='destination directory', required=True)
+    parser.add_argument('--env-file', type=str, action='append', default=[],
+                        help='env file, can be repeated (variables of later files win)')
+    parser.add_argument('--goenvtemplator', type=str,
+                        help='goenvtemplator2 binary for templates using unsupported syntax (fallback disabled '
+                             'if not set)')
+    parser.add_argument('--jobs', type=int, help='number of worker processes for big template sets')
+
+    args = parser.parse_args()
+    try:
+        for written_file in render_directory(args.source_dir, args.destination_dir, args.env_file,
+                                             args.goenvtemplator, args.jobs):
+            print(written_file)
+
+    except TemplateRenderException as e:
+        print("Template '{}' rendering failed: {}".format(e.template_file, e.error), file=sys.stderr)
+        exit(1)
+
+    except OSError as e:
+        print(str(e), file=sys.stderr)
+        exit(1)
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+import sys
+import argparse
+import queue
+import shlex
+import subprocess
+import threading
+import time
+
+
+class RolloutFailedException(Exception):
+    """Exception raised if rollout of any workload fails
+
+    Args:
+        manifest_file (str): manifest file of failed workload
+        returncode (int): kubectl rollout status exit code
+    """
+    def __init__(self, manifest_file, returncode):
+        self.manifest_file = manifest_file
+        self.returncode = returncode
+
+
+class RolloutTimeoutException(Exception):
+    """Exception raised if rollout of workloads is not finished before the deadline
+
+    Args:
+        manifest_files (list): manifest files of workloads not ready in time
+        timeout (float): deploy timeout in seconds
+    """
+    def __init__(self, manifest_files, timeout):
+        self.manifest_files = manifest_files
+        self.timeout = timeout
+
+
+def _read_output(process, manifest_file, events):
+    """Forwards kubectl output lines and finally the exit code of the process to events queue"""
+    for line in process.stdout:
+        events.put(('output', manifest_file, line.rstrip('\n')))
+    events.put(('exit', manifest_file, process.wait()))
+
+
+def _stop(processes):
+    """Kills all still running processes"""
+    for process in processes.values():
+        if process.poll() is None:
+            process.kill()
+    for process in processes.values():
+        process.wait()
+
+
+def watch_rollouts(manifest_files, kubectl='kubectl', timeout=180, output=sys.stdout, ready=None):
+    """Watches rollout status of all workloads concurrently under single deadline
+
+    Every workload is reported as soon as its rollout is finished. Watching is stopped
+    on the first failed rollout or when the deadline is reached.
+
+    Args:
+        manifest_files (list): manifest files of workloads
+        kubectl (str): kubectl command (may contain global options, e.g. --namespace)
+        timeout (float): deadline for all rollouts in seconds
+        output (file): stream for progress messages
+        ready (dict): dict to be filled with ready workloads (useful when exception is raised)
+
+    Returns:
+        dict: manifest file -> time to ready in seconds
+
+    Raises:
+        RolloutFailedException: if rollout status of any workload fails
+        RolloutTimeoutException: if any rollout is not finished in time
+
+    """
+    started = time.monotonic()
+    deadline = started + timeout
+    events = queue.Queue()
+    processes = {}
+    ready = {} if ready is None else ready
+    try:
+        for manifest_file in manifest_files:
+            process = subprocess.Popen(shlex.split(kubectl) + ['rollout', 'status', '-f', manifest_file],
+                                       stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                       universal_newlines=True)
+            processes[manifest_file] = process
+            threading.Thread(target=_read_output, args=(process, manifest_file, events), daemon=True).start()
+
+        while len(ready) < len(processes):
+            try:
+                event, manifest_file, data = events.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                raise RolloutTimeoutException([f for f in manifest_files if f not in ready], timeout)
+
+            if event == 'output':
+                print("{}: {}".format(manifest_file, data), file=output, flush=True)
+            elif data != 0:
+                raise RolloutFailedException(manifest_file, data)
+            else:
+                ready[manifest_file] = time.monotonic() - started
+                print("{}: ready in {:.1f}s".format(manifest_file, ready[manifest_file]), file=output, flush=True)
+    finally:
+        _stop(processes)
+
+    return ready
+
+
+def format_summary(manifest_files, ready):
+    """Returns table of time to ready per workload
+
+    Args:
+        manifest_files (list): manifest files of workloads
+        ready (dict): manifest file -> time to ready in seconds
+
+    Returns:
+        str: formatted table
+
+    """
+    width = max([len('workload')] + [len(f) for f in manifest_files])
+    lines = ["{:<{width}}  {:>14}".format('workload', 'time to ready', width=width)]
+    for manifest_file in manifest_files:
+        elapsed = "{:.1f}s".format(ready[manifest_file]) if manifest_file in ready else 'not ready'
+        lines.append("{:<{width}}  {:>14}".format(manifest_file, elapsed, width=width))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Watch rollout status of kubernetes workloads concurrently')
+    parser.add_argument('manifest_files', type=str, nargs='*', help='manifest files of workloads')
+    parser.add_argument('--kubectl', type=str, default='kubectl', help='kubectl command (default: %(default)s)')
+    parser.add_argument('--timeout', type=float, default=180, help='deadline for all rollouts in seconds '
+                                                                   '(default: %(default)s)')
+
+    args = parser.parse_args()
+    ready = {}
+    try:
+        watch_rollouts(args.manifest_files, args.kubectl, args.timeout, ready=ready)
+
+    except RolloutFailedException as e:
+        print("Rollout of '{}' failed (exit code {})".format(e.manifest_file, e.returncode), file=sys.stderr)
+        exit(1)
+
+    except RolloutTimeoutException as e:
+        print("Rollout not finished in {}s: {}".format(e.timeout, ', '.join(e.manifest_files)), file=sys.stderr)
+        exit(1)
+
+    finally:
+        if args.manifest_files:
+            print(format_summary(args.manifest_files, ready))
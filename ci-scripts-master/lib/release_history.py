@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+import sys
+import argparse
+import json
+import re
+import subprocess
+
+
+# CHANGELOG.md (https://keepachangelog.com/en/1.0.0/) headings, the same patterns as former get_version_from_changelog_md
+UNRELEASED_RE = re.compile(r'^##[ \t]+\[Unreleased.*\]', re.IGNORECASE)
+VERSION_RE = re.compile(r'^##[ \t]+\[[ \t]*[0-9]+\.[0-9]+\.[0-9]+[^]]*\]')
+VERSION_VALUE_RE = re.compile(r'[0-9]+\.[0-9]+\.[0-9]+[^] ]*')
+SECTION_RE = re.compile(r'^##[ \t]+\[[ \t]*([^]]*?)[ \t]*\][ \t]*(?:-[ \t]*)?(.*?)[ \t]*$')
+LEVEL2_HEADING_RE = re.compile(r'^##[ \t]')
+
+# commits whose message contains this are skipped (as in former gitlab-ci-lib last-commits.sh)
+SKIPPED_COMMIT_RE = re.compile(r'Merge branch')
+# git log record: fields separated by \x1f, records terminated by \x1e
+GIT_LOG_FORMAT = '%H%x1f%P%x1f%an%x1f%ae%x1f%aI%x1f%B%x1e'
+MAX_COMMITS = 1000
+
+EXIT_INVALID_CHANGELOG = 1
+EXIT_NOT_FOUND = 3
+
+
+class UnreleasedSectionException(Exception):
+    """Exception raised if [Unreleased] section of changelog breaks the release rules
+
+    Args:
+        error (str): description of the broken rule
+    """
+    def __init__(self, error):
+        self.error = error
+
+
+class GitException(Exception):
+    """Exception raised if git command fails
+
+    Args:
+        command (list): git command
+        output (str): git error output
+    """
+    def __init__(self, command, output):
+        self.command = command
+        self.output = output
+
+
+def heading_version(line_number, line):
+    """Returns version of version heading line (as the former 'echo N:LINE | grep -Eo' pipeline)"""
+    line = ' '.join('{}:{}'.format(line_number, line).split())
+    return '\n'.join(VERSION_VALUE_RE.findall(line))
+
+
+def index_changelog(path):
+    """Parses changelog into index of its level 2 sections (## headings), the file is read once
+
+    Args:
+        path (str): CHANGELOG.md path
+
+    Returns:
+        dict: index with keys
+            size (int): file size in bytes
+            sections (list): sections (dict of title, version, date, line, offset, end), offset and end are byte
+                offsets of the section (heading included) in the file, version is set for version sections only
+            unreleased (int): index of the [Unreleased] section in sections (None if missing)
+            latest (int): index of the first version section in sections (None if missing)
+            error (str): broken [Unreleased] section rule (None if valid)
+
+    """
+    with open(path, 'rb') as f:
+        content = f.read()
+
+    sections = []
+    unreleased = None
+    latest = None
+    # 1-based line numbers of the first [Unreleased] and first version heading and lines between them
+    unreleased_line = None
+    version_line = None
+    between = []
+    offset = 0
+    for line_number, raw_line in enumerate(content.splitlines(keepends=True), 1):
+        line = raw_line.decode(errors='surrogateescape').rstrip('\r\n')
+        if LEVEL2_HEADING_RE.match(line):
+            if sections and sections[-1]['end'] is None:
+                sections[-1]['end'] = offset
+            match = SECTION_RE.match(line)
+            title, date = (match.group(1), match.group(2) or None) if match else (line[2:].strip(), None)
+            section = {'title': title, 'version': None, 'date': date, 'line': line_number, 'offset': offset,
+                       'end': None}
+            if version_line is None and VERSION_RE.search(line):
+                version_line = line_number
+                section['version'] = heading_version(line_number, line)
+                latest = len(sections)
+            elif VERSION_RE.search(line):
+                section['version'] = heading_version(line_number, line)
+            elif unreleased_line is None and UNRELEASED_RE.search(line):
+                unreleased_line = line_number
+                unreleased = len(sections)
+            sections.append(section)
+        if unreleased_line not in (None, line_number) and version_line is None:
+            between.append(line)
+        offset += len(raw_line)
+    if sections and sections[-1]['end'] is None:
+        sections[-1]['end'] = offset
+
+    error = None
+    if unreleased_line is not None:
+        line_to = (version_line or 0) - 1
+        if unreleased_line == line_to:
+            error = 'Error: [Unreleased] tag should be separated from the last release section by a new line.'
+        elif unreleased_line > line_to:
+            error = 'Error: [Unreleased] tag has to be defined before the first version tag.'
+        elif any(line.strip() for line in between):
+            error = ('Error: There are changes in the [Unreleased] part of a changelog, which are already commited.\n'
+                     'Move them to the part of the changelog which is related to the changes or raise the version '
+                     'number.')
+    return {'size': len(content), 'sections': sections, 'unreleased': unreleased, 'latest': latest, 'error': error}
+
+
+def get_latest_version(index):
+    """Returns version of the first version section of changelog index (None if there is no version section)
+
+    Raises:
+        UnreleasedSectionException: if [Unreleased] section breaks the release rules
+
+    """
+    if index['error']:
+        raise UnreleasedSectionException(index['error'])
+    if index['latest'] is None:
+        return None
+    return index['sections'][index['latest']]['version']
+
+
+def read_section(path, index, version):
+    """Returns text of version section (heading included), only the section bytes are read
+
+    Args:
+        path (str): CHANGELOG.md path
+        index (dict): index of the changelog (see index_changelog())
+        version (str): version (or section title, e.g. Unreleased)
+
+    Returns:
+        str: section text (None if there is no such section)
+
+    """
+    version = version.lstrip('v')
+    for section in index['sections']:
+        if version in (section['version'], section['title']):
+            with open(path, 'rb') as f:
+                f.seek(section['offset'])
+                return f.read(section['end'] - section['offset']).decode(errors='replace')
+    return None
+
+
+def _git(args, cwd=None, check=True):
+    command = ['git'] + list(args)
+    process = subprocess.run(command, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if check and process.returncode != 0:
+        raise GitException(command, process.stderr.decode(errors='replace'))
+    return process
+
+
+def find_nth_tag(nth_tag, cwd=None, revision='HEAD'):
+    """Returns the n-th tag (lightweight tags included) reachable from revision, the tag of revision is the first
+
+    Every step runs git describe, i.e. walks history just up to the nearest tag.
+
+    Returns:
+        str: tag (None if there are less tags)
+
+    """
+    tag = None
+    for _ in range(nth_tag):
+        process = _git(['describe', '--tags', '--abbrev=0', revision if tag is None else tag + '^{commit}^'],
+                       cwd=cwd, check=False)
+        if process.returncode != 0:
+            return None
+        tag = process.stdout.decode(errors='replace').strip()
+    return tag
+
+
+def parse_git_log(output):
+    """Parses git log --format=GIT_LOG_FORMAT output
+
+    Returns:
+        list: commits (dict of sha, parents, author, email, date, subject, paragraph, message), paragraph is list
+            of lines of the first paragraph of the message
+
+    """
+    commits = []
+    for record in output.decode(errors='replace').split('\x1e'):
+        record = record.lstrip('\n')
+        if not record:
+            continue
+        sha, parents, author, email, date, message = record.split('\x1f', 5)
+        paragraph = []
+        for line in message.strip('\n').split('\n'):
+            if not line.strip():
+                break
+            paragraph.append(line.strip())
+        commits.append({'sha': sha, 'parents': parents.split(), 'author': author, 'email': email, 'date': date,
+                        'subject': ' '.join(paragraph), 'paragraph': paragraph, 'message': message.rstrip('\n')})
+    return commits
+
+
+def get_commits(nth_tag=1, cwd=None, revision='HEAD', max_count=MAX_COMMITS):
+    """Returns commits since the n-th tag reachable from revision read by single git log TAG..REVISION call
+
+    Commits with 'Merge branch' in the first paragraph of the message are skipped.
+
+    Args:
+        nth_tag (int): boundary tag (1 = the tag of revision or the nearest older tag)
+        cwd (str): repository directory
+        revision (str): the newest commit
+        max_count (int): maximum number of commits
+
+    Returns:
+        dict: tag (None if there are less tags), range, truncated (True if max_count commits were read), commits
+
+    Raises:
+        GitException: if git log fails
+
+    """
+    tag = find_nth_tag(nth_tag, cwd, revision)
+    commit_range = '{}..{}'.format(tag, revision) if tag else revision
+    output = _git(['log', '--max-count={}'.format(max_count), '--format=' + GIT_LOG_FORMAT, commit_range, '--'],
+                  cwd=cwd).stdout
+    commits = parse_git_log(output)
+    return {'tag': tag, 'range': commit_range, 'truncated': len(commits) >= max_count,
+            'commits': [commit for commit in commits if not SKIPPED_COMMIT_RE.search('\n'.join(commit['paragraph']))]}
+
+
+def format_commit_list(commits):
+    """Returns ' - <line>' list of the first paragraph lines of commit messages"""
+    return '\n'.join(' - ' + line for commit in commits for line in commit['paragraph'])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Index CHANGELOG.md sections and read commits since tag '
+                                                 '(JSON output for release jobs)')
+    subparsers = parser.add_subparsers(dest='action')
+    subparsers.required = True
+    index_parser = subparsers.add_parser('index', help='print index of changelog sections (byte offsets) as JSON')
+    version_parser = subparsers.add_parser('version', help='print the latest version of changelog, validate '
+                                                           '[Unreleased] section (exits with 3 if there is no version)')
+    section_parser = subparsers.add_parser('section', help='print changelog section of given version')
+    section_parser.add_argument('version', type=str, help='version or section title (e.g. 1.2.3, v1.2.3, Unreleased)')
+    for subparser in (index_parser, version_parser, section_parser):
+        subparser.add_argument('--changelog', type=str, default='CHANGELOG.md', help='changelog (default: %(default)s)')
+    commits_parser = subparsers.add_parser('commits', help='print commits since the n-th tag as JSON')
+    commits_parser.add_argument('--nth-tag', type=int, default=1,
+                                help='boundary tag, the tag of HEAD is the first one (default: %(default)s)')
+    commits_parser.add_argument('--revision', type=str, default='HEAD', help='the newest commit (default: %(default)s)')
+    commits_parser.add_argument('--max-count', type=int, default=MAX_COMMITS,
+                                help='maximum number of read commits (default: %(default)s)')
+    commits_parser.add_argument('--format', choices=('json', 'list'), default='json',
+                                help="output format, list prints ' - <line>' per line of the first paragraph of "
+                                     "commit messages (default: %(default)s)")
+
+    args = parser.parse_args()
+    try:
+        if args.action == 'commits':
+            history = get_commits(args.nth_tag, revision=args.revision, max_count=args.max_count)
+            if args.format == 'list':
+                if history['commits']:
+                    print(format_commit_list(history['commits']))
+            else:
+                print(json.dumps(history, indent=2))
+            exit(0)
+
+        index = index_changelog(args.changelog)
+        if args.action == 'index':
+            print(json.dumps(dict(index, file=args.changelog), indent=2))
+        elif args.action == 'version':
+            version = get_latest_version(index)
+            if version is None:
+                exit(EXIT_NOT_FOUND)
+            print(version)
+        else:
+            section = read_section(args.changelog, index, args.version)
+            if section is None:
+                print("ERROR: section {} not found in {}".format(args.version, args.changelog), file=sys.stderr)
+                exit(EXIT_NOT_FOUND)
+            print(section.rstrip('\n'))
+
+    except UnreleasedSectionException as e:
+        print(e.error, file=sys.stderr)
+        exit(EXIT_INVALID_CHANGELOG)
+
+    except GitException as e:
+        print("'{}' failed: {}".format(' '.join(e.command), e.output.strip()), file=sys.stderr)
+        exit(EXIT_INVALID_CHANGELOG)
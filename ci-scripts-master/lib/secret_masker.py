@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+import sys
+import argparse
+import os
+import re
+
+
+DEFAULT_PATTERN = '(.+)'
+DEFAULT_FILL = '*'
+CHUNK_SIZE = 1024 * 1024
+# longer lines are masked in pieces of this size (to keep memory constant), secrets crossing the piece boundary
+# are not masked
+MAX_LINE_LENGTH = 4 * 1024 * 1024
+EXIT_INVALID_PATTERN = 2
+
+# POSIX bracket expressions (as understood by gawk) not supported by python re
+POSIX_CLASSES = {
+    '[:alnum:]': r'0-9A-Za-z', '[:alpha:]': r'A-Za-z', '[:blank:]': r' \t', '[:digit:]': r'0-9',
+    '[:lower:]': r'a-z', '[:upper:]': r'A-Z', '[:space:]': r' \t\n\r\f\v', '[:xdigit:]': r'0-9A-Fa-f',
+    '[:punct:]': r'!-/:-@\[-`{-~', '[:print:]': r' -~', '[:graph:]': r'!-~', '[:cntrl:]': r'\x00-\x1f\x7f',
+}
+
+
+class InvalidPatternException(Exception):
+    """Exception raised if secret pattern is not valid regular expression
+
+    Args:
+        pattern (str): pattern
+        error (str): error description
+    """
+    def __init__(self, pattern, error):
+        self.pattern = pattern
+        self.error = error
+
+
+def _translate_posix_classes(pattern):
+    for posix_class, replacement in POSIX_CLASSES.items():
+        pattern = pattern.replace(posix_class, replacement)
+    return pattern
+
+
+class SecretMasker:
+    """Masks secrets in byte stream line by line, all patterns and literal secrets are combined into single regexp
+
+    Group #1 of every pattern match is masked (patterns without any group do not mask anything, the same as
+    hide_secret always did), literal secrets are masked whole. Every masked character is replaced by fill string.
+
+    Args:
+        patterns (list): regular expressions (ERE) with group #1 selecting the secret
+        secrets (list): literal secret values (multi-line values are masked line by line)
+        fill (str): fill string
+    Raises:
+        InvalidPatternException: if any pattern is not valid regular expression
+    """
+    def __init__(self, patterns=(), secrets=(), fill=DEFAULT_FILL):
+        self.fill = (fill or DEFAULT_FILL).encode()
+        alternatives = []
+        # masked group index by index of the alternative group
+        self._secret_groups = {}
+        # candidate lines are searched by every pattern alone and by bytes.find of literal secrets, python re
+        # uses fast literal prefix scan only for single pattern (alternation is an order of magnitude slower)
+        self._pattern_scanners = []
+        group = 1
+        for pattern in patterns:
+            translated = _translate_posix_classes(pattern).encode(errors='surrogateescape')
+            try:
+                regexp = re.compile(translated, re.MULTILINE)
+            except re.error as e:
+                raise InvalidPatternException(pattern, str(e))
+            alternatives.append(b'(' + translated + b')')
+            self._secret_groups[group] = group + 1 if regexp.groups else None
+            if regexp.groups:
+                self._pattern_scanners.append(regexp)
+            group += 1 + regexp.groups
+
+        # longer secrets first not to leave suffix of a secret unmasked if it starts with another secret
+        lines = {line for secret in secrets for line in secret.split('\n') if line}
+        self._literals = [line.encode(errors='surrogateescape')
+                          for line in sorted(lines, key=lambda line: (-len(line), line))]
+        for literal in self._literals:
+            alternatives.append(b'(' + re.escape(literal) + b')')
+            self._secret_groups[group] = group
+            group += 1
+
+        self._regexp = re.compile(b'|'.join(alternatives), re.MULTILINE) if alternatives else None
+
+    def mask_line(self, line):
+        """Masks all secrets in single line (without newline)"""
+        parts = []
+        position = 0
+        for match in self._regexp.finditer(line):
+            secret_group = self._secret_groups[match.lastindex]
+            if secret_group is None:
+                continue
+            start, end = match.span(secret_group)
+            if start >= end:
+                continue
+            # fill character per (utf-8) character, invalid bytes count as one character each
+            length = len(line[start:end].decode(errors='surrogateescape'))
+            parts += [line[position:start], self.fill * length]
+            position = end
+        if not parts:
+            return line
+        parts.append(line[position:])
+        return b''.join(parts)
+
+    def _candidate_lines(self, data):
+        """Returns starts of lines possibly containing a secret
+
+        Scanning continues from the next line after every match (not from match end), so no line is skipped
+        even if the pattern matches across lines in data.
+        """
+        starts = set()
+        for regexp in self._pattern_scanners:
+            position = 0
+            while True:
+                match = regexp.search(data, position)
+                if not match:
+                    break
+                starts.add(data.rfind(b'\n', 0, match.start()) + 1)
+                position = data.find(b'\n', match.start()) + 1
+                if not position:
+                    break
+        for literal in self._literals:
+            position = data.find(literal)
+            while position >= 0:
+                line_start = data.rfind(b'\n', 0, position) + 1
+                starts.add(line_start)
+                line_end = data.find(b'\n', position)
+                if line_end < 0:
+                    break
+                position = data.find(literal, line_end + 1)
+        return sorted(starts)
+
+    def mask(self, data):
+        """Masks secrets in data consisting of whole lines
+
+        Only lines containing possible match are split and masked, the rest is copied as is.
+
+        Returns:
+            bytes: masked data
+        """
+        if self._regexp is None:
+            return data
+        parts = []
+        position = 0
+        for line_start in self._candidate_lines(data):
+            line_end = data.find(b'\n', line_start)
+            line_end = len(data) if line_end < 0 else line_end
+            parts += [data[position:line_start], self.mask_line(data[line_start:line_end])]
+            position = line_end
+        if not parts:
+            return data
+        parts.append(data[position:])
+        return b''.join(parts)
+
+    def mask_stream(self, input_stream, output_stream, chunk_size=CHUNK_SIZE, max_line_length=MAX_LINE_LENGTH):
+        """Masks secrets in binary stream using constant memory (chunk size + max line length)
+
+        Returns:
+            int: number of bytes processed
+        """
+        pending = b''
+        processed = 0
+        while True:
+            chunk = input_stream.read(chunk_size)
+            if not chunk:
+                break
+            processed += len(chunk)
+            pending += chunk
+            last_newline = pending.rfind(b'\n')
+            if last_newline >= 0:
+                output_stream.write(self.mask(pending[:last_newline + 1]))
+                pending = pending[last_newline + 1:]
+            while len(pending) >= max_line_length:
+                output_stream.write(self.mask(pending[:max_line_length]))
+                pending = pending[max_line_length:]
+            output_stream.flush()
+        if pending:
+            output_stream.write(self.mask(pending))
+        output_stream.flush()
+        return processed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Mask secrets in stdin stream (group #1 of pattern matches and '
+                                                 'values of given environment variables) to stdout')
+    parser.add_argument('-e', '--pattern', type=str, action='append', default=[],
+                        help='regular expression with group #1 selecting the secret, can be repeated '
+                             '(defaults to {} if neither pattern nor secret variable is given)'.format(DEFAULT_PATTERN))
+    parser.add_argument('-v', '--secret-variable', type=str, action='append', default=[],
+                        help='name of environment variable with secret value, can be repeated')
+    parser.add_argument('-f', '--fill', type=str, default=DEFAULT_FILL,
+                        help='fill character (default: %(default)s)')
+
+    args = parser.parse_args()
+    patterns = args.pattern
+    secrets = [os.environ[name] for name in args.secret_variable if os.environ.get(name)]
+    if not patterns and not args.secret_variable:
+        patterns = [DEFAULT_PATTERN]
+    try:
+        masker = SecretMasker(patterns, secrets, args.fill)
+        masker.mask_stream(sys.stdin.buffer, sys.stdout.buffer)
+
+    except InvalidPatternException as e:
+        print("Invalid pattern '{}': {}".format(e.pattern, e.error), file=sys.stderr)
+        exit(EXIT_INVALID_PATTERN)
+
+    except BrokenPipeError:
+        # output closed (e.g. piped to head)
+        sys.stderr.close()
+        exit(1)
@@ -17,11 +17,10 @@
 #
 # Exit when input versions does not fit SemVer 2.0.0 specification.
 #
-# Gotchas:
-#    * According to semver, following statement is true: 1.0.0-alpha.1 < 1.0.0-alpha.beta
-#      Unfortunatelly our dummy comparator evaluates 1.0.0-alpha.1 > 1.0.0-alpha.beta
-#    * In semver, 1.0.0+1 = 1.0.0+2
-#      Unfortunatell our dummy comparator evalutes 1.0.0+1 < 1.0.0+2
+# Versions are sorted by semver precedence (see version_index.py), versions
+# of the same precedence differing by build metadata are sorted
+# lexicographically by build metadata and put before the plain version
+# (1.0.0+1 < 1.0.0+2 < 1.0.0).
 
 set -eo pipefail
 
@@ -56,31 +55,12 @@ while true; do
   esac
 done
 
-# sort semantic versions
-# (see https://stackoverflow.com/questions/40390957/how-to-sort-semantic-versions-in-bash)
-sorted_versions=$(sed "s/^$VERSION_PREFIX//gp;d" | sed '/-/!{s/$/_/}' | sort -V | sed 's/_$//')
-
-invalid_versions=$(echo "$sorted_versions" | \
-    egrep -v '^([1-9][0-9]*|0)\.([1-9][0-9]*|0)\.([1-9][0-9]*|0)([-+][0-9A-Za-z]+([-\.+][0-9A-Za-z]+)*)?$' || \
-    true)
-if [ -n "$invalid_versions" ]; then
-    echo "ERROR: there are invalid semantic versions names: " \
-        "$(echo $invalid_versions | tr "\n" ",")" 1>&2
-    exit 2
-fi
-
 case "$1" in
-    major)
-        echo "$sorted_versions" | cut -f1 -d. | uniq
-        ;;
-    minor)
-        echo "$sorted_versions" | awk -F. '{print $1 "." $2}' | uniq
-        ;;
-    patch)
-        echo "$sorted_versions" | awk -F'[+-]' '{print $1}' | uniq
+    major|minor|patch|all|full)
+        exec python3 $dir/version_index.py --version-prefix="$VERSION_PREFIX" cut "$1"
         ;;
-    ''|all|full)
-        echo "$sorted_versions"
+    '')
+        exec python3 $dir/version_index.py --version-prefix="$VERSION_PREFIX" cut all
         ;;
     *)
         myexit --help 1 "Not implemented: $1"
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+import sys
+import argparse
+import glob
+import json
+import os
+from collections import defaultdict
+
+
+# metrics of span usable in folded stacks: (span field, scale)
+METRICS = {
+    'time': ('duration', 1000),
+    'spawns': ('spawns', 1),
+}
+
+
+def _trace_files(paths):
+    """Yields trace files, directories are searched for *.jsonl files recursively"""
+    for path in paths:
+        if os.path.isdir(path):
+            yield from sorted(glob.glob(os.path.join(path, '**', '*.jsonl'), recursive=True))
+        else:
+            yield path
+
+
+def load_spans(paths):
+    """Loads spans written by common.sh trace_* helpers
+
+    Args:
+        paths (list): trace files or directories containing them (*.jsonl)
+
+    Returns:
+        tuple: (list of spans with duration field added, number of invalid lines)
+
+    """
+    spans = []
+    invalid = 0
+    for trace_file in _trace_files(paths):
+        with open(trace_file, errors='replace') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    span = json.loads(line)
+                    span['duration'] = max(float(span['end']) - float(span['start']), 0.0)
+                    span.setdefault('stack', '')
+                except (ValueError, TypeError, KeyError, AttributeError):
+                    # e.g. truncated line of killed job
+                    invalid += 1
+                    continue
+                spans.append(span)
+    return spans, invalid
+
+
+def span_path(span):
+    """Returns full path of span (parent spans and the span name)"""
+    return tuple(part for part in span['stack'].split(';') if part) + (span['name'],)
+
+
+def _job(span):
+    return (span.get('job') or 'local').replace(';', '_')
+
+
+def folded_stacks(spans, metric='time', by_job=True):
+    """Aggregates spans into folded stacks (flamegraph.pl / speedscope input)
+
+    Value of the stack is self value of the span (value of the span minus values of its direct child spans),
+    spans of the same path are summed (within a job if by_job is set).
+
+    Args:
+        spans (list): spans (see load_spans())
+        metric (str): 'time' (milliseconds) or 'spawns'
+        by_job (bool): prefix stacks with job name (merge traces of more pipeline jobs)
+
+    Returns:
+        dict: folded stack (str) -> value (int)
+
+    """
+    field, scale = METRICS[metric]
+    totals = defaultdict(float)
+    for span in spans:
+        prefix = (_job(span),) if by_job else ()
+        totals[prefix + span_path(span)] += (span.get(field) or 0) * scale
+
+    children = defaultdict(float)
+    for path, value in totals.items():
+        children[path[:-1]] += value
+
+    stacks = {}
+    for path, value in totals.items():
+        # children may overlap (concurrent sub-processes), self value is never negative
+        self_value = int(round(max(value - children[path], 0)))
+        if self_value:
+            stacks[';'.join(path)] = self_value
+    return stacks
+
+
+def format_folded(stacks):
+    """Returns folded stacks as lines '<frame>;<frame>.. <value>'"""
+    return '\n'.join('{} {}'.format(stack, value) for stack, value in sorted(stacks.items()))
+
+
+def top_spans(spans, limit=20, by_name=False):
+    """Returns the slowest spans (or steps aggregated by span name)
+
+    Args:
+        spans (list): spans (see load_spans())
+        limit (int): maximum number of returned rows
+        by_name (bool): aggregate spans of the same name (count, total and max duration, spawns, failures)
+
+    Returns:
+        list: rows (dict) sorted by total duration (descending)
+
+    """
+    if not by_name:
+        rows = [{'name': span['name'], 'path': ';'.join(span_path(span)), 'job': _job(span), 'count': 1,
+                 'total': span['duration'], 'max': span['duration'], 'spawns': span.get('spawns'),
+                 'failed': int(span.get('exit_code', 0) != 0)} for span in spans]
+    else:
+        steps = {}
+        for span in spans:
+            row = steps.setdefault(span['name'], {'name': span['name'], 'path': None, 'job': None, 'count': 0,
+                                                  'total': 0.0, 'max': 0.0, 'spawns': None, 'failed': 0})
+            row['count'] += 1
+            row['total'] += span['duration']
+            row['max'] = max(row['max'], span['duration'])
+            if span.get('spawns') is not None:
+                row['spawns'] = (row['spawns'] or 0) + span['spawns']
+            row['failed'] += int(span.get('exit_code', 0) != 0)
+        rows = list(steps.values())
+    return sorted(rows, key=lambda row: row['total'], reverse=True)[:limit]
+
+
+def format_top(rows, by_name=False):
+    """Returns table of top_spans() rows"""
+    def spawns(value):
+        return '-' if value is None else str(value)
+
+    if by_name:
+        lines = ["{:>10}  {:>10}  {:>6}  {:>7}  {:>6}  {}".format('total', 'max', 'count', 'spawns', 'failed',
+                                                                   'step')]
+        lines += ["{:>9.2f}s  {:>9.2f}s  {:>6}  {:>7}  {:>6}  {}".format(
+            row['total'], row['max'], row['count'], spawns(row['spawns']), row['failed'], row['name'])
+            for row in rows]
+    else:
+        lines = ["{:>10}  {:>7}  {:>4}  {}".format('duration', 'spawns', 'exit', 'job: step')]
+        lines += ["{:>9.2f}s  {:>7}  {:>4}  {}: {}".format(row['total'], spawns(row['spawns']),
+                                                          'fail' if row['failed'] else 'ok', row['job'], row['path'])
+                  for row in rows]
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Aggregate ci-scripts traces (CI_SCRIPTS_TRACE_FILE) of pipeline '
+                                                 'jobs into folded stacks or report of the slowest steps')
+    subparsers = parser.add_subparsers(dest='action')
+    subparsers.required = True
+    folded_parser = subparsers.add_parser('folded', help='print folded stacks (flamegraph.pl, speedscope input)')
+    folded_parser.add_argument('--metric', choices=sorted(METRICS), default='time',
+                               help='stack value: self time in milliseconds or spawned processes '
+                                    '(default: %(default)s)')
+    folded_parser.add_argument('--no-job', action='store_true', help='do not prefix stacks with job name')
+    top_parser = subparsers.add_parser('top', help='print the slowest steps')
+    top_parser.add_argument('--limit', type=int, default=20, help='number of steps (default: %(default)s)')
+    top_parser.add_argument('--by-name', action='store_true', help='aggregate steps of the same name')
+    for subparser in (folded_parser, top_parser):
+        subparser.add_argument('paths', type=str, nargs='+',
+                               help='trace files or directories with trace files (*.jsonl)')
+
+    args = parser.parse_args()
+    spans, invalid = load_spans(args.paths)
+    if invalid:
+        print("WARNING: {} invalid trace lines skipped".format(invalid), file=sys.stderr)
+    if not spans:
+        print("ERROR: no spans found in {}".format(' '.join(args.paths)), file=sys.stderr)
+        exit(1)
+
+    if args.action == 'folded':
+        print(format_folded(folded_stacks(spans, args.metric, not args.no_job)))
+    else:
+        print(format_top(top_spans(spans, args.limit, args.by_name), args.by_name))
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+import sys
+import argparse
+import collections
+import re
+
+
+SCHEMES = ('semver', 'pep440')
+CUT_PARTS = ('major', 'minor', 'patch', 'all', 'full')
+LATEST_TAG = 'latest'
+# the same (slightly benevolent) definition as semver-cut.sh always used
+SEMVER_RE = re.compile(r'(0|[1-9][0-9]*)\.(0|[1-9][0-9]*)\.(0|[1-9][0-9]*)([-+][0-9A-Za-z]+([-.+][0-9A-Za-z]+)*)?')
+EXIT_NOT_FOUND = 1
+EXIT_INVALID = 2
+
+# is_release is False for pre-releases and versions with build metadata (semver) or local version label (PEP 440)
+Version = collections.namedtuple('Version', ['text', 'major', 'minor', 'patch', 'is_release', 'key'])
+
+
+class InvalidVersionException(Exception):
+    """Exception raised if version does not comply with the versioning scheme
+
+    Args:
+        versions (list): invalid versions
+        scheme (str): versioning scheme
+    """
+    def __init__(self, versions, scheme):
+        self.versions = versions
+        self.scheme = scheme
+
+
+def _prerelease_key(prerelease):
+    # numeric identifiers have lower precedence than alphanumeric ones (https://semver.org/#spec-item-11)
+    return tuple((0, int(identifier), '') if identifier.isdigit() else (1, 0, identifier)
+                 for identifier in prerelease.split('.'))
+
+
+def parse_semver(text):
+    """Parses semantic version
+
+    Versions are ordered by semver precedence, versions of the same precedence (differing by build metadata) are
+    ordered pre-release with build metadata, version with build metadata and plain version.
+
+    Raises:
+        InvalidVersionException: if the version is not valid semantic version
+
+    """
+    match = SEMVER_RE.fullmatch(text)
+    if not match:
+        raise InvalidVersionException([text], 'semver')
+    major, minor, patch = (int(part) for part in match.group(1, 2, 3))
+    suffix = match.group(4) or ''
+    if suffix.startswith('-'):
+        prerelease, _, build = suffix[1:].partition('+')
+        rank, prerelease_key = 0, _prerelease_key(prerelease)
+    else:
+        build = suffix[1:]
+        rank, prerelease_key = (1 if build else 2), ()
+    return Version(text, major, minor, patch, not suffix, (major, minor, patch, rank, prerelease_key, build))
+
+
+def parse_pep440(text):
+    """Parses PEP 440 version (https://www.python.org/dev/peps/pep-0440/)
+
+    Raises:
+        InvalidVersionException: if the version does not comply with PEP 440
+
+    """
+    from packaging.version import Version as Pep440Version, InvalidVersion
+
+    try:
+        version = Pep440Version(text)
+    except InvalidVersion:
+        raise InvalidVersionException([text], 'pep440')
+    major, minor, patch = (tuple(version.release) + (0, 0))[:3]
+    return Version(text, major, minor, patch, not (version.is_prerelease or version.local), version)
+
+
+PARSERS = {'semver': parse_semver, 'pep440': parse_pep440}
+
+
+def compare_versions(version1, version2, scheme='semver'):
+    """Returns -1, 0 or 1 if version1 is lower, equal or higher than version2"""
+    key1, key2 = PARSERS[scheme](version1).key, PARSERS[scheme](version2).key
+    return (key1 > key2) - (key1 < key2)
+
+
+class VersionIndex:
+    """Sorted index of versions answering latest version queries without re-parsing
+
+    All versions are parsed and sorted once, latest releases are indexed by major and (major, minor).
+
+    Args:
+        versions (list): versions (e.g. git tags)
+        scheme (str): versioning scheme (semver or pep440)
+        prefix (str): version prefix (e.g. v), versions without the prefix are skipped
+        strict (bool): raise InvalidVersionException on any invalid version, invalid versions are skipped
+            (and listed in invalid attribute) otherwise
+    """
+    def __init__(self, versions, scheme='semver', prefix='', strict=True):
+        self.scheme = scheme
+        self.prefix = prefix
+        self.invalid = []
+        parse = PARSERS[scheme]
+        parsed = []
+        for text in versions:
+            text = text.strip()
+            if not text or not text.startswith(prefix):
+                continue
+            try:
+                parsed.append(parse(text[len(prefix):]))
+            except InvalidVersionException:
+                self.invalid.append(text[len(prefix):])
+        if self.invalid and strict:
+            raise InvalidVersionException(self.invalid, scheme)
+
+        self.versions = sorted(parsed, key=lambda version: version.key)
+        self._latest = None
+        self._latest_in_major = {}
+        self._latest_in_minor = {}
+        self._texts = set()
+        for version in self.versions:
+            self._texts.add(version.text)
+            if version.is_release:
+                self._latest = version
+                self._latest_in_major[version.major] = version
+                self._latest_in_minor[(version.major, version.minor)] = version
+
+    def parse(self, text):
+        """Parses version using scheme of the index"""
+        return PARSERS[self.scheme](text)
+
+    def __contains__(self, text):
+        return text in self._texts
+
+    def cut(self, part='all'):
+        """Returns sorted versions or their unique major, major.minor or major.minor.patch parts (as semver-cut.sh)"""
+        if part in ('all', 'full'):
+            return [version.text for version in self.versions]
+        fields = {'major': ('major',), 'minor': ('major', 'minor'), 'patch': ('major', 'minor', 'patch')}[part]
+        parts = []
+        for version in self.versions:
+            cut = '.'.join(str(getattr(version, field)) for field in fields)
+            if not parts or parts[-1] != cut:
+                parts.append(cut)
+        return parts
+
+    def latest(self):
+        """Returns the latest release (pre-releases are not considered) or None"""
+        return self._latest.text if self._latest else None
+
+    def latest_in_major(self, major):
+        """Returns the latest release of the major version or None"""
+        latest = self._latest_in_major.get(int(major))
+        return latest.text if latest else None
+
+    def latest_in_minor(self, major, minor):
+        """Returns the latest release of the major.minor version or None"""
+        latest = self._latest_in_minor.get((int(major), int(minor)))
+        return latest.text if latest else None
+
+    def is_newest(self, text):
+        """Returns True if there is no newer release than the version"""
+        return self._latest is None or self._latest.key <= self.parse(text).key
+
+    def latest_tags(self, text):
+        """Returns floating tags of the version (the same as latest-tags.sh)
+
+        Version gets major.minor tag if it is the latest release of its minor version, major tag if it is the latest
+        release of its major version and latest tag if it is the latest release at all. Pre-releases (and versions
+        with build metadata) never get any floating tag and newer pre-releases do not take them from releases.
+
+        Returns:
+            list: floating tags (e.g. ['1', '1.2', 'latest']), empty if the version is not the latest of its minor
+
+        """
+        version = self.parse(text)
+        if not version.is_release:
+            return []
+        latest_in_major = self._latest_in_major.get(version.major)
+        latest_in_minor = self._latest_in_minor.get((version.major, version.minor))
+        if latest_in_minor and latest_in_minor.key > version.key:
+            return []
+        tags = ['{}.{}'.format(version.major, version.minor)]
+        if not latest_in_major or latest_in_major.key <= version.key:
+            tags.insert(0, str(version.major))
+        if self.is_newest(text):
+            tags.append(LATEST_TAG)
+        return tags
+
+    def query(self, line):
+        """Answers single batch mode query
+
+        Queries (one per line): latest, latest-in-major MAJOR, latest-in-minor MAJOR.MINOR, is-newest VERSION,
+        latest-tags VERSION, compare VERSION1 VERSION2, cut major|minor|patch|all
+
+        Returns:
+            str: answer line (empty if there is no such version)
+
+        Raises:
+            ValueError: on unknown or malformed query
+            InvalidVersionException: if the version in query is not valid
+
+        """
+        words = line.split()
+        if not words:
+            raise ValueError('empty query')
+        query, args = words[0], words[1:]
+        if query == 'latest' and not args:
+            return self.latest() or ''
+        if query == 'latest-in-major' and len(args) == 1 and args[0].isdigit():
+            return self.latest_in_major(args[0]) or ''
+        if query == 'latest-in-minor' and len(args) == 1 and re.fullmatch(r'[0-9]+\.[0-9]+', args[0]):
+            return self.latest_in_minor(*args[0].split('.')) or ''
+        if query == 'is-newest' and len(args) == 1:
+            return 'true' if self.is_newest(args[0]) else 'false'
+        if query == 'latest-tags' and len(args) == 1:
+            return ','.join(self.latest_tags(args[0]))
+        if query == 'compare' and len(args) == 2:
+            return str(compare_versions(args[0], args[1], self.scheme))
+        if query == 'cut' and len(args) == 1 and args[0] in CUT_PARTS:
+            return ' '.join(self.cut(args[0]))
+        raise ValueError("invalid query '{}'".format(line.strip()))
+
+
+def _print_invalid(e):
+    print('ERROR: there are invalid {} versions names: {}'.format(
+        'semantic' if e.scheme == 'semver' else 'PEP 440', ','.join(e.versions)), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Sort versions and answer latest version queries (semver or PEP 440)')
+    parser.add_argument('--scheme', choices=SCHEMES, default='semver', help='versioning scheme (default: %(default)s)')
+    parser.add_argument('-p', '--version-prefix', type=str, default='',
+                        help='version prefix, versions without the prefix are skipped')
+    subparsers = parser.add_subparsers(dest='action')
+
+    cut_parser = subparsers.add_parser('cut', help='print sorted versions read from stdin (as semver-cut.sh)')
+    cut_parser.add_argument('part', choices=CUT_PARTS, nargs='?', default='all', help='version part to print')
+
+    latest_tags_parser = subparsers.add_parser(
+        'latest-tags', help='print comma separated floating tags of the current version, tags are read from stdin')
+    latest_tags_parser.add_argument('current', type=str, help='current version (without prefix)')
+
+    batch_parser = subparsers.add_parser(
+        'batch', help='answer queries read from stdin (one answer line per query line), see VersionIndex.query')
+    batch_parser.add_argument('--tags-file', type=argparse.FileType(), required=True,
+                              help='file with versions (tags), one per line')
+
+    args = parser.parse_args()
+    try:
+        if args.action == 'cut':
+            for line in VersionIndex(sys.stdin, args.scheme, args.version_prefix).cut(args.part):
+                print(line)
+
+        elif args.action == 'latest-tags':
+            tags = sys.stdin.read().split('\n')
+            index = VersionIndex(tags, args.scheme, args.version_prefix, strict=False)
+            if index.invalid:
+                print('WARN: skipping invalid versions: {}'.format(','.join(index.invalid)), file=sys.stderr)
+            prefixed_current = args.version_prefix + args.current
+            if prefixed_current not in (tag.strip() for tag in tags):
+                print("ERROR: current version '{}' is not in git tags '{}'!".format(
+                    prefixed_current, ','.join(tag.strip() for tag in tags if tag.strip())), file=sys.stderr)
+                exit(EXIT_NOT_FOUND)
+            latest_tags = index.latest_tags(args.current)
+            if latest_tags:
+                print(','.join(latest_tags))
+            elif index.parse(args.current).is_release:
+                print('WARN: Releasing old version!', file=sys.stderr)
+
+        elif args.action == 'batch':
+            with args.tags_file:
+                index = VersionIndex(args.tags_file, args.scheme, args.version_prefix)
+            for line in sys.stdin:
+                if not line.strip():
+                    continue
+                try:
+                    print(index.query(line), flush=True)
+                except InvalidVersionException as e:
+                    _print_invalid(e)
+                    print('', flush=True)
+                except ValueError as e:
+                    print('ERROR: {}'.format(e), file=sys.stderr)
+                    print('', flush=True)
+
+        else:
+            parser.error('action is required')
+
+    except InvalidVersionException as e:
+        _print_invalid(e)
+        exit(EXIT_INVALID)
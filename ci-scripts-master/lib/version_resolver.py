@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+import sys
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+
+try:
+    from .release_history import index_changelog, get_latest_version, UnreleasedSectionException
+except ImportError:
+    from release_history import index_changelog, get_latest_version, UnreleasedSectionException
+
+
+# environment variables affecting the resolved version (besides git HEAD and working tree)
+KEY_ENVIRONMENT = ('VERSION', 'CI_COMMIT_TAG', 'CI_COMMIT_SHA', 'CI_BUILD_REF', 'CI_JOB_ID')
+# files read by probes (relative to project directory), their state is part of the key even if git ignores them
+KEY_FILES = ('ci/version.sh', 'debian/changelog', 'GNUmakefile', 'makefile', 'Makefile', 'package.json',
+             'Cargo.toml', 'VERSION', 'CHANGELOG.md', 'Dockerfile')
+CACHE_FORMAT = 'version-resolver-v2'
+MAX_CACHE_ENTRIES = 64
+
+CARGO_VERSION_RE = re.compile(r'version\s*=\s*"([0-9]+\.[0-9]+\.[0-9]+(-.+)?)"')
+CARGO_VERSION_SED_RE = re.compile(r'.*version\s*=\s*"(.*)".*')
+DOCKERFILE_VERSION_RE = re.compile(r'^[^#]*org.label-schema.version="([0-9]+\.[0-9]+\.[0-9]+(-.+)?)"')
+DOCKERFILE_VERSION_SED_RE = re.compile(r'.*org.label-schema.version="(.*)".*')
+GIT_TAG_VERSION_RE = re.compile(r'^.*[0-9]+.[0-9]+.[0-9]+')
+GIT_TAG_PREFIX_RE = re.compile(r'^([a-zA-Z0-9-]+[-/])?v?')
+
+
+class InvalidVersionException(Exception):
+    """Exception raised if the resolved version is empty or contains whitespaces
+
+    Args:
+        version (str): resolved version
+    """
+    def __init__(self, version):
+        self.version = version
+
+
+def _run(args, cwd):
+    """Runs command, returns its stdout without trailing newlines (as shell $(...)) or '' on failure"""
+    try:
+        process = subprocess.run(args, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                 universal_newlines=True)
+    except OSError:
+        return ''
+    return process.stdout.rstrip('\n')
+
+
+def _read(path):
+    try:
+        with open(path, newline='', errors='surrogateescape') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _grep_sed(content, grep_re, sed_re):
+    """Emulates egrep GREP_RE FILE | sed -r 's/SED_RE/\\1/'"""
+    if content is None:
+        return ''
+    lines = [sed_re.sub(r'\1', line) for line in content.split('\n') if grep_re.search(line)]
+    return '\n'.join(lines)
+
+
+def probe_environment(cwd, environ):
+    return environ.get('VERSION', '')
+
+
+def probe_ci_version_script(cwd, environ):
+    script = os.path.join(cwd, 'ci', 'version.sh')
+    if not (os.path.isfile(script) and os.access(script, os.X_OK)):
+        return ''
+    return _run(['bash', script], cwd)
+
+
+def probe_debian_changelog(cwd, environ):
+    changelog = os.path.join(cwd, 'debian', 'changelog')
+    if not os.path.isfile(changelog):
+        return ''
+    if shutil.which('dpkg-parsechangelog'):
+        for line in _run(['dpkg-parsechangelog'], cwd).split('\n'):
+            if line.startswith('Version:'):
+                fields = line.split()
+                return fields[1] if len(fields) > 1 else ''
+        return ''
+    # for wheezy support
+    fields = (_read(changelog) or '').split('\n')[0].split()
+    return fields[1].replace('(', '').replace(')', '') if len(fields) > 1 else ''
+
+
+def _probe_make(variable):
+    def probe_make(cwd, environ):
+        if not any(os.path.isfile(os.path.join(cwd, name)) for name in ('GNUmakefile', 'makefile', 'Makefile')):
+            return ''
+        return _run(['make', '_print-{}'.format(variable)], cwd)
+    return probe_make
+
+
+def probe_npm(cwd, environ):
+    content = _read(os.path.join(cwd, 'package.json'))
+    try:
+        version = json.loads(content).get('version') if content is not None else None
+    except (ValueError, AttributeError):
+        return ''
+    if version is None or version is False:
+        return ''
+    return version if isinstance(version, str) else json.dumps(version)
+
+
+def probe_cargo(cwd, environ):
+    return _grep_sed(_read(os.path.join(cwd, 'Cargo.toml')), CARGO_VERSION_RE, CARGO_VERSION_SED_RE)
+
+
+def probe_version_file(cwd, environ):
+    return (_read(os.path.join(cwd, 'VERSION')) or '').rstrip('\n')
+
+
+def probe_changelog_md(cwd, environ, log=sys.stderr):
+    """Emulates get_version_from_changelog_md (error in [Unreleased] section results in empty version)"""
+    changelog = os.path.join(cwd, 'CHANGELOG.md')
+    try:
+        if not os.path.getsize(changelog):
+            return ''
+        version = get_latest_version(index_changelog(changelog))
+    except OSError:
+        return ''
+    except UnreleasedSectionException as e:
+        print(e.error, file=log)
+        return ''
+    return version or ''
+
+
+def probe_dockerfile(cwd, environ):
+    return _grep_sed(_read(os.path.join(cwd, 'Dockerfile')), DOCKERFILE_VERSION_RE, DOCKERFILE_VERSION_SED_RE)
+
+
+def _git_revision(cwd, environ):
+    return environ.get('CI_COMMIT_SHA') or environ.get('CI_BUILD_REF') or \
+        _run(['git', 'log', 'HEAD', '--pretty=format:%H', '-n', '1'], cwd)
+
+
+def probe_git_tag(cwd, environ):
+    tag = environ.get('CI_COMMIT_TAG') or \
+        _run(['git', 'describe', '--exact-match', '--tags', _git_revision(cwd, environ)], cwd)
+    if not GIT_TAG_VERSION_RE.search(tag):
+        return ''
+    return GIT_TAG_PREFIX_RE.sub('', ' '.join(tag.split()), count=1)
+
+
+def probe_git_revision(cwd, environ):
+    return _git_revision(cwd, environ)
+
+
+# probes in priority order (the same as get_version in common.sh)
+PROBES = [
+    ('environment', probe_environment),
+    ('ci/version.sh', probe_ci_version_script),
+    ('debian/changelog', probe_debian_changelog),
+    ('make _print-VERSION', _probe_make('VERSION')),
+    ('make _print-version', _probe_make('version')),
+    ('package.json', probe_npm),
+    ('Cargo.toml', probe_cargo),
+    ('VERSION', probe_version_file),
+    ('CHANGELOG.md', probe_changelog_md),
+    ('Dockerfile', probe_dockerfile),
+    ('git tag', probe_git_tag),
+    ('git revision', probe_git_revision),
+]
+
+
+def get_cache_key(cwd, environ):
+    """Returns memoization key of (HEAD commit, working tree state, relevant environment) or None outside git
+
+    Working tree state is represented by git status and size and mtime of every changed file and of every file
+    read by probes (KEY_FILES, git ignored files included). Output of ci/version.sh and make is expected to be stable
+    for the same key (memoization is scoped to single CI job by default, see get_cache_dir()).
+    """
+    head = _run(['git', 'rev-parse', '--verify', '-q', 'HEAD'], cwd)
+    if not head:
+        return None
+    digest = hashlib.sha256()
+    for value in [CACHE_FORMAT, os.path.realpath(cwd), head] + [environ.get(name, '') for name in KEY_ENVIRONMENT]:
+        digest.update(value.encode(errors='surrogateescape') + b'\0')
+    digest.update(_run(['git', 'tag', '--points-at', 'HEAD'], cwd).encode(errors='surrogateescape') + b'\0')
+
+    try:
+        status = subprocess.run(['git', 'status', '--porcelain', '-z', '--untracked-files=all'], cwd=cwd,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True).stdout
+        top_level = _run(['git', 'rev-parse', '--show-toplevel'], cwd)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    digest.update(status)
+    for name in KEY_FILES:
+        try:
+            stat = os.stat(os.path.join(cwd, name))
+            digest.update('{}:{}:{}\0'.format(name, stat.st_size, stat.st_mtime_ns).encode())
+        except OSError:
+            digest.update('{}:-\0'.format(name).encode())
+    for entry in status.split(b'\0'):
+        if len(entry) < 4:
+            continue
+        try:
+            stat = os.stat(os.path.join(top_level.encode(errors='surrogateescape'), entry[3:]))
+            digest.update('{}:{}\0'.format(stat.st_size, stat.st_mtime_ns).encode())
+        except OSError:
+            digest.update(b'-\0')
+    return digest.hexdigest()
+
+
+def get_cache_dir(environ):
+    """Returns memoization cache directory or None if memoization is disabled
+
+    Memoization is enabled by CI_SCRIPTS_VERSION_CACHE_DIR or within CI job (CI_JOB_ID is part of the key,
+    so the default directory keeps results of single job only).
+    """
+    if environ.get('CI_SCRIPTS_VERSION_CACHE_DIR'):
+        return environ['CI_SCRIPTS_VERSION_CACHE_DIR']
+    if environ.get('CI_JOB_ID'):
+        return os.path.join(tempfile.gettempdir(), 'ci-scripts-version-cache-{}'.format(os.getuid()))
+    return None
+
+
+def _load_cached(cache_dir, key):
+    try:
+        with open(os.path.join(cache_dir, key)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _store_cached(cache_dir, key, result):
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_file = os.path.join(cache_dir, '.{}.{}.tmp'.format(key, os.getpid()))
+        with open(tmp_file, 'w') as f:
+            json.dump(result, f)
+        os.replace(tmp_file, os.path.join(cache_dir, key))
+        entries = sorted((entry for entry in os.scandir(cache_dir) if not entry.name.startswith('.')),
+                         key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:-MAX_CACHE_ENTRIES]:
+            os.remove(entry.path)
+    except OSError:
+        # memoization is best effort only
+        pass
+
+
+def resolve_version(cwd=None, environ=None, use_cache=True):
+    """Resolves version the same way as get_version in common.sh, probes are run lazily in priority order
+
+    Result is memoized per (HEAD commit, working tree state, relevant environment variables) if memoization
+    is enabled (see get_cache_dir()).
+
+    Args:
+        cwd (str): project directory (current directory if not set)
+        environ (dict): environment (os.environ if not set)
+        use_cache (bool): use memoization cache
+
+    Returns:
+        dict: version, source (winning probe), probes (list of [probe, value, seconds]), cache (hit, miss or None)
+
+    Raises:
+        InvalidVersionException: if the version is empty or contains whitespaces
+
+    """
+    cwd = cwd or os.getcwd()
+    environ = os.environ if environ is None else environ
+    result = {'version': None, 'source': None, 'probes': [], 'cache': None}
+
+    # environment is checked first, not to pay for the cache lookup
+    cache_dir = get_cache_dir(environ) if use_cache else None
+    if not environ.get('VERSION'):
+        key = get_cache_key(cwd, environ) if cache_dir else None
+        cached = _load_cached(cache_dir, key) if key else None
+        if cached:
+            cached['cache'] = 'hit'
+            return cached
+        result['cache'] = 'miss' if key else None
+
+        for name, probe in PROBES[1:]:
+            started = time.monotonic()
+            value = probe(cwd, environ)
+            result['probes'].append([name, value, time.monotonic() - started])
+            if value:
+                result['source'] = name
+                break
+    else:
+        key = None
+        result['source'] = 'environment'
+        value = environ['VERSION']
+        result['probes'].append(['environment', value, 0.0])
+
+    version = value
+    if len(version.split()) != 1:
+        raise InvalidVersionException(version)
+    result['version'] = version.strip()
+    if key:
+        _store_cached(cache_dir, key, result)
+    return result
+
+
+def format_explanation(result):
+    """Returns table of run probes with their results and durations"""
+    lines = ['version: {}'.format(result['version']),
+             'source: {}'.format(result['source']),
+             'cache: {}'.format(result['cache'] or 'disabled')]
+    if result['cache'] == 'hit':
+        lines.append('probes (cached from the first resolution):')
+    for name, value, seconds in result['probes']:
+        lines.append('{} {:<22} {:>9.1f} ms  {}'.format('*' if name == result['source'] else ' ', name,
+                                                             seconds * 1000, value or '-'))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Resolve project version (the same way as get_version in common.sh)')
+    parser.add_argument('--explain', action='store_true',
+                        help='print which source won and how long each probe took (to stderr)')
+    parser.add_argument('--no-cache', action='store_true', help='do not use memoization cache')
+
+    args = parser.parse_args()
+    try:
+        started = time.monotonic()
+        result = resolve_version(use_cache=not args.no_cache)
+        if args.explain:
+            print(format_explanation(result), file=sys.stderr)
+            print('total: {:.1f} ms'.format((time.monotonic() - started) * 1000), file=sys.stderr)
+        print(result['version'])
+
+    except InvalidVersionException as e:
+        print("ERROR: version '{}' can not contain whitespaces or be empty!".format(' '.join(e.version.split())),
+              file=sys.stderr)
+        exit(1)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+""" argocd-mock.py is argocd CLI mock approximation for testing purposes
+
+Supported actions:
+  login ...                      does nothing
+  app get APP -o json [--refresh]
+                                 prints application APP simulated by ARGOCD_MOCK_DIR/APP.json scenario:
+                                   revision            new gitops revision
+                                   started             scenario start (unix time)
+                                   seen_after          seconds until argocd notices the revision (OutOfSync)
+                                   synced_after        seconds until the revision is synced (Progressing)
+                                   healthy_after       seconds until the application is healthy
+                                   failed              message of failed sync of the revision (optional)
+                                   refresh_required    the revision is noticed only after app get --refresh
+                                 unknown application exits with 20
+
+Every call is appended to ARGOCD_MOCK_LOG file (if set) as JSON list of arguments.
+"""
+
+# imports
+import argparse
+import json
+import os
+import sys
+import time
+
+# constants
+OLD_REVISION = '0000000000000000000000000000000000000000'
+
+# local functions
+def application(name, scenario, refreshed):
+    """ returns application in the state given by scenario and elapsed time """
+    elapsed = time.time() - scenario['started']
+    revision = scenario['revision']
+    seen = elapsed >= scenario.get('seen_after', 0) and (refreshed or not scenario.get('refresh_required'))
+    status = {'sync': {'status': 'Synced', 'revision': OLD_REVISION}, 'health': {'status': 'Healthy'},
+              'history': [{'id': 1, 'revision': OLD_REVISION}]}
+    if seen and scenario.get('failed') and elapsed >= scenario.get('synced_after', 0):
+        status['sync'] = {'status': 'OutOfSync', 'revision': revision}
+        status['operationState'] = {'phase': 'Failed', 'message': scenario['failed'],
+                                    'syncResult': {'revision': revision}}
+    elif seen and elapsed >= scenario.get('synced_after', 0):
+        status['sync'] = {'status': 'Synced', 'revision': revision}
+        status['history'].append({'id': 2, 'revision': revision})
+        status['operationState'] = {'phase': 'Succeeded', 'syncResult': {'revision': revision}}
+        healthy = elapsed >= scenario.get('healthy_after', 0)
+        status['health'] = {'status': 'Healthy' if healthy else 'Progressing'}
+    elif seen:
+        status['sync'] = {'status': 'OutOfSync', 'revision': revision}
+        status['operationState'] = {'phase': 'Running', 'syncResult': {'revision': revision}}
+    return {'metadata': {'name': name}, 'status': status}
+
+def action_app_get(name, refresh):
+    """ argocd app get action """
+    path = os.path.join(os.environ['ARGOCD_MOCK_DIR'], name + '.json')
+    if not os.path.exists(path):
+        print('rpc error: code = NotFound desc = applications.argoproj.io "%s" not found' % name, file=sys.stderr)
+        return 20
+    refreshed_path = path + '.refreshed'
+    if refresh:
+        open(refreshed_path, 'w').close()
+    with open(path, 'r') as file_handle:
+        scenario = json.load(file_handle)
+    print(json.dumps(application(name, scenario, os.path.exists(refreshed_path))))
+    return 0
+
+def get_cmdline_parser():
+    """ return command-line parser """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--grpc-web', action='store_true', help='ignored')
+    subparsers = parser.add_subparsers(dest='action')
+    login_parser = subparsers.add_parser('login')
+    login_parser.add_argument('server', type=str)
+    login_parser.add_argument('--grpc-web', action='store_true', help='ignored')
+    login_parser.add_argument('--username', type=str)
+    login_parser.add_argument('--password', type=str)
+    app_parser = subparsers.add_parser('app')
+    app_parser.add_argument('app_action', choices=['get'])
+    app_parser.add_argument('name', type=str)
+    app_parser.add_argument('-o', '--output', choices=['json'], required=True)
+    app_parser.add_argument('--refresh', action='store_true')
+    return parser
+
+def main():
+    """ main """
+    args = get_cmdline_parser().parse_args()
+    if os.environ.get('ARGOCD_MOCK_LOG'):
+        with open(os.environ['ARGOCD_MOCK_LOG'], 'a') as file_handle:
+            file_handle.write(json.dumps(sys.argv[1:]) + '\n')
+    if args.action == 'login':
+        return 0
+    if args.action == 'app' and args.app_action == 'get':
+        return action_app_get(args.name, args.refresh)
+    raise NotImplementedError('Action %s not supported!' % args.action)
+
+# main call
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+""" benchmark_kubernetes_deployment_add_env.py compares env block patching with full yaml round-trip
+
+Synthetic deployment manifests (many containers, long annotations with inline JSON) of given sizes
+are updated by both patch_deployment_env() and update_deployment_round_trip(), results are checked
+for equality and timings are printed.
+
+example:
+  $ python3 test/benchmark_kubernetes_deployment_add_env.py --sizes 10K,100K,1M,10M --repeat 3
+"""
+
+# imports
+import argparse
+import json
+import os.path
+import sys
+import time
+
+from ruamel import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from lib.kubernetes_deployment_add_env import patch_deployment_env, update_deployment_round_trip
+
+# constants
+SIZE_SUFFIXES = {'K': 1024, 'M': 1024 * 1024}
+ENV_VARIABLES = {'BENCHMARK_A': 'value', 'BENCHMARK_B': 'value with spaces', 'c0e1': 'overwritten'}
+
+CONTAINER_TEMPLATE = """      - name: container{index}
+        image: docker.ops.iszn.cz/benchmark/container{index}:1.0.{index}
+        args: ["--config", "/etc/container{index}/config.json", "--verbose"]
+        resources:
+          limits: {{cpu: "1", memory: 1Gi}}
+        env:
+        - name: "c{index}e1"
+          value: "value"
+        - name: "c{index}e2"
+          valueFrom:
+            fieldRef:
+              fieldPath: metadata.name
+"""
+
+
+# local functions
+def parse_size(size):
+    """ parse human readable size (10K, 1M) """
+    size = size.strip().upper()
+    if size[-1:] in SIZE_SUFFIXES:
+        return int(float(size[:-1]) * SIZE_SUFFIXES[size[-1]])
+    return int(size)
+
+
+def generate_manifest(size):
+    """ generate deployment manifest of approximately given size (in bytes) """
+    annotation = json.dumps({'key{}'.format(i): ['item', i, {'nested': 'x' * 40}] for i in range(size // 400 + 1)})
+    header = ("apiVersion: apps/v1\n"
+              "kind: Deployment\n"
+              "metadata:\n"
+              "  name: benchmark\n"
+              "  annotations:\n"
+              "    benchmark/config.json: '{}'\n"
+              "spec:\n"
+              "  replicas: 3\n"
+              "  template:\n"
+              "    metadata:\n"
+              "      labels: {{app: benchmark}}\n"
+              "    spec:\n"
+              "      containers:\n").format(annotation)
+    containers = []
+    length = len(header)
+    index = 0
+    while length < size or index == 0:
+        container = CONTAINER_TEMPLATE.format(index=index)
+        containers.append(container)
+        length += len(container)
+        index += 1
+    return header + ''.join(containers)
+
+
+def measure(func, raw, repeat):
+    """ run func(raw, ...) repeat times, returns (best time, result) """
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(raw, dict(ENV_VARIABLES), 'container0', True)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def get_cmdline_parser():
+    """ return command-line parser """
+    parser = argparse.ArgumentParser(prog=os.path.basename(__file__), description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=str, default='10K,100K,1M,10M',
+                        help='comma separated manifest sizes (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3, help='repeat count, best time is taken (default: %(default)s)')
+    parser.add_argument('--round-trip-max-size', type=str, default='10M',
+                        help='skip full round-trip for bigger manifests (default: %(default)s)')
+    return parser
+
+
+def main():
+    """ run the benchmark """
+    args = get_cmdline_parser().parse_args()
+    round_trip_max_size = parse_size(args.round_trip_max_size)
+
+    print("{:>10} {:>12} {:>12} {:>9}".format('size', 'patch [s]', 'round [s]', 'speedup'))
+    for size in [parse_size(s) for s in args.sizes.split(',')]:
+        raw = generate_manifest(size)
+        patch_time, patched = measure(patch_deployment_env, raw, args.repeat)
+        if size > round_trip_max_size:
+            print("{:>10} {:>12.4f} {:>12} {:>9}".format(len(raw), patch_time, '-', '-'))
+            continue
+        round_trip_time, round_trip = measure(update_deployment_round_trip, raw, args.repeat)
+        assert yaml.safe_load(patched) == yaml.safe_load(round_trip), 'Results differ for size %d!' % size
+        print("{:>10} {:>12.4f} {:>12.4f} {:>8.1f}x".format(len(raw), patch_time, round_trip_time,
+                                                           round_trip_time / patch_time))
+
+
+if __name__ == '__main__':
+    main()
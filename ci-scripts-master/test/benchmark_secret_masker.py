@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+""" benchmark_secret_masker.py compares secret_masker.py throughput with the former gawk hide_secret filter
+
+Synthetic job log (kubectl/docker like lines, some of them with tokens) of given sizes is masked by gawk
+once per pattern (as hide_secret had to be chained) and by secret_masker.py in single pass, results are
+checked for equality and throughput is printed. gawk is skipped if not installed.
+
+example:
+  $ python3 test/benchmark_secret_masker.py --sizes 1M,10M,100M --secret-length 40,4000
+"""
+
+# imports
+import argparse
+import io
+import os.path
+import random
+import shutil
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from lib.secret_masker import SecretMasker
+
+# constants
+SIZE_SUFFIXES = {'K': 1024, 'M': 1024 * 1024, 'G': 1024 * 1024 * 1024}
+PATTERNS = ['token:[ \t]*(.+)$', 'password=([^ ]+)', 'Authorization: Bearer (.+)$']
+FILL = '*'
+
+# the former hide_secret implementation
+GAWK_PROGRAM = ('{m=match($0,re,ma); '
+                'if((m>0)&&(ma[1,"length"]>0)){printf("%s%s%s\\n",substr($0,1,ma[1,"start"]-1),genstr(ch,ma[1,"length"]),'
+                'substr($0,ma[1,"start"]+ma[1,"length"]))}else{print}} '
+                'function genstr(ch,cn){rstr="";for(_i=0;_i<cn;_i++){rstr=sprintf("%s%s",rstr,ch)}return(rstr)}')
+
+LINES = [
+    'deployment.apps/component-{index} configured\n',
+    'Step {index}/42 : RUN apt-get update && apt-get install -y --no-install-recommends package-{index}\n',
+    'Waiting for deployment "component-{index}" rollout to finish: 1 of 3 updated replicas are available...\n',
+    ' ---> Running in 0123456789ab{index}\n',
+]
+SECRET_LINES = [
+    '    token: {secret}\n',
+    'curl -u user password={secret} https://registry.example.com/v2/\n',
+    'Authorization: Bearer {secret}\n',
+]
+
+
+# local functions
+def parse_size(size):
+    """ parse human readable size (10K, 1M) """
+    size = size.strip().upper()
+    if size[-1:] in SIZE_SUFFIXES:
+        return int(float(size[:-1]) * SIZE_SUFFIXES[size[-1]])
+    return int(size)
+
+
+def generate_log(size, secret_length, secret_ratio):
+    """ generate job log of approximately given size (in bytes), at most one secret per line """
+    generator = random.Random(size)
+    lines = []
+    length = 0
+    index = 0
+    while length < size:
+        if generator.random() < secret_ratio:
+            secret = ''.join(generator.choice('0123456789abcdef') for _ in range(secret_length))
+            line = generator.choice(SECRET_LINES).format(secret=secret)
+        else:
+            line = generator.choice(LINES).format(index=index)
+        lines.append(line)
+        length += len(line)
+        index += 1
+    return ''.join(lines).encode()
+
+
+def run_gawk(raw):
+    """ mask secrets by gawk (one process per pattern piped together), returns (time, result) """
+    started = time.perf_counter()
+    output = raw
+    for pattern in PATTERNS:
+        output = subprocess.run(['gawk', '-r', '-v', 'ch=' + FILL, '-v', 're=' + pattern, GAWK_PROGRAM],
+                                input=output, stdout=subprocess.PIPE, check=True).stdout
+    return time.perf_counter() - started, output
+
+
+def run_masker(raw):
+    """ mask secrets by secret_masker in single pass, returns (time, result) """
+    started = time.perf_counter()
+    output = io.BytesIO()
+    SecretMasker(PATTERNS, fill=FILL).mask_stream(io.BytesIO(raw), output)
+    return time.perf_counter() - started, output.getvalue()
+
+
+def measure(func, raw, repeat):
+    """ run func(raw) repeat times, returns (best time, result) """
+    best = None
+    result = None
+    for _ in range(repeat):
+        elapsed, result = func(raw)
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def get_cmdline_parser():
+    """ return command-line parser """
+    parser = argparse.ArgumentParser(prog=os.path.basename(__file__), description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=str, default='1M,10M,100M',
+                        help='comma separated log sizes (default: %(default)s)')
+    parser.add_argument('--secret-length', type=str, default='40,4000',
+                        help='comma separated secret lengths (default: %(default)s)')
+    parser.add_argument('--secret-ratio', type=float, default=0.01,
+                        help='ratio of lines with secret (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3, help='repeat count, best time is taken (default: %(default)s)')
+    return parser
+
+
+def main():
+    """ run the benchmark """
+    args = get_cmdline_parser().parse_args()
+    gawk = shutil.which('gawk')
+    if not gawk:
+        print('gawk not found, measuring secret_masker.py only', file=sys.stderr)
+
+    print("{:>10} {:>7} {:>11} {:>11} {:>9}".format('size', 'secret', 'gawk [MB/s]', 'py [MB/s]', 'speedup'))
+    for secret_length in [int(length) for length in args.secret_length.split(',')]:
+        for size in [parse_size(s) for s in args.sizes.split(',')]:
+            raw = generate_log(size, secret_length, args.secret_ratio)
+            megabytes = len(raw) / 1024 / 1024
+            masker_time, masked = measure(run_masker, raw, args.repeat)
+            if not gawk:
+                print("{:>10} {:>7} {:>11} {:>11.1f} {:>9}".format(len(raw), secret_length, '-',
+                                                                   megabytes / masker_time, '-'))
+                continue
+            gawk_time, gawk_masked = measure(run_gawk, raw, args.repeat)
+            assert masked == gawk_masked, 'Results differ for size %d!' % size
+            print("{:>10} {:>7} {:>11.1f} {:>11.1f} {:>8.1f}x".format(len(raw), secret_length, megabytes / gawk_time,
+                                                                      megabytes / masker_time,
+                                                                      gawk_time / masker_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+# docker-mock.py and harbor-api-mock.py helpers for bats tests (load docker-mock-helper)
+#
+# Every test gets its own docker-mock.py state directory (seeded from docker-mock-state.yaml),
+# so the tests do not depend on each other and can run in parallel (bats --jobs N).
+
+# docker_mock_setup
+#   creates isolated docker-mock.py state directory and points DOCKER_BIN to docker-mock.py
+function docker_mock_setup() {
+    export DOCKER_MOCK_STATE_DIR="$(mktemp -d "${BATS_TMPDIR}/docker-mock.XXXXXX")"
+    export DOCKER_BIN="${BATS_TEST_DIRNAME}/docker-mock.py"
+}
+
+# harbor_api_mock_start <registry>
+#   starts Harbor API stub of <registry> sharing docker-mock.py state and points ci-scripts to it
+function harbor_api_mock_start() {
+    local port_file="${DOCKER_MOCK_STATE_DIR}/harbor-api-mock.port"
+    # fd 3 has to be closed, bats would wait for the background process otherwise
+    python3 "${BATS_TEST_DIRNAME}/harbor-api-mock.py" --registry "$1" --port-file "${port_file}" 3>&- &
+    HARBOR_API_MOCK_PID=$!
+    for _ in $(seq 50); do
+        [ -s "${port_file}" ] && break
+        sleep 0.1
+    done
+    export CI_SCRIPTS_DOCKER_REGISTRY_API_URL="http://127.0.0.1:$(cat "${port_file}")"
+}
+
+# docker_mock_teardown
+#   stops Harbor API stub (if started) and removes docker-mock.py state directory
+function docker_mock_teardown() {
+    [ -n "${HARBOR_API_MOCK_PID}" ] && kill "${HARBOR_API_MOCK_PID}" 2> /dev/null
+    [ -n "${DOCKER_MOCK_STATE_DIR}" ] && rm -rf "${DOCKER_MOCK_STATE_DIR}"
+    return 0
+}
@@ -1,77 +1,191 @@
 #!/usr/bin/env python3
 
-""" docker-mock.py is docker mock approximation for testing purposes """
+""" docker-mock.py is docker mock approximation for testing purposes
+
+State is kept in DOCKER_MOCK_STATE_DIR (see docker_mock_state.py), docker-mock-state.yaml is just the initial state.
+
+docker build approximates BuildKit: every FROM/RUN/COPY/ADD/WORKDIR step has cache key chained from the previous
+one (RUN key includes declared build-args and env, COPY/ADD key includes content of sources), there is no local
+build cache (fresh CI runner), layers are reused only from --cache-from images exported with inline cache
+(--cache-to type=inline or BUILDKIT_INLINE_CACHE=1 build-arg) or from type=registry cache refs.
+Output mimics --progress=plain.
+"""
 
 # imports
 import argparse
-import copy
+import glob
+import hashlib
 import json
 import os.path
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-import yaml
+from docker_mock_state import DockerMockState
 
 # constants
-STATE_FILE = os.path.join(os.path.dirname(__file__), 'docker-mock-state.yaml')
+BUILD_STEPS = ('FROM', 'RUN', 'COPY', 'ADD', 'WORKDIR')
+VARIABLE_RE = re.compile(r'\$(?:\{(\w+)\}|(\w+))')
+KEY_VALUE_RE = re.compile(r'([\w.-]+)=(?:"([^"]*)"|(\S*))')
 
 # local functions
-def load_state(file=STATE_FILE):
-    """ reads docker state"""
-    with open(file, 'r') as file_handle:
-        return yaml.load(file_handle, Loader=yaml.SafeLoader)
-
-def store_state(state, file=STATE_FILE):
-    """ store docker state"""
-    with open(file, 'w') as file_handle:
-        return yaml.dump(state, file_handle)
-
-def action_info():
+def action_info(state):
     """ docker info action"""
     print("%s info" % os.path.basename(__file__))
 
-def action_login(registry_url, user=None):
+def action_login(state, registry_url, user=None):
     """ docker login action, intentionally no-op """
     pass
 
-def action_pull(image):
+def action_pull(state, image):
     """ docker pull action, marks image locally available """
-    state = load_state()
-    assert image in state['images'], 'Unknown Image %s!' % image
-    state['images'][image]['storage']['local'] = True
-    store_state(state)
+    with state.transaction():
+        assert state.get(image), 'Unknown Image %s!' % image
+        state.update(image, local=True)
 
-def action_push(image):
+def action_push(state, image):
     """ docker push, marks image remotely available """
-    state = load_state()
-    assert image in state['images'], 'Unknown Image %s!' % image
-    assert state['images'][image]['storage']['local'], 'Image %s not available locally!' % image
-    state['images'][image]['storage']['remote'] = True
-    store_state(state)
+    with state.transaction():
+        details = state.get(image)
+        assert details, 'Unknown Image %s!' % image
+        assert details['local'], 'Image %s not available locally!' % image
+        state.update(image, remote=True)
 
-def action_tag(src_image, dst_image):
+def action_tag(state, src_image, dst_image):
     """ docker tag, alias locally available image under new name """
-    state = load_state()
-    assert src_image in state['images'], 'Unknown Image %s!' % src_image
-    assert state['images'][src_image]['storage']['local'], \
-      'Image %s not available locally!' % src_image
-    state['images'][dst_image] = copy.deepcopy(state['images'][src_image])
-    state['images'][dst_image]['storage']['remote'] = False
-    store_state(state)
-
-def action_inspect(image):
+    with state.transaction():
+        details = state.get(src_image)
+        assert details, 'Unknown Image %s!' % src_image
+        assert details['local'], 'Image %s not available locally!' % src_image
+        state.set(dst_image, details['digest'], local=True, remote=False)
+        state.set_layers(dst_image, state.get_layers(src_image))
+
+def action_inspect(state, image):
     """ docker inspect, provides details about locally available image """
-    state = load_state()
-    assert image in state['images'], 'Unknown Image %s!' % image
-    assert state['images'][image]['storage']['local'], 'Image %s not available locally!' % image
-    print(json.dumps([{'Id': '42', 
-                       'RepoDigests': ['%s@%s' % (image, state['images'][image]['digest'])]}]))
+    details = state.get(image)
+    assert details, 'Unknown Image %s!' % image
+    assert details['local'], 'Image %s not available locally!' % image
+    print(json.dumps([{'Id': '42',
+                       'RepoDigests': ['%s@%s' % (image, details['digest'])]}]))
 
-def action_images(format, digests):
+def action_images(state, format, digests):
     """ docker images action, list docker images """
-    state = load_state()
-    images = state['images']
-    cmd_output = [f"{i} {images[i]['digest']}" for i in images]
+    cmd_output = [f"{name} {digest}" for name, digest in state.images()]
     print("\n".join(cmd_output))
 
+def read_instructions(dockerfile):
+    """ return Dockerfile instructions (continuation lines joined, comments skipped) """
+    instructions = []
+    instruction = ''
+    with open(dockerfile) as file_handle:
+        for line in file_handle:
+            line = line.strip()
+            if not instruction and (not line or line.startswith('#')):
+                continue
+            if line.endswith('\\'):
+                instruction += line[:-1] + ' '
+                continue
+            instructions.append(instruction + line)
+            instruction = ''
+    if instruction.strip():
+        instructions.append(instruction.strip())
+    return instructions
+
+def hash_sources(context, sources):
+    """ return hash of COPY/ADD sources in build context """
+    digest = hashlib.sha256()
+    for source in sources:
+        for path in sorted(glob.glob(os.path.join(context, source))):
+            files = [path] if os.path.isfile(path) else \
+                sorted(os.path.join(root, name) for root, _, names in os.walk(path) for name in names)
+            for file_path in files:
+                with open(file_path, 'rb') as file_handle:
+                    digest.update(os.path.relpath(file_path, context).encode() + b'\0' + file_handle.read())
+    return digest.hexdigest()
+
+def parse_cache_option(value):
+    """ parse --cache-from/--cache-to value (plain image reference or type=...,ref=...) """
+    if '=' not in value.split(',')[0]:
+        return {'type': 'registry', 'ref': value}
+    return dict(item.split('=', 1) for item in value.split(','))
+
+def plan_build(dockerfile, context, build_args):
+    """ return (build steps as (instruction, cache key), labels) of Dockerfile """
+    args = {}
+    env = {}
+    labels = {}
+    key = ''
+    steps = []
+    for instruction in read_instructions(dockerfile):
+        command, _, value = instruction.partition(' ')
+        command = command.upper()
+        variables = dict(args, **env)
+        expanded = VARIABLE_RE.sub(lambda match: variables.get(match.group(1) or match.group(2), ''), value)
+        if command == 'ARG':
+            name, _, default = value.partition('=')
+            args[name.strip()] = build_args.get(name.strip(), default.strip().strip('"'))
+        elif command == 'ENV' and '=' not in expanded.split()[0]:
+            name, _, env_value = expanded.partition(' ')
+            env[name] = env_value.strip()
+        elif command in ('ENV', 'LABEL'):
+            pairs = {name: quoted or plain for name, quoted, plain in KEY_VALUE_RE.findall(expanded)}
+            (env if command == 'ENV' else labels).update(pairs)
+        if command not in BUILD_STEPS:
+            continue
+        content = expanded
+        if command == 'RUN':
+            # build-args and env are environment of RUN
+            content += json.dumps(sorted(variables.items()))
+        elif command in ('COPY', 'ADD') and '--from=' not in value:
+            content += hash_sources(context, [token for token in value.split() if not token.startswith('--')][:-1])
+        key = hashlib.sha256((key + command + content).encode()).hexdigest()
+        steps.append(('{} {}'.format(command, value), key))
+    return steps, labels
+
+def action_build(state, context, tag, file, build_arg, label, cache_from, cache_to, pull, no_cache, progress):
+    """ docker build, BuildKit approximation (see the module docstring) """
+    build_args = dict(item.split('=', 1) if '=' in item else (item, os.environ.get(item, '')) for item in build_arg)
+    steps, labels = plan_build(file or os.path.join(context, 'Dockerfile'), context, build_args)
+    labels.update(dict(item.split('=', 1) for item in label))
+    number = 1
+    print('#1 [internal] load build definition from %s' % os.path.basename(file or 'Dockerfile'))
+    print('#1 DONE 0.0s')
+    cached_keys = set()
+    for source in map(parse_cache_option, cache_from if no_cache != 'true' else []):
+        number += 1
+        print('#%d importing cache manifest from %s' % (number, source.get('ref')))
+        details = state.get(source.get('ref'))
+        layers = state.get_layers(source.get('ref')) if details and details['remote'] else []
+        if layers:
+            cached_keys.update(layers)
+            print('#%d DONE 0.0s' % number)
+        else:
+            print('#%d ERROR: %s: not found' % (number, source.get('ref')))
+    for index, (instruction, key) in enumerate(steps, 1):
+        number += 1
+        print('#%d [%d/%d] %s' % (number, index, len(steps), instruction))
+        print('#%d CACHED' % number if key in cached_keys else '#%d DONE 0.1s' % number)
+
+    layers = [key for _, key in steps]
+    config = (layers[-1] if layers else '') + json.dumps(labels, sort_keys=True)
+    digest = 'sha256:' + hashlib.sha256(config.encode()).hexdigest()
+    exports = [parse_cache_option(item) for item in cache_to]
+    inline = build_args.get('BUILDKIT_INLINE_CACHE') == '1' or any(item['type'] == 'inline' for item in exports)
+    number += 1
+    print('#%d exporting to image' % number)
+    with state.transaction():
+        for image in tag:
+            state.set(image, digest, local=True, remote=False)
+            state.set_layers(image, layers if inline else [])
+            print('#%d naming to %s' % (number, image))
+        for export in exports:
+            if export['type'] == 'registry':
+                state.set(export['ref'], digest, local=False, remote=True)
+                state.set_layers(export['ref'], layers)
+                print('#%d exporting cache to %s' % (number, export['ref']))
+    print('#%d DONE 0.1s' % number)
+
 def get_cmdline_parser():
     """ return command-line parser """
     parser = argparse.ArgumentParser(prog=os.path.basename(__file__))
@@ -89,6 +203,18 @@ def get_cmdline_parser():
     parser_tag = subparsers.add_parser('tag', help='alias the image under new image name')
     parser_tag.add_argument('src_image', type=str, help='source image')
     parser_tag.add_argument('dst_image', type=str, help='destination image')
+    parser_build = subparsers.add_parser('build', help='build the image (BuildKit approximation)')
+    parser_build.add_argument('context', type=str, help='build context')
+    parser_build.add_argument('-t', '--tag', type=str, action='append', default=[], help='image name')
+    parser_build.add_argument('-f', '--file', type=str, help='Dockerfile')
+    parser_build.add_argument('--build-arg', type=str, action='append', default=[], help='build-time variable')
+    parser_build.add_argument('--label', type=str, action='append', default=[], help='image label')
+    parser_build.add_argument('--cache-from', type=str, action='append', default=[], help='cache source')
+    parser_build.add_argument('--cache-to', type=str, action='append', default=[], help='cache export')
+    parser_build.add_argument('--pull', type=str, nargs='?', const='true', default='false', help='ignored')
+    parser_build.add_argument('--no-cache', type=str, nargs='?', const='true', default='false',
+                              help='do not use cache')
+    parser_build.add_argument('--progress', type=str, help='ignored (plain progress is printed)')
     parser_images = subparsers.add_parser('images', help='List images')
     parser_images.add_argument('--format', type=str, help='Pretty-print images using a Go template')
     parser_images.add_argument('--digests', action='store_true', help='Show digests')
@@ -102,4 +228,8 @@ ARGS = get_cmdline_parser().parse_args()
 ACTION_ARGS = vars(ARGS)
 ACTION_FUNC_NAME = 'action_%s' % ACTION_ARGS['action']
 del ACTION_ARGS['action']
-locals()[ACTION_FUNC_NAME](**ACTION_ARGS)
+STATE = DockerMockState()
+try:
+    locals()[ACTION_FUNC_NAME](STATE, **ACTION_ARGS)
+finally:
+    STATE.close()
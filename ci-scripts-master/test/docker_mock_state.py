@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+""" docker_mock_state.py is state store shared by docker-mock.py and harbor-api-mock.py
+
+State lives in sqlite database inside state directory (DOCKER_MOCK_STATE_DIR), every test should use
+its own directory, so tests can run in parallel. The database is seeded from read-only docker-mock-state.yaml
+on the first access. Every action updates just the touched image rows in single (locked) transaction.
+Image may carry build cache (layer cache keys of docker-mock.py build exported with the image).
+"""
+
+# imports
+import contextlib
+import fcntl
+import json
+import os.path
+import sqlite3
+import tempfile
+
+# constants
+SEED_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'docker-mock-state.yaml')
+DATABASE_FILE = 'docker-mock-state.sqlite'
+LOCK_FILE = 'docker-mock-state.lock'
+LOCK_TIMEOUT = 30
+SCHEMA = """CREATE TABLE IF NOT EXISTS images (
+    name TEXT PRIMARY KEY,
+    digest TEXT NOT NULL,
+    local INTEGER NOT NULL DEFAULT 0,
+    remote INTEGER NOT NULL DEFAULT 0,
+    layers TEXT NOT NULL DEFAULT '[]'
+)"""
+
+
+# local functions
+def get_state_dir():
+    """ return state directory (DOCKER_MOCK_STATE_DIR or per-user directory in temp) """
+    return os.environ.get('DOCKER_MOCK_STATE_DIR') or \
+        os.path.join(tempfile.gettempdir(), 'docker-mock-state-{}'.format(os.getuid()))
+
+
+def load_seed(file=SEED_FILE):
+    """ read initial docker state (images) from yaml file """
+    import yaml
+
+    with open(file, 'r') as file_handle:
+        state = yaml.load(file_handle, Loader=yaml.SafeLoader)
+    return state.get('images') or {}
+
+
+class DockerMockState:
+    """ docker-mock state (images with digest and local/remote storage flags) """
+    def __init__(self, state_dir=None, seed_file=SEED_FILE):
+        self.state_dir = state_dir or get_state_dir()
+        os.makedirs(self.state_dir, exist_ok=True)
+        database_file = os.path.join(self.state_dir, DATABASE_FILE)
+        # seeding is serialized by lock file not to seed twice when the first calls run concurrently
+        with open(os.path.join(self.state_dir, LOCK_FILE), 'a') as lock_handle:
+            fcntl.flock(lock_handle, fcntl.LOCK_EX)
+            seed = not os.path.exists(database_file)
+            self.connection = sqlite3.connect(database_file, timeout=LOCK_TIMEOUT, isolation_level=None)
+            if seed:
+                with self.transaction():
+                    self.connection.execute(SCHEMA)
+                    self.connection.executemany(
+                        'INSERT INTO images (name, digest, local, remote) VALUES (?, ?, ?, ?)',
+                        [(name, image['digest'], bool(image['storage']['local']), bool(image['storage']['remote']))
+                         for name, image in load_seed(seed_file).items()])
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """ write transaction, the database is locked for other writers until it ends """
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield self
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+        self.connection.execute('COMMIT')
+
+    def get(self, name):
+        """ return image (dict with digest, local and remote) or None """
+        row = self.connection.execute('SELECT digest, local, remote FROM images WHERE name = ?', (name,)).fetchone()
+        if row is None:
+            return None
+        return {'digest': row[0], 'local': bool(row[1]), 'remote': bool(row[2])}
+
+    def set(self, name, digest, local=False, remote=False):
+        """ create or replace single image """
+        self.connection.execute('INSERT OR REPLACE INTO images (name, digest, local, remote) VALUES (?, ?, ?, ?)',
+                                (name, digest, local, remote))
+
+    def update(self, name, **flags):
+        """ update storage flags (local, remote) of single image """
+        assert set(flags) <= {'local', 'remote'}, 'Unknown flags %s!' % flags
+        assignments = ', '.join('{} = ?'.format(flag) for flag in flags)
+        self.connection.execute('UPDATE images SET {} WHERE name = ?'.format(assignments),
+                                list(flags.values()) + [name])
+
+    def get_layers(self, name):
+        """ return build cache (list of layer cache keys) of single image """
+        row = self.connection.execute('SELECT layers FROM images WHERE name = ?', (name,)).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def set_layers(self, name, layers):
+        """ set build cache (list of layer cache keys) of single image """
+        self.connection.execute('UPDATE images SET layers = ? WHERE name = ?', (json.dumps(layers), name))
+
+    def images(self):
+        """ return list of (name, digest) of all images """
+        return self.connection.execute('SELECT name, digest FROM images ORDER BY name').fetchall()
+
+    def close(self):
+        """ close the database """
+        self.connection.close()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+""" harbor-api-mock.py is local HTTP stub of Harbor (v1) repositories API for testing purposes
+
+Serves images of single registry from docker-mock.py state (DOCKER_MOCK_STATE_DIR), only remotely available
+images are visible. Point ci-scripts to it by CI_SCRIPTS_DOCKER_REGISTRY_API_URL=http://127.0.0.1:<port>.
+
+  GET  /api/repositories/<project>/<repository>/tags/<tag>    image details ({"name": ..., "digest": ...})
+  POST /api/repositories/<project>/<repository>/tags          retag ({"tag": ..., "src_image": ..., "override": ...})
+
+example:
+  $ python3 test/harbor-api-mock.py --registry docker.dev.dszn.cz --port-file /tmp/harbor-api-mock.port &
+"""
+
+# imports
+import argparse
+import http.server
+import json
+import os.path
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from docker_mock_state import DockerMockState
+
+# constants
+TAG_PATH_RE = re.compile(r'^/api/repositories/(?P<repository>.+)/tags/(?P<tag>[^/]+)$')
+TAGS_PATH_RE = re.compile(r'^/api/repositories/(?P<repository>.+)/tags$')
+
+
+# local functions
+class HarborApiHandler(http.server.BaseHTTPRequestHandler):
+    """ Harbor repositories API request handler """
+    # keep-alive connections as Harbor does
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _reply(self, code, body=None):
+        content = b'' if body is None else json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _error(self, code, message):
+        self._reply(code, {'code': code, 'message': message})
+
+    def _image(self, repository, tag):
+        return '{}/{}:{}'.format(self.server.registry, repository, tag)
+
+    def do_GET(self):
+        match = TAG_PATH_RE.match(self.path)
+        if not match:
+            return self._error(404, 'not found')
+        state = DockerMockState()
+        try:
+            details = state.get(self._image(match.group('repository'), match.group('tag')))
+        finally:
+            state.close()
+        if not details or not details['remote']:
+            return self._error(404, 'resource: {}:{} not found'.format(match.group('repository'), match.group('tag')))
+        self._reply(200, {'name': match.group('tag'), 'digest': details['digest']})
+
+    def do_POST(self):
+        match = TAGS_PATH_RE.match(self.path)
+        if not match:
+            return self._error(404, 'not found')
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)))
+            src_repository, src_reference = request['src_image'].split(':', 1)
+            tag = request['tag']
+        except (ValueError, KeyError, AttributeError):
+            return self._error(400, 'invalid request')
+
+        state = DockerMockState()
+        try:
+            with state.transaction():
+                src_digest = None
+                for name, digest in state.images():
+                    if name.startswith(self._image(src_repository, '')) and \
+                            src_reference in (digest, name.rsplit(':', 1)[1]) and state.get(name)['remote']:
+                        src_digest = digest
+                        break
+                if src_digest is None:
+                    return self._error(404, 'source image {} not found'.format(request['src_image']))
+
+                dst_image = self._image(match.group('repository'), tag)
+                dst_details = state.get(dst_image)
+                if dst_details and dst_details['remote'] and dst_details['digest'] != src_digest and \
+                        not request.get('override'):
+                    return self._error(409, 'tag {} already exists'.format(tag))
+                state.set(dst_image, src_digest, local=bool(dst_details and dst_details['local']), remote=True)
+        finally:
+            state.close()
+        # Harbor leaves the response empty on success
+        self._reply(200)
+
+
+def get_cmdline_parser():
+    """ return command-line parser """
+    parser = argparse.ArgumentParser(prog=os.path.basename(__file__), description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--registry', type=str, required=True, help='registry host served by the stub')
+    parser.add_argument('--port', type=int, default=0, help='port (default: random free port)')
+    parser.add_argument('--port-file', type=str, help='file to write the listening port to')
+    parser.add_argument('-v', '--verbose', action='store_true', help='log requests to stderr')
+    return parser
+
+
+def main():
+    """ run the stub """
+    args = get_cmdline_parser().parse_args()
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', args.port), HarborApiHandler)
+    server.registry = args.registry
+    server.verbose = args.verbose
+    if args.port_file:
+        with open(args.port_file + '.tmp', 'w') as file_handle:
+            file_handle.write(str(server.server_address[1]))
+        os.replace(args.port_file + '.tmp', args.port_file)
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+""" kubectl-mock.py is kubectl mock approximation for testing purposes
+
+Supported actions:
+  rollout status -f FILE   waits kubectl-mock/rollout-delay seconds and exits with kubectl-mock/rollout-exit-code,
+                           both read from metadata.annotations of the first document in FILE
+  get KINDS -l SELECTOR -o json
+                           prints objects of KINDS matching equality-based SELECTOR as kubernetes List,
+                           objects are read from JSON list in file KUBECTL_MOCK_OBJECTS
+  delete [--ignore-not-found] KIND/NAME...
+                           removes objects from KUBECTL_MOCK_OBJECTS, waits kubectl-mock/delete-delay seconds
+                           and exits with kubectl-mock/delete-exit-code annotation of any deleted object
+                           (failed objects are kept)
+
+Every call is appended to KUBECTL_MOCK_LOG file (if set) as JSON list of arguments.
+"""
+
+# imports
+import argparse
+import fcntl
+import json
+import os
+import sys
+import time
+
+import yaml
+
+# constants
+DELAY_ANNOTATION = 'kubectl-mock/rollout-delay'
+EXIT_CODE_ANNOTATION = 'kubectl-mock/rollout-exit-code'
+DELETE_DELAY_ANNOTATION = 'kubectl-mock/delete-delay'
+DELETE_EXIT_CODE_ANNOTATION = 'kubectl-mock/delete-exit-code'
+
+# local functions
+def load_annotations(file):
+    """ reads annotations of the first document in manifest file """
+    with open(file, 'r') as file_handle:
+        document = next(yaml.load_all(file_handle, Loader=yaml.SafeLoader))
+    return (document.get('metadata') or {}).get('annotations') or {}
+
+def action_rollout_status(file):
+    """ kubectl rollout status action, simulates (failed) rollout delayed by annotations """
+    annotations = load_annotations(file)
+    print('Waiting for rollout of %s to finish' % file, flush=True)
+    time.sleep(float(annotations.get(DELAY_ANNOTATION, 0)))
+    exit_code = int(annotations.get(EXIT_CODE_ANNOTATION, 0))
+    if exit_code:
+        print('error: rollout of %s failed' % file, file=sys.stderr, flush=True)
+    else:
+        print('%s successfully rolled out' % file, flush=True)
+    return exit_code
+
+def kind_matches(kind, kinds):
+    """ checks object kind against comma-separated kinds (singular/plural, case insensitive) """
+    return any(kind.lower() in (k.lower(), k.lower()[:-1]) for k in kinds.split(','))
+
+def labels_match(labels, selector):
+    """ checks labels against equality-based selector (key=value and key, comma-separated) """
+    for requirement in filter(None, selector.split(',')):
+        key, _, value = requirement.partition('=')
+        if key not in labels or ('=' in requirement and labels[key] != value.lstrip('=')):
+            return False
+    return True
+
+def annotation(obj, name, default):
+    """ returns annotation of object """
+    return ((obj.get('metadata') or {}).get('annotations') or {}).get(name, default)
+
+def action_get(kinds, selector):
+    """ kubectl get action, prints matching objects as kubernetes List """
+    with open(os.environ['KUBECTL_MOCK_OBJECTS'], 'r') as file_handle:
+        objects = json.load(file_handle)
+    items = [obj for obj in objects
+             if kind_matches(obj['kind'], kinds) and labels_match(obj['metadata'].get('labels') or {}, selector)]
+    print(json.dumps({'apiVersion': 'v1', 'kind': 'List', 'items': items}))
+    return 0
+
+def action_delete(refs, ignore_not_found):
+    """ kubectl delete action, removes objects from the objects file """
+    with open(os.environ['KUBECTL_MOCK_OBJECTS'], 'r+') as file_handle:
+        fcntl.flock(file_handle, fcntl.LOCK_EX)
+        objects = json.load(file_handle)
+        by_ref = {'%s/%s' % (obj['kind'].lower(), obj['metadata']['name']): obj for obj in objects}
+        deleted = [by_ref.get(ref.lower()) for ref in refs]
+        failed = [obj for obj in deleted if obj and int(annotation(obj, DELETE_EXIT_CODE_ANNOTATION, 0))]
+        remaining = [obj for obj in objects if obj in failed or obj not in deleted]
+        file_handle.seek(0)
+        file_handle.truncate()
+        json.dump(remaining, file_handle)
+    time.sleep(max([float(annotation(obj, DELETE_DELAY_ANNOTATION, 0)) for obj in deleted if obj] + [0]))
+    exit_code = 0
+    for ref, obj in zip(refs, deleted):
+        if obj is None:
+            if not ignore_not_found:
+                print('Error from server (NotFound): %s not found' % ref, file=sys.stderr, flush=True)
+                exit_code = 1
+        elif obj in failed:
+            print('error: deletion of %s failed' % ref, file=sys.stderr, flush=True)
+            exit_code = int(annotation(obj, DELETE_EXIT_CODE_ANNOTATION, 0))
+        else:
+            print('%s deleted' % ref, flush=True)
+    return exit_code
+
+def get_cmdline_parser():
+    """ return command-line parser """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--namespace', type=str, help='ignored')
+    subparsers = parser.add_subparsers(dest='action')
+    rollout_parser = subparsers.add_parser('rollout')
+    rollout_parser.add_argument('rollout_action', choices=['status'])
+    rollout_parser.add_argument('-f', '--filename', type=str, required=True)
+    get_parser = subparsers.add_parser('get')
+    get_parser.add_argument('kinds', type=str)
+    get_parser.add_argument('-l', '--selector', type=str, default='')
+    get_parser.add_argument('-o', '--output', choices=['json'], required=True)
+    delete_parser = subparsers.add_parser('delete')
+    delete_parser.add_argument('objects', type=str, nargs='+')
+    delete_parser.add_argument('--ignore-not-found', action='store_true')
+    return parser
+
+def main():
+    """ main """
+    args = get_cmdline_parser().parse_args()
+    if os.environ.get('KUBECTL_MOCK_LOG'):
+        with open(os.environ['KUBECTL_MOCK_LOG'], 'a') as file_handle:
+            file_handle.write(json.dumps(sys.argv[1:]) + '\n')
+    if args.action == 'rollout' and args.rollout_action == 'status':
+        return action_rollout_status(args.filename)
+    if args.action == 'get':
+        return action_get(args.kinds, args.selector)
+    if args.action == 'delete':
+        return action_delete(args.objects, args.ignore_not_found)
+    raise NotImplementedError('Action %s not supported!' % args.action)
+
+# main call
+if __name__ == '__main__':
+    sys.exit(main())
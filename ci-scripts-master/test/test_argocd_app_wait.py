@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+import asyncio
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+import unittest
+import tempfile
+
+from lib.argocd_app_wait import wait_for_apps, get_exit_code, format_summary, app_state
+from lib.argocd_app_wait import AppFailedException, AppTimeoutException
+
+ARGOCD_MOCK = "{} {} --grpc-web".format(sys.executable, os.path.join(os.path.dirname(__file__), "argocd-mock.py"))
+ARGOCD_APP_WAIT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lib",
+                               "argocd_app_wait.py")
+REVISION = "4f5e6d7c8b9a4f5e6d7c8b9a4f5e6d7c8b9a4f5e"
+
+
+class TestArgocdAppWait(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.log_file = os.path.join(self.tmp_dir.name, "argocd.log")
+        os.environ["ARGOCD_MOCK_DIR"] = self.tmp_dir.name
+        os.environ["ARGOCD_MOCK_LOG"] = self.log_file
+        self.addCleanup(os.environ.pop, "ARGOCD_MOCK_DIR")
+        self.addCleanup(os.environ.pop, "ARGOCD_MOCK_LOG")
+
+    def _mk_app(self, name, **scenario):
+        with open(os.path.join(self.tmp_dir.name, name + ".json"), "w") as f:
+            json.dump(dict(scenario, revision=REVISION, started=time.time()), f)
+
+    def _wait(self, apps, timeout=10, **kwargs):
+        kwargs = dict(dict(argocd=ARGOCD_MOCK, min_poll_delay=0.05, max_poll_delay=0.2, log=io.StringIO()), **kwargs)
+        return asyncio.run(wait_for_apps(apps, REVISION[:7], timeout, **kwargs))
+
+    def _calls(self, app):
+        with open(self.log_file) as f:
+            return [call for call in map(json.loads, f) if app in call]
+
+    def test_concurrent_apps(self):
+        """Test apps are waited for concurrently, refresh is requested once and times are reported per app"""
+        self._mk_app("fast", seen_after=0, synced_after=0.1, healthy_after=0.2)
+        self._mk_app("slow", seen_after=0.2, synced_after=0.6, healthy_after=1.0)
+        self._mk_app("lazy", synced_after=0.3, healthy_after=0.3, refresh_required=True)
+
+        started = time.monotonic()
+        results = self._wait(["slow", "fast", "lazy"])
+
+        self.assertLess(time.monotonic() - started, 2.0)
+        self.assertEqual(get_exit_code(results), 0)
+        slow, fast, lazy = results
+        self.assertLess(fast["healthy"], slow["synced"])
+        self.assertGreaterEqual(slow["synced"], 0.6)
+        self.assertGreaterEqual(slow["healthy"], 1.0)
+        self.assertLessEqual(slow["seen"], slow["synced"])
+        self.assertIsNotNone(lazy["healthy"])
+        for app in ("slow", "fast", "lazy"):
+            # app may be healthy already on the first poll of loaded machine
+            refreshes = ["--refresh" in call for call in self._calls(app)]
+            self.assertEqual(refreshes, [True] + [False] * (len(refreshes) - 1))
+
+    def test_failed_sync(self):
+        """Test failed sync of the revision is reported without waiting for the deadline"""
+        self._mk_app("ok", synced_after=0.1, healthy_after=0.2)
+        self._mk_app("broken", synced_after=0.1, failed="one or more objects failed to apply")
+
+        started = time.monotonic()
+        results = self._wait(["ok", "broken"], timeout=30)
+
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertIsInstance(results[1], AppFailedException)
+        self.assertIn("failed to apply", results[1].error)
+        self.assertEqual(get_exit_code(results), 1)
+        self.assertIn("ok", format_summary(["ok", "broken"], results).splitlines()[1])
+
+    def test_shared_deadline(self):
+        """Test all apps share single deadline and unknown app fails after retries"""
+        self._mk_app("fast", synced_after=0, healthy_after=0)
+        self._mk_app("stuck", synced_after=0.1, healthy_after=60)
+
+        started = time.monotonic()
+        results = self._wait(["fast", "stuck", "missing"], timeout=1.0, fail_retry_count=1)
+
+        self.assertLess(time.monotonic() - started, 3)
+        self.assertIsInstance(results[0], dict)
+        self.assertIsInstance(results[1], AppTimeoutException)
+        self.assertIn("Synced/Progressing", results[1].state)
+        self.assertIsInstance(results[2], AppFailedException)
+        self.assertEqual(get_exit_code(results[:2]), 4)
+
+    def test_newer_revision(self):
+        """Test app synced to newer revision (pushed by concurrent job) counts as synced"""
+        app = {"status": {"sync": {"status": "Synced", "revision": "ffff"}, "health": {"status": "Healthy"},
+                          "history": [{"revision": REVISION}, {"revision": "ffff"}]}}
+        self.assertEqual(app_state(app, REVISION[:7])[:4], (True, True, True, None))
+        app["status"]["history"] = [{"revision": "eeee"}]
+        self.assertEqual(app_state(app, REVISION[:7])[:3], (False, False, False))
+
+    def test_summary(self):
+        """Test command-line summary table and exit code"""
+        self._mk_app("app-a", synced_after=0, healthy_after=0)
+        process = subprocess.run([sys.executable, ARGOCD_APP_WAIT, "--argocd", ARGOCD_MOCK, "--revision", REVISION,
+                                  "--timeout", "5", "--max-poll-delay", "0.1", "app-a", "app-b"],
+                                 stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True)
+        self.assertEqual(process.returncode, 1)
+        lines = process.stdout.splitlines()
+        self.assertEqual(lines[0].split(), ["application", "time", "to", "synced", "time", "to", "healthy", "result"])
+        self.assertTrue(lines[1].startswith("app-a") and lines[1].endswith("ok"))
+        self.assertTrue(lines[2].startswith("app-b") and "failed" in lines[2])
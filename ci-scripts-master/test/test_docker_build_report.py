@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from lib.docker_build_report import BuildOutputParser, report, format_report
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+DOCKER_BUILD = os.path.join(os.path.dirname(TEST_DIR), "lib", "docker-build.sh")
+IMAGE = "docker.dev.dszn.cz/sklik-devops/envoy"
+DOCKERFILE = """FROM debian:buster
+ARG VERSION
+RUN apt-get update && apt-get install -y envoy
+COPY envoy.yaml /etc/envoy/envoy.yaml
+LABEL org.label-schema.version=$VERSION
+"""
+
+
+class TestDockerBuildReport(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def _feed(self, output):
+        parser = BuildOutputParser()
+        for line in output.splitlines():
+            parser.feed(line)
+        return parser.stats()
+
+    def test_buildkit_output(self):
+        """Test BuildKit plain progress steps and cache hits are counted, FROM steps are skipped"""
+        stats = self._feed("#4 [1/3] FROM docker.io/library/debian:buster\n#4 CACHED\n"
+                           "#5 [build 2/3] RUN make\n#5 CACHED\n#6 [3/3] COPY . /src\n#6 DONE 0.2s\n"
+                           "#5 [build 2/3] RUN make\n")
+        self.assertEqual(stats, {"steps": 2, "cached": 1, "hit_ratio": 0.5})
+
+    def test_classic_output(self):
+        """Test classic builder steps and cache hits are counted"""
+        stats = self._feed("Step 1/3 : FROM debian:buster\n ---> 5c5d7b1e2f3a\nStep 2/3 : RUN make\n"
+                           " ---> Using cache\n ---> 1a2b3c4d5e6f\nStep 3/3 : COPY . /src\n ---> 6f5e4d3c2b1a\n")
+        self.assertEqual(stats, {"steps": 2, "cached": 1, "hit_ratio": 0.5})
+        self.assertIsNone(self._feed("")["hit_ratio"])
+
+    def test_report(self):
+        """Test output is passed through and summarized"""
+        output = io.BytesIO()
+        stats = report(io.BytesIO(b"#5 [2/2] RUN make\n#5 CACHED\n"), output)
+        self.assertEqual(output.getvalue(), b"#5 [2/2] RUN make\n#5 CACHED\n")
+        self.assertTrue(format_report(stats, IMAGE).startswith(
+            "Docker build of {}: 1 of 1 steps cached (100%), build time".format(IMAGE)))
+
+    def _mk_context(self):
+        # docker wrapper failing commands listed in DOCKER_MOCK_FAIL
+        self.docker_bin = os.path.join(self.tmp_dir.name, "docker")
+        with open(self.docker_bin, "w") as f:
+            f.write('#!/bin/sh\ncase " $DOCKER_MOCK_FAIL " in *" $1 "*) echo "$1 failed" >&2; exit 1;; esac\n'
+                    'exec {} {} "$@"\n'.format(sys.executable, os.path.join(TEST_DIR, "docker-mock.py")))
+        os.chmod(self.docker_bin, 0o755)
+        self.context = os.path.join(self.tmp_dir.name, "context")
+        os.mkdir(self.context)
+        for name, content in (("Dockerfile", DOCKERFILE), ("envoy.yaml", "admin: {}\n"),
+                              ("CHANGELOG.md", "## [Unreleased]\n\n## [1.0.0] - 2022-06-14\n")):
+            with open(os.path.join(self.context, name), "w") as f:
+                f.write(content)
+
+    def _docker_build(self, tag, branch, *args, **environ):
+        report_file = os.path.join(self.tmp_dir.name, "report.json")
+        env = dict(os.environ, DOCKER_BIN=self.docker_bin, DOCKER_MOCK_STATE_DIR=self.tmp_dir.name,
+                   CI_COMMIT_REF_SLUG=branch, CI_SCRIPTS_DOCKER_BUILD_REPORT_FILE=report_file)
+        for name in ("CI_COMMIT_TAG", "CI_SCRIPTS_DOCKER_BUILD_CACHE", "CI_SCRIPTS_TRACE_FILE",
+                     "CI_SCRIPTS_DEVELOPMENT_DOCKER_REGISTRY_USER", "CI_SCRIPTS_DEVELOPMENT_DOCKER_REGISTRY_PASSWORD_FILE"):
+            env.pop(name, None)
+        env.update(environ)
+        subprocess.run(["bash", DOCKER_BUILD, "--docker-image-name", "{}:{}".format(IMAGE, tag)] + list(args),
+                       cwd=self.context, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        with open(report_file) as f:
+            return json.load(f)
+
+    def test_registry_cache(self):
+        """Test registry cache of the branch (or of master) is used and volatile build-args do not break it"""
+        self._mk_context()
+        self.assertEqual(self._docker_build("1", "master", "--registry-cache")["cached"], 0)
+        self.assertEqual(self._docker_build("2", "master", "--registry-cache")["hit_ratio"], 1.0)
+        self.assertEqual(self._docker_build("3", "feature-x", "--registry-cache")["hit_ratio"], 1.0)
+        with open(os.path.join(self.context, "envoy.yaml"), "w") as f:
+            f.write("admin: {address: {}}\n")
+        self.assertEqual(self._docker_build("4", "feature-x", "--registry-cache")["cached"], 1)
+        self.assertEqual(self._docker_build("5", "feature-x")["cached"], 0)
+
+    def test_registry_cache_failures(self):
+        """Test failed registry login or cache push does not fail the build and the cache is not pushed"""
+        self._mk_context()
+        password_file = os.path.join(self.tmp_dir.name, "password")
+        with open(password_file, "w") as f:
+            f.write("secret")
+        for failing in ("login", "push"):
+            self._docker_build("1", "master", "--registry-cache", DOCKER_MOCK_FAIL=failing,
+                               CI_SCRIPTS_DEVELOPMENT_DOCKER_REGISTRY_USER="ci",
+                               CI_SCRIPTS_DEVELOPMENT_DOCKER_REGISTRY_PASSWORD_FILE=password_file)
+        self.assertEqual(self._docker_build("2", "master", "--registry-cache")["cached"], 0)
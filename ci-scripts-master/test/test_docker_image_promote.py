@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from lib.docker_image_promote import ImagePromoter, DockerCli, RegistryApiClient, split_image, expand_destination
+from lib.docker_image_promote import PromotionFailedException, get_exit_code, EXIT_OVERWRITE_REFUSED
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+DOCKER_BIN = "{} {}".format(sys.executable, os.path.join(TEST_DIR, "docker-mock.py"))
+SRC_IMAGE = "docker.dev.dszn.cz/sklik-devops/envoy:v1.7.0"
+SRC_DIGEST = "sha256:e4ae8982a8a62496bc94b871dd8409cb7585e3e12b72dde1046c3d6973510c1a"
+
+
+class TestDockerImagePromote(unittest.TestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        patcher = mock.patch.dict(os.environ, {"DOCKER_MOCK_STATE_DIR": tmp_dir.name})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        port_file = os.path.join(tmp_dir.name, "harbor-api-mock.port")
+        server = subprocess.Popen([sys.executable, os.path.join(TEST_DIR, "harbor-api-mock.py"),
+                                   "--registry", "docker.dev.dszn.cz", "--port-file", port_file])
+        self.addCleanup(server.wait)
+        self.addCleanup(server.kill)
+        for _ in range(50):
+            if os.path.exists(port_file):
+                break
+            time.sleep(0.1)
+        with open(port_file) as f:
+            self.api_url = "http://127.0.0.1:{}".format(f.read())
+
+    def _promoter(self, api_url=None, **kwargs):
+        api = RegistryApiClient({"CI_SCRIPTS_DOCKER_REGISTRY_API_URL": api_url or self.api_url})
+        self.addCleanup(api.close)
+        return ImagePromoter(SRC_IMAGE, docker=DockerCli(DOCKER_BIN), api=api, **kwargs)
+
+    def test_image_names(self):
+        """Test image names are split to registry, repository and tag, bare tags are expanded"""
+        self.assertEqual(split_image("local-registry:5000/project/name:1.0"), ("local-registry:5000", "project/name", "1.0"))
+        self.assertEqual(split_image("local-registry:5000/project/name"), ("local-registry:5000", "project/name", "latest"))
+        self.assertEqual(expand_destination(SRC_IMAGE, "latest"), "docker.dev.dszn.cz/sklik-devops/envoy:latest")
+        self.assertEqual(expand_destination(SRC_IMAGE, "other.cz/a/b:1"), "other.cz/a/b:1")
+
+    def test_retag_and_push(self):
+        """Test destinations in the source registry are retagged over pooled connection, the others pushed"""
+        promoter = self._promoter(src_digest=SRC_DIGEST, max_workers=1)
+        dst_images = ["docker.dev.dszn.cz/sklik-devops/envoy:v1", "docker.dev.dszn.cz/sklik-devops/envoy:latest",
+                      "local-testing-registry:5000/sklik-devops/envoy:v1.7.0",
+                      "local-testing-registry:5000/sklik-devops/envoy:v1"]
+        results = promoter.promote(dst_images)
+        self.assertEqual([(r.image, r.method, r.returncode, r.digest) for r in results],
+                         [(dst_images[0], "retag", 0, SRC_DIGEST), (dst_images[1], "retag", 0, SRC_DIGEST),
+                          (dst_images[2], "push", 0, SRC_DIGEST), (dst_images[3], "push", 0, SRC_DIGEST)])
+        self.assertEqual(promoter.api.connections, 1)
+        # repeated promotion leaves identical destinations as they are
+        results = self._promoter(src_digest=SRC_DIGEST).promote(dst_images)
+        self.assertEqual([r.method for r in results], ["identical", "identical", "present", "present"])
+
+    def test_failures(self):
+        """Test source digest mismatch fails all, existing destinations are not overwritten unless enabled"""
+        with self.assertRaises(PromotionFailedException):
+            self._promoter(src_digest="sha256:other").promote(["docker.dev.dszn.cz/sklik-devops/envoy:v1"])
+        v1_6_8 = "docker.dev.dszn.cz/sklik-devops/envoy:v1.6.8"
+        results = self._promoter().promote([v1_6_8, "docker.dev.dszn.cz/sklik-devops/envoy:v1"])
+        self.assertEqual([r.returncode for r in results], [EXIT_OVERWRITE_REFUSED, 0])
+        self.assertEqual(get_exit_code(results), EXIT_OVERWRITE_REFUSED)
+        self.assertEqual(self._promoter(overwrite=True).promote([v1_6_8])[0].digest, SRC_DIGEST)
+
+    def test_retag_conflict(self):
+        """Test retag conflict (e.g. of request retried after lost reply) is refusal only for different content"""
+        api = RegistryApiClient({"CI_SCRIPTS_DOCKER_REGISTRY_API_URL": self.api_url})
+        self.addCleanup(api.close)
+        request = api.request
+
+        def conflict(image, method, path, body=None):
+            return (409, b"") if method == "POST" else request(image, method, path, body)
+        with mock.patch.object(api, "request", side_effect=conflict):
+            api.retag(SRC_IMAGE, SRC_DIGEST, SRC_IMAGE)
+            with self.assertRaises(PromotionFailedException):
+                api.retag(SRC_IMAGE, SRC_DIGEST, "docker.dev.dszn.cz/sklik-devops/envoy:v1.6.8")
+
+    def test_api_fallback(self):
+        """Test all destinations are pushed if Harbor API is not available"""
+        results = self._promoter("http://127.0.0.1:1").promote(["docker.dev.dszn.cz/sklik-devops/envoy:v1"])
+        self.assertEqual([(r.method, r.returncode, r.digest) for r in results], [("push", 0, SRC_DIGEST)])
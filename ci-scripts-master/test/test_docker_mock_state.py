@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from test.docker_mock_state import DockerMockState, SEED_FILE
+
+DOCKER_MOCK = os.path.join(os.path.dirname(os.path.abspath(__file__)), "docker-mock.py")
+IMAGE = "docker.dev.dszn.cz/sklik-devops/envoy:v1.7.0"
+
+
+class TestDockerMockState(unittest.TestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.state_dir = tmp_dir.name
+
+    def _docker(self, *args):
+        return subprocess.run([sys.executable, DOCKER_MOCK] + list(args), check=True, stdout=subprocess.PIPE,
+                              env=dict(os.environ, DOCKER_MOCK_STATE_DIR=self.state_dir)).stdout.decode()
+
+    def test_seed_and_isolation(self):
+        """Test state is seeded from yaml, updated incrementally and kept in its own directory only"""
+        with open(SEED_FILE) as file_handle:
+            seed = file_handle.read()
+        state = DockerMockState(self.state_dir)
+        self.addCleanup(state.close)
+        self.assertEqual(state.get(IMAGE), {"digest": "sha256:e4ae8982a8a62496bc94b871dd8409cb7585e3e12b72dde1046c3d6973510c1a",
+                                            "local": False, "remote": True})
+        with state.transaction():
+            state.update(IMAGE, local=True)
+        self.assertTrue(DockerMockState(self.state_dir).get(IMAGE)["local"])
+        with tempfile.TemporaryDirectory() as other_state_dir:
+            self.assertFalse(DockerMockState(other_state_dir).get(IMAGE)["local"])
+        with open(SEED_FILE) as file_handle:
+            self.assertEqual(file_handle.read(), seed)
+
+    def test_concurrent_actions(self):
+        """Test concurrent docker-mock.py calls (the first ones seeding the state) do not lose updates"""
+        targets = ["local-testing-registry:5000/envoy:{}".format(i) for i in range(8)]
+
+        def copy(target):
+            self._docker("pull", IMAGE)
+            self._docker("tag", IMAGE, target)
+            self._docker("push", target)
+
+        with ThreadPoolExecutor(len(targets)) as executor:
+            list(executor.map(copy, targets))
+        images = self._docker("images").splitlines()
+        for target in targets:
+            self.assertIn("{} sha256:e4ae8982a8a62496bc94b871dd8409cb7585e3e12b72dde1046c3d6973510c1a".format(target),
+                          images)
+        self.assertTrue(DockerMockState(self.state_dir).get(targets[0])["remote"])
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+import io
+import json
+import asyncio
+import tempfile
+import threading
+import unittest
+import urllib.parse
+from http.server import ThreadingHTTPServer
+
+from lib.gitlab_pipeline_watch import GitlabClient
+from lib.gitlab_pipeline_fanout import load_fan_out_file, fan_out, get_exit_code, format_summary, trigger_pipeline
+from lib.gitlab_pipeline_fanout import FanOutFileException, TriggerFailedException
+from test.test_gitlab_pipeline_watch import GitlabStubHandler
+
+TRIGGER_TOKEN = "trigger-token"
+
+
+class GitlabTriggerStubHandler(GitlabStubHandler):
+    """Triggers pipelines with scripted state sequence per project (see GitlabStubHandler)"""
+
+    def do_POST(self):
+        project_id = urllib.parse.unquote(self.path.split("/")[4])
+        form = dict(urllib.parse.parse_qsl(self.rfile.read(int(self.headers["Content-Length"])).decode()))
+        self.server.triggers.append((project_id, form))
+        if self.server.drop_triggers:
+            # the trigger is accepted, but the reply is lost
+            self.close_connection = True
+            return
+        if project_id in self.server.pipelines and form.get("token") == TRIGGER_TOKEN:
+            self.server.next_id += 1
+            pipeline_path = "/api/v4/projects/{}/pipelines/{}".format(urllib.parse.quote(project_id, safe=""),
+                                                                    self.server.next_id)
+            self.server.replies[pipeline_path] = [(200, state) for state in self.server.pipelines[project_id]]
+            status, body = 201, {"id": self.server.next_id}
+        else:
+            status, body = 404, {"message": "404 Not Found"}
+        body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TestFanOutFile(unittest.TestCase):
+
+    def _load(self, data, environ=None):
+        with tempfile.NamedTemporaryFile("w", suffix=".yaml") as f:
+            f.write(data)
+            f.flush()
+            return load_fan_out_file(f.name, environ or {})
+
+    def test_load(self):
+        """Test fan-out file defaults and trigger tokens from environment"""
+        pipelines = self._load("- project-id: 1\n"
+                               "- project-id: group/project\n"
+                               "  ref: release\n"
+                               "  variables: {A: 1, B: null}\n"
+                               "  trigger-token-env: PROJECT_TOKEN\n", {"PROJECT_TOKEN": "token"})
+        self.assertEqual(pipelines, [
+            {"project_id": "1", "ref": "master", "variables": {}, "trigger_token": None},
+            {"project_id": "group/project", "ref": "release", "variables": {"A": "1", "B": ""},
+             "trigger_token": "token"}])
+
+    def test_invalid(self):
+        """Test invalid fan-out files"""
+        for data in ("project-id: 1\n", "- ref: master\n", "- project-id: 1\n  variables: [A]\n",
+                     "- project-id: 1\n  trigger-token-env: MISSING\n", "- project-id: 1\n  refs: master\n", "- ["):
+            with self.assertRaises(FanOutFileException):
+                self._load(data)
+
+
+class TestFanOut(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), GitlabTriggerStubHandler)
+        self.server.daemon_threads = True
+        self.server.connections = 0
+        self.server.requests = []
+        self.server.replies = {}
+        self.server.triggers = []
+        self.server.pipelines = {}
+        self.server.next_id = 100
+        self.server.drop_triggers = False
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def _fan_out(self, pipelines, timeout=10, jobs=2):
+        events = []
+
+        async def run():
+            client = GitlabClient("http://127.0.0.1:{}".format(self.server.server_port), "access-token",
+                                  max_connections=jobs)
+            try:
+                return await fan_out(client, pipelines, TRIGGER_TOKEN, timeout, jobs, events.append,
+                                     min_retry_delay=0.05, max_retry_delay=0.1, log=io.StringIO())
+            finally:
+                await client.close()
+        return asyncio.run(run()), events
+
+    @staticmethod
+    def _pipeline(project_id, **kwargs):
+        return dict(dict(project_id=project_id, ref="master", variables={}, trigger_token=None), **kwargs)
+
+    def test_fan_out(self):
+        """Test all pipelines are triggered and waited for"""
+        self.server.pipelines = {str(i): ["pending", "running", "success"] for i in range(6)}
+        self.server.pipelines["group/project"] = ["running", "failed"]
+
+        results, events = self._fan_out([self._pipeline(str(i)) for i in range(6)] +
+                                        [self._pipeline("group/project", ref="v1", variables={"A": "a"})])
+
+        self.assertEqual([r["status"] for r in results], ["success"] * 6 + ["failed"])
+        self.assertEqual(sorted(r["pipeline_id"] for r in results), list(range(101, 108)))
+        self.assertTrue(all(r["duration"] is not None for r in results))
+        self.assertEqual(self.server.triggers[-1], ("group/project", {"token": TRIGGER_TOKEN, "ref": "v1",
+                                                                      "variables[A]": "a"}))
+        # triggers are sent on new connections
+        self.assertLessEqual(self.server.connections, 2 + 7)
+        self.assertEqual(get_exit_code(results), 1)
+
+        project_events = [(e["event"], e.get("status")) for e in events if e["project_id"] == "0"]
+        self.assertEqual(project_events, [("triggered", None), ("state", "pending"), ("state", "running"),
+                                          ("state", "success")])
+        json.dumps(events)
+
+    def test_trigger_failed(self):
+        """Test pipeline not triggered does not stop the others"""
+        self.server.pipelines = {"1": ["success"]}
+
+        results, events = self._fan_out([self._pipeline("1"), self._pipeline("2"),
+                                          self._pipeline("1", trigger_token="invalid")])
+
+        self.assertEqual(results[0]["status"], "success")
+        self.assertIsInstance(results[1]["error"], TriggerFailedException)
+        self.assertIsInstance(results[2]["error"], TriggerFailedException)
+        self.assertEqual(len([e for e in events if e["event"] == "trigger_failed"]), 2)
+        self.assertEqual(get_exit_code(results), 2)
+
+    def test_trigger_not_retried(self):
+        """Test trigger with lost reply is not sent again on reused keep-alive connection failure"""
+        self.server.drop_triggers = True
+
+        async def run():
+            client = GitlabClient("http://127.0.0.1:{}".format(self.server.server_port), "access-token")
+            try:
+                # keep-alive connection in the pool
+                await client.request("GET", "/api/v4/projects/1/pipelines/1")
+                return await trigger_pipeline(client, "1", "master", {}, TRIGGER_TOKEN)
+            finally:
+                await client.close()
+        with self.assertRaises(TriggerFailedException):
+            asyncio.run(run())
+        self.assertEqual(len(self.server.triggers), 1)
+
+    def test_timeout(self):
+        """Test single deadline for the whole fan-out"""
+        self.server.pipelines = {"1": ["success"], "2": ["running"]}
+
+        results, _ = self._fan_out([self._pipeline("1"), self._pipeline("2")], timeout=0.5)
+
+        self.assertEqual(results[0]["status"], "success")
+        self.assertEqual(results[1]["status"], "running")
+        self.assertEqual(get_exit_code(results), 1)
+        summary = format_summary(results).splitlines()
+        self.assertEqual(summary[0].split(), ["project", "ref", "pipeline", "status", "duration"])
+        self.assertEqual(summary[2].split()[:5], ["2", "master", "102", "timeout", "(running)"])
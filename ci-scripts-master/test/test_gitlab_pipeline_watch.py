@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+import io
+import json
+import asyncio
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from lib.gitlab_pipeline_watch import GitlabClient, wait_for_pipelines, get_exit_code, parse_pipeline
+from lib.gitlab_pipeline_watch import PipelineNotFoundException, PipelineTransientException, PipelineTimeoutException
+
+ACCESS_TOKEN = "secret-token"
+
+
+class GitlabStubHandler(BaseHTTPRequestHandler):
+    """Replies with scripted (status, pipeline state) sequence per request path, the last reply is repeated"""
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.get("PRIVATE-TOKEN")))
+        replies = self.server.replies.get(self.path, [(404, None)])
+        status, state = replies.pop(0) if len(replies) > 1 else replies[0]
+        body = json.dumps({"status": state} if status == 200 else {"message": "404 Not found"}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestPipelineWatch(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), GitlabStubHandler)
+        self.server.daemon_threads = True
+        self.server.connections = 0
+        self.server.requests = []
+        self.server.replies = {}
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def _wait(self, pipelines, timeout=10, **kwargs):
+        async def run():
+            client = GitlabClient("http://127.0.0.1:{}/".format(self.server.server_port), ACCESS_TOKEN)
+            try:
+                return await wait_for_pipelines(client, pipelines, timeout, min_retry_delay=0.05,
+                                                max_retry_delay=0.2, log=io.StringIO(), **kwargs)
+            finally:
+                await client.close()
+        return asyncio.run(run())
+
+    def test_parse_pipeline(self):
+        """Test pipeline parsing with default project"""
+        self.assertEqual(parse_pipeline("42", "8379"), ("8379", "42"))
+        self.assertEqual(parse_pipeline("group/project:42", "8379"), ("group/project", "42"))
+        with self.assertRaises(ValueError):
+            parse_pipeline("42")
+
+    def test_multiple_pipelines(self):
+        """Test pipelines across projects are watched concurrently over single connection"""
+        self.server.replies = {
+            "/api/v4/projects/1/pipelines/10": [(200, "pending"), (200, "running"), (200, "running"), (200, "success")],
+            "/api/v4/projects/group%2Fproject/pipelines/20": [(200, "running"), (200, "failed")],
+        }
+        finished = []
+
+        results = self._wait([("1", "10"), ("group/project", "20")],
+                             on_result=lambda pipeline, result: finished.append(pipeline))
+
+        self.assertEqual(results, ["success", "failed"])
+        self.assertEqual(finished, [("group/project", "20"), ("1", "10")])
+        self.assertEqual(get_exit_code(results), 0)
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual({token for _, token in self.server.requests}, {ACCESS_TOKEN})
+
+    def test_not_found(self):
+        """Test 404 stops watching the pipeline with exit code 2"""
+        self.server.replies = {"/api/v4/projects/1/pipelines/10": [(200, "success")]}
+
+        results = self._wait([("1", "10"), ("1", "11")])
+
+        self.assertEqual(results[0], "success")
+        self.assertIsInstance(results[1], PipelineNotFoundException)
+        self.assertEqual(get_exit_code(results), 2)
+
+    def test_transient_errors(self):
+        """Test transient errors are retried up to fail_retry_count times"""
+        self.server.replies = {
+            "/api/v4/projects/1/pipelines/10": [(502, None), (503, None), (200, "success")],
+            "/api/v4/projects/1/pipelines/11": [(502, None)],
+        }
+
+        results = self._wait([("1", "10"), ("1", "11")], fail_retry_count=2)
+
+        self.assertEqual(results[0], "success")
+        self.assertIsInstance(results[1], PipelineTransientException)
+        self.assertEqual(len([path for path, _ in self.server.requests if path.endswith("/11")]), 3)
+        self.assertEqual(get_exit_code(results), 99)
+
+    def test_unreachable(self):
+        """Test connection errors are transient"""
+        port = self.server.server_port
+        self.server.shutdown()
+        self.server.server_close()
+
+        async def run():
+            client = GitlabClient("http://127.0.0.1:{}".format(port), ACCESS_TOKEN)
+            return await wait_for_pipelines(client, [("1", "10")], 5, min_retry_delay=0.01, max_retry_delay=0.01,
+                                            fail_retry_count=1, log=io.StringIO())
+
+        self.assertIsInstance(asyncio.run(run())[0], PipelineTransientException)
+
+    def test_timeout(self):
+        """Test timeout is measured as wall-clock time shared by all pipelines"""
+        self.server.replies = {
+            "/api/v4/projects/1/pipelines/10": [(200, "running")],
+            "/api/v4/projects/1/pipelines/11": [(200, "success")],
+        }
+
+        started = time.monotonic()
+        results = self._wait([("1", "10"), ("1", "11")], timeout=0.5)
+
+        self.assertLess(time.monotonic() - started, 1.5)
+        self.assertIsInstance(results[0], PipelineTimeoutException)
+        self.assertEqual(results[0].state, "running")
+        self.assertEqual(results[1], "success")
+        self.assertEqual(get_exit_code(results), 1)
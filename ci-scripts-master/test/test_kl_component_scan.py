@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+import os
+import unittest
+import tempfile
+from ruamel.yaml import YAML
+
+from lib.kl_component_scan import scan_resources, load_documents, ComponentNameException
+
+
+class TestKlComponentScan(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def _mk_manifest(self, name, content):
+        with open(os.path.join(self.tmp_dir.name, name), "w") as f:
+            f.write(content)
+
+    def test_generated_component(self):
+        """Test component is generated with name from the first app label and not written to resource dir"""
+        self._mk_manifest("a-configmap.yaml", "kind: ConfigMap\nmetadata:\n  name: cfg\n")
+        self._mk_manifest("b-service.yaml", "kind: Service\nmetadata:\n  name: svc\n  labels:\n    app: userproxy\n")
+        self._mk_manifest("c-deployment.yaml", "kind: Deployment\nmetadata:\n  labels:\n    app: other\n")
+
+        result = scan_resources(self.tmp_dir.name, environment="sklik-dev", version="1.0", created="2024-01-01")
+
+        self.assertEqual(result["app"], "userproxy")
+        self.assertIsNone(result["component_file"])
+        self.assertEqual(result["files"], ["a-configmap.yaml", "b-service.yaml", "c-deployment.yaml"])
+        self.assertEqual(result["descriptor"], {"environment": "sklik-dev", "name": "userproxy", "version": "1.0",
+                                                "description": "", "created": "2024-01-01", "sourceUrl": "",
+                                                "pipelineUrl": ""})
+        component = YAML(typ="safe").load(result["component"])
+        self.assertEqual(component["kind"], "KubeLauncherComponent")
+        self.assertEqual(component["spec"]["descriptor"], result["descriptor"])
+        self.assertEqual(sorted(os.listdir(self.tmp_dir.name)), result["files"])
+
+    def test_component_in_multidoc_file(self):
+        """Test existing component is found in multi-document file and its descriptor name is used"""
+        self._mk_manifest("app.yaml", "kind: Service\nmetadata:\n  labels:\n    app: svc\n---\n"
+                                      "kind: KubeLauncherComponent\nspec:\n  descriptor:\n    name: launcher\n"
+                                      "    description:\n")
+
+        result = scan_resources(self.tmp_dir.name)
+
+        self.assertEqual(result["app"], "launcher")
+        self.assertEqual(result["component_file"], os.path.join(self.tmp_dir.name, "app.yaml"))
+        self.assertEqual(result["descriptor"], {"name": "launcher", "description": ""})
+        self.assertEqual(scan_resources(self.tmp_dir.name, component_name="given")["app"], "given")
+
+    def test_deployment_fallback(self):
+        """Test name is taken from Deployment pod template if component has no name, invalid files are skipped"""
+        self._mk_manifest("component.yaml", "kind: KubeLauncherComponent\nspec:\n  descriptor:\n    version: 1\n")
+        self._mk_manifest("deployment.yaml", "kind: Deployment\nmetadata:\n  labels:\n    app: label\n"
+                                             "spec:\n  template:\n    metadata:\n      labels:\n        app: pod\n")
+        self._mk_manifest("invalid.yaml", "kind: [\n")
+
+        result = scan_resources(self.tmp_dir.name)
+
+        self.assertEqual(result["app"], "pod")
+        self.assertEqual(list(result["invalid_files"]), [os.path.join(self.tmp_dir.name, "invalid.yaml")])
+        self.assertEqual([len(documents) for _, documents in load_documents(self.tmp_dir.name)], [1, 1, 0])
+
+    def test_name_not_found(self):
+        """Test missing component name is reported"""
+        self._mk_manifest("configmap.yaml", "kind: ConfigMap\n")
+        with self.assertRaises(ComponentNameException):
+            scan_resources(self.tmp_dir.name)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+import os
+import unittest
+import tempfile
+
+from lib.kubernetes_deploy_plan import get_manifest_kinds, classify_kinds, get_deploy_action, plan_deploy
+from lib.kubernetes_deploy_plan import ManifestParseException
+
+
+class TestClassify(unittest.TestCase):
+
+    def test_single_kind(self):
+        """Test classification of single kind files"""
+        self.assertEqual(classify_kinds(["Namespace"]), "GLOBAL_SCOPED_RESOURCES")
+        self.assertEqual(classify_kinds(["ConfigMap"]), "CONFIGMAPS")
+        self.assertEqual(classify_kinds(["StatefulSet"]), "WORKLOADS")
+        self.assertEqual(classify_kinds(["CronJob"]), "JOBS")
+        self.assertEqual(classify_kinds(["Ingress"]), "OTHERS")
+
+    def test_mixed_kinds(self):
+        """Test file with multiple objects belongs to OTHERS (as kubectl List)"""
+        self.assertEqual(classify_kinds(["Deployment", "Service"]), "OTHERS")
+        self.assertEqual(classify_kinds(["ConfigMap", "Deployment"]), "OTHERS")
+        self.assertEqual(classify_kinds(["Deployment", "Deployment"]), "OTHERS")
+        self.assertEqual(classify_kinds(["Namespace", "ClusterRole"]), "OTHERS")
+        self.assertEqual(classify_kinds(["Namespace", "Deployment"]), "OTHERS")
+
+    def test_deploy_action(self):
+        """Test specific kubectl deploy action for jobs"""
+        self.assertEqual(get_deploy_action(["Job"]), "replace --force")
+        self.assertEqual(get_deploy_action(["Job", "Job"]), "apply --record")
+        self.assertEqual(get_deploy_action(["Job", "ConfigMap"]), "apply --record")
+        self.assertEqual(get_deploy_action(["Deployment"]), "apply --record")
+
+
+class TestPlan(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def _mk_manifest(self, name, data):
+        path = os.path.join(self.tmp_dir.name, name)
+        with open(path, "w") as f:
+            f.write(data)
+        return path
+
+    def test_multidoc_kinds(self):
+        """Test all documents of multi-document file are read, empty documents are skipped"""
+        kinds = get_manifest_kinds("test/test_files/kubernetes_deployment_multidoc.yaml")
+        self.assertEqual(kinds, ["Service", "Deployment"])
+
+    def test_invalid_manifest(self):
+        """Test exception on document without kind and invalid yaml"""
+        for data in ("metadata: {}\n", "kind: [\n"):
+            with self.assertRaises(ManifestParseException):
+                get_manifest_kinds(self._mk_manifest("invalid.yaml", data))
+
+    def test_plan_order(self):
+        """Test deploy plan order and flags"""
+        deployment = self._mk_manifest("a-deployment.yaml", "kind: Deployment\n")
+        secret = self._mk_manifest("b-secret.yaml", "kind: Secret\n---\nkind: Deployment\n")
+        job = self._mk_manifest("b-job.yaml", "kind: Job\n")
+        configmap = self._mk_manifest("c-configmap.yaml", "kind: ConfigMap\n")
+        namespace = self._mk_manifest("d-namespace.yaml", "kind: Namespace\n")
+        empty = self._mk_manifest("e-empty.yaml", "")
+
+        plan = plan_deploy([deployment, secret, job, configmap, namespace, empty])
+
+        self.assertEqual([s["file"] for s in plan["steps"]], [namespace, configmap, job, secret, deployment])
+        self.assertEqual([s["action"] for s in plan["steps"]],
+                         ["apply --record", "apply --record", "replace --force", "apply --record", "apply --record"])
+        self.assertEqual([s["rollout"] for s in plan["steps"]], [False, False, False, False, True])
+        self.assertEqual(plan["groups"]["WORKLOADS"], [deployment])
+        self.assertTrue(plan["namespaced"])
+
+    def test_plan_global_only(self):
+        """Test plan with global-scoped resources only does not require namespace"""
+        namespace = self._mk_manifest("namespace.yaml", "kind: Namespace\n")
+        self.assertFalse(plan_deploy([namespace])["namespaced"])
+
+    def test_plan_mixed_scopes(self):
+        """Test file mixing global-scoped and namespace-scoped resources requires namespace"""
+        mixed = self._mk_manifest("mixed.yaml", "kind: Namespace\n---\nkind: Deployment\n")
+        plan = plan_deploy([mixed])
+        self.assertEqual(plan["groups"]["OTHERS"], [mixed])
+        self.assertEqual([s["namespaced"] for s in plan["steps"]], [True])
+        self.assertTrue(plan["namespaced"])
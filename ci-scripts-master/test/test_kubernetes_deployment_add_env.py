@@ -1,11 +1,16 @@
 #!/usr/bin/env python3
+import os
+import shutil
 import unittest
 import tempfile
 from ruamel import yaml
 
 from lib.kubernetes_deployment_add_env import get_env_vars, update_deployment
+from lib.kubernetes_deployment_add_env import patch_deployment_env, update_deployment_round_trip
+from lib.kubernetes_deployment_add_env import split_documents, update_deployment_stream, find_manifest_files,\
+    process_manifest_files
 from lib.kubernetes_deployment_add_env import BadEnvFormatException, OverwriteDisabledException,\
-    ContainerNotFoundException, ContainerNameNotSetException
+    ContainerNotFoundException, ContainerNameNotSetException, ManifestFileException, AmbiguousManifestException
 
 
 class TestGetEnv(unittest.TestCase):
@@ -157,4 +162,200 @@ class TestGenerateManifest(unittest.TestCase):
         env_variables = {}
 
         with self.assertRaises(ContainerNameNotSetException):
-            self._test_deployment_env(manifest, expected_result, env_variables)
\ No newline at end of file
+            self._test_deployment_env(manifest, expected_result, env_variables)
+
+class TestPatchDeployment(unittest.TestCase):
+
+    manifest = "test/test_files/kubernetes_deployment_formatted.yaml"
+
+    @staticmethod
+    def _get_raw_manifest(file):
+        with open(file) as f:
+            raw_data = f.read()
+        return raw_data
+
+    def _test_same_as_round_trip(self, raw, env_variables, container=None, allow_overwrite=False):
+        patched = patch_deployment_env(raw, dict(env_variables), container, allow_overwrite)
+        round_trip = update_deployment_round_trip(raw, dict(env_variables), container, allow_overwrite)
+        self.assertEqual(yaml.safe_load(patched), yaml.safe_load(round_trip))
+        return patched
+
+    def test_test_files_same_as_round_trip(self):
+        """Test patching gives the same data as full round-trip"""
+        for manifest, container in (("test/test_files/kubernetes_deployment.yaml", "container1"),
+                                    ("test/test_files/kubernetes_deployment.yaml", "container2"),
+                                    ("test/test_files/kubernetes_deployment_one_container.yaml", None)):
+            raw = self._get_raw_manifest(manifest)
+            self._test_same_as_round_trip(raw, {"c1e2": "value3", "new": "a 'b' \"c\""}, container, True)
+
+    def test_rest_of_document_untouched(self):
+        """Test only env block is modified"""
+        raw = self._get_raw_manifest(self.manifest)
+        patched = self._test_same_as_round_trip(raw, {"c2e3": "value3"}, "container2")
+
+        expected = raw.replace("                fieldRef: {fieldPath: metadata.name}\n",
+                               "                fieldRef: {fieldPath: metadata.name}\n"
+                               "            - name: \"c2e3\"\n"
+                               "              value: \"value3\"\n")
+        self.assertEqual(patched, expected)
+
+    def test_env_block_created(self):
+        """Test env block is created in container without env variables"""
+        raw = self._get_raw_manifest(self.manifest)
+        patched = self._test_same_as_round_trip(raw, {"c1e1": "1"}, "container1")
+
+        self.assertIn("              \"--b\"]\n"
+                      "            env:\n"
+                      "              - name: \"c1e1\"\n"
+                      "                value: \"1\"\n"
+                      "        - name: container2\n", patched)
+
+    def test_overwrite_in_place(self):
+        """Test overwritten variable keeps its position"""
+        raw = self._get_raw_manifest(self.manifest)
+        patched = self._test_same_as_round_trip(raw, {"c2e1": "value3"}, "container2", True)
+
+        self.assertEqual(patched, raw.replace("value: \"value\"", "value: \"value3\""))
+
+    def test_overwrite_failed(self):
+        """Test overwriting variable with disabled overwriting"""
+        with self.assertRaises(OverwriteDisabledException):
+            patch_deployment_env(self._get_raw_manifest(self.manifest), {"c2e1": "value3"}, "container2", False)
+
+    def test_container_exceptions(self):
+        """Test container selection exceptions are same as in full round-trip"""
+        raw = self._get_raw_manifest(self.manifest)
+        with self.assertRaises(ContainerNotFoundException):
+            patch_deployment_env(raw, {}, "non_existing_container", False)
+        with self.assertRaises(ContainerNameNotSetException):
+            patch_deployment_env(raw, {}, None, False)
+
+    def test_ambiguous_structure(self):
+        """Test manifests which can not be patched safely"""
+        raw = self._get_raw_manifest(self.manifest)
+        for ambiguous in (raw.replace("  template:\n", "  template: &template\n"),
+                          raw.replace("          env:\n", "          <<: {}\n          env:\n"),
+                          raw.replace("            name: \"container1\"\n", "            name: &n container1\n"),
+                          "---\n" + raw,
+                          '{"kind": "Deployment"}'):
+            with self.assertRaises(AmbiguousManifestException):
+                patch_deployment_env(ambiguous, {"c1e1": "1"}, "container1", False)
+
+    def test_block_scalar_comment_lines(self):
+        """Test lines of block scalars starting with '#' are kept in the scalar"""
+        raw = ("kind: Deployment\nspec:\n  template:\n    spec:\n      containers:\n      - name: app\n"
+               "        command:\n        - sh\n        - -c\n        - |\n          echo hi\n          # keep me\n"
+               "      - name: other\n        args: >-\n          --a\n          # keep me\n"
+               "        env:\n        - name: B\n          value: |\n            b\n            # keep me\n")
+        for container in ("app", "other"):
+            patched = self._test_same_as_round_trip(raw, {"A": "1"}, container)
+            containers = yaml.safe_load(patched)["spec"]["template"]["spec"]["containers"]
+            self.assertEqual(containers[0]["command"], ["sh", "-c", "echo hi\n# keep me\n"])
+            self.assertEqual(containers[1]["args"], "--a # keep me")
+            self.assertEqual(containers[1]["env"][0]["value"], "b\n# keep me\n")
+
+    def test_overwrite_value_from_falls_back(self):
+        """Test overwriting valueFrom variable is left to full round-trip"""
+        raw = self._get_raw_manifest(self.manifest)
+        with self.assertRaises(AmbiguousManifestException):
+            patch_deployment_env(raw, {"c2e2": "value3"}, "container2", True)
+
+        updated = yaml.safe_load(update_deployment(raw, {"c2e2": "value3"}, "container2", True))
+        self.assertEqual(updated["spec"]["template"]["spec"]["containers"][1]["env"][1]["value"], "value3")
+
+
+class TestBatchManifests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    @staticmethod
+    def _get_raw_manifest(file):
+        with open(file) as f:
+            raw_data = f.read()
+        return raw_data
+
+    def _copy_manifest(self, file, directory):
+        target = os.path.join(directory, os.path.basename(file))
+        shutil.copy(file, target)
+        return target
+
+    def test_split_documents_roundtrip(self):
+        """Test splitting multi-document stream keeps separators"""
+        raw = self._get_raw_manifest("test/test_files/split_yaml_test.yaml")
+        documents = split_documents(raw)
+
+        self.assertEqual(len(documents), 4)
+        self.assertEqual("".join(s + d for s, d in documents), raw)
+
+    def test_stream_non_deployment_untouched(self):
+        """Test non-deployment documents are passed through byte-for-byte"""
+        raw = self._get_raw_manifest("test/test_files/kubernetes_deployment_multidoc.yaml")
+        updated, deployments, documents = update_deployment_stream(raw, {"c1e3": "value3"}, None, False)
+
+        self.assertEqual((deployments, documents), (1, 3))
+        original_documents = split_documents(raw)
+        updated_documents = split_documents(updated)
+        self.assertEqual(updated_documents[0], original_documents[0])
+        self.assertEqual(updated_documents[2], original_documents[2])
+        deployment = yaml.safe_load(updated_documents[1][1])
+        self.assertIn({"name": "c1e3", "value": "value3"},
+                      deployment["spec"]["template"]["spec"]["containers"][0]["env"])
+
+    def test_stream_env_variables_not_consumed(self):
+        """Test overwritten variables are applied to every deployment in stream"""
+        raw = self._get_raw_manifest("test/test_files/kubernetes_deployment_one_container.yaml")
+        env_variables = {"c1e2": "value3"}
+        updated, deployments, _ = update_deployment_stream(raw + "---\n" + raw, env_variables, None, True)
+
+        self.assertEqual(deployments, 2)
+        self.assertEqual(env_variables, {"c1e2": "value3"})
+        expected_dict = yaml.safe_load(self._get_raw_manifest("test/test_files/kubernetes_deployment_test4.yaml"))
+        for _, document in split_documents(updated):
+            self.assertDictEqual(yaml.safe_load(document), expected_dict)
+
+    def test_directory_to_destination_dir(self):
+        """Test batch processing of directory into destination directory"""
+        src_dir = os.path.join(self.tmp_dir.name, "src")
+        dst_dir = os.path.join(self.tmp_dir.name, "dst")
+        os.mkdir(src_dir)
+        self._copy_manifest("test/test_files/kubernetes_deployment_one_container.yaml", src_dir)
+        self._copy_manifest("test/test_files/kubernetes_deployment_multidoc.yaml", src_dir)
+
+        manifest_files = find_manifest_files([src_dir])
+        results = process_manifest_files(manifest_files, {"c1e3": "value3"}, None, False, dst_dir, jobs=2)
+
+        self.assertEqual([r["file"] for r in results], manifest_files)
+        self.assertEqual(sorted(os.listdir(dst_dir)), sorted(os.path.basename(f) for f in manifest_files))
+        self.assertDictEqual(
+            yaml.safe_load(self._get_raw_manifest(
+                os.path.join(dst_dir, "kubernetes_deployment_one_container.yaml"))),
+            yaml.safe_load(self._get_raw_manifest("test/test_files/kubernetes_deployment_test3.yaml")))
+        # source files are left untouched
+        self.assertEqual(
+            self._get_raw_manifest(os.path.join(src_dir, "kubernetes_deployment_one_container.yaml")),
+            self._get_raw_manifest("test/test_files/kubernetes_deployment_one_container.yaml"))
+
+    def test_glob_in_place(self):
+        """Test batch processing of glob pattern in place"""
+        manifest = self._copy_manifest("test/test_files/kubernetes_deployment_one_container.yaml",
+                                       self.tmp_dir.name)
+
+        results = process_manifest_files(find_manifest_files([os.path.join(self.tmp_dir.name, "*.yaml")]),
+                                         {"c1e3": "value3"}, None, False, jobs=1)
+
+        self.assertEqual(results[0]["output"], manifest)
+        self.assertDictEqual(
+            yaml.safe_load(self._get_raw_manifest(manifest)),
+            yaml.safe_load(self._get_raw_manifest("test/test_files/kubernetes_deployment_test3.yaml")))
+
+    def test_failure_reports_manifest_file(self):
+        """Test failing manifest is reported together with original exception"""
+        manifest = self._copy_manifest("test/test_files/kubernetes_deployment.yaml", self.tmp_dir.name)
+
+        with self.assertRaises(ManifestFileException) as cm:
+            process_manifest_files([manifest], {"c1e3": "value3"}, None, False, jobs=1)
+
+        self.assertEqual(cm.exception.manifest_file, manifest)
+        self.assertIsInstance(cm.exception.error, ContainerNameNotSetException)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+import io
+import json
+import os
+import sys
+import time
+import unittest
+import tempfile
+
+from lib.kubernetes_prune import parse_sort_key, select_objects, prune, format_report
+from lib.kubernetes_prune import SortKeyException, PruneFailedException
+
+KUBECTL_MOCK = "{} {} --namespace=test".format(sys.executable,
+                                               os.path.join(os.path.dirname(__file__), "kubectl-mock.py"))
+
+
+def _object(kind, name, version, labels=None, annotations=None):
+    return {"kind": kind, "metadata": {"name": name, "resourceVersion": str(version), "labels": labels or {},
+                                       "annotations": annotations or {}}}
+
+
+class TestKubernetesPrune(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.objects_file = os.path.join(self.tmp_dir.name, "objects.json")
+        self.log_file = os.path.join(self.tmp_dir.name, "kubectl.log")
+        os.environ["KUBECTL_MOCK_OBJECTS"] = self.objects_file
+        os.environ["KUBECTL_MOCK_LOG"] = self.log_file
+        self.addCleanup(os.environ.pop, "KUBECTL_MOCK_OBJECTS")
+        self.addCleanup(os.environ.pop, "KUBECTL_MOCK_LOG")
+
+    def _write_objects(self, objects):
+        with open(self.objects_file, "w") as f:
+            json.dump(objects, f)
+
+    def _remaining(self):
+        with open(self.objects_file) as f:
+            return sorted(o["metadata"]["name"] for o in json.load(f))
+
+    def _delete_calls(self):
+        with open(self.log_file) as f:
+            return [call for call in map(json.loads, f) if "delete" in call]
+
+    def test_sort_key(self):
+        """Test go-template sort key expressions used by kubernetes-delete-objects.sh"""
+        self.assertEqual(parse_sort_key(".metadata.resourceVersion"), ["metadata", "resourceVersion"])
+        self.assertEqual(parse_sort_key('index .metadata "labels" "ci-pipeline-id"'),
+                         ["metadata", "labels", "ci-pipeline-id"])
+        self.assertEqual(parse_sort_key('index .metadata.labels "ci-pipeline-id"'),
+                         ["metadata", "labels", "ci-pipeline-id"])
+        with self.assertRaises(SortKeyException):
+            parse_sort_key("printf .metadata.name")
+
+    def test_keep_n_recent_per_group(self):
+        """Test N most recent objects (numeric order) are kept in every label group"""
+        objects = [_object("Job", "a-{}".format(i), i, {"app": "a"}) for i in (9, 10, 100, 11)] + \
+                  [_object("Job", "b-{}".format(i), i, {"app": "b"}) for i in (5, 3)]
+
+        deleted, kept = select_objects(objects, 2, group_by=["app"])
+
+        self.assertEqual({g: [o["metadata"]["name"] for o in objs] for g, objs in deleted.items()},
+                         {("a",): ["a-9", "a-10"], ("b",): []})
+        self.assertEqual({g: [o["metadata"]["name"] for o in objs] for g, objs in kept.items()},
+                         {("a",): ["a-11", "a-100"], ("b",): ["b-3", "b-5"]})
+
+        deleted, kept = select_objects(objects, 2, parse_sort_key('index .metadata "labels" "app"'))
+        self.assertEqual([o["metadata"]["name"] for o in kept[()]], ["b-3", "b-5"])
+        self.assertEqual(len(deleted[()]), 4)
+
+    def test_batched_concurrent_delete(self):
+        """Test objects are listed once and deleted by concurrent batches"""
+        self._write_objects([_object("ConfigMap", "cm-{}".format(i), i, {"app": "x"},
+                                     {"kubectl-mock/delete-delay": "0.5"}) for i in range(20)] +
+                            [_object("ConfigMap", "other", 1, {"app": "y"})])
+        output = io.StringIO()
+
+        started = time.monotonic()
+        stats = prune("configmaps", "app=x", KUBECTL_MOCK, keep=3, batch_size=5, concurrency=4, output=output)
+
+        self.assertLess(time.monotonic() - started, 1.8)
+        self.assertEqual(self._remaining(), ["cm-17", "cm-18", "cm-19", "other"])
+        self.assertEqual(len(self._delete_calls()), 4)
+        self.assertTrue(all("--ignore-not-found" in call for call in self._delete_calls()))
+        self.assertEqual((stats["listed"], stats["deleted"], stats["kept"], stats["batches"], stats["failed"]),
+                         (20, 17, 3, 4, 0))
+        self.assertIn("deleted 17 objects", format_report(stats))
+
+    def test_dry_run(self):
+        """Test dry run deletes nothing"""
+        self._write_objects([_object("Job", "job-{}".format(i), i) for i in range(5)])
+        output = io.StringIO()
+
+        stats = prune("job", "", KUBECTL_MOCK, keep=2, dry_run=True, output=output)
+
+        self.assertEqual(len(self._remaining()), 5)
+        self.assertEqual(self._delete_calls(), [])
+        self.assertEqual([line for line in output.getvalue().splitlines() if line.startswith("Would delete")],
+                         ["Would delete 'Job/job-0'", "Would delete 'Job/job-1'", "Would delete 'Job/job-2'"])
+        self.assertIn("would delete 3 of 5 objects", format_report(stats))
+
+    def test_failed_batch(self):
+        """Test all batches are processed and objects of failed batches are reported"""
+        self._write_objects([_object("Job", "job-{}".format(i), i, annotations={"kubectl-mock/delete-exit-code": "1"}
+                                     if i == 1 else {}) for i in range(6)])
+
+        with self.assertRaises(PruneFailedException) as cm:
+            prune("jobs", "", KUBECTL_MOCK, batch_size=2, output=io.StringIO())
+
+        self.assertEqual(cm.exception.objects, ["Job/job-0", "Job/job-1"])
+        self.assertEqual((cm.exception.stats["deleted"], cm.exception.stats["failed"]), (4, 2))
+        self.assertEqual(self._remaining(), ["job-1"])
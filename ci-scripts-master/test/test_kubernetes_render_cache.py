@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+import os
+import time
+import unittest
+import tempfile
+
+from lib.kubernetes_render_cache import get_cache_key, RenderCache, NotCacheableException, format_stats
+
+
+class TestCacheKey(unittest.TestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.source_dir = tmp_dir.name
+        self.env_file = os.path.join(tmp_dir.name, "production.env")
+        self._write("production.env", "A=a\n")
+        self._write("service.yaml", "kind: Service\n")
+        self._write("deployment.yaml.tmpl", 'image: {{ env "IMAGE" }}\na: {{ env "A" }}\n')
+
+    def _write(self, name, content):
+        with open(os.path.join(self.source_dir, name), "w") as f:
+            f.write(content)
+
+    def _key(self, environ=None, app="app", tool_versions=("kubectl=1.18.8",)):
+        environ = {"IMAGE": "image:1", "CI_JOB_ID": "1"} if environ is None else environ
+        return get_cache_key(self.source_dir, [self.env_file], app, tool_versions, ["--no-validate"], environ)
+
+    def test_stable_key(self):
+        """Test key does not depend on environment variables not used by templates"""
+        self.assertEqual(self._key(), self._key({"IMAGE": "image:1", "CI_JOB_ID": "2"}))
+
+    def test_key_inputs(self):
+        """Test key changes with any input"""
+        key = self._key()
+        self.assertNotEqual(key, self._key({"IMAGE": "image:2"}))
+        self.assertNotEqual(key, self._key(app="other"))
+        self.assertNotEqual(key, self._key(tool_versions=("kubectl=1.16.6",)))
+        self._write("production.env", "A=a\nB=b\n")
+        self.assertNotEqual(key, self._key())
+        key = self._key()
+        self._write("service.yaml", "kind: Service\n\n")
+        self.assertNotEqual(key, self._key())
+
+    def test_not_cacheable(self):
+        """Test templates with syntax not supported by in-process renderer are not cached"""
+        self._write("if.yaml.tmpl", '{{ if env "A" }}a{{ end }}\n')
+        with self.assertRaises(NotCacheableException):
+            self._key()
+
+
+class TestRenderCache(unittest.TestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.cache_dir = os.path.join(tmp_dir.name, "cache")
+        self.destination_dir = os.path.join(tmp_dir.name, "production")
+        os.makedirs(self.destination_dir)
+
+    def _render(self, files):
+        for name in os.listdir(self.destination_dir):
+            os.remove(os.path.join(self.destination_dir, name))
+        for name, content in files.items():
+            with open(os.path.join(self.destination_dir, name), "w") as f:
+                f.write(content)
+
+    def test_store_restore(self):
+        """Test cache hit restores all files, miss and hit are counted"""
+        cache = RenderCache(self.cache_dir)
+        self.assertIsNone(cache.restore("key1", self.destination_dir))
+        self._render({"a.yaml": "a", "b.yaml": "b"})
+        cache.store("key1", self.destination_dir)
+        self._render({})
+
+        restored = cache.restore("key1", self.destination_dir)
+
+        self.assertEqual([os.path.basename(f) for f in restored], ["a.yaml", "b.yaml"])
+        with open(os.path.join(self.destination_dir, "b.yaml")) as f:
+            self.assertEqual(f.read(), "b")
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["entries"], stats["size"]), (1, 1, 1, 2))
+        self.assertIn("hit (key key1), hits 1, misses 1, entries 1", format_stats(stats))
+
+    def test_lru_eviction(self):
+        """Test least recently used entries are evicted when cache exceeds max size"""
+        cache = RenderCache(self.cache_dir, max_size=20)
+        for key in ("key1", "key2"):
+            self._render({"a.yaml": "x" * 8})
+            cache.store(key, self.destination_dir)
+        past = time.time() - 60
+        os.utime(os.path.join(self.cache_dir, "entries", "key2"), (past, past))
+        cache.restore("key1", self.destination_dir)
+
+        self._render({"a.yaml": "x" * 8})
+        evicted = cache.store("key3", self.destination_dir)
+
+        self.assertEqual(evicted, ["key2"])
+        self.assertEqual(sorted(key for key, _, _ in cache.entries()), ["key1", "key3"])
+
+    def test_oversized_entry_kept(self):
+        """Test just stored entry is never evicted"""
+        cache = RenderCache(self.cache_dir, max_size=1)
+        self._render({"a.yaml": "x" * 8})
+        cache.store("key1", self.destination_dir)
+        self.assertEqual([key for key, _, _ in cache.entries()], ["key1"])
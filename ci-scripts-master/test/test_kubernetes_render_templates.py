@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+import os
+import unittest
+import tempfile
+from unittest import mock
+
+from lib import kubernetes_render_templates
+from lib.kubernetes_render_templates import load_env_files, render_template, split_documents, render_directory
+from lib.kubernetes_render_templates import UnsupportedTemplateException, TemplateRenderException
+
+
+class TestRenderTemplate(unittest.TestCase):
+
+    def test_env(self):
+        """Test env and default functions"""
+        env = {"A": "a", "EMPTY": ""}
+        self.assertEqual(render_template('x={{ env "A" }} y={{env "B"}}', env), "x=a y=")
+        self.assertEqual(render_template('{{ env "A" | default "d" }} {{ env "B" | default "d" }}', env), "a d")
+        self.assertEqual(render_template('{{ env "EMPTY" | default `raw` }}', env), "raw")
+
+    def test_private_ini(self):
+        """Test syntax used in cicd-scout conf/private.ini.tmpl"""
+        template = ('workers = {{ env "PRIVATE_WORKERS" | default "3" }}\n'
+                    'http-socket = {{ env "PRIVATE_LISTEN_SOCKET" | default ":8010" }}\n')
+        self.assertEqual(render_template(template, {"PRIVATE_WORKERS": "5"}),
+                         "workers = 5\nhttp-socket = :8010\n")
+
+    def test_literals_comments_trim(self):
+        """Test string literals, comments and trim markers"""
+        self.assertEqual(render_template('a {{ "{{" }} b', {}), "a {{ b")
+        self.assertEqual(render_template('a: 1\n{{- /* comment */ -}}\n  b', {}), "a: 1b")
+        self.assertEqual(render_template('{{ "a\\tb" }}', {}), "a\tb")
+
+    def test_unsupported(self):
+        """Test unsupported syntax is detected"""
+        for template in ('{{ if env "A" }}a{{ end }}', '{{ .Env.A }}', '{{ env "A" | upper }}', '{{ env }}',
+                         '{{ env "A" | }}'):
+            with self.assertRaises(UnsupportedTemplateException):
+                render_template(template, {})
+
+
+class TestSplitDocuments(unittest.TestCase):
+
+    def test_single_document(self):
+        """Test document without separator is not split, empty lines are removed"""
+        self.assertEqual(split_documents("a: 1\n\nb: 2\n"), [(None, "a: 1\nb: 2\n")])
+        self.assertEqual(split_documents("--- # comment\na: 1\n"), [(None, "--- # comment\na: 1\n")])
+        self.assertEqual(split_documents("\n\n"), [(None, None)])
+
+    def test_multi_document(self):
+        """Test numbering of parts is the same as with csplit --elide-empty-files + removing empty files"""
+        self.assertEqual(split_documents("---\na: 1\n---\n\n---\n---\nb: 2\n--- # x\nc: 3"),
+                         [(0, "a: 1\n"), (1, None), (2, "b: 2\n"), (3, "c: 3")])
+
+
+class TestRenderDirectory(unittest.TestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.source_dir = os.path.join(tmp_dir.name, "kubernetes")
+        self.destination_dir = os.path.join(tmp_dir.name, "kubernetes", "production")
+        self.env_files = [os.path.join(tmp_dir.name, "base.env"), os.path.join(tmp_dir.name, "production.env")]
+        os.makedirs(self.source_dir)
+        self._write(self.env_files[0], "# comment\nA=base\nB=base\n\n")
+        self._write(self.env_files[1], "B = production \nexport C=c=c")
+
+    @staticmethod
+    def _write(path, content):
+        with open(path, "w") as f:
+            f.write(content)
+
+    def _read(self, name):
+        with open(os.path.join(self.destination_dir, name)) as f:
+            return f.read()
+
+    def test_load_env_files(self):
+        """Test later env files win"""
+        self.assertEqual(load_env_files(self.env_files, {"A": "environ", "D": "d"}),
+                         {"A": "base", "B": "production", "C": "c=c", "D": "d"})
+
+    def test_render_directory(self):
+        """Test manifests are copied, templates rendered and split"""
+        self._write(os.path.join(self.source_dir, "service.yaml"), "kind: Service\n\n")
+        self._write(os.path.join(self.source_dir, "empty.yaml"), "\n")
+        self._write(os.path.join(self.source_dir, "deployment.yaml.tmpl"), 'kind: Deployment\nb: {{ env "B" }}\n')
+        self._write(os.path.join(self.source_dir, "multi.yaml.tmpl"), '---\na: {{ env "A" }}\n---\n\n---\nc: 3\n')
+        self._write(os.path.join(self.source_dir, "nothing.yaml.tmpl"), '{{ env "X" }}\n\n')
+
+        written = render_directory(self.source_dir, self.destination_dir, self.env_files)
+
+        self.assertEqual(sorted(os.listdir(self.destination_dir)),
+                         ["deployment.yaml", "multi-00.yaml", "multi-02.yaml", "multi.yaml.orig", "service.yaml"])
+        self.assertEqual(len(written), 5)
+        self.assertEqual(self._read("service.yaml"), "kind: Service\n")
+        self.assertEqual(self._read("deployment.yaml"), "kind: Deployment\nb: production\n")
+        self.assertEqual(self._read("multi-00.yaml"), "a: base\n")
+        self.assertEqual(self._read("multi.yaml.orig"), "---\na: base\n---\n---\nc: 3\n")
+
+    def test_render_directory_parallel(self):
+        """Test templates are rendered in process pool"""
+        for i in range(4):
+            self._write(os.path.join(self.source_dir, "{}.yaml.tmpl".format(i)), 'i: {}\nb: {{{{ env "B" }}}}\n'.format(i))
+
+        with mock.patch.object(kubernetes_render_templates, "PARALLEL_THRESHOLD", 2):
+            render_directory(self.source_dir, self.destination_dir, self.env_files, jobs=2)
+
+        for i in range(4):
+            self.assertEqual(self._read("{}.yaml".format(i)), "i: {}\nb: production\n".format(i))
+
+    def test_unsupported_without_fallback(self):
+        """Test error on unsupported template syntax without goenvtemplator2 fallback"""
+        self._write(os.path.join(self.source_dir, "if.yaml.tmpl"), '{{ if env "A" }}a{{ end }}\n')
+        with self.assertRaises(TemplateRenderException):
+            render_directory(self.source_dir, self.destination_dir, self.env_files)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+import io
+import os
+import sys
+import time
+import unittest
+import tempfile
+
+from lib.kubernetes_rollout_watch import watch_rollouts, format_summary
+from lib.kubernetes_rollout_watch import RolloutFailedException, RolloutTimeoutException
+
+KUBECTL_MOCK = "{} {} --namespace=test".format(sys.executable,
+                                               os.path.join(os.path.dirname(__file__), "kubectl-mock.py"))
+
+
+class TestRolloutWatch(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def _mk_workload(self, name, delay, exit_code=0):
+        path = os.path.join(self.tmp_dir.name, name)
+        with open(path, "w") as f:
+            f.write("kind: Deployment\n"
+                    "metadata:\n"
+                    "  name: {}\n"
+                    "  annotations:\n"
+                    "    kubectl-mock/rollout-delay: '{}'\n"
+                    "    kubectl-mock/rollout-exit-code: '{}'\n".format(name, delay, exit_code))
+        return path
+
+    def test_concurrent_rollouts(self):
+        """Test workloads are watched concurrently and reported in order of readiness"""
+        slow = self._mk_workload("slow.yaml", 1.0)
+        fast = self._mk_workload("fast.yaml", 0.2)
+        output = io.StringIO()
+
+        started = time.monotonic()
+        ready = watch_rollouts([slow, fast, self._mk_workload("medium.yaml", 0.6)], KUBECTL_MOCK, 10, output)
+
+        self.assertLess(time.monotonic() - started, 1.8)
+        self.assertEqual(len(ready), 3)
+        self.assertLess(ready[fast], ready[slow])
+        ready_lines = [line for line in output.getvalue().splitlines() if ": ready in " in line]
+        self.assertTrue(ready_lines[0].startswith(fast))
+        self.assertTrue(ready_lines[-1].startswith(slow))
+
+    def test_fail_fast(self):
+        """Test watching is stopped on the first failed rollout"""
+        failed = self._mk_workload("failed.yaml", 0.2, 1)
+        ready = {}
+
+        started = time.monotonic()
+        with self.assertRaises(RolloutFailedException) as cm:
+            watch_rollouts([self._mk_workload("slow.yaml", 30), failed], KUBECTL_MOCK, 60, io.StringIO(), ready)
+
+        self.assertLess(time.monotonic() - started, 10)
+        self.assertEqual(cm.exception.manifest_file, failed)
+        self.assertEqual(cm.exception.returncode, 1)
+        self.assertEqual(ready, {})
+
+    def test_shared_deadline(self):
+        """Test all rollouts share single deadline"""
+        fast = self._mk_workload("fast.yaml", 0)
+        slow = self._mk_workload("slow.yaml", 30)
+        ready = {}
+
+        started = time.monotonic()
+        with self.assertRaises(RolloutTimeoutException) as cm:
+            watch_rollouts([fast, slow, self._mk_workload("slower.yaml", 60)], KUBECTL_MOCK, 1.5, io.StringIO(), ready)
+
+        self.assertLess(time.monotonic() - started, 10)
+        self.assertEqual(cm.exception.manifest_files, [slow, os.path.join(self.tmp_dir.name, "slower.yaml")])
+        self.assertEqual(list(ready), [fast])
+
+    def test_summary(self):
+        """Test time to ready table"""
+        summary = format_summary(["a.yaml", "b.yaml"], {"a.yaml": 1.25})
+        self.assertEqual(summary.splitlines(), ["workload   time to ready",
+                                                "a.yaml              1.2s",
+                                                "b.yaml         not ready"])
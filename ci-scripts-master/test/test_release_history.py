@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+import os
+import subprocess
+import unittest
+import tempfile
+
+from lib.release_history import index_changelog, get_latest_version, read_section, get_commits, format_commit_list
+from lib.release_history import UnreleasedSectionException
+
+CHANGELOG = """# Changelog
+
+## [Unreleased]
+
+## [1.10.0] - 2024-02-01
+### Added
+- čeština
+
+## Notes
+text
+
+## [ 1.9.0 ]
+- first
+"""
+
+
+class TestReleaseHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.changelog = os.path.join(self.tmp_dir.name, "CHANGELOG.md")
+
+    def _write(self, content):
+        with open(self.changelog, "w") as f:
+            f.write(content)
+
+    def _git(self, *args):
+        return subprocess.run(["git", "-c", "user.name=test", "-c", "user.email=test@example.com"] + list(args),
+                              cwd=self.tmp_dir.name, check=True, stdout=subprocess.PIPE,
+                              universal_newlines=True).stdout
+
+    def _commit(self, message):
+        self._git("commit", "--quiet", "--allow-empty", "-m", message)
+
+    def test_index(self):
+        """Test sections are indexed with byte offsets and read back by offset"""
+        self._write(CHANGELOG)
+        index = index_changelog(self.changelog)
+
+        self.assertIsNone(index["error"])
+        self.assertEqual([(section["title"], section["version"], section["date"], section["line"])
+                          for section in index["sections"]],
+                         [("Unreleased", None, None, 3), ("1.10.0", "1.10.0", "2024-02-01", 5),
+                          ("Notes", None, None, 9), ("1.9.0", "1.9.0", None, 12)])
+        self.assertEqual(get_latest_version(index), "1.10.0")
+        self.assertEqual(read_section(self.changelog, index, "v1.10.0"),
+                         "## [1.10.0] - 2024-02-01\n### Added\n- čeština\n\n")
+        self.assertEqual(read_section(self.changelog, index, "1.9.0"), "## [ 1.9.0 ]\n- first\n")
+        self.assertEqual(index["sections"][-1]["end"], index["size"])
+        self.assertIsNone(read_section(self.changelog, index, "2.0.0"))
+
+    def test_unreleased_rules(self):
+        """Test [Unreleased] section rules of get_version_from_changelog_md"""
+        for content, error in (("## [Unreleased]\n- change\n\n## [1.0.0]\n", "There are changes"),
+                               ("## [Unreleased]\n## [1.0.0]\n", "separated from the last release"),
+                               ("## [1.0.0]\n\n## [Unreleased]\n", "defined before the first version"),
+                               ("## [Unreleased]\n\n## Other\n\n## [1.0.0]\n", "There are changes")):
+            self._write(content)
+            with self.assertRaises(UnreleasedSectionException) as context:
+                get_latest_version(index_changelog(self.changelog))
+            self.assertIn(error, context.exception.error)
+        self._write("## [Unreleased]\n\n")
+        self.assertIsNone(index_changelog(self.changelog)["latest"])
+
+    def test_commits_since_nth_tag(self):
+        """Test commits since the n-th tag are read by single git log, merge commits are skipped"""
+        self._git("init", "--quiet")
+        self._commit("init")
+        self._git("tag", "v1.0.0")
+        self._commit("feature\nsecond line\n\nbody")
+        self._commit("mentions tag and Author")
+        self._git("checkout", "--quiet", "-b", "topic")
+        self._commit("topic change")
+        self._git("checkout", "--quiet", "master")
+        self._git("merge", "--quiet", "--no-ff", "topic", "-m", "Merge branch 'topic'")
+        self._git("tag", "-a", "-m", "release", "v1.1.0")
+        self._commit("fix")
+        self._git("tag", "v1.1.1")
+
+        history = get_commits(2, cwd=self.tmp_dir.name)
+
+        self.assertEqual(history["range"], "v1.1.0..HEAD")
+        self.assertEqual(format_commit_list(history["commits"]), " - fix")
+        history = get_commits(3, cwd=self.tmp_dir.name)
+        # order of commits of the same second is not defined
+        self.assertEqual(sorted(format_commit_list(history["commits"]).split("\n")),
+                         [" - feature", " - fix", " - mentions tag and Author", " - second line", " - topic change"])
+        self.assertEqual(history["commits"][-1]["message"], "feature\nsecond line\n\nbody")
+        self.assertEqual(get_commits(1, cwd=self.tmp_dir.name)["commits"], [])
+        history = get_commits(9, cwd=self.tmp_dir.name, max_count=2)
+        self.assertIsNone(history["tag"])
+        self.assertTrue(history["truncated"])
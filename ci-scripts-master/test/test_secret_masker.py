@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from lib.secret_masker import SecretMasker, InvalidPatternException
+
+
+class TestSecretMasker(unittest.TestCase):
+
+    def _mask(self, data, patterns=(), secrets=(), fill="*", **kwargs):
+        output = io.BytesIO()
+        SecretMasker(patterns, secrets, fill).mask_stream(io.BytesIO(data), output, **kwargs)
+        return output.getvalue()
+
+    def test_hide_secret_semantics(self):
+        """Test the same results as the former gawk hide_secret (hide_secret.bats)"""
+        self.assertEqual(self._mask(b"token: xyz\n", ["token:[ \t]*(.+)"]), b"token: ***\n")
+        self.assertEqual(self._mask(b"A\ntoken: 1234\nB\n", ["(.+)"], fill="_"), b"_\n___________\n_\n")
+        self.assertEqual(self._mask(b"token: 1234\n", [".+"]), b"token: 1234\n")
+        self.assertEqual(self._mask(b"token: 1234 \n", ["token:[ \t]*(.+)([ \t]+)"], fill="Y"), b"token: YYYY \n")
+        self.assertEqual(self._mask(b"token: \n", ["token:[ \t]*(.*)"]), b"token: \n")
+        self.assertEqual(self._mask(b"token:\tabc\n", ["token:[[:space:]]*(.+)$"], fill="ab"), b"token:\tababab\n")
+        with self.assertRaises(InvalidPatternException):
+            SecretMasker(["(.+"])
+
+    def test_multiple_patterns_and_secrets(self):
+        """Test all occurrences of all patterns and literal secrets are masked in single pass"""
+        data = (b"password=abc user=x password=defg\n"
+                b"Authorization: Bearer t0k3n\n"
+                b"echo s3cr3t-value s3cr3t\n"
+                b"nothing here\n")
+        masked = self._mask(data, ["password=([^ ]+)", "Bearer (.+)$"], ["s3cr3t", "s3cr3t-value\nline2"])
+        self.assertEqual(masked, (b"password=*** user=x password=****\n"
+                                  b"Authorization: Bearer *****\n"
+                                  b"echo ************ ******\n"
+                                  b"nothing here\n"))
+
+    def test_binary_and_chunks(self):
+        """Test binary data and lines crossing chunk boundaries, unterminated last line is kept unterminated"""
+        data = b"\xff\x00 token: \xc3\xa1bc\n" * 100 + b"x" * 50 + b" token: end"
+        masked = self._mask(data, ["token: (.+)$"], chunk_size=7)
+        self.assertEqual(masked, b"\xff\x00 token: ***\n" * 100 + b"x" * 50 + b" token: ***")
+
+    def test_long_line(self):
+        """Test lines longer than max line length are masked in pieces"""
+        data = b"secret " * 10 + b"\n"
+        self.assertEqual(self._mask(data, secrets=["secret"], chunk_size=4, max_line_length=14),
+                         b"****** " * 10 + b"\n")
+
+    def test_hide_secret_variables_command_line(self):
+        """Test hide_secret_variables masks values passed by environment only (not visible in command lines)"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            log_file = os.path.join(tmp_dir, "argv.log")
+            # env and python3 wrappers recording their command lines
+            for name in ("env", "python3"):
+                with open(os.path.join(tmp_dir, name), "w") as f:
+                    f.write('#!/bin/sh\necho "$@" >> {}\nexec {} "$@"\n'.format(log_file, shutil.which(name)))
+                os.chmod(os.path.join(tmp_dir, name), 0o755)
+            lib_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lib")
+            process = subprocess.run(
+                ["bash", "-c", 'source "$0/common.sh" > /dev/null; export PATH="$1:$PATH"; KUBE_TOKEN=s3cr3t; '
+                               'echo "token s3cr3t" | hide_secret_variables KUBE_TOKEN', lib_dir, tmp_dir],
+                stdout=subprocess.PIPE, universal_newlines=True, check=True)
+            self.assertEqual(process.stdout, "token ******\n")
+            with open(log_file) as f:
+                self.assertNotIn("s3cr3t", f.read())
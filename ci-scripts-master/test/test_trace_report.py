@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+import json
+import os
+import subprocess
+import unittest
+import tempfile
+
+from lib.trace_report import load_spans, folded_stacks, format_folded, top_spans, format_top
+
+COMMON_SH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lib", "common.sh")
+
+
+class TestTraceReport(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.trace_file = os.path.join(self.tmp_dir.name, "traces", "job.jsonl")
+
+    def _run_script(self, name, script, **env):
+        script_file = os.path.join(self.tmp_dir.name, name)
+        with open(script_file, "w") as f:
+            f.write("set -eo pipefail\nsource {}\n{}".format(COMMON_SH, script))
+        return subprocess.run(["bash", script_file], env=dict(os.environ, **env), stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, universal_newlines=True)
+
+    def _span(self, name, stack, start, end, job="build", spawns=1, exit_code=0):
+        return {"name": name, "stack": stack, "start": start, "end": end, "duration": end - start, "job": job,
+                "spawns": spawns, "exit_code": exit_code}
+
+    def test_common_sh_spans(self):
+        """Test spans of script, nested spans, called ci-scripts and failed step are written to the trace file"""
+        self._run_script("child.sh", "trace_run child-step true\n")
+        process = self._run_script("deploy.sh", "trace_run plan sleep 0.1\n"
+                                                "trace_begin apply\n"
+                                                "version=$(trace_run 'get;version' echo 1.0)\n"
+                                                "trace_run child bash {}\n"
+                                                "trace_end\n"
+                                                "trace_run 'rollout \"x\"' false\n"
+                                                "echo not reached\n".format(os.path.join(self.tmp_dir.name,
+                                                                                         "child.sh")),
+                                   CI_SCRIPTS_TRACE_FILE=self.trace_file, CI_JOB_NAME="deploy")
+
+        self.assertEqual(process.returncode, 1)
+        self.assertEqual(process.stdout, "")
+        spans, invalid = load_spans([self.tmp_dir.name])
+        self.assertEqual(invalid, 0)
+        self.assertEqual([(span["stack"], span["name"], span["exit_code"]) for span in spans], [
+            ("deploy.sh", "plan", 0),
+            ("deploy.sh;apply", "get_version", 0),
+            ("deploy.sh;apply;child;child.sh", "child-step", 0),
+            ("deploy.sh;apply;child", "child.sh", 0),
+            ("deploy.sh;apply", "child", 0),
+            ("deploy.sh", "apply", 0),
+            ("deploy.sh", 'rollout "x"', 1),
+            ("", "deploy.sh", 1)])
+        self.assertGreaterEqual(spans[0]["duration"], 0.1)
+        self.assertGreaterEqual(spans[0]["spawns"], 1)
+        self.assertEqual({span["job"] for span in spans}, {"deploy"})
+
+    def test_tracing_disabled(self):
+        """Test helpers are no-ops with tracing disabled"""
+        process = self._run_script("build.sh", "trace_begin build\ntrace_run step echo ok\ntrace_end\n"
+                                               "trace_run failed false || echo $?\n")
+        self.assertEqual(process.stdout, "ok\n1\n")
+        self.assertFalse(os.path.exists(os.path.dirname(self.trace_file)))
+
+    def test_folded_stacks(self):
+        """Test folded stacks of more jobs contain self time, concurrent children do not make it negative"""
+        spans = [self._span("build.sh", "", 0, 10), self._span("docker_build", "build.sh", 1, 9),
+                 self._span("get_version", "build.sh", 9, 9.5), self._span("get_version", "build.sh", 9.5, 10),
+                 self._span("deploy.sh", "", 0, 2, job="deploy"), self._span("a", "deploy.sh", 0, 2, job="deploy"),
+                 self._span("b", "deploy.sh", 0, 2, job="deploy")]
+
+        stacks = folded_stacks(spans)
+
+        self.assertEqual(stacks, {"build;build.sh": 1000, "build;build.sh;docker_build": 8000,
+                                  "build;build.sh;get_version": 1000, "deploy;deploy.sh;a": 2000,
+                                  "deploy;deploy.sh;b": 2000})
+        self.assertEqual(format_folded(folded_stacks(spans, metric="spawns", by_job=False)).splitlines(),
+                         ["build.sh;docker_build 1", "build.sh;get_version 2", "deploy.sh;a 1", "deploy.sh;b 1"])
+
+    def test_top_spans(self):
+        """Test the slowest steps report, invalid (truncated) trace lines are skipped"""
+        os.makedirs(os.path.dirname(self.trace_file))
+        with open(self.trace_file, "w") as f:
+            for span in (self._span("kubeconform", "config.sh", 0, 3), self._span("kubeconform", "config.sh", 5, 6),
+                         self._span("kubectl_apply", "deploy.sh", 0, 2, spawns=None, exit_code=1)):
+                f.write(json.dumps(span) + "\n")
+            f.write('{"name": "trunc')
+
+        spans, invalid = load_spans([self.trace_file])
+
+        self.assertEqual(invalid, 1)
+        self.assertEqual([(row["path"], row["total"]) for row in top_spans(spans, limit=2)],
+                         [("config.sh;kubeconform", 3), ("deploy.sh;kubectl_apply", 2)])
+        rows = top_spans(spans, by_name=True)
+        self.assertEqual([(row["name"], row["count"], row["total"], row["max"], row["spawns"], row["failed"])
+                          for row in rows], [("kubeconform", 2, 4, 3, 2, 0), ("kubectl_apply", 1, 2, 2, None, 1)])
+        self.assertIn("fail  build: deploy.sh;kubectl_apply", format_top(top_spans(spans)))
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+import random
+import unittest
+
+from lib.version_index import VersionIndex, InvalidVersionException, compare_versions
+
+
+class TestVersionIndex(unittest.TestCase):
+
+    def test_semver_precedence(self):
+        """Test semver precedence including numeric pre-release identifiers and build metadata"""
+        versions = ["1.0.0-alpha", "1.0.0-alpha.1", "1.0.0-alpha.beta", "1.0.0-beta", "1.0.0-beta.2",
+                    "1.0.0-beta.11", "1.0.0-rc.1", "1.0.0+1", "1.0.0+2", "1.0.0", "1.0.1", "1.10.0", "10.0.0"]
+        shuffled = list(versions)
+        random.Random(1).shuffle(shuffled)
+        self.assertEqual(VersionIndex(shuffled).cut(), versions)
+        self.assertEqual(VersionIndex(shuffled).cut("minor"), ["1.0", "1.10", "10.0"])
+
+    def test_invalid(self):
+        """Test invalid versions are refused in strict mode and skipped otherwise"""
+        with self.assertRaises(InvalidVersionException) as e:
+            VersionIndex(["1.0.0", "1.01.0", "v1.0.0"])
+        self.assertEqual(e.exception.versions, ["1.01.0", "v1.0.0"])
+        index = VersionIndex(["v1.0.0", "v1.0", "2.0.0"], prefix="v", strict=False)
+        self.assertEqual((index.cut(), index.invalid), (["1.0.0"], ["1.0"]))
+
+    def test_latest(self):
+        """Test latest queries ignore pre-releases"""
+        index = VersionIndex(["1.0.0", "1.0.10", "1.0.9", "1.1.0", "1.2.0-rc.1", "2.0.0", "2.1.0-alpha"])
+        self.assertEqual(index.latest(), "2.0.0")
+        self.assertEqual(index.latest_in_major(1), "1.1.0")
+        self.assertEqual(index.latest_in_minor(1, 0), "1.0.10")
+        self.assertIsNone(index.latest_in_minor(1, 2))
+        self.assertTrue(index.is_newest("2.0.0"))
+        self.assertFalse(index.is_newest("1.1.0"))
+
+    def test_latest_tags(self):
+        """Test floating tags (the same as latest-tags.sh)"""
+        index = VersionIndex(["1.0.0", "1.0.1", "1.1.0", "1.1.1", "2.0.0", "2.1.0", "2.2.0-rc.1", "2.1.0+build"])
+        self.assertEqual(index.latest_tags("1.0.0"), [])
+        self.assertEqual(index.latest_tags("1.0.1"), ["1.0"])
+        self.assertEqual(index.latest_tags("1.1.1"), ["1", "1.1"])
+        self.assertEqual(index.latest_tags("2.1.0"), ["2", "2.1", "latest"])
+        self.assertEqual(index.latest_tags("2.2.0-rc.1"), [])
+        self.assertEqual(index.latest_tags("2.1.0+build"), [])
+
+    def test_pep440(self):
+        """Test PEP 440 versions"""
+        index = VersionIndex(["1.0", "1.0.post1", "1.1rc1", "1.0.1.dev1", "0.9", "1!0.1"], scheme="pep440")
+        self.assertEqual(index.cut(), ["0.9", "1.0", "1.0.post1", "1.0.1.dev1", "1.1rc1", "1!0.1"])
+        self.assertEqual(index.latest_in_major(1), "1.0.post1")
+        self.assertEqual(index.latest_tags("1.0.post1"), ["1", "1.0"])
+        self.assertEqual(compare_versions("1.0rc1", "1.0", "pep440"), -1)
+        with self.assertRaises(InvalidVersionException):
+            VersionIndex(["1.0-foo-bar"], scheme="pep440")
+
+    def test_query(self):
+        """Test batch mode queries"""
+        index = VersionIndex(["v1.0.0", "v1.1.0", "v2.0.0"], prefix="v")
+        self.assertEqual([index.query(query) for query in ("latest", "latest-in-major 1", "latest-in-minor 3.0",
+                                                           "is-newest 1.1.0", "latest-tags 1.1.0",
+                                                           "compare 1.0.0 1.0.0-rc.1", "cut major")],
+                         ["2.0.0", "1.1.0", "", "false", "1,1.1", "1", "1 2"])
+        with self.assertRaises(ValueError):
+            index.query("latest-in-minor 1")
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+import os
+import io
+import shutil
+import subprocess
+import unittest
+import tempfile
+from unittest import mock
+
+from lib import version_resolver
+from lib.version_resolver import resolve_version, probe_changelog_md, probe_git_tag, format_explanation
+from lib.version_resolver import InvalidVersionException
+
+TEST_FILES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_files")
+
+
+class TestProbes(unittest.TestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.cwd = tmp_dir.name
+
+    def _changelog(self, name):
+        shutil.copy(os.path.join(TEST_FILES_DIR, name), os.path.join(self.cwd, "CHANGELOG.md"))
+        log = io.StringIO()
+        return probe_changelog_md(self.cwd, {}, log=log), log.getvalue()
+
+    def test_changelog_md(self):
+        """Test the same results as get_version_from_changelog_md (changelog-md.bats)"""
+        self.assertEqual(self._changelog("changelog-md_good-version1.md"), ("1.2.3", ""))
+        self.assertEqual(self._changelog("changelog-md_good-version2.md"), ("11.22.33", ""))
+        self.assertEqual(self._changelog("changelog-md_bad-version1.md"), ("4.5.6", ""))
+        for name in ("changelog-md_unreleased1.md", "changelog-md_unreleased2.md"):
+            version, error = self._changelog(name)
+            self.assertEqual(version, "")
+            self.assertIn("Error: ", error)
+
+    def test_git_tag(self):
+        """Test the same results as get_version_from_git_tag (get_version_from_git_tag.bats)"""
+        for tag, version in (("11.22.33", "11.22.33"), ("component-name-v11.22.33", "11.22.33"),
+                             ("component1-name1-11.22.33", "11.22.33"), ("COMPONENT-NAME-11.22.33", "11.22.33"),
+                             ("component-name-11.22.33-flag", "11.22.33-flag"), ("v1.2.3", "1.2.3"),
+                             ("component-name", "")):
+            self.assertEqual(probe_git_tag(self.cwd, {"CI_COMMIT_TAG": tag}), version, tag)
+
+
+class TestResolveVersion(unittest.TestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.cwd = os.path.join(tmp_dir.name, "project")
+        os.makedirs(self.cwd)
+        self.environ = {"CI_SCRIPTS_VERSION_CACHE_DIR": os.path.join(tmp_dir.name, "cache"),
+                        "PATH": os.environ.get("PATH", "")}
+        self._git("init", "-q")
+        self._write("Dockerfile", 'LABEL org.label-schema.version="1.0.0"\n')
+        self._git("add", "-A")
+        self._git("-c", "user.name=test", "-c", "user.email=test@example.com", "commit", "-q", "-m", "init")
+
+    def _git(self, *args):
+        subprocess.run(["git"] + list(args), cwd=self.cwd, check=True, stdout=subprocess.DEVNULL)
+
+    def _write(self, name, content):
+        with open(os.path.join(self.cwd, name), "w") as f:
+            f.write(content)
+
+    def _resolve(self, environ=None):
+        return resolve_version(self.cwd, dict(self.environ, **(environ or {})))
+
+    def test_lazy_probing(self):
+        """Test probes are run in priority order and stop at the first hit"""
+        result = self._resolve()
+        self.assertEqual((result["version"], result["source"], result["cache"]), ("1.0.0", "Dockerfile", "miss"))
+        self.assertEqual([name for name, _, _ in result["probes"]][-2:], ["CHANGELOG.md", "Dockerfile"])
+
+        self._write("VERSION", "2.0.0\n")
+        result = self._resolve()
+        self.assertEqual((result["version"], result["source"]), ("2.0.0", "VERSION"))
+        self.assertNotIn("Dockerfile", [name for name, _, _ in result["probes"]])
+
+    def test_environment(self):
+        """Test VERSION variable wins without any probe or cache lookup"""
+        with mock.patch.object(version_resolver, "get_cache_key") as get_cache_key:
+            result = self._resolve({"VERSION": "3.0.0"})
+        get_cache_key.assert_not_called()
+        self.assertEqual((result["version"], result["source"], result["cache"]), ("3.0.0", "environment", None))
+
+    def test_invalid_version(self):
+        """Test version with whitespaces is refused"""
+        self._write("VERSION", "1.0 beta\n")
+        with self.assertRaises(InvalidVersionException):
+            self._resolve()
+
+    def test_memoization(self):
+        """Test result is memoized per commit and working tree state"""
+        self.assertEqual(self._resolve()["cache"], "miss")
+        probe = mock.Mock(return_value="")
+        with mock.patch.object(version_resolver, "PROBES", [(name, probe) for name, _ in version_resolver.PROBES]):
+            result = self._resolve()
+        probe.assert_not_called()
+        self.assertEqual((result["version"], result["cache"]), ("1.0.0", "hit"))
+        self.assertIn("probes (cached from the first resolution):", format_explanation(result))
+
+        self._write("Dockerfile", 'LABEL org.label-schema.version="1.0.1"\n')
+        result = self._resolve()
+        self.assertEqual((result["version"], result["cache"]), ("1.0.1", "miss"))
+        self.assertEqual(self._resolve({"CI_COMMIT_TAG": "v1.0.2"})["cache"], "miss")
+
+    def test_ignored_files_in_key(self):
+        """Test change of git ignored file read by probes is not answered from cache"""
+        self._write(".gitignore", "VERSION\n")
+        self._git("add", ".gitignore")
+        self._git("-c", "user.name=test", "-c", "user.email=test@example.com", "commit", "-q", "-m", "ignore")
+        self.assertEqual(self._resolve()["version"], "1.0.0")
+        self._write("VERSION", "2.0.0\n")
+        self.assertEqual(self._resolve()["version"], "2.0.0")
+
+    def test_memoization_scope(self):
+        """Test memoization is disabled outside CI job unless the cache directory is set"""
+        environ = {"PATH": os.environ.get("PATH", "")}
+        with mock.patch.object(version_resolver, "get_cache_key") as get_cache_key:
+            result = resolve_version(self.cwd, environ)
+        get_cache_key.assert_not_called()
+        self.assertEqual((result["version"], result["cache"]), ("1.0.0", None))
+        self.assertIsNotNone(version_resolver.get_cache_dir(dict(environ, CI_JOB_ID="42")))
+
+    def test_explain(self):
+        """Test explain output marks the winning probe"""
+        explanation = format_explanation(self._resolve())
+        self.assertIn("source: Dockerfile", explanation)
+        self.assertIn("cache: miss", explanation)
+        self.assertRegex(explanation, r"\* Dockerfile +[0-9.]+ ms  1\.0\.0")
+        self.assertRegex(explanation, r"\n  VERSION +[0-9.]+ ms  -")
@@ -0,0 +1,31 @@
+""" Health routes served from pre-serialized responses
+
+Liveness/readiness probes hit / and /test constantly, so GET and HEAD of them are answered by WSGI
+middleware in front of Flask with bytes and headers prepared once. Other methods fall through to Flask.
+"""
+
+from server.metrics import ROUTE_ENVIRON_KEY
+
+FAST_METHODS = frozenset(("GET", "HEAD"))
+
+
+class HealthFastPath:
+    """ WSGI middleware answering GET/HEAD of constant routes, bodies is dict path -> (status, body, content type)
+    """
+
+    def __init__(self, wsgi_app, bodies):
+        self.wsgi_app = wsgi_app
+        self.responses = {}
+        for path, (status, body, content_type) in bodies.items():
+            headers = [("Content-Type", content_type), ("Content-Length", str(len(body)))]
+            self.responses[path] = (status, headers, [body], [])
+
+    def __call__(self, environ, start_response):
+        response = self.responses.get(environ.get("PATH_INFO"))
+        if response is None or environ.get("REQUEST_METHOD") not in FAST_METHODS:
+            return self.wsgi_app(environ, start_response)
+        status, headers, body, empty = response
+        environ[ROUTE_ENVIRON_KEY] = environ["PATH_INFO"]
+        # servers may extend the header list (wsgiref adds Date), pass a copy to keep the prepared one intact
+        start_response(status, list(headers))
+        return empty if environ["REQUEST_METHOD"] == "HEAD" else body
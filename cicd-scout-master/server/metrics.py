@@ -0,0 +1,304 @@
+""" Prometheus metrics shared by uwsgi workers
+
+Every worker (process) keeps its values in its own memory mapped file in metrics directory, /metrics
+served by any worker sums the files of all workers. Counters and histograms of finished workers
+are kept, gauges are summed over live workers only.
+"""
+
+import bisect
+import glob
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+
+from flask import request
+
+try:
+    import uwsgi
+except ImportError:
+    uwsgi = None
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# route of the request (set by Flask hook or by WSGI fast path) and whether it is tracked as in flight
+ROUTE_ENVIRON_KEY = "cicd_scout.route"
+IN_FLIGHT_ENVIRON_KEY = "cicd_scout.in_flight"
+
+_HEADER = struct.Struct("II")
+_KEY_LENGTH = struct.Struct("I")
+_VALUE = struct.Struct("d")
+_INITIAL_FILE_SIZE = 64 * 1024
+_FILE_NAME_RE = re.compile(r"^values-(?P<pid>\d+)\.db$")
+
+
+def _padded(length):
+    """ key length padded, so the value following the length and the key is 8 bytes aligned
+    """
+    return length + (8 - (_KEY_LENGTH.size + length) % 8) % 8
+
+
+def read_values(data):
+    """ yield (key, value) of values file content
+    """
+    used = _HEADER.unpack_from(data, 0)[0] if len(data) >= _HEADER.size else 0
+    offset = _HEADER.size
+    while offset < used:
+        length = _KEY_LENGTH.unpack_from(data, offset)[0]
+        key_offset = offset + _KEY_LENGTH.size
+        value_offset = key_offset + _padded(length)
+        yield data[key_offset:key_offset + length].decode(), _VALUE.unpack_from(data, value_offset)[0]
+        offset = value_offset + _VALUE.size
+
+
+class ValueFile:
+    """ values (doubles) of single process in memory mapped file, keys are appended on their first use
+
+    Layout: header (used bytes, reserved), entries (key length, key padded to 8 bytes, value). The header
+    is updated after the entry is written, so readers never see incomplete entry. Not thread-safe.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._size = os.fstat(self._fd).st_size
+        if self._size < _INITIAL_FILE_SIZE:
+            self._size = _INITIAL_FILE_SIZE
+            os.ftruncate(self._fd, self._size)
+        self._mmap = mmap.mmap(self._fd, self._size)
+        self._offsets = {}
+        self._used = _HEADER.size
+        for key, _ in read_values(self._mmap):
+            self._used += _KEY_LENGTH.size + _padded(len(key.encode())) + _VALUE.size
+            self._offsets[key] = self._used - _VALUE.size
+
+    def offset(self, key):
+        """ return offset of key value, the key is added if missing
+        """
+        offset = self._offsets.get(key)
+        if offset is None:
+            encoded = key.encode()
+            entry = _KEY_LENGTH.pack(len(encoded)) + encoded.ljust(_padded(len(encoded)), b"\0") + _VALUE.pack(0.0)
+            while self._used + len(entry) > self._size:
+                self._size *= 2
+                os.ftruncate(self._fd, self._size)
+                self._mmap.close()
+                self._mmap = mmap.mmap(self._fd, self._size)
+            self._mmap[self._used:self._used + len(entry)] = entry
+            self._used += len(entry)
+            _HEADER.pack_into(self._mmap, 0, self._used, 0)
+            offset = self._offsets[key] = self._used - _VALUE.size
+        return offset
+
+    def add(self, offset, amount):
+        """ add amount to value at offset
+        """
+        _VALUE.pack_into(self._mmap, offset, _VALUE.unpack_from(self._mmap, offset)[0] + amount)
+
+    def close(self):
+        """ unmap and close the file
+        """
+        self._mmap.close()
+        os.close(self._fd)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class MetricsStore:
+    """ metric values of all workers in directory, one values file per process (reopened after fork)
+
+    Metric is identified by name and labels (tuple of (name, value) pairs), offsets of its values
+    are cached, so updating a value is just single write to shared memory.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._pid = None
+        self._file = None
+        self._offsets = {}
+
+    def _key_offset(self, name, labels):
+        pid = os.getpid()
+        if self._pid != pid:
+            os.makedirs(self.directory, exist_ok=True)
+            self._file = ValueFile(os.path.join(self.directory, "values-{}.db".format(pid)))
+            self._offsets = {}
+            self._pid = pid
+        offset = self._offsets.get((name, labels))
+        if offset is None:
+            offset = self._offsets[(name, labels)] = self._file.offset(json.dumps([name, labels]))
+        return offset
+
+    def add(self, name, labels, amount=1.0):
+        """ add amount to the metric of current process
+        """
+        with self._lock:
+            offset = self._key_offset(name, labels)
+            self._file.add(offset, amount)
+
+    def add_many(self, updates):
+        """ add amounts to more metrics at once, updates are (name, labels, amount) tuples
+        """
+        with self._lock:
+            for name, labels, amount in updates:
+                offset = self._key_offset(name, labels)
+                self._file.add(offset, amount)
+
+    def collect(self, gauges=()):
+        """ return dict (name, labels) -> value summed over all workers (gauges over live workers only)
+        """
+        values = {}
+        for path in glob.glob(os.path.join(self.directory, "values-*.db")):
+            match = _FILE_NAME_RE.match(os.path.basename(path))
+            if not match:
+                continue
+            alive = _pid_alive(int(match.group("pid")))
+            try:
+                with open(path, "rb") as file:
+                    data = file.read()
+            except FileNotFoundError:
+                continue
+            for key, value in read_values(data):
+                name, labels = json.loads(key)
+                if name in gauges and not alive:
+                    continue
+                metric = (name, tuple(tuple(label) for label in labels))
+                values[metric] = values.get(metric, 0.0) + value
+        return values
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"')
+                                           .replace("\n", "\\n")) for name, value in labels) + "}"
+
+
+def _format_value(value):
+    return repr(int(value)) if value == int(value) else repr(value)
+
+
+class Instrumentation:
+    """ request metrics of Flask app (WSGI middleware)
+
+    Per-route latency histogram, requests counter by route, method and status, in-flight gauge per route
+    and per-worker requests counter. Route is the url rule matched by Flask ("none" for unknown urls)
+    or ROUTE_ENVIRON_KEY set by wrapped WSGI app (requests answered without Flask are not tracked as in flight).
+    """
+
+    def __init__(self, app, store, buckets=DEFAULT_BUCKETS, prefix="cicd_scout"):
+        self.store = store
+        self.buckets = tuple(buckets)
+        self.prefix = prefix
+        self.requests_name = prefix + "_http_requests_total"
+        self.duration_name = prefix + "_http_request_duration_seconds"
+        self.in_flight_name = prefix + "_http_requests_in_flight"
+        self.worker_name = prefix + "_worker_requests_total"
+        self._bucket_labels = {}
+        self._worker_labels = None
+        self._worker_pid = None
+        self._wsgi_app = app.wsgi_app
+        app.wsgi_app = self
+        app.before_request(self._before_request)
+
+    def _before_request(self):
+        route = request.url_rule.rule if request.url_rule is not None else "none"
+        request.environ[ROUTE_ENVIRON_KEY] = route
+        request.environ[IN_FLIGHT_ENVIRON_KEY] = True
+        self.store.add(self.in_flight_name, (("route", route),), 1.0)
+
+    def _worker(self):
+        pid = os.getpid()
+        if self._worker_pid != pid:
+            worker_id = uwsgi.worker_id() if uwsgi is not None else pid
+            self._worker_labels = (("worker", str(worker_id)),)
+            self._worker_pid = pid
+        return self._worker_labels
+
+    def __call__(self, environ, start_response):
+        start = time.perf_counter()
+        status = []
+
+        def _start_response(status_line, headers, exc_info=None):
+            status.append(status_line[:3])
+            return start_response(status_line, headers, exc_info)
+
+        try:
+            return self._wsgi_app(environ, _start_response)
+        finally:
+            self.observe(environ.get(ROUTE_ENVIRON_KEY, "none"), environ.get("REQUEST_METHOD", ""),
+                         status[0] if status else "500", time.perf_counter() - start,
+                         environ.get(IN_FLIGHT_ENVIRON_KEY, False))
+
+    def observe(self, route, method, status, duration, in_flight=False):
+        """ record finished request (in_flight if it has been counted as in flight)
+        """
+        updates = []
+        if in_flight:
+            updates.append((self.in_flight_name, (("route", route),), -1.0))
+        route_labels = self._bucket_labels.get(route)
+        if route_labels is None:
+            route_labels = self._bucket_labels[route] = (
+                (("route", route),),
+                [(("route", route), ("le", str(le))) for le in self.buckets] + [(("route", route), ("le", "+Inf"))])
+        updates += [(self.requests_name, (("route", route), ("method", method), ("status", status)), 1.0),
+                    (self.duration_name + "_bucket", route_labels[1][bisect.bisect_left(self.buckets, duration)], 1.0),
+                    (self.duration_name + "_sum", route_labels[0], duration),
+                    (self.worker_name, self._worker(), 1.0)]
+        self.store.add_many(updates)
+
+    def render(self):
+        """ return all metrics in Prometheus text format
+        """
+        values = self.store.collect(gauges=(self.in_flight_name,))
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            lines.append("# HELP {} {}".format(name, help_text))
+            lines.append("# TYPE {} {}".format(name, kind))
+            lines.extend("{}{} {}".format(sample, _format_labels(labels), _format_value(value))
+                         for sample, labels, value in samples)
+
+        def samples(name):
+            return sorted((labels, value) for (metric, labels), value in values.items() if metric == name)
+
+        family(self.requests_name, "counter", "HTTP requests by route, method and status.",
+               [(self.requests_name, labels, value) for labels, value in samples(self.requests_name)])
+
+        histogram = []
+        buckets = {}
+        for labels, value in samples(self.duration_name + "_bucket"):
+            buckets.setdefault(labels[:-1], {})[labels[-1][1]] = value
+        sums = dict(samples(self.duration_name + "_sum"))
+        for route_labels in sorted(buckets):
+            cumulative = 0.0
+            for le in [str(le) for le in self.buckets] + ["+Inf"]:
+                cumulative += buckets[route_labels].get(le, 0.0)
+                histogram.append((self.duration_name + "_bucket", route_labels + (("le", le),), cumulative))
+            histogram.append((self.duration_name + "_sum", route_labels, sums.get(route_labels, 0.0)))
+            histogram.append((self.duration_name + "_count", route_labels, cumulative))
+        family(self.duration_name, "histogram", "HTTP request latency by route.", histogram)
+
+        family(self.in_flight_name, "gauge", "HTTP requests being processed by route.",
+               [(self.in_flight_name, labels, value) for labels, value in samples(self.in_flight_name)])
+        family(self.worker_name, "counter", "HTTP requests processed by uwsgi worker.",
+               [(self.worker_name, labels, value) for labels, value in samples(self.worker_name)])
+
+        if uwsgi is not None:
+            family(self.prefix + "_uwsgi_listen_queue", "gauge", "Requests waiting in uwsgi listen queue.",
+                   [(self.prefix + "_uwsgi_listen_queue", (), uwsgi.listen_queue())])
+            family(self.prefix + "_uwsgi_workers", "gauge", "Number of uwsgi workers.",
+                   [(self.prefix + "_uwsgi_workers", (), uwsgi.numproc)])
+        return "\n".join(lines) + "\n"
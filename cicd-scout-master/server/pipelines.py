@@ -0,0 +1,247 @@
+""" Cached GitLab pipeline status
+
+Pipelines are served from in-memory TTL cache of the uwsgi worker. Concurrent misses of the same
+pipeline wait for single upstream fetch, hot (recently requested) pipelines are refreshed in the background
+until they reach terminal state, so waiting CI jobs do not hit GitLab at all.
+"""
+
+import logging as log
+import os
+import threading
+import time
+import urllib.parse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# pipeline statuses which never change
+TERMINAL_STATUSES = frozenset(("success", "failed", "canceled", "skipped"))
+
+
+class GitlabError(Exception):
+    """ GitLab request failed (connection error or unexpected status)
+    """
+
+
+class PipelineNotFoundError(GitlabError):
+    """ GitLab does not know the pipeline (or the project)
+    """
+
+
+class GitlabClient:
+    """ GitLab API client with pooled (keep-alive) session
+    """
+
+    def __init__(self, url, access_token=None, timeout=10.0, pool_size=10):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if access_token:
+            self.session.headers["PRIVATE-TOKEN"] = access_token
+
+    def get_pipeline(self, project, pipeline_id):
+        """ return pipeline (GitLab API JSON), project is id or path
+        """
+        url = "{}/api/v4/projects/{}/pipelines/{}".format(
+            self.url, urllib.parse.quote(str(project), safe=""), pipeline_id)
+        try:
+            resp = self.session.get(url, timeout=self.timeout)
+        except requests.RequestException as exc:
+            raise GitlabError("{}: {}".format(url, exc)) from exc
+        if resp.status_code == 404:
+            raise PipelineNotFoundError("pipeline {}/{} not found".format(project, pipeline_id))
+        if resp.status_code != 200:
+            raise GitlabError("{}: HTTP {}".format(url, resp.status_code))
+        try:
+            return resp.json()
+        except ValueError as exc:
+            raise GitlabError("{}: {}".format(url, exc)) from exc
+
+    def close(self):
+        """ close pooled connections
+        """
+        self.session.close()
+
+
+class _Entry:
+    """ cached value (or not found error) with its expiration
+    """
+    __slots__ = ("value", "error", "expires_at", "accessed_at", "terminal")
+
+    def __init__(self, value, error, expires_at, accessed_at, terminal):
+        self.value = value
+        self.error = error
+        self.expires_at = expires_at
+        self.accessed_at = accessed_at
+        self.terminal = terminal
+
+
+class _Pending:
+    """ upstream fetch in progress, waiters are woken up by event
+    """
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class PipelineCache:
+    """ TTL cache of pipelines with request coalescing and background refresh
+
+    fetch(key) returns pipeline dict (key is (project, pipeline_id) tuple), PipelineNotFoundError
+    is cached for ttl as well, other errors are not cached. Pipelines in terminal state are kept
+    for terminal_ttl. Non-terminal pipelines requested within hot_period are refreshed before they expire
+    by background thread (started on first use), the rest just expires.
+    """
+
+    def __init__(self, fetch, ttl=5.0, terminal_ttl=3600.0, hot_period=60.0, max_entries=10000,
+                 fetch_timeout=30.0):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.terminal_ttl = terminal_ttl
+        self.hot_period = hot_period
+        self.max_entries = max_entries
+        self.fetch_timeout = fetch_timeout
+        self.counters = {"hits": 0, "misses": 0, "coalesced": 0, "fetches": 0, "refreshes": 0, "errors": 0}
+        self._entries = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._refresher = None
+        self._stopped = threading.Event()
+
+    def _store(self, key, value, error, accessed_at):
+        terminal = error is None and value.get("status") in TERMINAL_STATUSES
+        now = time.monotonic()
+        self._entries[key] = _Entry(value, error, now + (self.terminal_ttl if terminal else self.ttl),
+                                    accessed_at, terminal)
+        if len(self._entries) > self.max_entries:
+            # least recently requested entries are evicted first
+            for old_key in sorted(self._entries, key=lambda k: self._entries[k].accessed_at)[
+                    :len(self._entries) - self.max_entries]:
+                del self._entries[old_key]
+
+    def _load(self, key, pending, counter, accessed_at):
+        """ fetch key upstream and wake up all waiters (caller has registered pending under the key)
+        """
+        try:
+            pending.value = self.fetch(key)
+        except Exception as exc:  # pylint: disable=broad-except
+            pending.error = exc
+        with self._lock:
+            self.counters[counter] += 1
+            if pending.error is not None and not isinstance(pending.error, PipelineNotFoundError):
+                self.counters["errors"] += 1
+            else:
+                self._store(key, pending.value, pending.error, accessed_at)
+            del self._pending[key]
+        pending.event.set()
+
+    def get(self, key):
+        """ return cached pipeline, fetch it upstream (once for all concurrent callers) if missing or expired
+        """
+        self._ensure_refresher()
+        now = time.monotonic()
+        leader = False
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > now:
+                entry.accessed_at = now
+                self.counters["hits"] += 1
+                return self._result(entry)
+            self.counters["misses"] += 1
+            pending = self._pending.get(key)
+            if pending is None:
+                pending = self._pending[key] = _Pending()
+                leader = True
+            else:
+                self.counters["coalesced"] += 1
+        if leader:
+            self._load(key, pending, "fetches", now)
+        elif not pending.event.wait(self.fetch_timeout):
+            raise GitlabError("pipeline {}/{} fetch timed out".format(*key))
+        return self._result(pending)
+
+    @staticmethod
+    def _result(entry):
+        if entry.error is not None:
+            raise entry.error
+        return entry.value
+
+    def refresh(self):
+        """ refresh hot non-terminal entries expiring before the next refresh round, return their number
+        """
+        now = time.monotonic()
+        refresh_keys = []
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if entry.terminal or entry.error is not None:
+                    if entry.expires_at <= now:
+                        del self._entries[key]
+                elif now - entry.accessed_at > self.hot_period:
+                    if entry.expires_at <= now:
+                        del self._entries[key]
+                elif entry.expires_at - now <= self.ttl / 2 and key not in self._pending:
+                    pending = self._pending[key] = _Pending()
+                    refresh_keys.append((key, pending, entry.accessed_at))
+        for key, pending, accessed_at in refresh_keys:
+            self._load(key, pending, "refreshes", accessed_at)
+        return len(refresh_keys)
+
+    def _refresh_loop(self):
+        while not self._stopped.wait(self.ttl / 4):
+            try:
+                self.refresh()
+            except Exception:  # pylint: disable=broad-except
+                log.exception("Pipeline cache refresh failed")
+
+    def _ensure_refresher(self):
+        if self._refresher is None:
+            with self._lock:
+                if self._refresher is None:
+                    self._refresher = threading.Thread(target=self._refresh_loop, name="pipeline-cache-refresh",
+                                                       daemon=True)
+                    self._refresher.start()
+
+    def stop(self):
+        """ stop background refresh
+        """
+        self._stopped.set()
+        if self._refresher is not None:
+            self._refresher.join()
+
+    def stats(self):
+        """ return counters and number of cached entries
+        """
+        with self._lock:
+            return dict(self.counters, entries=len(self._entries), pending=len(self._pending))
+
+
+_CACHE_LOCK = threading.Lock()
+
+
+def get_pipeline_cache(app):
+    """ return pipeline cache (with its GitLab client) of current uwsgi worker, created on first use
+    """
+    cache = app.extensions.get("pipeline_cache")
+    if cache is not None and cache.pid == os.getpid():
+        return cache
+    with _CACHE_LOCK:
+        cache = app.extensions.get("pipeline_cache")
+        if cache is None or cache.pid != os.getpid():
+            config = app.config
+            client = GitlabClient(config["GITLAB_URL"], config.get("GITLAB_ACCESS_TOKEN"),
+                                  timeout=config["GITLAB_TIMEOUT"], pool_size=config["GITLAB_POOL_SIZE"])
+            cache = PipelineCache(lambda key: client.get_pipeline(*key), ttl=config["PIPELINE_CACHE_TTL"],
+                                  terminal_ttl=config["PIPELINE_CACHE_TERMINAL_TTL"],
+                                  hot_period=config["PIPELINE_CACHE_HOT_PERIOD"],
+                                  max_entries=config["PIPELINE_CACHE_MAX_ENTRIES"],
+                                  fetch_timeout=config["GITLAB_TIMEOUT"] * 2)
+            cache.client = client
+            cache.pid = os.getpid()
+            app.extensions["pipeline_cache"] = cache
+    return cache
@@ -1,13 +1,40 @@
 """ Docstring
 """
 
+import fnmatch
 import logging as log
+import os
+import tempfile
 
 from flask import Flask, jsonify, make_response
 
+from server.health import HealthFastPath
+from server.metrics import CONTENT_TYPE, Instrumentation, MetricsStore
+from server.pipelines import GitlabError, PipelineNotFoundError, get_pipeline_cache
+
 # CONFFILE = os.environ.get("CONFFILE", '/app/conf/vassals/private.ini')
 
 app = Flask(__name__)
+app.config.from_mapping(
+    GITLAB_URL=os.environ.get("GITLAB_URL", "https://gitlab.seznam.net"),
+    GITLAB_ACCESS_TOKEN=os.environ.get("GITLAB_ACCESS_TOKEN"),
+    GITLAB_TIMEOUT=float(os.environ.get("GITLAB_TIMEOUT", "10")),
+    GITLAB_POOL_SIZE=int(os.environ.get("GITLAB_POOL_SIZE", "10")),
+    PIPELINE_CACHE_TTL=float(os.environ.get("PIPELINE_CACHE_TTL", "5")),
+    PIPELINE_CACHE_TERMINAL_TTL=float(os.environ.get("PIPELINE_CACHE_TERMINAL_TTL", "3600")),
+    PIPELINE_CACHE_HOT_PERIOD=float(os.environ.get("PIPELINE_CACHE_HOT_PERIOD", "60")),
+    PIPELINE_CACHE_MAX_ENTRIES=int(os.environ.get("PIPELINE_CACHE_MAX_ENTRIES", "10000")),
+    # projects (paths or ids, shell patterns) whose pipelines are served with GITLAB_ACCESS_TOKEN, none by default
+    PIPELINE_PROJECTS=[project.strip() for project in os.environ.get("PIPELINE_PROJECTS", "").split(",")
+                       if project.strip()],
+)
+HEALTH_BODIES = {
+    "/": ("200 OK", app.json.response({"code": 200, "message": "OK"}).get_data(), "application/json"),
+    "/test": ("200 OK", app.json.response({"code": 200, "message": "Nope!"}).get_data(), "application/json"),
+}
+app.wsgi_app = HealthFastPath(app.wsgi_app, HEALTH_BODIES)
+metrics = Instrumentation(app, MetricsStore(
+    os.environ.get("METRICS_DIR", os.path.join(tempfile.gettempdir(), "cicd-scout-metrics"))))
 # utils.setup_logging(app.cfg)
 log.info("Config and logger initialized")
 
@@ -16,11 +43,40 @@ log.info("Config and logger initialized")
 def test():
     """ test
     """
-    return make_response(jsonify({"code": 200, "message":"Nope!"}), 200)
+    return make_response(HEALTH_BODIES["/test"][1], 200, {"Content-Type": HEALTH_BODIES["/test"][2]})
 
 
 @app.route("/")
 def monitoring():
     """ root
     """
-    return make_response(jsonify({"code": 200, "message":"OK"}), 200)
+    return make_response(HEALTH_BODIES["/"][1], 200, {"Content-Type": HEALTH_BODIES["/"][2]})
+
+
+@app.route("/pipelines/<path:project>/<int:pipeline_id>")
+def pipeline(project, pipeline_id):
+    """ pipeline (GitLab API JSON) served from cache of the worker, projects not in PIPELINE_PROJECTS are refused
+    """
+    if not any(fnmatch.fnmatchcase(project, pattern) for pattern in app.config["PIPELINE_PROJECTS"]):
+        return make_response(jsonify({"code": 403, "message": "project {} is not allowed".format(project)}), 403)
+    try:
+        return make_response(jsonify(get_pipeline_cache(app).get((project, pipeline_id))), 200)
+    except PipelineNotFoundError as exc:
+        return make_response(jsonify({"code": 404, "message": str(exc)}), 404)
+    except GitlabError as exc:
+        log.warning("GitLab request failed: %s", exc)
+        return make_response(jsonify({"code": 502, "message": "GitLab request failed"}), 502)
+
+
+@app.route("/pipelines/cache")
+def pipeline_cache():
+    """ pipeline cache counters of the worker
+    """
+    return make_response(jsonify(get_pipeline_cache(app).stats()), 200)
+
+
+@app.route("/metrics")
+def prometheus_metrics():
+    """ request metrics of all workers in Prometheus format
+    """
+    return make_response(metrics.render(), 200, {"Content-Type": CONTENT_TYPE})
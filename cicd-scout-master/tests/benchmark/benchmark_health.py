@@ -0,0 +1,199 @@
+""" Load test of cicd-scout routes
+
+Starts the app under uwsgi (or threaded werkzeug server, or uses running instance given by --url),
+drives it by keep-alive HTTP clients at given concurrency levels and reports requests/s and p50/p99 latency.
+
+examples:
+  $ python3 tests/benchmark/benchmark_health.py --server uwsgi --workers 3 --concurrency 1,16,64
+  $ python3 tests/benchmark/benchmark_health.py --server threaded --method HEAD --path /test
+  $ python3 tests/benchmark/benchmark_health.py --url http://cicd-scout.mapy-master.ops.dszn.cz --duration 30
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def free_port():
+    """ return free local port
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(mode, port, workers, threads):
+    """ start the app in subprocess, return the process
+    """
+    env = dict(os.environ, METRICS_DIR=tempfile.mkdtemp(prefix="cicd-scout-metrics-"))
+    if mode == "uwsgi":
+        command = ["uwsgi", "--http11-socket", "127.0.0.1:{}".format(port), "--module", "server.private:app",
+                   "--master", "--workers", str(workers), "--threads", str(threads), "--enable-threads",
+                   "--lazy-apps", "--need-app", "--die-on-term", "--disable-logging", "--listen", "1024"]
+    else:
+        command = [sys.executable, os.path.abspath(__file__), "--serve-threaded", str(port)]
+    return subprocess.Popen(command, cwd=ROOT_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def serve_threaded(port):
+    """ serve the app by threaded werkzeug server with keep-alive connections
+    """
+    sys.path.insert(0, ROOT_DIR)
+    from werkzeug.serving import WSGIRequestHandler, make_server  # pylint: disable=import-outside-toplevel
+    from server.private import app  # pylint: disable=import-outside-toplevel
+
+    class Handler(WSGIRequestHandler):
+        """ HTTP/1.1 (keep-alive) request handler without logging
+        """
+        protocol_version = "HTTP/1.1"
+
+        def log_request(self, *args, **kwargs):
+            pass
+
+    make_server("127.0.0.1", port, app, threaded=True, request_handler=Handler).serve_forever()
+
+
+async def _request(reader, writer, request):
+    """ send request, return (status, keep-alive)
+    """
+    writer.write(request)
+    await writer.drain()
+    status_line = await reader.readuntil(b"\r\n")
+    headers = {}
+    while True:
+        line = await reader.readuntil(b"\r\n")
+        if line == b"\r\n":
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    if length and not request.startswith(b"HEAD "):
+        await reader.readexactly(length)
+    keep_alive = headers.get("connection", "").lower() != "close" and status_line.startswith(b"HTTP/1.1")
+    return int(status_line.split()[1]), keep_alive
+
+
+async def _client(url, request, deadline, latencies, errors):
+    connection = None
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            if connection is None:
+                connection = await asyncio.open_connection(url.hostname, url.port or 80)
+            status, keep_alive = await _request(*connection, request)
+        except (OSError, ValueError, asyncio.IncompleteReadError) as exc:
+            errors.append(str(exc))
+            connection = None
+            continue
+        latencies.append(time.perf_counter() - start)
+        if status >= 400:
+            errors.append("HTTP {}".format(status))
+        if not keep_alive:
+            connection[1].close()
+            connection = None
+    if connection is not None:
+        connection[1].close()
+
+
+async def run_load(url, method, concurrency, duration):
+    """ drive url by concurrent keep-alive clients for duration seconds, return latencies and errors
+    """
+    parsed = urllib.parse.urlsplit(url)
+    request = "{} {} HTTP/1.1\r\nHost: {}\r\nConnection: keep-alive\r\n\r\n".format(
+        method, parsed.path or "/", parsed.netloc).encode()
+    latencies, errors = [], []
+    deadline = time.monotonic() + duration
+    await asyncio.gather(*[_client(parsed, request, deadline, latencies, errors) for _ in range(concurrency)])
+    return latencies, errors
+
+
+def percentile(values, fraction):
+    """ return percentile of sorted values
+    """
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else float("nan")
+
+
+def wait_ready(url, process, timeout=30.0):
+    """ wait until the server answers
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError("server exited with {}".format(process.returncode))
+        latencies, errors = asyncio.run(run_load(url, "GET", 1, 0.01))
+        if latencies and not errors:
+            return
+        time.sleep(0.1)
+    raise RuntimeError("server not ready in {}s".format(timeout))
+
+
+def get_cmdline_parser():
+    """ return command-line parser
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", choices=("uwsgi", "threaded"), default="uwsgi",
+                        help="server started for the benchmark (default: %(default)s)")
+    parser.add_argument("--url", help="benchmark running instance instead of starting the server")
+    parser.add_argument("--workers", type=int, default=3, help="uwsgi workers (default: %(default)s)")
+    parser.add_argument("--threads", type=int, default=1, help="uwsgi threads per worker (default: %(default)s)")
+    parser.add_argument("--path", default="/", help="requested path (default: %(default)s)")
+    parser.add_argument("--method", default="GET", choices=("GET", "HEAD"), help="HTTP method (default: %(default)s)")
+    parser.add_argument("--concurrency", default="1,8,32",
+                        help="comma-separated concurrency levels (default: %(default)s)")
+    parser.add_argument("--duration", type=float, default=5.0,
+                        help="duration of every level in seconds (default: %(default)s)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON lines")
+    parser.add_argument("--serve-threaded", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    return parser
+
+
+def main():
+    """ run the benchmark
+    """
+    args = get_cmdline_parser().parse_args()
+    if args.serve_threaded:
+        serve_threaded(args.serve_threaded)
+        return
+
+    process = None
+    base_url = args.url
+    if not base_url:
+        port = free_port()
+        process = start_server(args.server, port, args.workers, args.threads)
+        base_url = "http://127.0.0.1:{}".format(port)
+    try:
+        wait_ready(base_url, process)
+        url = base_url.rstrip("/") + args.path
+        if not args.json:
+            print("{:>11}  {:>9}  {:>10}  {:>9}  {:>9}  {:>6}".format(
+                "concurrency", "requests", "requests/s", "p50 ms", "p99 ms", "errors"))
+        for concurrency in [int(level) for level in args.concurrency.split(",")]:
+            latencies, errors = asyncio.run(run_load(url, args.method, concurrency, args.duration))
+            latencies.sort()
+            result = {"server": "external" if args.url else args.server, "path": args.path, "method": args.method,
+                      "concurrency": concurrency, "requests": len(latencies),
+                      "requests_per_second": len(latencies) / args.duration,
+                      "p50_ms": percentile(latencies, 0.5) * 1000, "p99_ms": percentile(latencies, 0.99) * 1000,
+                      "errors": len(errors)}
+            if args.json:
+                print(json.dumps(result))
+            else:
+                print("{concurrency:>11}  {requests:>9}  {requests_per_second:>10.0f}  {p50_ms:>9.2f}  "
+                      "{p99_ms:>9.2f}  {errors:>6}".format(**result))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+""" local GitLab API stub
+"""
+
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PIPELINE_PATH_RE = re.compile(r"^/api/v4/projects/(?P<project>[^/]+)/pipelines/(?P<pipeline_id>\d+)$")
+
+
+class GitlabStub:
+    """ serves pipelines from dict (project, pipeline_id) -> pipeline, counts requests
+    """
+
+    def __init__(self):
+        self.pipelines = {}
+        self.requests = 0
+        self.connections = set()
+        self.delay = 0.0
+        self.status = 200
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """ GitLab pipelines API handler
+            """
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+                pass
+
+            def do_GET(self):  # pylint: disable=invalid-name
+                """ GET pipeline
+                """
+                with stub.lock:
+                    stub.requests += 1
+                    stub.connections.add(self.client_address)
+                time.sleep(stub.delay)
+                match = PIPELINE_PATH_RE.match(self.path)
+                pipeline = None
+                if match:
+                    pipeline = stub.pipelines.get((match.group("project").replace("%2F", "/"),
+                                                   int(match.group("pipeline_id"))))
+                status = stub.status if pipeline is not None or stub.status != 200 else 404
+                body = json.dumps(pipeline if status == 200 else {"message": "404 Not found"}).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = "http://127.0.0.1:{}".format(self.server.server_address[1])
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
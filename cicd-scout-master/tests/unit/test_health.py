@@ -0,0 +1,40 @@
+""" health routes test
+"""
+
+from flask import jsonify
+
+from server.private import app
+
+
+def test_health_bodies():
+    """ fast path serves the same responses as jsonify did
+    """
+    client = app.test_client()
+    for path, message in (("/", "OK"), ("/test", "Nope!")):
+        resp = client.get(path)
+        with app.app_context():
+            expected = jsonify({"code": 200, "message": message})
+        assert resp.status_code == 200
+        assert resp.get_data() == expected.get_data()
+        assert resp.headers["Content-Type"] == "application/json"
+        assert resp.headers["Content-Length"] == str(len(expected.get_data()))
+        assert client.get(path + "?probe=1").get_data() == expected.get_data()
+
+
+def test_health_head():
+    """ HEAD has the same headers as GET and no body
+    """
+    client = app.test_client()
+    get, head = client.get("/"), client.head("/")
+    assert head.status_code == 200
+    assert head.get_data() == b""
+    assert head.headers["Content-Length"] == get.headers["Content-Length"]
+    assert head.headers["Content-Type"] == get.headers["Content-Type"]
+
+
+def test_health_other_methods():
+    """ other methods are handled by Flask
+    """
+    client = app.test_client()
+    assert client.post("/").status_code == 405
+    assert "GET" in client.options("/test").headers["Allow"]
@@ -0,0 +1,71 @@
+""" metrics test
+"""
+
+import multiprocessing
+import re
+
+import pytest
+
+from server.metrics import MetricsStore
+from server.private import app, metrics
+
+
+@pytest.fixture(name="store")
+def fixture_store(tmp_path):
+    """ app metrics in empty directory
+    """
+    original, metrics.store = metrics.store, MetricsStore(str(tmp_path))
+    yield metrics.store
+    metrics.store = original
+
+
+def _increment(directory, count):
+    store = MetricsStore(directory)
+    for _ in range(count):
+        store.add("counter", (("route", "/"),))
+    store.add("gauge", (), 1.0)
+
+
+def test_store_aggregates_workers(tmp_path):
+    """ values of all processes are summed, gauges of finished processes are left out
+    """
+    store = MetricsStore(str(tmp_path))
+    for _ in range(1000):
+        store.add("counter", (("route", "/"),))
+    store.add("gauge", (), 1.0)
+    workers = [multiprocessing.get_context("fork").Process(target=_increment, args=(str(tmp_path), 500))
+               for _ in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert store.collect(gauges=("gauge",)) == {("counter", (("route", "/"),)): 2500.0, ("gauge", ()): 1.0}
+    # values file is reopened and keeps growing
+    for index in range(3000):
+        store.add("counter", (("route", "/{}".format(index)),))
+    assert len(MetricsStore(str(tmp_path)).collect()) == 3002
+
+
+def test_metrics_endpoint(store):
+    """ requests are counted per route and status, latency histogram is cumulative
+    """
+    client = app.test_client()
+    for _ in range(3):
+        client.get("/")
+    client.get("/nonexistent")
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    text = resp.get_data(as_text=True)
+    assert 'cicd_scout_http_requests_total{route="/",method="GET",status="200"} 3' in text
+    assert 'cicd_scout_http_requests_total{route="none",method="GET",status="404"} 1' in text
+    assert 'cicd_scout_http_request_duration_seconds_bucket{route="/",le="+Inf"} 3' in text
+    assert 'cicd_scout_http_request_duration_seconds_count{route="/"} 3' in text
+    # health routes are answered by fast path, they are never in flight
+    assert 'cicd_scout_http_requests_in_flight{route="/"}' not in text
+    # the /metrics request itself is in flight
+    assert 'cicd_scout_http_requests_in_flight{route="/metrics"} 1' in text
+    buckets = [float(value) for value in re.findall(r'_bucket\{route="/",le="[^"]+"\} (\S+)', text)]
+    assert buckets == sorted(buckets)
+    assert re.search(r'cicd_scout_worker_requests_total\{worker="\d+"\} 4', text)
+    assert store.collect()
@@ -0,0 +1,105 @@
+""" pipelines cache test
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from server.private import app
+from tests.unit.gitlab_stub import GitlabStub
+
+
+@pytest.fixture(name="gitlab")
+def fixture_gitlab():
+    """ stub GitLab and app using it with fresh cache
+    """
+    with GitlabStub() as gitlab:
+        app.config.update(GITLAB_URL=gitlab.url, PIPELINE_CACHE_TTL=0.4, PIPELINE_CACHE_HOT_PERIOD=60,
+                          PIPELINE_PROJECTS=["group/*", "42"])
+        app.extensions.pop("pipeline_cache", None)
+        yield gitlab
+        cache = app.extensions.pop("pipeline_cache", None)
+        if cache:
+            cache.stop()
+
+
+def test_hit_miss(gitlab):
+    """ repeated requests are served from cache
+    """
+    gitlab.pipelines[("group/project", 1)] = {"id": 1, "status": "success"}
+    client = app.test_client()
+    for _ in range(3):
+        resp = client.get("/pipelines/group/project/1")
+        assert resp.status_code == 200
+        assert resp.get_json() == {"id": 1, "status": "success"}
+    assert gitlab.requests == 1
+    stats = client.get("/pipelines/cache").get_json()
+    assert (stats["hits"], stats["misses"], stats["fetches"]) == (2, 1, 1)
+
+
+def test_coalescing(gitlab):
+    """ concurrent misses of the same pipeline cause single upstream fetch over pooled session
+    """
+    gitlab.pipelines[("42", 7)] = {"id": 7, "status": "running"}
+    gitlab.delay = 0.3
+
+    def get(_):
+        return app.test_client().get("/pipelines/42/7").status_code
+
+    with ThreadPoolExecutor(20) as executor:
+        assert set(executor.map(get, range(20))) == {200}
+    assert gitlab.requests == 1
+    stats = app.test_client().get("/pipelines/cache").get_json()
+    assert stats["coalesced"] == 19
+    gitlab.delay = 0
+    gitlab.pipelines[("42", 8)] = {"id": 8, "status": "running"}
+    app.test_client().get("/pipelines/42/8")
+    assert len(gitlab.connections) == 1
+
+
+def test_errors(gitlab):
+    """ unknown pipelines are not found (and cached), GitLab failures are not cached
+    """
+    client = app.test_client()
+    assert client.get("/pipelines/42/1").status_code == 404
+    assert client.get("/pipelines/42/1").status_code == 404
+    assert gitlab.requests == 1
+    gitlab.pipelines[("42", 2)] = {"id": 2, "status": "running"}
+    gitlab.status = 500
+    assert client.get("/pipelines/42/2").status_code == 502
+    gitlab.status = 200
+    assert client.get("/pipelines/42/2").status_code == 200
+    assert client.get("/pipelines/cache").get_json()["errors"] == 1
+
+
+def test_background_refresh(gitlab):
+    """ hot pipeline is refreshed in the background until it is finished
+    """
+    gitlab.pipelines[("42", 3)] = {"id": 3, "status": "running"}
+    client = app.test_client()
+    assert client.get("/pipelines/42/3").get_json()["status"] == "running"
+    time.sleep(0.6)
+    gitlab.pipelines[("42", 3)] = {"id": 3, "status": "success"}
+    deadline = time.monotonic() + 3
+    while client.get("/pipelines/42/3").get_json()["status"] != "success":
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    stats = client.get("/pipelines/cache").get_json()
+    assert stats["refreshes"] >= 1
+    assert stats["misses"] == 1
+    requests = gitlab.requests
+    time.sleep(0.6)
+    assert gitlab.requests == requests
+
+
+def test_project_allowlist(gitlab):
+    """ pipelines of projects not in PIPELINE_PROJECTS are refused without upstream request
+    """
+    gitlab.pipelines[("other/project", 1)] = {"id": 1, "status": "success"}
+    client = app.test_client()
+    assert client.get("/pipelines/other/project/1").status_code == 403
+    assert client.get("/pipelines/43/1").status_code == 403
+    assert gitlab.requests == 0
+    app.config.update(PIPELINE_PROJECTS=[])
+    assert client.get("/pipelines/42/1").status_code == 403
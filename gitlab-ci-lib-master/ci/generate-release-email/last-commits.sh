@@ -5,32 +5,16 @@
 #
 # AUTHOR:
 # Kozlovský, Jiří <jiri.kozlovsky@firma.seznam.cz>
+#
+# last-commits.sh [UNTIL_NTH_TAG]
+#   prints " - <line>" per line of the first paragraph of commit messages since the UNTIL_NTH_TAG-th tag
+#   (default 1, tag of HEAD is the first one), merge branch commits are skipped
+#
+# Commits are read by single bounded `git log <tag>..HEAD` of ci-scripts' release_history.py
+# (RELEASE_HISTORY_PY, default /ci/release_history.py of ci-scripts tarball),
+# use `release_history.py commits --nth-tag N` for JSON output.
 
 UNTIL_NTH_TAG=${1:-1}
-TAGS_ENCOUNTERED=0
-line_number=0
-git log --decorate=full | \
-	while read line; do
-		# echo DEBUG: $line
-		[[ "$line" =~ "Author" ]] && line_number=1
-		[[ "$line" =~ tag ]] && {
-			test "$((++TAGS_ENCOUNTERED))" -eq "$UNTIL_NTH_TAG" && break || continue
-		}
-		if test $line_number -gt 0; then
-			# echo "FOUND: $line"
-			if test $line_number -ge 4; then
-				if test -n "$line"; then
-					if [[ "$line" =~ "Merge branch" ]]; then
-						line_number=0
-					else
-						echo " - $line"
-						((++line_number))
-					fi
-				else
-					line_number=0
-				fi
-			else
-				((++line_number))
-			fi
-		fi
-	done
\ No newline at end of file
+RELEASE_HISTORY_PY=${RELEASE_HISTORY_PY:-/ci/release_history.py}
+
+python3 "${RELEASE_HISTORY_PY}" commits --nth-tag "${UNTIL_NTH_TAG}" --format list